@@ -24,7 +24,8 @@ from .admin_utils import (gerar_relatorio_pdf, gerar_relatorio_excel, gerar_rela
 # Importar modelos de outros módulos
 from auth.auth_models import Usuario, PerfilUsuario
 from tasks.task_models import Tarefa, Subtarefa, ComentarioTarefa
-from files.file_models import Arquivo
+from files.file_manutencao import resumo_manutencao
+from files.file_cotas import resumo_uso, maiores_consumidores, ESCOPO_USUARIO, ESCOPO_INSTITUICAO, ESCOPO_TOTAL, REFERENCIA_TOTAL
 
 # Importar extensões da aplicação
 from auth import db
@@ -56,7 +57,9 @@ def dashboard():
     # Obter estatísticas gerais
     total_usuarios = Usuario.query.count()
     total_tarefas = Tarefa.query.count()
-    total_arquivos = Arquivo.query.count()
+    
+    # Contador mantido a cada upload e exclusão
+    total_arquivos = resumo_uso(ESCOPO_TOTAL, REFERENCIA_TOTAL)['arquivos']
     
     # Usuários por perfil
     usuarios_por_perfil = db.session.query(
@@ -994,3 +997,101 @@ def calcular_proximo_agendamento(frequencia):
     else:
         # Sob demanda não tem próximo agendamento
         return None
+
+@admin_bp.route('/arquivos/cache')
+@admin_required
+def estatisticas_cache_arquivos():
+    """
+    Retorna os contadores do cache de conteúdo em memória deste processo.
+    """
+    from files.file_download import obter_cache_conteudo
+    
+    return jsonify(obter_cache_conteudo().estatisticas())
+
+@admin_bp.route('/arquivos/uso')
+@admin_required
+def uso_armazenamento_arquivos():
+    """
+    Retorna o uso de armazenamento do sistema e os usuários e instituições que mais usam espaço.
+    
+    Parâmetro opcional: limite (quantidade de usuários e de instituições, padrão 10).
+    """
+    limite = request.args.get('limite', 10, type=int)
+    
+    if limite <= 0:
+        return jsonify({'error': 'O limite deve ser positivo'}), 400
+    
+    def formatar(uso):
+        return {
+            'id': uso.referencia_id,
+            'arquivos': uso.arquivos,
+            'bytes_usados': uso.bytes_usados,
+            'bytes_arquivos': uso.bytes_arquivos,
+            'bytes_versoes': uso.bytes_versoes
+        }
+    
+    return jsonify({
+        'total': resumo_uso(ESCOPO_TOTAL, REFERENCIA_TOTAL),
+        'maiores_usuarios': [formatar(uso) for uso in maiores_consumidores(ESCOPO_USUARIO, limite)],
+        'maiores_instituicoes': [formatar(uso) for uso in maiores_consumidores(ESCOPO_INSTITUICAO, limite)]
+    })
+
+@admin_bp.route('/arquivos/manutencao')
+@admin_required
+def resumo_manutencao_arquivos():
+    """
+    Retorna a última execução da manutenção do armazenamento e o espaço liberado.
+    
+    Parâmetro opcional: dias (período do total de espaço liberado, padrão 30).
+    """
+    dias = request.args.get('dias', 30, type=int)
+    
+    if dias <= 0:
+        return jsonify({'error': 'O período deve ser de pelo menos um dia'}), 400
+    
+    resumo = resumo_manutencao(dias)
+    if resumo['ultima_execucao']:
+        resumo['ultima_execucao'] = resumo['ultima_execucao'].isoformat()
+    
+    return jsonify(resumo)
+
+@admin_bp.route('/arquivos/duplicados')
+@admin_required
+def relatorio_arquivos_duplicados():
+    """
+    Relatório dos grupos de arquivos quase idênticos (texto extraído semelhante).
+    
+    Parâmetros opcionais: limiar (similaridade mínima, entre 0 e 1) e
+    grupos (quantidade máxima de grupos, os maiores primeiro).
+    """
+    from files.file_similaridade import agrupar_quase_identicos
+    
+    limiar = request.args.get('limiar', type=float)
+    maximo_grupos = request.args.get('grupos', 100, type=int)
+    
+    if limiar is not None and not 0 < limiar <= 1:
+        return jsonify({'error': 'O limiar deve estar entre 0 e 1'}), 400
+    
+    grupos = agrupar_quase_identicos(limiar=limiar, maximo_grupos=maximo_grupos)
+    
+    return jsonify({
+        'total_grupos': len(grupos),
+        'grupos': [
+            {
+                'total_arquivos': len(grupo['arquivos']),
+                'similaridade_minima': round(grupo['similaridade_minima'], 3),
+                'arquivos': [
+                    {
+                        'id': arquivo.id,
+                        'nome': arquivo.nome,
+                        'usuario_id': arquivo.usuario_id,
+                        'instituicao_id': arquivo.instituicao_id,
+                        'tamanho': arquivo.tamanho,
+                        'data_upload': arquivo.data_upload.isoformat()
+                    }
+                    for arquivo in grupo['arquivos']
+                ]
+            }
+            for grupo in grupos
+        ]
+    })
@@ -23,6 +23,7 @@ from .admin_models import LogSistema, Configuracao, Estatistica, Backup
 from auth.auth_models import Usuario, PerfilUsuario
 from tasks.task_models import Tarefa, Subtarefa, ComentarioTarefa
 from files.file_models import Arquivo
+from files.file_cotas import consultar_uso, ESCOPO_TOTAL, REFERENCIA_TOTAL
 
 # Importar extensões da aplicação
 from auth import db
@@ -74,13 +75,14 @@ def calcular_estatisticas(periodo_inicio=None, periodo_fim=None):
         Tarefa.status
     ).all()
     
-    # Estatísticas de arquivos
-    total_arquivos = Arquivo.query.count()
+    # Estatísticas de arquivos (totais lidos do contador de uso do sistema)
+    uso_total = consultar_uso(ESCOPO_TOTAL, REFERENCIA_TOTAL)
+    total_arquivos = uso_total.arquivos
     arquivos_periodo = Arquivo.query.filter(
         Arquivo.data_upload >= periodo_inicio,
         Arquivo.data_upload <= periodo_fim
     ).count()
-    tamanho_total_arquivos = db.session.query(func.sum(Arquivo.tamanho)).scalar() or 0
+    tamanho_total_arquivos = uso_total.bytes_arquivos
     arquivos_por_tipo = db.session.query(
         Arquivo.tipo, func.count(Arquivo.id)
     ).group_by(
@@ -132,6 +134,7 @@ def calcular_estatisticas(periodo_inicio=None, periodo_fim=None):
             'total': total_arquivos,
             'periodo': arquivos_periodo,
             'tamanho_total': tamanho_total_arquivos,
+            'tamanho_versoes': uso_total.bytes_versoes,
             'por_tipo': {tipo: count for tipo, count in arquivos_por_tipo}
         },
         'atividades': {
@@ -0,0 +1,179 @@
+"""
+Benchmark da análise de documentos: etapas separadas x análise em passagem única
+Serra Projetos Educacionais
+
+Para cada PDF do corpus, mede o tempo para obter texto, metadados, número
+de páginas e miniatura:
+
+- separado: fluxo anterior, em que extrair_texto_arquivo (PyPDF2, com
+  concatenação sucessiva do texto), obter_metadados_arquivo (PyPDF2) e
+  gerar_thumbnail (PyMuPDF + Pillow) abrem e interpretam o arquivo cada um;
+- passagem única: files.file_utils.analisar_documento, que abre o arquivo
+  uma vez.
+
+Também mede, isoladamente, a montagem do texto por concatenação (texto +=)
+e por junção de lista, sobre as páginas já extraídas.
+
+Sem --corpus, é gerado um corpus sintético de PDFs grandes.
+
+Uso:
+    python benchmarks/benchmark_analise.py [--corpus DIRETORIO] [--paginas 100,300,500] [--repeticoes 3]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import PyPDF2
+from files.file_utils import analisar_documento
+
+LARGURA_MINIATURA = 200
+
+LINHA = 'Relatório de avaliação educacional da rede municipal de ensino - indicadores e metas'
+
+def gerar_pdf(caminho, paginas, linhas_por_pagina=45):
+    """Gera um PDF simples com texto em todas as páginas (sem dependências externas)."""
+    objetos = []
+
+    def adicionar(conteudo):
+        objetos.append(conteudo)
+        return len(objetos)
+
+    catalogo = adicionar(None)
+    raiz_paginas = adicionar(None)
+    fonte = adicionar(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    ids_paginas = []
+    for numero in range(1, paginas + 1):
+        linhas = [b'BT /F1 10 Tf 40 800 Td 12 TL']
+        for i in range(linhas_por_pagina):
+            texto = f'{LINHA} {numero}.{i}'.encode('latin-1').replace(b'(', b'').replace(b')', b'')
+            linhas.append(b'(' + texto + b') Tj T*')
+        linhas.append(b'ET')
+        fluxo = b'\n'.join(linhas)
+        conteudo = adicionar(b'<< /Length %d >>\nstream\n' % len(fluxo) + fluxo + b'\nendstream')
+        ids_paginas.append(adicionar(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>' % (raiz_paginas, fonte, conteudo)
+        ))
+
+    objetos[catalogo - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % raiz_paginas
+    objetos[raiz_paginas - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % i for i in ids_paginas), len(ids_paginas)
+    )
+
+    with open(caminho, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        posicoes = []
+        for numero, conteudo in enumerate(objetos, 1):
+            posicoes.append(f.tell())
+            f.write(b'%d 0 obj\n' % numero + conteudo + b'\nendobj\n')
+        inicio_xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1))
+        for posicao in posicoes:
+            f.write(b'%010d 00000 n \n' % posicao)
+        f.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+            len(objetos) + 1, catalogo, inicio_xref
+        ))
+
+def fluxo_separado(caminho):
+    """Reproduz as três etapas anteriores, cada uma abrindo o arquivo."""
+    # extrair_texto_arquivo
+    texto = ''
+    with open(caminho, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                texto += page_text + '\n'
+
+    # obter_metadados_arquivo
+    metadados = {}
+    with open(caminho, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        metadados['paginas'] = len(reader.pages)
+        if reader.metadata and reader.metadata.get('/Title'):
+            metadados['titulo'] = reader.metadata.get('/Title')
+
+    # gerar_thumbnail
+    try:
+        import fitz  # PyMuPDF
+        from PIL import Image
+    except ImportError:
+        return texto, metadados
+
+    with tempfile.NamedTemporaryFile(suffix='.png') as destino:
+        doc = fitz.open(caminho)
+        pix = doc.load_page(0).get_pixmap()
+        pix.save(destino.name)
+        img = Image.open(destino.name)
+        img.thumbnail((LARGURA_MINIATURA, LARGURA_MINIATURA))
+        img.save(destino.name)
+        doc.close()
+
+    return texto, metadados
+
+def passagem_unica(caminho):
+    """Obtém tudo com analisar_documento."""
+    return analisar_documento(caminho, 'application/pdf', largura_miniatura=LARGURA_MINIATURA, propagar_erros=True)
+
+def medir(funcao, argumento, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(argumento)
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+def montar_concatenando(paginas):
+    texto = ''
+    for pagina in paginas:
+        texto += pagina + '\n'
+    return texto
+
+def montar_juntando(paginas):
+    return '\n'.join(paginas)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Diretório com arquivos PDF (padrão: corpus sintético)')
+    parser.add_argument('--paginas', default='100,300,500', help='Páginas dos PDFs sintéticos, separadas por vírgula')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Repetições por medição')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        if args.corpus:
+            arquivos = sorted(glob.glob(os.path.join(args.corpus, '*.pdf')))
+        else:
+            arquivos = []
+            for paginas in [int(p) for p in args.paginas.split(',')]:
+                caminho = os.path.join(diretorio, f'sintetico_{paginas}_paginas.pdf')
+                gerar_pdf(caminho, paginas)
+                arquivos.append(caminho)
+
+        print(f"{'Arquivo':<32} | {'Páginas':>7} | {'Separado':>10} | {'Passagem única':>14} | {'texto +=':>9} | {'join':>7}")
+        print('-' * 94)
+
+        total_separado = total_unica = 0
+        for caminho in arquivos:
+            resultado = passagem_unica(caminho)
+            paginas = resultado['paginas'] or []
+
+            tempo_separado = medir(fluxo_separado, caminho, args.repeticoes)
+            tempo_unica = medir(passagem_unica, caminho, args.repeticoes)
+            tempo_concatenar = medir(montar_concatenando, paginas, args.repeticoes)
+            tempo_juntar = medir(montar_juntando, paginas, args.repeticoes)
+
+            total_separado += tempo_separado
+            total_unica += tempo_unica
+            print(f"{os.path.basename(caminho)[:32]:<32} | {resultado['total_paginas'] or 0:>7} | "
+                  f"{tempo_separado:>7.0f} ms | {tempo_unica:>11.0f} ms | {tempo_concatenar:>6.1f} ms | {tempo_juntar:>4.1f} ms")
+
+        print('-' * 94)
+        print(f"{'Total':<32} | {'':>7} | {total_separado:>7.0f} ms | {total_unica:>11.0f} ms |")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Benchmark da verificação antivírus dos uploads: em fluxo x após gravar x veredito em cache
+Serra Projetos Educacionais
+
+Recebe conteúdos de tamanhos diferentes com o ReceptorUpload e os verifica
+em um daemon simulado compatível com o clamd (ServidorClamdSimulado, abaixo)
+de quatro formas:
+
+- sem verificação (referência);
+- após gravar: o arquivo recebido é relido e enviado ao daemon (como o
+  antigo verificar_virus, que chamava o clamscan sobre o arquivo salvo);
+- em fluxo: os blocos são enviados ao daemon durante o recebimento e, ao
+  final, apenas o veredito é aguardado (files.file_antivirus);
+- conteúdo repetido: a verificação em fluxo é descartada porque o hash já
+  tem veredito guardado, sem verificação no daemon.
+
+Para cada forma, mede o tempo total por upload e o tempo entre o último
+byte recebido e o veredito. O daemon simulado procura as assinaturas à
+medida que os blocos chegam; o clamd grava o stream e o verifica ao final,
+de modo que com ele o ganho da verificação em fluxo é a releitura e a
+transferência evitadas após o recebimento, e não o tempo do exame.
+
+Uso:
+    python benchmarks/benchmark_antivirus.py [--tamanhos 1,10,50] [--repeticoes 5]
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+import threading
+import statistics
+import socketserver
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from files.file_pipeline import ReceptorUpload
+from files.file_antivirus import VerificadorClamd
+
+TAMANHO_BLOCO_UPLOAD = 64 * 1024
+
+# Arquivo de teste padrão EICAR, a única assinatura detectada pelo daemon simulado
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+class _TratadorClamd(socketserver.StreamRequestHandler):
+    """Atende um comando zINSTREAM ou zPING por conexão, como o clamd sem IDSESSION."""
+
+    def handle(self):
+        comando = bytearray()
+        while True:
+            caractere = self.rfile.read(1)
+            if not caractere or caractere == b'\0':
+                break
+            comando += caractere
+
+        if comando == b'zPING':
+            self.wfile.write(b'PONG\0')
+            return
+        if comando != b'zINSTREAM':
+            self.wfile.write(b'UNKNOWN COMMAND\0')
+            return
+
+        # Assinatura procurada à medida que os blocos chegam (podendo estar
+        # dividida entre dois blocos)
+        cauda = b''
+        encontrada = False
+        while True:
+            cabecalho = self.rfile.read(4)
+            if len(cabecalho) < 4:
+                return
+            tamanho = struct.unpack('!L', cabecalho)[0]
+            if tamanho == 0:
+                break
+            janela = cauda + self.rfile.read(tamanho)
+            encontrada = encontrada or EICAR in janela
+            cauda = janela[-(len(EICAR) - 1):]
+
+        with self.server.lock:
+            self.server.verificacoes += 1
+        self.wfile.write(b'stream: Eicar-Signature FOUND\0' if encontrada else b'stream: OK\0')
+
+
+class ServidorClamdSimulado:
+    """Daemon simulado compatível com o protocolo INSTREAM do clamd, em um socket Unix."""
+
+    def __init__(self, endereco):
+        classe = type('ServidorUnix', (socketserver.ThreadingMixIn, socketserver.UnixStreamServer), {})
+        self.endereco = endereco
+        self.servidor = classe(endereco, _TratadorClamd)
+        self.servidor.daemon_threads = True
+        self.servidor.lock = threading.Lock()
+        self.servidor.verificacoes = 0
+
+    @property
+    def verificacoes(self):
+        """Quantidade de conteúdos verificados (INSTREAM concluídos)."""
+        return self.servidor.verificacoes
+
+    def iniciar_em_segundo_plano(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def encerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        if os.path.exists(self.endereco):
+            os.remove(self.endereco)
+
+
+def gerar_conteudo(tamanho):
+    """Gera um conteúdo com cabeçalho de PDF e o tamanho solicitado."""
+    cabecalho = b'%PDF-1.4\n'
+    return cabecalho + os.urandom(tamanho - len(cabecalho))
+
+def receber(conteudo, diretorio, verificador=None):
+    """Recebe o conteúdo em blocos, como nas rotas com upload_em_fluxo."""
+    receptor = ReceptorUpload('documento.pdf', diretorio, verificador=verificador)
+    stream = io.BytesIO(conteudo)
+    for bloco in iter(lambda: stream.read(TAMANHO_BLOCO_UPLOAD), b''):
+        receptor.write(bloco)
+    return receptor.finalizar()
+
+def sem_verificacao(conteudo, diretorio, verificador):
+    recebido = receber(conteudo, diretorio)
+    fim_recebimento = time.perf_counter()
+    recebido.descartar()
+    return fim_recebimento
+
+def apos_gravar(conteudo, diretorio, verificador):
+    recebido = receber(conteudo, diretorio)
+    fim_recebimento = time.perf_counter()
+    with open(recebido.caminho_temporario, 'rb') as origem:
+        resultado = verificador.verificar_stream(origem)
+    assert resultado['erro'] is None
+    recebido.descartar()
+    return fim_recebimento
+
+def em_fluxo(conteudo, diretorio, verificador):
+    recebido = receber(conteudo, diretorio, verificador)
+    fim_recebimento = time.perf_counter()
+    resultado = recebido.verificacao.concluir()
+    assert resultado['erro'] is None
+    recebido.descartar()
+    return fim_recebimento
+
+def conteudo_repetido(conteudo, diretorio, verificador):
+    recebido = receber(conteudo, diretorio, verificador)
+    fim_recebimento = time.perf_counter()
+    # Veredito já guardado para o hash: o stream é encerrado sem ser verificado
+    recebido.verificacao.cancelar()
+    recebido.descartar()
+    return fim_recebimento
+
+def medir(forma, conteudo, diretorio, verificador, repeticoes):
+    """Retorna as medianas (tempo total, tempo após o recebimento) em segundos."""
+    totais = []
+    apos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        fim_recebimento = forma(conteudo, diretorio, verificador)
+        fim = time.perf_counter()
+        totais.append(fim - inicio)
+        apos.append(fim - fim_recebimento)
+    return statistics.median(totais), statistics.median(apos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', default='1,10,50', help='Tamanhos dos uploads, em MB, separados por vírgula')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Repetições por tamanho e forma')
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp()
+    endereco = os.path.join(diretorio, 'clamd.sock')
+    servidor = ServidorClamdSimulado(endereco).iniciar_em_segundo_plano()
+    verificador = VerificadorClamd(endereco)
+
+    formas = [
+        ('Sem verificação', sem_verificacao),
+        ('Após gravar', apos_gravar),
+        ('Em fluxo', em_fluxo),
+        ('Repetido (cache)', conteudo_repetido),
+    ]
+
+    try:
+        print(f"{'Tamanho':>8} | {'Forma':<18} | {'Total':>9} | {'Após receber':>12} | {'Verificações':>12}")
+        print('-' * 72)
+        for tamanho_mb in (float(valor) for valor in args.tamanhos.split(',')):
+            conteudo = gerar_conteudo(int(tamanho_mb * 1024 * 1024))
+            for nome, forma in formas:
+                antes = servidor.verificacoes
+                total, apos = medir(forma, conteudo, diretorio, verificador, args.repeticoes)
+                print(f'{tamanho_mb:>6.0f}MB | {nome:<18} | {total * 1000:>6.1f} ms | {apos * 1000:>9.1f} ms | '
+                      f'{servidor.verificacoes - antes:>12}')
+            print('-' * 72)
+    finally:
+        servidor.encerrar()
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark da compressão do conteúdo armazenado: espaço economizado x custo de leitura
+Serra Projetos Educacionais
+
+Grava um corpus de arquivos em um LocalBlobStore temporário e, para cada
+algoritmo e nível, mede:
+
+- a razão entre o tamanho compactado e o original de cada tipo de conteúdo;
+- o tempo para compactar o corpus (LocalBlobStore.compactar);
+- o tempo para ler o corpus por inteiro, em blocos, como no envio de
+  downloads (sem compressão: leitura direta do disco).
+
+Sem --corpus, é gerado um corpus sintético de textos (tipo text/plain) e de
+conteúdo aleatório (semelhante a PDFs e imagens já compactados), que deve
+ser mantido sem compressão pela estimativa da razão na amostra inicial.
+
+Uso:
+    python benchmarks/benchmark_compressao.py [--corpus DIRETORIO] [--arquivos 200] [--tamanho-kb 512] [--algoritmos zlib:1,zlib:6,zstd:3]
+"""
+
+import os
+import sys
+import glob
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from files.file_storage import LocalBlobStore, TAMANHO_BLOCO
+
+PALAVRAS = (
+    'plano aula atividade avaliação aluno professor escola ensino fundamental médio '
+    'matemática português ciências história geografia objetivo conteúdo metodologia '
+    'recurso competência habilidade projeto pedagógico turma bimestre frequência nota'
+).split()
+
+def gerar_texto(tamanho, aleatorio):
+    """Gera um texto em português com o tamanho aproximado informado."""
+    partes = []
+    total = 0
+    while total < tamanho:
+        frase = ' '.join(aleatorio.choice(PALAVRAS) for _ in range(aleatorio.randint(6, 18))).capitalize() + '.\n'
+        partes.append(frase)
+        total += len(frase)
+    return ''.join(partes).encode('utf-8')[:tamanho]
+
+def gerar_corpus(quantidade, tamanho_kb, aleatorio):
+    """Gera (tipo, bytes) para metade de textos e metade de conteúdo aleatório."""
+    corpus = []
+    for i in range(quantidade):
+        tamanho = aleatorio.randint(tamanho_kb * 256, tamanho_kb * 1024)
+        if i % 2 == 0:
+            corpus.append(('texto', gerar_texto(tamanho, aleatorio)))
+        else:
+            corpus.append(('aleatorio', os.urandom(tamanho)))
+    return corpus
+
+def carregar_corpus(diretorio):
+    """Carrega os arquivos do diretório, classificados pela extensão."""
+    corpus = []
+    for caminho in sorted(glob.glob(os.path.join(diretorio, '*'))):
+        if os.path.isfile(caminho):
+            with open(caminho, 'rb') as f:
+                corpus.append((os.path.splitext(caminho)[1].lstrip('.').lower() or 'sem extensão', f.read()))
+    return corpus
+
+def gravar_corpus(store, corpus):
+    """Grava o corpus no armazenamento e retorna (tipo, hash, tamanho) de cada arquivo."""
+    itens = []
+    for tipo, dados in corpus:
+        hash_conteudo = hashlib.sha256(dados).hexdigest()
+        store.gravar_bytes(dados, hash_conteudo)
+        itens.append((tipo, hash_conteudo, len(dados)))
+    return itens
+
+def ler_tudo(store, itens):
+    """Lê todo o conteúdo em blocos, como no envio de downloads."""
+    inicio = time.perf_counter()
+    for _, hash_conteudo, _ in itens:
+        with store.abrir(hash_conteudo) as origem:
+            while origem.read(TAMANHO_BLOCO):
+                pass
+    return (time.perf_counter() - inicio) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Diretório com arquivos reais')
+    parser.add_argument('--arquivos', type=int, default=200, help='Quantidade de arquivos do corpus sintético')
+    parser.add_argument('--tamanho-kb', type=int, default=512, help='Tamanho máximo dos arquivos sintéticos, em KB')
+    parser.add_argument('--algoritmos', default='zlib:1,zlib:6,zstd:3', help='Algoritmo:nível, separados por vírgula')
+    parser.add_argument('--razao-maxima', type=float, default=0.9, help='Maior razão compactado/original aceita')
+    args = parser.parse_args()
+
+    aleatorio = random.Random(42)
+    corpus = carregar_corpus(args.corpus) if args.corpus else gerar_corpus(args.arquivos, args.tamanho_kb, aleatorio)
+    tipos = sorted({tipo for tipo, _ in corpus})
+
+    print(f"{'Algoritmo':>10} | {'Compactar':>10} | {'Leitura':>9} | {'Em disco':>9} | " +
+          ' | '.join(f'{tipo:>10}' for tipo in tipos))
+    print('-' * (52 + 13 * len(tipos)))
+
+    for opcao in ['nenhum'] + args.algoritmos.split(','):
+        algoritmo, _, nivel = opcao.partition(':')
+        raiz = tempfile.mkdtemp()
+        try:
+            store = LocalBlobStore(raiz)
+            itens = gravar_corpus(store, corpus)
+            original = {tipo: 0 for tipo in tipos}
+            armazenado = {tipo: 0 for tipo in tipos}
+
+            inicio = time.perf_counter()
+            for tipo, hash_conteudo, tamanho in itens:
+                if algoritmo != 'nenhum':
+                    try:
+                        store.compactar(hash_conteudo, algoritmo, nivel=int(nivel) if nivel else None,
+                                        razao_maxima=args.razao_maxima)
+                    except ImportError:
+                        print(f'{opcao:>10} | módulo zstandard não instalado')
+                        break
+                original[tipo] += tamanho
+                armazenado[tipo] += store.tamanho(hash_conteudo)
+            else:
+                tempo_compactar = (time.perf_counter() - inicio) * 1000
+                tempo_leitura = ler_tudo(store, itens)
+                total = sum(armazenado.values()) / (1024 * 1024)
+                razoes = ' | '.join(f'{armazenado[tipo] / original[tipo]:>10.2f}' for tipo in tipos)
+                print(f'{opcao:>10} | {tempo_compactar:>7.0f} ms | {tempo_leitura:>6.0f} ms | {total:>6.1f} MB | {razoes}')
+        finally:
+            shutil.rmtree(raiz, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
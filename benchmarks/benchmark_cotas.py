@@ -0,0 +1,193 @@
+"""
+Benchmark das cotas de armazenamento: somas na tabela de arquivos x contadores mantidos
+Serra Projetos Educacionais
+
+Cria bancos SQLite temporários com quantidades crescentes de arquivos (e
+versões anteriores) distribuídos entre usuários e instituições e compara,
+para cada tamanho:
+
+- total do painel: SUM(arquivos.tamanho) em toda a tabela (como em
+  calcular_estatisticas) x leitura da linha 'total' de uso_armazenamento;
+- verificação da cota de um usuário: soma dos arquivos e versões do
+  usuário x UPDATE condicional do contador (como files.file_cotas.registrar_uso);
+- registro de um upload: INSERT do arquivo sozinho x INSERT com a
+  atualização dos contadores do usuário, da instituição e do total na
+  mesma transação.
+
+Uso:
+    python benchmarks/benchmark_cotas.py [--arquivos 1000,10000,100000,500000] [--usuarios 200] [--repeticoes 20]
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from sqlalchemy import (create_engine, Column, Integer, BigInteger, String, ForeignKey, UniqueConstraint,
+                        select, insert, update, func, or_)
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+COTA_USUARIO = 1024 * 1024 * 1024
+COTA_INSTITUICAO = 10 * 1024 * 1024 * 1024
+
+
+class Arquivo(Base):
+    __tablename__ = 'arquivos'
+
+    id = Column(Integer, primary_key=True)
+    tamanho = Column(Integer, nullable=False)
+    usuario_id = Column(Integer, nullable=False)
+    instituicao_id = Column(Integer, nullable=True)
+
+
+class VersaoArquivo(Base):
+    __tablename__ = 'versoes_arquivo'
+
+    id = Column(Integer, primary_key=True)
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id'), nullable=False, index=True)
+    tamanho = Column(Integer, nullable=False)
+
+
+class UsoArmazenamento(Base):
+    __tablename__ = 'uso_armazenamento'
+    __table_args__ = (UniqueConstraint('escopo', 'referencia_id'),)
+
+    id = Column(Integer, primary_key=True)
+    escopo = Column(String(20), nullable=False)
+    referencia_id = Column(Integer, nullable=False)
+    arquivos = Column(Integer, nullable=False)
+    bytes_arquivos = Column(BigInteger, nullable=False)
+    bytes_versoes = Column(BigInteger, nullable=False)
+    limite_bytes = Column(BigInteger, nullable=True)
+
+
+def popular(caminho, quantidade, usuarios):
+    """Cria o banco com os arquivos, as versões (um arquivo em cada dez) e os contadores."""
+    engine = create_engine(f'sqlite:///{caminho}')
+    Base.metadata.create_all(engine)
+    aleatorio = random.Random(42)
+
+    arquivos = []
+    versoes = []
+    for i in range(1, quantidade + 1):
+        usuario_id = aleatorio.randint(1, usuarios)
+        arquivos.append({'id': i, 'tamanho': aleatorio.randint(10_000, 2_000_000),
+                         'usuario_id': usuario_id, 'instituicao_id': usuario_id % 20 + 1})
+        if i % 10 == 0:
+            versoes.append({'arquivo_id': i, 'tamanho': aleatorio.randint(10_000, 2_000_000)})
+
+    with engine.begin() as conexao:
+        for inicio in range(0, len(arquivos), 50_000):
+            conexao.execute(insert(Arquivo), arquivos[inicio:inicio + 50_000])
+        if versoes:
+            conexao.execute(insert(VersaoArquivo), versoes)
+
+        # Contadores iniciais, como os criados pela reconciliação
+        for escopo, coluna in (('usuario', Arquivo.usuario_id), ('instituicao', Arquivo.instituicao_id)):
+            bytes_versoes = dict(conexao.execute(
+                select(coluna, func.sum(VersaoArquivo.tamanho)).join(Arquivo).group_by(coluna)
+            ).all())
+            linhas = [
+                {'escopo': escopo, 'referencia_id': referencia_id, 'arquivos': total, 'bytes_arquivos': soma,
+                 'bytes_versoes': bytes_versoes.get(referencia_id, 0), 'limite_bytes': 0}
+                for referencia_id, total, soma in conexao.execute(
+                    select(coluna, func.count(), func.sum(Arquivo.tamanho)).group_by(coluna)
+                )
+            ]
+            conexao.execute(insert(UsoArmazenamento), linhas)
+        conexao.execute(insert(UsoArmazenamento), [{
+            'escopo': 'total', 'referencia_id': 0, 'arquivos': quantidade,
+            'bytes_arquivos': sum(a['tamanho'] for a in arquivos),
+            'bytes_versoes': sum(v['tamanho'] for v in versoes), 'limite_bytes': 0
+        }])
+
+    return engine
+
+def medir(funcao, repeticoes):
+    """Mediana do tempo de execução, em milissegundos."""
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arquivos', default='1000,10000,100000,500000', help='Quantidades de arquivos, separadas por vírgula')
+    parser.add_argument('--usuarios', type=int, default=200, help='Quantidade de usuários')
+    parser.add_argument('--repeticoes', type=int, default=20, help='Repetições por medição')
+    args = parser.parse_args()
+
+    print(f"{'Arquivos':>9} | {'Total: SUM':>10} | {'Total: cont.':>12} | {'Cota: SUM':>10} | {'Cota: cont.':>11} | "
+          f"{'Upload':>8} | {'Upload+cont.':>12}")
+    print('-' * 92)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        for quantidade in (int(valor) for valor in args.arquivos.split(',')):
+            engine = popular(os.path.join(diretorio, f'cotas_{quantidade}.db'), quantidade, args.usuarios)
+            conexao = engine.connect()
+            usuario_id = 1
+            tamanho = 500_000
+
+            def total_soma():
+                conexao.execute(select(func.sum(Arquivo.tamanho))).scalar()
+                conexao.rollback()
+
+            def total_contador():
+                conexao.execute(select(UsoArmazenamento.bytes_arquivos).where(
+                    UsoArmazenamento.escopo == 'total', UsoArmazenamento.referencia_id == 0)).scalar()
+                conexao.rollback()
+
+            def cota_soma():
+                usado = conexao.execute(select(func.coalesce(func.sum(Arquivo.tamanho), 0)).where(
+                    Arquivo.usuario_id == usuario_id)).scalar()
+                usado += conexao.execute(select(func.coalesce(func.sum(VersaoArquivo.tamanho), 0)).join(Arquivo).where(
+                    Arquivo.usuario_id == usuario_id)).scalar()
+                conexao.rollback()
+                return usado + tamanho <= COTA_USUARIO
+
+            def atualizar_contador(escopo, referencia_id, limite):
+                limite_efetivo = func.coalesce(UsoArmazenamento.limite_bytes, limite)
+                return conexao.execute(update(UsoArmazenamento).where(
+                    UsoArmazenamento.escopo == escopo, UsoArmazenamento.referencia_id == referencia_id,
+                    or_(limite_efetivo == 0, UsoArmazenamento.bytes_arquivos + UsoArmazenamento.bytes_versoes + tamanho <= limite_efetivo)
+                ).values(arquivos=UsoArmazenamento.arquivos + 1,
+                         bytes_arquivos=UsoArmazenamento.bytes_arquivos + tamanho)).rowcount
+
+            def cota_contador():
+                # Verificação feita no UPDATE; desfeita para não alterar o contador
+                atualizar_contador('usuario', usuario_id, COTA_USUARIO)
+                conexao.rollback()
+
+            def upload(contadores):
+                def executar():
+                    conexao.execute(insert(Arquivo).values(tamanho=tamanho, usuario_id=usuario_id, instituicao_id=2))
+                    if contadores:
+                        atualizar_contador('usuario', usuario_id, COTA_USUARIO)
+                        atualizar_contador('instituicao', 2, COTA_INSTITUICAO)
+                        atualizar_contador('total', 0, 0)
+                    conexao.commit()
+                return executar
+
+            resultados = [
+                medir(total_soma, args.repeticoes),
+                medir(total_contador, args.repeticoes),
+                medir(cota_soma, args.repeticoes),
+                medir(cota_contador, args.repeticoes),
+                medir(upload(False), args.repeticoes),
+                medir(upload(True), args.repeticoes),
+            ]
+            conexao.close()
+            engine.dispose()
+
+            print(f'{quantidade:>9} | {resultados[0]:>7.2f} ms | {resultados[1]:>9.3f} ms | {resultados[2]:>7.2f} ms | '
+                  f'{resultados[3]:>8.3f} ms | {resultados[4]:>5.2f} ms | {resultados[5]:>9.2f} ms')
+
+if __name__ == '__main__':
+    main()
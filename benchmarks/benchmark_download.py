@@ -0,0 +1,92 @@
+"""
+Benchmark do envio de conteúdo: leitura do armazenamento x cache de conteúdo em memória
+Serra Projetos Educacionais
+
+Grava um corpus de arquivos pequenos em um diretório temporário e simula
+downloads com popularidade de Zipf (poucos arquivos concentram a maior
+parte dos acessos). Para cada limite do cache mede o tempo total de
+obtenção do conteúdo e a taxa de acertos de files.file_download.CacheConteudo,
+comparando com a leitura direta do disco a cada download.
+
+Uso:
+    python benchmarks/benchmark_download.py [--arquivos 2000] [--downloads 50000] [--tamanho-kb 200] [--limites-mb 0,16,64]
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from files.file_download import CacheConteudo, _ler_conteudo
+
+def gerar_corpus(diretorio, quantidade, tamanho_kb, aleatorio):
+    """Grava os arquivos do corpus e retorna (hash, caminho, tamanho) de cada um."""
+    arquivos = []
+    for i in range(quantidade):
+        tamanho = aleatorio.randint(tamanho_kb * 256, tamanho_kb * 1024)
+        dados = os.urandom(tamanho)
+        hash_conteudo = hashlib.sha256(dados).hexdigest()
+        caminho = os.path.join(diretorio, hash_conteudo)
+        with open(caminho, 'wb') as f:
+            f.write(dados)
+        arquivos.append((hash_conteudo, caminho, tamanho))
+    return arquivos
+
+def gerar_acessos(quantidade_arquivos, downloads, aleatorio, expoente=1.1):
+    """Sorteia os downloads com distribuição de Zipf sobre os arquivos."""
+    pesos = [1 / (posicao ** expoente) for posicao in range(1, quantidade_arquivos + 1)]
+    return aleatorio.choices(range(quantidade_arquivos), weights=pesos, k=downloads)
+
+def simular(arquivos, acessos, cache):
+    """Obtém o conteúdo de cada download como em enviar_conteudo_arquivo."""
+    inicio = time.perf_counter()
+    total_bytes = 0
+
+    for indice in acessos:
+        hash_conteudo, caminho, tamanho = arquivos[indice]
+        dados = cache.obter(hash_conteudo) if cache else None
+        if dados is None:
+            dados = _ler_conteudo(caminho)
+            if cache and cache.admitir(hash_conteudo, tamanho):
+                cache.gravar(hash_conteudo, dados)
+        total_bytes += len(dados)
+
+    return (time.perf_counter() - inicio) * 1000, total_bytes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arquivos', type=int, default=2000, help='Quantidade de arquivos')
+    parser.add_argument('--downloads', type=int, default=50000, help='Quantidade de downloads simulados')
+    parser.add_argument('--tamanho-kb', type=int, default=200, help='Tamanho máximo de cada arquivo, em KB')
+    parser.add_argument('--limites-mb', default='0,16,64', help='Limites do cache em MB, separados por vírgula (0 = sem cache)')
+    args = parser.parse_args()
+
+    aleatorio = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivos = gerar_corpus(diretorio, args.arquivos, args.tamanho_kb, aleatorio)
+        acessos = gerar_acessos(len(arquivos), args.downloads, aleatorio)
+
+        print(f"{'Cache':>8} | {'Tempo':>10} | {'Acertos':>8} | {'Ocupação':>10}")
+        print('-' * 46)
+
+        for limite_mb in [int(valor) for valor in args.limites_mb.split(',')]:
+            cache = CacheConteudo(limite_mb * 1024 * 1024, args.tamanho_kb * 1024) if limite_mb else None
+            tempo, _ = simular(arquivos, acessos, cache)
+
+            if cache:
+                estatisticas = cache.estatisticas()
+                taxa = f"{estatisticas['taxa_acertos'] * 100:>7.1f}%"
+                ocupacao = f"{estatisticas['bytes'] / (1024 * 1024):>7.1f} MB"
+            else:
+                taxa, ocupacao = f"{'-':>8}", f"{'-':>10}"
+
+            print(f"{limite_mb:>5} MB | {tempo:>7.0f} ms | {taxa} | {ocupacao}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark da exportação em ZIP: pacote gerado em fluxo x pacote montado em memória
+Serra Projetos Educacionais
+
+Grava um corpus misto em um LocalBlobStore temporário (textos compactáveis e
+conteúdo aleatório, semelhante a PDFs e imagens já compactados) e gera o
+pacote ZIP de todo o corpus de três formas:
+
+- em memória: ZipFile sobre BytesIO com ZIP_DEFLATED em todas as entradas,
+  enviado apenas ao final (como a exportação de dados da LGPD);
+- em fluxo, sempre ZIP_DEFLATED;
+- em fluxo com o método escolhido por entrada (files.file_exportacao):
+  ZIP_STORED para conteúdo já compactado.
+
+Para cada forma, mede o tempo até o primeiro byte, o tempo total, o tamanho
+do pacote e o pico de memória alocada (tracemalloc).
+
+Uso:
+    python benchmarks/benchmark_exportacao.py [--arquivos 60] [--tamanho-mb 4] [--fracao-compactados 0.5]
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import hashlib
+import zipfile
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from files.file_storage import LocalBlobStore
+from files import file_exportacao
+from files.file_exportacao import gerar_zip
+
+PALAVRAS = (
+    'plano aula atividade avaliação aluno professor escola ensino fundamental médio '
+    'matemática português ciências história geografia objetivo conteúdo metodologia'
+).split()
+
+def gerar_corpus(store, quantidade, tamanho, fracao_compactados, aleatorio):
+    """Grava o corpus e retorna os itens no formato de preparar_itens."""
+    itens = []
+    for indice in range(quantidade):
+        if aleatorio.random() < fracao_compactados:
+            dados = os.urandom(tamanho)
+            nome = f'documento_{indice}.pdf'
+        else:
+            linha = ' '.join(aleatorio.choice(PALAVRAS) for _ in range(2000)).encode()
+            dados = (linha * (tamanho // len(linha) + 1))[:tamanho]
+            nome = f'plano_{indice}.txt'
+
+        hash_conteudo = hashlib.sha256(dados).hexdigest()
+        store.gravar_bytes(dados, hash_conteudo)
+        itens.append({
+            'arquivo_id': indice,
+            'nome': nome,
+            'tamanho': len(dados),
+            'hash_conteudo': hash_conteudo,
+            'blob': True,
+            'compactado': False,
+            'mime_type': 'application/pdf' if nome.endswith('.pdf') else 'text/plain',
+            'data': (2024, 1, 1, 0, 0, 0)
+        })
+    return itens
+
+def zip_em_memoria(itens, store):
+    """Monta o pacote inteiro em memória antes de enviá-lo."""
+    destino = io.BytesIO()
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as pacote:
+        for item in itens:
+            with store.abrir(item['hash_conteudo']) as origem:
+                pacote.writestr(item['nome'], origem.read())
+    yield destino.getvalue()
+
+def medir(gerador):
+    """Consome um gerador de blocos, retornando (primeiro byte, total, bytes, pico de memória)."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    primeiro = None
+    total = 0
+    for bloco in gerador:
+        if primeiro is None:
+            primeiro = time.perf_counter() - inicio
+        total += len(bloco)
+    duracao = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return primeiro, duracao, total, pico
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arquivos', type=int, default=60, help='Quantidade de arquivos no pacote')
+    parser.add_argument('--tamanho-mb', type=float, default=4, help='Tamanho de cada arquivo, em MB')
+    parser.add_argument('--fracao-compactados', type=float, default=0.5, help='Fração de arquivos já compactados')
+    args = parser.parse_args()
+
+    raiz = tempfile.mkdtemp()
+    app = Flask(__name__)
+    try:
+        store = LocalBlobStore(raiz)
+        itens = gerar_corpus(store, args.arquivos, int(args.tamanho_mb * 1024 * 1024),
+                             args.fracao_compactados, random.Random(42))
+        total_mb = sum(item['tamanho'] for item in itens) / (1024 * 1024)
+        print(f'Corpus: {len(itens)} arquivos, {total_mb:.1f} MB '
+              f'({sum(1 for item in itens if item["nome"].endswith(".pdf"))} já compactados)')
+        print(f"{'Forma':<28} | {'1º byte':>9} | {'Total':>7} | {'Vazão':>10} | {'Pacote':>9} | {'Pico mem.':>9}")
+        print('-' * 88)
+
+        sempre_deflate = file_exportacao.TIPOS_COMPACTADOS
+        with app.app_context():
+            formas = [
+                ('Em memória (deflate)', lambda: zip_em_memoria(itens, store), None),
+                ('Em fluxo (sempre deflate)', lambda: gerar_zip(itens, store), set()),
+                ('Em fluxo (método por tipo)', lambda: gerar_zip(itens, store), sempre_deflate),
+            ]
+            for nome, criar, tipos in formas:
+                if tipos is not None:
+                    file_exportacao.TIPOS_COMPACTADOS = tipos
+                    # Sem tipos conhecidos, evita também a escolha pela amostra
+                    app.config['BLOB_COMPRESSAO_RAZAO_MAXIMA'] = 0.9 if tipos else float('inf')
+                primeiro, duracao, tamanho, pico = medir(criar())
+                print(f'{nome:<28} | {primeiro * 1000:>6.0f} ms | {duracao:>5.2f} s | {total_mb / duracao:>5.0f} MB/s | '
+                      f'{tamanho / 1048576:>6.1f} MB | {pico / 1048576:>6.1f} MB')
+            file_exportacao.TIPOS_COMPACTADOS = sempre_deflate
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark da verificação de integridade: vazão, taxa limitada e efeito nas leituras concorrentes
+Serra Projetos Educacionais
+
+Grava um corpus em um LocalBlobStore temporário e, para cada combinação de
+workers e taxa de leitura, executa a verificação (files.file_integridade)
+de todo o corpus enquanto outra thread simula downloads de arquivos
+pequenos, medindo:
+
+- a vazão obtida pela verificação e o desvio em relação à taxa configurada
+  (que determina a duração de uma passagem completa);
+- a latência (mediana e p95) das leituras concorrentes, comparada à de
+  leituras sem verificação em andamento.
+
+Uso:
+    python benchmarks/benchmark_integridade.py [--arquivos 200] [--tamanho-kb 1024] [--configuracoes 1:0,4:0,2:50,4:50]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from files.file_storage import LocalBlobStore, TAMANHO_BLOCO
+from files.file_integridade import LimitadorTaxa, calcular_hash_armazenado
+
+def gravar_corpus(store, quantidade, tamanho_kb, aleatorio):
+    """Grava arquivos aleatórios e retorna seus hashes."""
+    hashes = []
+    for _ in range(quantidade):
+        dados = os.urandom(aleatorio.randint(tamanho_kb * 512, tamanho_kb * 1024))
+        hash_conteudo = hashlib.sha256(dados).hexdigest()
+        store.gravar_bytes(dados, hash_conteudo)
+        hashes.append(hash_conteudo)
+    return hashes
+
+def medir_leituras(store, hashes, parar, latencias):
+    """Lê arquivos pequenos repetidamente, como downloads, registrando a latência de cada um."""
+    aleatorio = random.Random(7)
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        with store.abrir(aleatorio.choice(hashes)) as origem:
+            while origem.read(TAMANHO_BLOCO):
+                pass
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(0.005)
+
+def percentil(valores, fracao):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * fracao))] if valores else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arquivos', type=int, default=200, help='Quantidade de arquivos verificados')
+    parser.add_argument('--tamanho-kb', type=int, default=1024, help='Tamanho máximo dos arquivos, em KB')
+    parser.add_argument('--configuracoes', default='1:0,4:0,2:50,4:50',
+                        help='workers:taxa em MB/s (0 sem limite), separados por vírgula')
+    args = parser.parse_args()
+
+    raiz = tempfile.mkdtemp()
+    try:
+        store = LocalBlobStore(raiz)
+        aleatorio = random.Random(42)
+        hashes = gravar_corpus(store, args.arquivos, args.tamanho_kb, aleatorio)
+        pequenos = gravar_corpus(store, 50, 32, aleatorio)
+        total_mb = sum(store.tamanho(hash_conteudo) for hash_conteudo in hashes) / (1024 * 1024)
+
+        # Latência de referência, sem verificação em andamento
+        parar = threading.Event()
+        referencia = []
+        leitor = threading.Thread(target=medir_leituras, args=(store, pequenos, parar, referencia))
+        leitor.start()
+        time.sleep(2)
+        parar.set()
+        leitor.join()
+
+        print(f'Corpus: {len(hashes)} arquivos, {total_mb:.1f} MB. Leituras sem verificação: '
+              f'mediana {percentil(referencia, 0.5):.2f} ms, p95 {percentil(referencia, 0.95):.2f} ms')
+        print(f"{'Workers':>7} | {'Taxa':>10} | {'Obtida':>11} | {'Duração':>8} | {'Mediana':>9} | {'p95':>9}")
+        print('-' * 69)
+
+        for configuracao in args.configuracoes.split(','):
+            workers, taxa_mb = configuracao.split(':')
+            taxa = int(float(taxa_mb) * 1024 * 1024)
+            limitador = LimitadorTaxa(taxa)
+
+            parar = threading.Event()
+            latencias = []
+            leitor = threading.Thread(target=medir_leituras, args=(store, pequenos, parar, latencias))
+            leitor.start()
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=int(workers)) as executor:
+                resultados = list(executor.map(
+                    lambda hash_conteudo: calcular_hash_armazenado(store, hash_conteudo, limitador), hashes
+                ))
+            duracao = time.perf_counter() - inicio
+
+            parar.set()
+            leitor.join()
+
+            assert all(calculado == hash_conteudo for (calculado, _), hash_conteudo in zip(resultados, hashes))
+            descricao_taxa = f'{float(taxa_mb):>5.0f} MB/s' if taxa else 'sem limite'
+            print(f'{int(workers):>7} | {descricao_taxa} | {total_mb / duracao:>6.1f} MB/s | {duracao:>6.1f} s | '
+                  f'{percentil(latencias, 0.5):>6.2f} ms | {percentil(latencias, 0.95):>6.2f} ms')
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark da listagem de arquivos: texto extraído na tabela arquivos x tabela arquivos_texto
+Serra Projetos Educacionais
+
+Cria dois bancos SQLite temporários com a mesma quantidade de arquivos. No
+primeiro, o texto extraído e os metadados ficam em colunas da tabela arquivos
+(esquema anterior); no segundo, ficam compactados na tabela arquivos_texto
+(esquema atual de files.file_models). Em seguida mede o tempo e o pico de
+memória de uma listagem como a de listar_arquivos (query.all() ordenado pela
+data de upload, lendo nome e tamanho de cada arquivo).
+
+Uso:
+    python benchmarks/benchmark_listagem.py [--arquivos 10000] [--texto-kb 20] [--repeticoes 3]
+"""
+
+import os
+import gc
+import json
+import time
+import zlib
+import random
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, LargeBinary, ForeignKey
+from sqlalchemy.orm import declarative_base, relationship, Session
+
+PALAVRAS = (
+    'avaliação escola professor aluno projeto educacional aprendizagem turma '
+    'relatório atividade conteúdo matemática leitura escrita planejamento aula '
+    'desenvolvimento competência habilidade currículo proposta pedagógica '
+    'resultado indicador meta município rede ensino fundamental médio'
+).split()
+
+BaseAnterior = declarative_base()
+BaseAtual = declarative_base()
+
+
+class ArquivoAnterior(BaseAnterior):
+    __tablename__ = 'arquivos'
+
+    id = Column(Integer, primary_key=True)
+    nome = Column(String(255), nullable=False)
+    tipo = Column(String(50), nullable=False)
+    tamanho = Column(Integer, nullable=False)
+    conteudo_texto = Column(Text, nullable=True)
+    metadados = Column(Text, nullable=True)
+    data_upload = Column(DateTime, nullable=False)
+
+
+class ArquivoAtual(BaseAtual):
+    __tablename__ = 'arquivos'
+
+    id = Column(Integer, primary_key=True)
+    nome = Column(String(255), nullable=False)
+    tipo = Column(String(50), nullable=False)
+    tamanho = Column(Integer, nullable=False)
+    data_upload = Column(DateTime, nullable=False)
+
+    texto = relationship('ArquivoTextoAtual', uselist=False)
+
+
+class ArquivoTextoAtual(BaseAtual):
+    __tablename__ = 'arquivos_texto'
+
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id'), primary_key=True)
+    conteudo_texto_compactado = Column(LargeBinary, nullable=True)
+    metadados_compactados = Column(LargeBinary, nullable=True)
+
+
+def gerar_texto(tamanho_kb, aleatorio):
+    """Gera um texto com palavras do vocabulário até o tamanho aproximado."""
+    palavras = []
+    total = 0
+    while total < tamanho_kb * 1024:
+        palavra = aleatorio.choice(PALAVRAS)
+        palavras.append(palavra)
+        total += len(palavra) + 1
+    return ' '.join(palavras)
+
+def popular(caminho, atual, quantidade, tamanho_kb):
+    """Cria o banco de dados e insere os arquivos."""
+    engine = create_engine(f'sqlite:///{caminho}')
+    (BaseAtual if atual else BaseAnterior).metadata.create_all(engine)
+    aleatorio = random.Random(42)
+    inicio = datetime.datetime(2024, 1, 1)
+
+    with Session(engine) as session:
+        for i in range(1, quantidade + 1):
+            texto = gerar_texto(tamanho_kb, aleatorio)
+            metadados = json.dumps({'mime_type': 'application/pdf', 'upload_ip': '127.0.0.1'})
+            dados = dict(
+                id=i,
+                nome=f'documento_{i}.pdf',
+                tipo='pdf',
+                tamanho=len(texto) * 3,
+                data_upload=inicio + datetime.timedelta(minutes=i)
+            )
+
+            if atual:
+                session.add(ArquivoAtual(**dados))
+                session.add(ArquivoTextoAtual(
+                    arquivo_id=i,
+                    conteudo_texto_compactado=zlib.compress(texto.encode('utf-8'), 6),
+                    metadados_compactados=zlib.compress(metadados.encode('utf-8'), 6)
+                ))
+            else:
+                session.add(ArquivoAnterior(conteudo_texto=texto, metadados=metadados, **dados))
+
+            if i % 1000 == 0:
+                session.commit()
+        session.commit()
+
+    return engine
+
+def listar(engine, modelo):
+    """Reproduz a listagem de arquivos e retorna (tempo em ms, pico de memória em bytes)."""
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+
+    with Session(engine) as session:
+        arquivos = session.query(modelo).order_by(modelo.data_upload.desc()).all()
+        linhas = [(a.nome, a.tamanho) for a in arquivos]
+
+    tempo = (time.perf_counter() - inicio) * 1000
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert linhas
+    return tempo, pico
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arquivos', type=int, default=10000, help='Quantidade de arquivos')
+    parser.add_argument('--texto-kb', type=int, default=20, help='Tamanho do texto extraído de cada arquivo, em KB')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Repetições por medição')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        print(f'Criando bancos com {args.arquivos} arquivos de {args.texto_kb} KB de texto...')
+        cenarios = [
+            ('anterior', ArquivoAnterior, os.path.join(diretorio, 'anterior.db'), False),
+            ('atual', ArquivoAtual, os.path.join(diretorio, 'atual.db'), True),
+        ]
+
+        print(f"{'Esquema':<10} | {'Banco':>10} | {'Tempo médio':>12} | {'Pico de memória':>16}")
+        print('-' * 58)
+
+        for nome, modelo, caminho, atual in cenarios:
+            engine = popular(caminho, atual, args.arquivos, args.texto_kb)
+            medicoes = [listar(engine, modelo) for _ in range(args.repeticoes)]
+            tempo = sum(m[0] for m in medicoes) / len(medicoes)
+            pico = max(m[1] for m in medicoes)
+            tamanho_banco = os.path.getsize(caminho) / (1024 * 1024)
+            print(f"{nome:<10} | {tamanho_banco:>7.1f} MB | {tempo:>9.1f} ms | {pico / (1024 * 1024):>13.1f} MB")
+            engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark das listas de opções dos formulários de tarefas: query.all() x listas em cache
+Serra Projetos Educacionais
+
+Cria bancos SQLite temporários com quantidades crescentes de usuários (e
+instituições e projetos proporcionais) e mede, para cada tamanho:
+
+- carregamento anterior: Usuario/Instituicao/Projeto.query.all() montando as
+  três listas de choices completas, como faziam listar_tarefas, nova_tarefa
+  e editar_tarefa a cada página;
+- falha no cache: consultas de (id, rótulo) restritas ao escopo de um
+  administrador, com a montagem das ListaOpcoes (tasks.task_opcoes);
+- acerto no cache: CacheOpcoes.obter das três listas e montagem dos choices
+  limitados a OPCOES_TAREFAS_MAXIMO_RENDERIZADAS opções;
+- busca incremental: ListaOpcoes.buscar (índice de prefixos) x varredura
+  linear dos rótulos normalizados.
+
+Uso:
+    python benchmarks/benchmark_opcoes.py [--usuarios 1000,10000,50000] [--renderizadas 200] [--repeticoes 20]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, ForeignKey, insert
+from sqlalchemy.orm import declarative_base, Session
+
+from tasks.task_opcoes import ListaOpcoes, CacheOpcoes, normalizar_rotulo
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Débora', 'Eduardo', 'Fábio', 'Gabriela', 'Helena', 'Ícaro', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sílvia', 'Tiago', 'Vânia', 'Wagner')
+SOBRENOMES = ('Silva', 'Souza', 'Oliveira', 'Santos', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida',
+              'Nascimento', 'Araújo', 'Ferreira', 'Gomes', 'Ribeiro', 'Martins', 'Carvalho', 'Rocha', 'Barbosa')
+TERMOS = ('ana', 'sil', 'joao ol', 'mar', 'fab santos', 'xyz')
+
+Base = declarative_base()
+
+
+class Usuario(Base):
+    __tablename__ = 'usuarios'
+
+    id = Column(Integer, primary_key=True)
+    nome_completo = Column(String(100), nullable=False)
+    email = Column(String(120), nullable=False)
+    senha_hash = Column(String(128), nullable=False)
+    tipo = Column(String(20), nullable=False)
+    status = Column(String(20), nullable=False)
+    ultimo_login = Column(DateTime, nullable=True)
+
+
+class Instituicao(Base):
+    __tablename__ = 'instituicoes'
+
+    id = Column(Integer, primary_key=True)
+    nome = Column(String(255), nullable=False)
+    tipo = Column(String(50), nullable=True)
+    endereco = Column(Text, nullable=True)
+
+
+class Projeto(Base):
+    __tablename__ = 'projetos'
+
+    id = Column(Integer, primary_key=True)
+    nome = Column(String(255), nullable=False)
+    descricao = Column(Text, nullable=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
+    instituicao_id = Column(Integer, ForeignKey('instituicoes.id'), nullable=True)
+
+
+def popular(caminho, usuarios):
+    """Cria o banco com os usuários, uma instituição a cada 50 usuários e um projeto a cada 5."""
+    engine = create_engine(f'sqlite:///{caminho}')
+    Base.metadata.create_all(engine)
+    aleatorio = random.Random(42)
+    instituicoes = max(usuarios // 50, 1)
+
+    with engine.begin() as conexao:
+        conexao.execute(insert(Usuario), [
+            {'id': i, 'nome_completo': f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}',
+             'email': f'usuario{i}@exemplo.com.br', 'senha_hash': 'x' * 60, 'tipo': 'consultor', 'status': 'ativo'}
+            for i in range(1, usuarios + 1)
+        ])
+        conexao.execute(insert(Instituicao), [
+            {'id': i, 'nome': f'Escola Municipal {aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {i}',
+             'tipo': 'escola', 'endereco': 'Rua ' * 10}
+            for i in range(1, instituicoes + 1)
+        ])
+        conexao.execute(insert(Projeto), [
+            {'id': i, 'nome': f'Projeto {i}', 'descricao': 'Descrição ' * 20,
+             'usuario_id': aleatorio.randint(1, usuarios), 'instituicao_id': aleatorio.randint(1, instituicoes)}
+            for i in range(1, usuarios // 5 + 1)
+        ])
+
+    return engine
+
+def medir(funcao, repeticoes):
+    """Mediana do tempo de execução, em milissegundos."""
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', default='1000,10000,50000', help='Quantidades de usuários, separadas por vírgula')
+    parser.add_argument('--renderizadas', type=int, default=200, help='Máximo de opções renderizadas por campo')
+    parser.add_argument('--repeticoes', type=int, default=20, help='Repetições por medição')
+    args = parser.parse_args()
+
+    print(f"{'Usuários':>9} | {'query.all()':>11} | {'Cache: falha':>12} | {'Cache: acerto':>13} | "
+          f"{'Busca linear':>12} | {'Busca índice':>12}")
+    print('-' * 86)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        for quantidade in (int(valor) for valor in args.usuarios.split(',')):
+            engine = popular(os.path.join(diretorio, f'opcoes_{quantidade}.db'), quantidade)
+            sessao = Session(engine)
+            cache = CacheOpcoes(validade=300, maximo_listas=1000)
+            consultas = {
+                'usuarios': lambda: sessao.query(Usuario.id, Usuario.nome_completo).all(),
+                'instituicoes': lambda: sessao.query(Instituicao.id, Instituicao.nome).all(),
+                'projetos': lambda: sessao.query(Projeto.id, Projeto.nome).all(),
+            }
+
+            def anterior():
+                escolhas = [(0, 'Todos')] + [(u.id, u.nome_completo) for u in sessao.query(Usuario).all()]
+                escolhas += [(0, 'Todas')] + [(i.id, i.nome) for i in sessao.query(Instituicao).all()]
+                escolhas += [(0, 'Todos')] + [(p.id, p.nome) for p in sessao.query(Projeto).all()]
+                sessao.expunge_all()
+                sessao.rollback()
+                return escolhas
+
+            def cache_falha():
+                listas = [ListaOpcoes(consulta()) for consulta in consultas.values()]
+                sessao.rollback()
+                return listas
+
+            def cache_acerto():
+                escolhas = []
+                for tipo, consulta in consultas.items():
+                    lista = cache.obter(tipo, 'todos', consulta)
+                    escolhas += [(0, 'Todos')] + list(lista.opcoes[:args.renderizadas])
+                return escolhas
+
+            lista_usuarios = ListaOpcoes(consultas['usuarios']())
+            rotulos_normalizados = [(id, rotulo, normalizar_rotulo(rotulo).split())
+                                    for id, rotulo in lista_usuarios.opcoes]
+
+            def busca_linear():
+                for termo in TERMOS:
+                    termos = normalizar_rotulo(termo).split()
+                    [(id, rotulo) for id, rotulo, palavras in rotulos_normalizados
+                     if all(any(p.startswith(t) for p in palavras) for t in termos)][:20]
+
+            def busca_indice():
+                for termo in TERMOS:
+                    lista_usuarios.buscar(termo, 20)
+
+            resultados = [
+                medir(anterior, args.repeticoes),
+                medir(cache_falha, args.repeticoes),
+                medir(cache_acerto, args.repeticoes),
+                medir(busca_linear, args.repeticoes) / len(TERMOS),
+                medir(busca_indice, args.repeticoes) / len(TERMOS),
+            ]
+            sessao.close()
+            engine.dispose()
+
+            print(f'{quantidade:>9} | {resultados[0]:>8.2f} ms | {resultados[1]:>9.2f} ms | {resultados[2]:>10.3f} ms | '
+                  f'{resultados[3]:>9.3f} ms | {resultados[4]:>9.3f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark da extração isolada: processo por tarefa (forkserver) x pool de processos compartilhado
+Serra Projetos Educacionais
+
+Analisa um lote de PDFs pequenos (files.file_utils.analisar_documento) em
+que alguns arquivos são "venenosos" (entram em laço, esgotam a memória ou
+derrubam o interpretador) e compara:
+
+- pool compartilhado: ProcessPoolExecutor (spawn, um processo por tarefa,
+  limites de CPU e memória), como antes do isolamento; um processo
+  encerrado quebra o pool e derruba as tarefas em andamento dos outros
+  arquivos, e um laço só termina no limite de CPU;
+- processo isolado: files.file_sandbox.executar_isolado em threads, com
+  tempo máximo de execução; cada falha atinge apenas o próprio arquivo.
+
+Mede o custo de uma tarefa sem falhas e, para o lote, o tempo total,
+quantos arquivos válidos foram derrubados junto com os venenosos (e
+reenviados, no pool compartilhado) e quantos ficaram sem resultado.
+
+Uso:
+    python benchmarks/benchmark_sandbox.py [--arquivos 24] [--venenosos 3] [--workers 2]
+"""
+
+import os
+import sys
+import time
+import signal
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from files.file_sandbox import executar_isolado, aplicar_limites, FalhaSandbox
+
+LIMITE_CPU = 5
+LIMITE_MEMORIA = 512 * 1024 * 1024
+TEMPO_MAXIMO = 5
+
+def gerar_pdf(caminho, paginas=3):
+    """Grava um PDF pequeno com texto em cada página."""
+    import fitz  # PyMuPDF
+
+    with fitz.open() as documento:
+        for numero in range(paginas):
+            documento.new_page().insert_text((72, 72), f'Plano de aula {numero + 1}: frações e decimais')
+        documento.save(caminho)
+
+def analisar(caminho):
+    """Tarefa válida: análise completa do PDF."""
+    from files.file_utils import analisar_documento
+    return len(analisar_documento(caminho, 'application/pdf', largura_miniatura=200, propagar_erros=True)['texto'])
+
+def analisar_laco(caminho):
+    """Documento que trava o leitor."""
+    while True:
+        pass
+
+def analisar_memoria(caminho):
+    """Documento que faz o leitor alocar memória sem limite."""
+    blocos = []
+    while True:
+        blocos.append(bytearray(64 * 1024 * 1024))
+
+def analisar_segfault(caminho):
+    """Documento que derruba o interpretador (falha em código nativo)."""
+    os.kill(os.getpid(), signal.SIGSEGV)
+
+VENENOS = [analisar_laco, analisar_memoria, analisar_segfault]
+
+def montar_lote(caminho, quantidade, venenosos):
+    """Retorna a lista de tarefas (função, caminho), com os venenosos espalhados."""
+    lote = [(analisar, caminho) for _ in range(quantidade)]
+    passo = max(1, quantidade // (venenosos + 1))
+    for indice in range(venenosos):
+        lote.insert((indice + 1) * passo, (VENENOS[indice % len(VENENOS)], caminho))
+    return lote
+
+def executar_pool_compartilhado(lote, workers):
+    """
+    Executa o lote no ProcessPoolExecutor. Como no pool anterior, as tarefas
+    derrubadas por um pool quebrado são reenviadas uma vez, a um pool novo.
+    """
+    def executar(tarefas):
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=aplicar_limites,
+            initargs=(LIMITE_CPU, LIMITE_MEMORIA),
+            max_tasks_per_child=1
+        )
+        futuros = [(executor.submit(funcao, caminho), funcao, caminho) for funcao, caminho in tarefas]
+        wait([futuro for futuro, _, _ in futuros])
+        executor.shutdown(wait=True)
+        return [(funcao, caminho) for futuro, funcao, caminho in futuros
+                if futuro.exception() is not None and funcao is analisar]
+
+    derrubados = executar(lote)
+    return len(derrubados), len(executar(derrubados)) if derrubados else 0
+
+def executar_isolado_lote(lote, workers):
+    """Executa o lote com um processo isolado por tarefa."""
+    def tarefa(funcao, caminho):
+        try:
+            executar_isolado(funcao, (caminho,), limite_cpu=LIMITE_CPU, limite_memoria=LIMITE_MEMORIA,
+                             tempo_maximo=TEMPO_MAXIMO)
+            return None
+        except FalhaSandbox as e:
+            return e
+
+    falhas_validas = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futuros = {executor.submit(tarefa, funcao, caminho): funcao for funcao, caminho in lote}
+        for futuro, funcao in futuros.items():
+            if futuro.result() is not None and funcao is analisar:
+                falhas_validas += 1
+    return falhas_validas, falhas_validas
+
+def medir_tarefa(executar, repeticoes=10):
+    """Custo médio de uma tarefa válida, em milissegundos."""
+    executar()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        executar()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arquivos', type=int, default=24, help='Quantidade de PDFs válidos no lote')
+    parser.add_argument('--venenosos', type=int, default=3, help='Quantidade de arquivos venenosos no lote')
+    parser.add_argument('--workers', type=int, default=2, help='Tarefas simultâneas')
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp()
+    try:
+        caminho = os.path.join(diretorio, 'plano.pdf')
+        gerar_pdf(caminho)
+
+        contexto_spawn = multiprocessing.get_context('spawn')
+        def no_processo():
+            analisar(caminho)
+        def spawn_por_tarefa():
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto_spawn, max_tasks_per_child=1) as executor:
+                executor.submit(analisar, caminho).result()
+        def isolado():
+            executar_isolado(analisar, (caminho,), limite_cpu=LIMITE_CPU, limite_memoria=LIMITE_MEMORIA,
+                             tempo_maximo=TEMPO_MAXIMO)
+
+        print('Custo por tarefa válida:')
+        print(f'  no próprio processo (sem isolamento): {medir_tarefa(no_processo):>7.1f} ms')
+        print(f'  processo novo (spawn):                {medir_tarefa(spawn_por_tarefa, 3):>7.1f} ms')
+        print(f'  processo isolado (forkserver):        {medir_tarefa(isolado):>7.1f} ms')
+
+        lote = montar_lote(caminho, args.arquivos, args.venenosos)
+        print(f'\nLote: {args.arquivos} PDFs válidos e {args.venenosos} venenosos, {args.workers} tarefas simultâneas')
+        print(f"{'Forma':<24} | {'Total':>8} | {'Válidos derrubados':>18} | {'Válidos sem resultado':>21}")
+        print('-' * 82)
+        for nome, executar in [('Pool compartilhado', executar_pool_compartilhado),
+                               ('Processo isolado', executar_isolado_lote)]:
+            inicio = time.perf_counter()
+            derrubados, falhas = executar(list(lote), args.workers)
+            print(f'{nome:<24} | {time.perf_counter() - inicio:>6.1f} s | {derrubados:>18} | {falhas:>21}')
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark da busca de documentos quase idênticos: comparação par a par x índice LSH
+Serra Projetos Educacionais
+
+Gera um corpus sintético em que parte dos documentos são versões editadas
+(poucas palavras trocadas) de outros e, para cada tamanho de corpus, mede o
+tempo médio de uma busca de semelhantes:
+
+- par a par: similaridade de Jaccard exata entre os trechos do documento e
+  os de todos os outros (custo proporcional ao total de documentos);
+- LSH: candidatos obtidos pelas bandas das assinaturas MinHash
+  (files.file_similaridade), em um dicionário que faz o papel da tabela
+  bandas_similaridade indexada, seguidos da comparação das assinaturas.
+
+Também informa a revocação do LSH em relação aos pares encontrados pela
+comparação exata com similaridade de pelo menos --limiar.
+
+Uso:
+    python benchmarks/benchmark_similaridade.py [--tamanhos 500,2000,5000] [--palavras 800] [--buscas 50] [--limiar 0.8]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from files.file_similaridade import (
+    calcular_assinatura, desempacotar_assinatura, valores_bandas, similaridade, PALAVRAS_TRECHO
+)
+
+def gerar_corpus(quantidade, palavras, aleatorio, fracao_versoes=0.3):
+    """Gera documentos originais e versões editadas de alguns deles."""
+    vocabulario = [f'palavra{i}' for i in range(5000)]
+    documentos = []
+    for _ in range(quantidade):
+        if documentos and aleatorio.random() < fracao_versoes:
+            versao = list(aleatorio.choice(documentos))
+            for _ in range(max(1, palavras // 200)):
+                versao[aleatorio.randrange(len(versao))] = aleatorio.choice(vocabulario)
+            documentos.append(versao)
+        else:
+            documentos.append([aleatorio.choice(vocabulario) for _ in range(palavras)])
+    return [' '.join(documento) for documento in documentos]
+
+def trechos(texto):
+    palavras = texto.split()
+    return {' '.join(palavras[i:i + PALAVRAS_TRECHO]) for i in range(len(palavras) - PALAVRAS_TRECHO + 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', default='500,2000,5000', help='Quantidades de documentos, separadas por vírgula')
+    parser.add_argument('--palavras', type=int, default=800, help='Palavras por documento')
+    parser.add_argument('--buscas', type=int, default=50, help='Buscas medidas por tamanho de corpus')
+    parser.add_argument('--limiar', type=float, default=0.8, help='Similaridade mínima')
+    args = parser.parse_args()
+
+    print(f"{'Documentos':>10} | {'Par a par':>12} | {'LSH':>9} | {'Candidatos':>10} | {'Revocação':>9} | {'Assinatura':>10}")
+    print('-' * 76)
+
+    for quantidade in [int(valor) for valor in args.tamanhos.split(',')]:
+        aleatorio = random.Random(42)
+        textos = gerar_corpus(quantidade, args.palavras, aleatorio)
+        conjuntos = [trechos(texto) for texto in textos]
+
+        inicio = time.perf_counter()
+        assinaturas = [calcular_assinatura(texto)[0] for texto in textos]
+        tempo_assinatura = (time.perf_counter() - inicio) * 1000 / quantidade
+
+        valores = [desempacotar_assinatura(assinatura) for assinatura in assinaturas]
+        indice = defaultdict(list)
+        for documento, assinatura in enumerate(assinaturas):
+            for banda, valor in enumerate(valores_bandas(assinatura)):
+                indice[(banda, valor)].append(documento)
+
+        consultas = aleatorio.sample(range(quantidade), min(args.buscas, quantidade))
+
+        inicio = time.perf_counter()
+        esperados = []
+        for consulta in consultas:
+            encontrados = set()
+            for outro in range(quantidade):
+                if outro != consulta:
+                    uniao = len(conjuntos[consulta] | conjuntos[outro])
+                    if len(conjuntos[consulta] & conjuntos[outro]) / uniao >= args.limiar:
+                        encontrados.add(outro)
+            esperados.append(encontrados)
+        tempo_par_a_par = (time.perf_counter() - inicio) * 1000 / len(consultas)
+
+        inicio = time.perf_counter()
+        obtidos = []
+        total_candidatos = 0
+        for consulta in consultas:
+            candidatos = set()
+            for banda, valor in enumerate(valores_bandas(assinaturas[consulta])):
+                candidatos.update(indice[(banda, valor)])
+            candidatos.discard(consulta)
+            total_candidatos += len(candidatos)
+            obtidos.append({
+                candidato for candidato in candidatos
+                if similaridade(valores[consulta], valores[candidato]) >= args.limiar
+            })
+        tempo_lsh = (time.perf_counter() - inicio) * 1000 / len(consultas)
+
+        total_esperados = sum(len(encontrados) for encontrados in esperados)
+        acertos = sum(len(e & o) for e, o in zip(esperados, obtidos))
+        revocacao = f'{acertos / total_esperados * 100:>8.1f}%' if total_esperados else f"{'-':>9}"
+
+        print(f'{quantidade:>10} | {tempo_par_a_par:>9.2f} ms | {tempo_lsh:>6.3f} ms | '
+              f'{total_candidatos / len(consultas):>10.1f} | {revocacao} | {tempo_assinatura:>7.2f} ms')
+
+if __name__ == '__main__':
+    main()
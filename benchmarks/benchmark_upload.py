@@ -0,0 +1,120 @@
+"""
+Benchmark do recebimento de uploads: fluxo anterior x pipeline em passagem única
+Serra Projetos Educacionais
+
+Mede, para uploads de tamanhos diferentes, os bytes lidos do disco e o tempo
+gasto entre o recebimento do conteúdo e o arquivo pronto para ser armazenado.
+
+O fluxo anterior salva o arquivo, identifica o tipo MIME com libmagic,
+relê o arquivo em blocos de 4 KB para o SHA-256, consulta o tamanho e relê
+o arquivo inteiro para a memória. O pipeline (files.file_pipeline.ReceptorUpload)
+faz tudo isso enquanto recebe os bytes.
+
+Uso:
+    python benchmarks/benchmark_upload.py [--tamanhos 1,5,10] [--repeticoes 5]
+"""
+
+import os
+import io
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import magic
+from files.file_pipeline import ReceptorUpload
+from files.file_utils import validar_arquivo
+
+def bytes_lidos_processo():
+    """
+    Retorna o total de bytes lidos pelo processo (rchar de /proc/self/io).
+
+    Inclui as leituras feitas por bibliotecas em C, como a libmagic.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            for linha in f:
+                if linha.startswith('rchar:'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+def gerar_conteudo(tamanho):
+    """Gera um conteúdo com cabeçalho de PDF e o tamanho solicitado."""
+    cabecalho = b'%PDF-1.4\n'
+    return cabecalho + os.urandom(tamanho - len(cabecalho))
+
+def fluxo_anterior(conteudo, diretorio):
+    """Reproduz as etapas do upload antes do pipeline em passagem única."""
+    caminho = os.path.join(diretorio, 'documento.pdf')
+
+    # Salvar arquivo temporariamente (equivalente a FileStorage.save)
+    with open(caminho, 'wb') as f:
+        shutil.copyfileobj(io.BytesIO(conteudo), f)
+
+    mime_type = magic.Magic(mime=True).from_file(caminho)
+    validar_arquivo(caminho, mime_type)
+
+    hash_arquivo = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for byte_block in iter(lambda: f.read(4096), b""):
+            hash_arquivo.update(byte_block)
+    hash_arquivo.hexdigest()
+
+    os.path.getsize(caminho)
+
+    with open(caminho, 'rb') as f:
+        f.read()
+
+    os.remove(caminho)
+
+def pipeline(conteudo, diretorio):
+    """Recebe o conteúdo com o ReceptorUpload, como nas rotas com upload_em_fluxo."""
+    receptor = ReceptorUpload('documento.pdf', diretorio)
+    stream = io.BytesIO(conteudo)
+    for bloco in iter(lambda: stream.read(64 * 1024), b''):
+        receptor.write(bloco)
+    receptor.finalizar()
+    receptor.descartar()
+
+def medir(funcao, conteudo, repeticoes):
+    """Executa a função e retorna (tempo médio em ms, bytes lidos por upload)."""
+    with tempfile.TemporaryDirectory() as diretorio:
+        lidos_inicio = bytes_lidos_processo()
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao(conteudo, diretorio)
+        tempo = (time.perf_counter() - inicio) / repeticoes * 1000
+        lidos_fim = bytes_lidos_processo()
+
+    lidos = None
+    if lidos_inicio is not None and lidos_fim is not None:
+        lidos = (lidos_fim - lidos_inicio) / repeticoes
+    return tempo, lidos
+
+def formatar_mb(valor):
+    return 'n/d' if valor is None else f'{valor / (1024 * 1024):.2f} MB'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', default='1,5,10', help='Tamanhos dos uploads em MB, separados por vírgula')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Repetições por medição')
+    args = parser.parse_args()
+
+    print(f"{'Tamanho':>8} | {'Fluxo':<10} | {'Tempo médio':>12} | {'Lidos do disco':>15}")
+    print('-' * 56)
+
+    for tamanho_mb in [float(t) for t in args.tamanhos.split(',')]:
+        conteudo = gerar_conteudo(int(tamanho_mb * 1024 * 1024))
+
+        for nome, funcao in [('anterior', fluxo_anterior), ('pipeline', pipeline)]:
+            tempo, lidos = medir(funcao, conteudo, args.repeticoes)
+            print(f"{tamanho_mb:>6.1f}MB | {nome:<10} | {tempo:>9.1f} ms | {formatar_mb(lidos):>15}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark do versionamento: espaço ocupado por versões fragmentadas e vazão da fragmentação
+Serra Projetos Educacionais
+
+Simula um documento editado semanalmente (edições pequenas em pontos
+aleatórios, inclusive inserções que deslocam o restante do conteúdo) e
+compara o espaço ocupado pelo histórico guardado em cópias completas com o
+ocupado pelos fragmentos definidos pelo conteúdo (files.file_versoes), em
+que trechos iguais entre versões são armazenados uma única vez. Também mede
+a vazão da fragmentação e a distribuição do tamanho dos fragmentos.
+
+Uso:
+    python benchmarks/benchmark_versoes.py [--tamanho-mb 20] [--versoes 8] [--edicoes 5]
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from files.file_versoes import dividir_fragmentos, MINIMO_FRAGMENTO, MEDIA_FRAGMENTO, MAXIMO_FRAGMENTO
+
+def gerar_documento(tamanho, aleatorio):
+    """Gera um texto com vocabulário limitado, como um documento real."""
+    palavras = [''.join(aleatorio.choice('abcdefghijlmnopqrstuvxz') for _ in range(aleatorio.randint(2, 10))) for _ in range(3000)]
+    partes = []
+    total = 0
+    while total < tamanho:
+        linha = ' '.join(aleatorio.choice(palavras) for _ in range(aleatorio.randint(5, 15))) + '\n'
+        partes.append(linha)
+        total += len(linha)
+    return ''.join(partes).encode()[:tamanho]
+
+def editar(dados, edicoes, aleatorio):
+    """Aplica edições pequenas: substituições, inserções e remoções de trechos."""
+    dados = bytearray(dados)
+    for _ in range(edicoes):
+        posicao = aleatorio.randrange(len(dados))
+        trecho = os.urandom(aleatorio.randint(10, 2000))
+        operacao = aleatorio.choice(('substituir', 'inserir', 'remover'))
+        if operacao == 'substituir':
+            dados[posicao:posicao + len(trecho)] = trecho
+        elif operacao == 'inserir':
+            dados[posicao:posicao] = trecho
+        else:
+            del dados[posicao:posicao + len(trecho)]
+    return bytes(dados)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanho-mb', type=float, default=20, help='Tamanho do documento, em MB')
+    parser.add_argument('--versoes', type=int, default=8, help='Quantidade de versões')
+    parser.add_argument('--edicoes', type=int, default=5, help='Edições entre versões consecutivas')
+    args = parser.parse_args()
+
+    aleatorio = random.Random(42)
+    dados = gerar_documento(int(args.tamanho_mb * 1024 * 1024), aleatorio)
+
+    armazenados = {}
+    bytes_completos = 0
+    tempo_total = 0.0
+    tamanhos = []
+
+    print(f'Fragmentos: mínimo {MINIMO_FRAGMENTO // 1024} KB, médio {MEDIA_FRAGMENTO // 1024} KB, '
+          f'máximo {MAXIMO_FRAGMENTO // 1024} KB')
+    print(f"{'Versão':>6} | {'Tamanho':>10} | {'Fragmentos':>10} | {'Novos':>6} | {'Cópias completas':>16} | {'Fragmentado':>11} | {'Vazão':>10}")
+    print('-' * 92)
+
+    for numero in range(1, args.versoes + 1):
+        if numero > 1:
+            dados = editar(dados, args.edicoes, aleatorio)
+
+        inicio = time.perf_counter()
+        fragmentos = list(dividir_fragmentos(io.BytesIO(dados)))
+        duracao = time.perf_counter() - inicio
+        tempo_total += duracao
+
+        novos = 0
+        for fragmento in fragmentos:
+            hash_fragmento = hashlib.sha256(fragmento).hexdigest()
+            if hash_fragmento not in armazenados:
+                armazenados[hash_fragmento] = len(fragmento)
+                novos += 1
+            tamanhos.append(len(fragmento))
+
+        assert b''.join(fragmentos) == dados
+        bytes_completos += len(dados)
+        bytes_fragmentados = sum(armazenados.values())
+        print(f'{numero:>6} | {len(dados) / 1048576:>7.2f} MB | {len(fragmentos):>10} | {novos:>6} | '
+              f'{bytes_completos / 1048576:>13.2f} MB | {bytes_fragmentados / 1048576:>8.2f} MB | '
+              f'{len(dados) / 1048576 / duracao:>5.2f} MB/s')
+
+    tamanhos.sort()
+    print(f'\nEspaço do histórico: {sum(armazenados.values()) / bytes_completos:.1%} do ocupado por cópias completas')
+    print(f'Tamanho dos fragmentos: mediana {tamanhos[len(tamanhos) // 2] / 1024:.0f} KB, '
+          f'média {sum(tamanhos) / len(tamanhos) / 1024:.0f} KB')
+    print(f'Vazão média da fragmentação: {bytes_completos / 1048576 / tempo_total:.2f} MB/s')
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@ Módulo de inicialização do sistema de gerenciamento de arquivos
 Serra Projetos Educacionais
 """
 
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -21,10 +22,94 @@ def init_app(app):
     app.config['UPLOAD_FOLDER'] = 'uploads'
     app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB
     
+    # Configurações de upload em lote
+    app.config.setdefault('LOTE_MAXIMO_ARQUIVOS', 500)
+    app.config.setdefault('LOTE_MAX_CONTENT_LENGTH', 200 * 1024 * 1024)
+    app.config.setdefault('LOTE_LIMITE_DESCOMPACTADO', 1024 * 1024 * 1024)
+    app.config.setdefault('LOTE_WORKERS', 4)
+    
+    # Configurações de upload em blocos (retomável, além do MAX_CONTENT_LENGTH)
+    app.config.setdefault('UPLOAD_SESSOES_PATH', os.path.join(app.instance_path, 'upload_sessoes'))
+    app.config.setdefault('UPLOAD_SESSAO_TAMANHO_MAXIMO', 1024 * 1024 * 1024)
+    app.config.setdefault('UPLOAD_SESSAO_TAMANHO_BLOCO', 5 * 1024 * 1024)
+    app.config.setdefault('UPLOAD_SESSAO_VALIDADE', 24 * 60 * 60)
+    
+    # Configurações de armazenamento de conteúdo
+    app.config.setdefault('BLOB_STORAGE_BACKEND', 'local')
+    app.config.setdefault('BLOB_STORAGE_PATH', os.path.join(app.instance_path, 'blobs'))
+    app.config.setdefault('BLOB_COMPRESSAO', None)
+    app.config.setdefault('BLOB_COMPRESSAO_NIVEL', None)
+    app.config.setdefault('BLOB_COMPRESSAO_TIPOS', [
+        'text/plain',
+        'application/msword',
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+    ])
+    app.config.setdefault('BLOB_COMPRESSAO_RAZAO_MAXIMA', 0.9)
+    app.config.setdefault('BLOB_COMPRESSAO_TAMANHO_MINIMO', 4096)
+    
+    # Configurações do cache de conteúdo em memória (downloads frequentes)
+    app.config.setdefault('CACHE_CONTEUDO_LIMITE_BYTES', 64 * 1024 * 1024)
+    app.config.setdefault('CACHE_CONTEUDO_TAMANHO_MAXIMO_ARQUIVO', 1024 * 1024)
+    
+    # Configurações de URLs de download assinadas e envio pelo servidor web
+    app.config.setdefault('DOWNLOAD_URL_ASSINADA_BASE', None)
+    app.config.setdefault('DOWNLOAD_URL_ASSINADA_VALIDADE', 300)
+    app.config.setdefault('DOWNLOAD_OFFLOAD_CABECALHO', None)
+    app.config.setdefault('DOWNLOAD_OFFLOAD_PREFIXO', '/blobs-internos/')
+    
+    # Configurações da verificação antivírus dos uploads
+    app.config.setdefault('ANTIVIRUS_BACKEND', None)
+    app.config.setdefault('ANTIVIRUS_ENDERECO', '/var/run/clamav/clamd.ctl')
+    app.config.setdefault('ANTIVIRUS_TIMEOUT', 30)
+    app.config.setdefault('ANTIVIRUS_VALIDADE_VEREDITO', 7 * 24 * 60 * 60)
+    
+    # Cotas de armazenamento (0 = sem limite)
+    app.config.setdefault('COTA_USUARIO_BYTES', 1024 * 1024 * 1024)
+    app.config.setdefault('COTA_INSTITUICAO_BYTES', 10 * 1024 * 1024 * 1024)
+    
+    # Configurações da exportação de arquivos em pacotes ZIP
+    app.config.setdefault('EXPORTACAO_ZIP_MAXIMO_ARQUIVOS', 1000)
+    
+    # Configurações do cache de miniaturas
+    app.config.setdefault('MINIATURAS_PATH', os.path.join(app.instance_path, 'miniaturas'))
+    app.config.setdefault('MINIATURAS_LIMITE_BYTES', 256 * 1024 * 1024)
+    app.config.setdefault('MINIATURAS_TEMPO_MAXIMO', 15)
+    
+    # Configurações da detecção de documentos quase idênticos
+    app.config.setdefault('SIMILARIDADE_LIMIAR', 0.8)
+    app.config.setdefault('SIMILARIDADE_MAXIMO_RESULTADOS', 10)
+    
+    # Configurações da manutenção do armazenamento (flask arquivos manutencao)
+    app.config.setdefault('MANUTENCAO_IDADE_TEMPORARIOS', 60 * 60)
+    app.config.setdefault('MANUTENCAO_IDADE_BLOBS_ORFAOS', 24 * 60 * 60)
+    app.config.setdefault('MANUTENCAO_PREFIXOS_POR_EXECUCAO', 16)
+    app.config.setdefault('MANUTENCAO_LIMITE_BLOBS_BYTES', None)
+    app.config.setdefault('MANUTENCAO_ESPACO_LIVRE_MINIMO', 0.1)
+    
+    # Configurações da verificação de integridade (flask arquivos verificar-integridade)
+    app.config.setdefault('INTEGRIDADE_WORKERS', 2)
+    app.config.setdefault('INTEGRIDADE_TAXA_BYTES', 16 * 1024 * 1024)
+    app.config.setdefault('INTEGRIDADE_LOTE', 100)
+    
+    # Configurações de extração de texto
+    app.config.setdefault('EXTRACAO_ASSINCRONA', True)
+    app.config.setdefault('EXTRACAO_WORKERS', 2)
+    app.config.setdefault('EXTRACAO_LIMITE_CPU', 60)
+    app.config.setdefault('EXTRACAO_LIMITE_MEMORIA', 512 * 1024 * 1024)
+    app.config.setdefault('EXTRACAO_TEMPO_MAXIMO', 120)
+    
+    # Receber uploads em passagem única nas rotas com upload_em_fluxo
+    from .file_pipeline import RequisicaoUpload
+    app.request_class = RequisicaoUpload
+    
     # Registrar blueprint
     from .file_routes import files_bp
     app.register_blueprint(files_bp, url_prefix='/files')
     
+    # Registrar comandos de linha de comando
+    from .file_commands import arquivos_cli
+    app.cli.add_command(arquivos_cli)
+    
     # Criar tabelas no banco de dados (em ambiente de desenvolvimento)
     if app.config.get('ENV') == 'development':
         with app.app_context():
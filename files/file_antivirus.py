@@ -0,0 +1,416 @@
+"""
+Verificação antivírus do conteúdo enviado ao sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+
+O conteúdo de cada upload é enviado ao verificador à medida que é recebido,
+na mesma passagem que calcula o hash (ReceptorUpload), sem nova leitura do
+arquivo gravado. O backend incluído conversa com um daemon compatível com o
+clamd (comando INSTREAM) por socket local ou TCP; outros backends podem ser
+registrados com registrar_verificador.
+
+Os vereditos são guardados por hash do conteúdo (VerificacaoConteudo), de
+modo que uploads repetidos de um mesmo conteúdo não são verificados de novo.
+Arquivos com ameaça detectada ficam em quarentena: são mantidos para
+análise, mas não podem ser baixados nem processados.
+"""
+
+import socket
+import struct
+import datetime
+from flask import current_app
+
+# Importar modelos e utilitários
+from .file_models import VerificacaoConteudo
+from .file_storage import obter_blob_store, TAMANHO_BLOCO
+
+# Importar modelos de outros módulos
+from admin.admin_models import LogSistema
+
+# Importar extensões da aplicação
+from auth import db
+
+# Estados da verificação persistidos em Arquivo.status_verificacao
+# (None: verificação desabilitada quando o arquivo foi enviado)
+VERIFICACAO_LIMPO = 'limpo'
+VERIFICACAO_PENDENTE = 'pendente'
+VERIFICACAO_QUARENTENA = 'quarentena'
+
+# Resultados guardados em VerificacaoConteudo
+RESULTADO_LIMPO = 'limpo'
+RESULTADO_INFECTADO = 'infectado'
+
+# Tamanho máximo de cada bloco do comando INSTREAM
+TAMANHO_MAXIMO_PEDACO_CLAMD = 1024 * 1024
+
+
+class SessaoVerificacao:
+    """
+    Verificação de um conteúdo recebido em blocos.
+
+    enviar() é chamado para cada bloco, na ordem; concluir() aguarda e
+    retorna o resultado; cancelar() descarta a verificação sem resultado.
+    """
+
+    def enviar(self, dados):
+        raise NotImplementedError
+
+    def concluir(self):
+        """
+        Returns:
+            Dicionário com 'infectado' (bool), 'ameaca' e 'erro' (None se verificado)
+        """
+        raise NotImplementedError
+
+    def cancelar(self):
+        pass
+
+
+class Verificador:
+    """Interface dos backends de verificação antivírus."""
+
+    nome = 'base'
+
+    def iniciar(self):
+        """Inicia a verificação de um conteúdo, retornando uma SessaoVerificacao."""
+        raise NotImplementedError
+
+    def versao(self):
+        """Retorna a identificação do verificador e das assinaturas, ou None."""
+        return None
+
+    def verificar_stream(self, stream):
+        """
+        Verifica um stream binário por inteiro.
+
+        Args:
+            stream: Objeto com método read()
+
+        Returns:
+            Dicionário retornado por SessaoVerificacao.concluir
+        """
+        sessao = self.iniciar()
+        for bloco in iter(lambda: stream.read(TAMANHO_BLOCO), b''):
+            sessao.enviar(bloco)
+        return sessao.concluir()
+
+
+class SessaoClamd(SessaoVerificacao):
+    """
+    Sessão INSTREAM do clamd: cada bloco é enviado precedido de seu tamanho
+    (4 bytes, big-endian) e um bloco de tamanho zero encerra o conteúdo.
+
+    A conexão é aberta no primeiro bloco. Uma falha de comunicação não
+    interrompe o upload: os blocos seguintes são ignorados e o erro é
+    informado em concluir().
+    """
+
+    def __init__(self, verificador):
+        self.verificador = verificador
+        self.erro = None
+        self._conexao = None
+
+    def _abrir(self):
+        self._conexao = self.verificador.conectar()
+        self._conexao.sendall(b'zINSTREAM\0')
+
+    def enviar(self, dados):
+        if self.erro:
+            return
+
+        try:
+            if self._conexao is None:
+                self._abrir()
+            visao = memoryview(dados)
+            for inicio in range(0, len(visao), TAMANHO_MAXIMO_PEDACO_CLAMD):
+                pedaco = visao[inicio:inicio + TAMANHO_MAXIMO_PEDACO_CLAMD]
+                self._conexao.sendall(struct.pack('!L', len(pedaco)) + pedaco)
+        except OSError as e:
+            # O clamd encerra a conexão ao exceder StreamMaxLength
+            self.erro = f'Falha ao enviar o conteúdo ao verificador: {str(e)}'
+            self.cancelar()
+
+    def concluir(self):
+        if self.erro:
+            return {'infectado': False, 'ameaca': None, 'erro': self.erro}
+
+        try:
+            if self._conexao is None:
+                self._abrir()
+            self._conexao.sendall(struct.pack('!L', 0))
+            resposta = self.verificador.ler_resposta(self._conexao)
+        except OSError as e:
+            return {'infectado': False, 'ameaca': None, 'erro': f'Falha na resposta do verificador: {str(e)}'}
+        finally:
+            self.cancelar()
+
+        return interpretar_resposta_clamd(resposta)
+
+    def cancelar(self):
+        # Sem o bloco final, o clamd descarta o conteúdo sem verificá-lo
+        if self._conexao is not None:
+            try:
+                self._conexao.close()
+            except OSError:
+                pass
+            self._conexao = None
+
+
+class VerificadorClamd(Verificador):
+    """
+    Verificador que usa um daemon compatível com o clamd.
+
+    O endereço é o caminho de um socket Unix (ex.: /var/run/clamav/clamd.ctl)
+    ou host:porta para TCP (ex.: 127.0.0.1:3310).
+    """
+
+    nome = 'clamd'
+
+    def __init__(self, endereco, timeout=30):
+        self.endereco = endereco
+        self.timeout = timeout
+
+    def conectar(self):
+        """Abre uma conexão com o daemon."""
+        if '/' in self.endereco:
+            conexao = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            destino = self.endereco
+        else:
+            host, _, porta = self.endereco.rpartition(':')
+            conexao = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            destino = (host or '127.0.0.1', int(porta))
+
+        conexao.settimeout(self.timeout)
+        try:
+            conexao.connect(destino)
+        except OSError:
+            conexao.close()
+            raise
+        return conexao
+
+    @staticmethod
+    def ler_resposta(conexao):
+        """Lê uma resposta terminada em NUL (comandos com prefixo 'z')."""
+        partes = []
+        while True:
+            dados = conexao.recv(4096)
+            if not dados:
+                break
+            partes.append(dados)
+            if dados.endswith(b'\0'):
+                break
+        return b''.join(partes).rstrip(b'\0').decode('utf-8', 'replace').strip()
+
+    def _comando(self, comando):
+        conexao = self.conectar()
+        try:
+            conexao.sendall(b'z' + comando + b'\0')
+            return self.ler_resposta(conexao)
+        finally:
+            conexao.close()
+
+    def iniciar(self):
+        return SessaoClamd(self)
+
+    def ping(self):
+        """Verifica se o daemon responde."""
+        try:
+            return self._comando(b'PING') == 'PONG'
+        except OSError:
+            return False
+
+    def versao(self):
+        try:
+            return self._comando(b'VERSION')[:100]
+        except OSError:
+            return None
+
+
+def interpretar_resposta_clamd(resposta):
+    """
+    Interpreta a resposta do comando INSTREAM.
+
+    Args:
+        resposta: Texto como 'stream: OK' ou 'stream: Eicar-Signature FOUND'
+
+    Returns:
+        Dicionário com 'infectado', 'ameaca' e 'erro'
+    """
+    mensagem = resposta.split(':', 1)[1].strip() if ':' in resposta else resposta
+
+    if mensagem == 'OK':
+        return {'infectado': False, 'ameaca': None, 'erro': None}
+    if mensagem.endswith(' FOUND'):
+        return {'infectado': True, 'ameaca': mensagem[:-len(' FOUND')][:255], 'erro': None}
+    return {'infectado': False, 'ameaca': None, 'erro': f'Erro do verificador: {resposta or "sem resposta"}'}
+
+
+# Backends disponíveis, selecionados por ANTIVIRUS_BACKEND
+VERIFICADORES = {
+    'clamd': VerificadorClamd,
+}
+
+def registrar_verificador(nome, classe):
+    """
+    Registra um backend de verificação antivírus.
+
+    Args:
+        nome: Nome usado em ANTIVIRUS_BACKEND
+        classe: Subclasse de Verificador, criada com (endereco, timeout=...)
+    """
+    VERIFICADORES[nome] = classe
+
+def obter_verificador():
+    """
+    Retorna o verificador configurado na aplicação.
+
+    Returns:
+        Instância de Verificador ou None se a verificação estiver desabilitada
+    """
+    nome_backend = current_app.config.get('ANTIVIRUS_BACKEND')
+    if not nome_backend:
+        return None
+
+    verificador = current_app.extensions.get('verificador_antivirus')
+    if verificador is None:
+        if nome_backend not in VERIFICADORES:
+            raise ValueError(f'Backend de verificação antivírus desconhecido: {nome_backend}')
+
+        verificador = VERIFICADORES[nome_backend](
+            current_app.config.get('ANTIVIRUS_ENDERECO'),
+            timeout=current_app.config.get('ANTIVIRUS_TIMEOUT', 30)
+        )
+        current_app.extensions['verificador_antivirus'] = verificador
+
+    return verificador
+
+def consultar_veredito(hash_conteudo):
+    """
+    Retorna o veredito válido de um conteúdo já verificado.
+
+    Vereditos de conteúdo infectado não expiram; os de conteúdo limpo valem
+    por ANTIVIRUS_VALIDADE_VEREDITO segundos, para que o conteúdo seja
+    verificado de novo com assinaturas atualizadas.
+
+    Args:
+        hash_conteudo: Hash SHA-256 do conteúdo
+
+    Returns:
+        Objeto VerificacaoConteudo ou None
+    """
+    if not hash_conteudo:
+        return None
+
+    veredito = VerificacaoConteudo.query.get(hash_conteudo)
+    if veredito is None or veredito.resultado == RESULTADO_INFECTADO:
+        return veredito
+
+    validade = current_app.config.get('ANTIVIRUS_VALIDADE_VEREDITO', 7 * 24 * 60 * 60)
+    if validade and veredito.data_verificacao < datetime.datetime.now() - datetime.timedelta(seconds=validade):
+        return None
+
+    return veredito
+
+def registrar_veredito(hash_conteudo, resultado, verificador=None):
+    """
+    Guarda (ou atualiza) o veredito de um conteúdo.
+
+    Args:
+        hash_conteudo: Hash SHA-256 do conteúdo
+        resultado: Dicionário retornado por SessaoVerificacao.concluir
+        verificador: Instância de Verificador (opcional)
+
+    Returns:
+        Objeto VerificacaoConteudo
+    """
+    veredito = VerificacaoConteudo.query.get(hash_conteudo)
+    if veredito is None:
+        veredito = VerificacaoConteudo(hash_conteudo=hash_conteudo)
+        db.session.add(veredito)
+
+    veredito.resultado = RESULTADO_INFECTADO if resultado['infectado'] else RESULTADO_LIMPO
+    veredito.ameaca = resultado['ameaca']
+    veredito.verificador = verificador.nome if verificador else None
+    veredito.data_verificacao = datetime.datetime.now()
+    return veredito
+
+def verificar_conteudo_armazenado(hash_conteudo, verificador=None):
+    """
+    Verifica um conteúdo já gravado no armazenamento de blobs.
+
+    Args:
+        hash_conteudo: Hash SHA-256 do conteúdo
+        verificador: Instância de Verificador (padrão: o da aplicação)
+
+    Returns:
+        Dicionário com 'infectado', 'ameaca' e 'erro'
+    """
+    verificador = verificador or obter_verificador()
+    try:
+        with obter_blob_store().abrir(hash_conteudo) as origem:
+            return verificador.verificar_stream(origem)
+    except FileNotFoundError:
+        return {'infectado': False, 'ameaca': None, 'erro': 'Conteúdo não encontrado no armazenamento.'}
+
+def aplicar_verificacao(arquivo, recebido=None):
+    """
+    Define o estado da verificação antivírus de um arquivo.
+
+    Com um veredito válido para o conteúdo, a verificação em andamento do
+    upload é descartada sem ser concluída. Caso contrário, o resultado da
+    verificação feita durante o recebimento é aguardado (ou, sem ela, o
+    conteúdo armazenado é verificado) e guardado. Se o verificador não
+    responder, o arquivo fica pendente e pode ser verificado depois com
+    flask arquivos verificar-antivirus. A alteração é feita na sessão atual.
+
+    Args:
+        arquivo: Objeto Arquivo com hash_conteudo definido
+        recebido: Objeto ReceptorUpload do conteúdo (opcional)
+
+    Returns:
+        O estado definido em arquivo.status_verificacao
+    """
+    sessao = getattr(recebido, 'verificacao', None)
+    verificador = obter_verificador()
+
+    veredito = consultar_veredito(arquivo.hash_conteudo)
+    if veredito is not None:
+        if sessao is not None:
+            sessao.cancelar()
+        resultado = {'infectado': veredito.resultado == RESULTADO_INFECTADO, 'ameaca': veredito.ameaca, 'erro': None}
+    elif sessao is not None:
+        resultado = sessao.concluir()
+    elif verificador is not None:
+        resultado = verificar_conteudo_armazenado(arquivo.hash_conteudo, verificador)
+    else:
+        arquivo.status_verificacao = None
+        arquivo.ameaca_detectada = None
+        return None
+
+    if resultado['erro']:
+        print(f"Erro na verificação antivírus: {resultado['erro']}")
+        arquivo.status_verificacao = VERIFICACAO_PENDENTE
+        arquivo.ameaca_detectada = None
+        return arquivo.status_verificacao
+
+    if veredito is None:
+        registrar_veredito(arquivo.hash_conteudo, resultado, verificador)
+
+    if resultado['infectado']:
+        arquivo.status_verificacao = VERIFICACAO_QUARENTENA
+        arquivo.ameaca_detectada = resultado['ameaca']
+        db.session.add(LogSistema(
+            tipo='seguranca',
+            nivel='warning',
+            mensagem=f'Arquivo {arquivo.nome} colocado em quarentena: {resultado["ameaca"]}',
+            detalhes={'hash_conteudo': arquivo.hash_conteudo, 'ameaca': resultado['ameaca']},
+            usuario_id=arquivo.usuario_id
+        ))
+    else:
+        arquivo.status_verificacao = VERIFICACAO_LIMPO
+        arquivo.ameaca_detectada = None
+
+    return arquivo.status_verificacao
+
+def em_quarentena(arquivo):
+    """Indica se o arquivo está em quarentena (não pode ser baixado nem processado)."""
+    return arquivo.status_verificacao == VERIFICACAO_QUARENTENA
@@ -0,0 +1,507 @@
+"""
+Comandos de linha de comando para o sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import json
+import hashlib
+import click
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text, or_
+from sqlalchemy.orm import selectinload
+
+# Importar modelos e utilitários
+from .file_models import Arquivo, ArquivoConteudo, Blob
+from .file_storage import obter_blob_store, registrar_blob, deve_compactar, compactar_conteudo, aplicar_compressao
+
+# Importar extensões da aplicação
+from auth import db
+
+# Grupo de comandos: flask arquivos <comando>
+arquivos_cli = AppGroup('arquivos', help='Manutenção do armazenamento de arquivos.')
+
+@arquivos_cli.command('migrar-conteudo')
+@click.option('--lote', default=50, show_default=True, help='Quantidade de registros por transação.')
+def migrar_conteudo(lote):
+    """
+    Move o conteúdo da tabela arquivos_conteudo para o armazenamento de blobs.
+
+    Cada lote é confirmado separadamente e os registros migrados são removidos,
+    de modo que o comando pode ser interrompido e executado novamente.
+    """
+    store = obter_blob_store()
+    total_registros = 0
+    total_bytes = 0
+
+    while True:
+        registros = ArquivoConteudo.query.order_by(ArquivoConteudo.id).limit(lote).all()
+        if not registros:
+            break
+
+        for registro in registros:
+            arquivo = Arquivo.query.get(registro.arquivo_id)
+            conteudo = registro.conteudo
+            hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+
+            if arquivo is None:
+                db.session.delete(registro)
+                continue
+
+            if arquivo.hash_conteudo and arquivo.hash_conteudo != hash_conteudo:
+                click.echo(f'Aviso: hash divergente para o arquivo {arquivo.id}; usando o hash do conteúdo armazenado.')
+                arquivo.hash_conteudo = hash_conteudo
+
+            # Gravar o conteúdo antes de alterar o banco de dados
+            store.gravar_bytes(conteudo, hash_conteudo)
+
+            if arquivo.blob_id is None:
+                arquivo.hash_conteudo = hash_conteudo
+                arquivo.blob = registrar_blob(hash_conteudo, len(conteudo))
+
+            db.session.delete(registro)
+            total_registros += 1
+            total_bytes += len(conteudo)
+
+        db.session.commit()
+        click.echo(f'{total_registros} arquivos migrados ({total_bytes / (1024 * 1024):.1f} MB).')
+
+    click.echo(f'Migração concluída: {total_registros} arquivos, {total_bytes / (1024 * 1024):.1f} MB movidos para o armazenamento de blobs.')
+
+@arquivos_cli.command('reprocessar-extracoes')
+@click.option('--falhas', is_flag=True, help='Incluir arquivos cuja extração falhou.')
+@click.option('--todos', is_flag=True, help='Reprocessar todos os arquivos.')
+def reprocessar_extracoes(falhas, todos):
+    """
+    Envia para o pool de extração os arquivos com extração pendente.
+
+    Arquivos que ficaram em processamento quando a aplicação foi encerrada
+    também são reenviados. O comando aguarda a conclusão das extrações.
+    """
+    from .file_workers import agendar_extracao, obter_pool_extracao, STATUS_PENDENTE, STATUS_PROCESSANDO, STATUS_FALHOU
+
+    query = Arquivo.query
+    if not todos:
+        status = [STATUS_PENDENTE, STATUS_PROCESSANDO]
+        if falhas:
+            status.append(STATUS_FALHOU)
+        query = query.filter(Arquivo.status_extracao.in_(status))
+
+    arquivos = query.order_by(Arquivo.id).all()
+    for arquivo in arquivos:
+        agendar_extracao(arquivo)
+
+    click.echo(f'{len(arquivos)} arquivos enviados para extração. Aguardando conclusão...')
+    obter_pool_extracao().aguardar()
+
+    totais = dict(
+        db.session.query(Arquivo.status_extracao, db.func.count(Arquivo.id))
+        .filter(Arquivo.id.in_([a.id for a in arquivos]))
+        .group_by(Arquivo.status_extracao)
+        .all()
+    ) if arquivos else {}
+    click.echo(f"Extração concluída: {totais.get('concluido', 0)} concluídos, {totais.get('falhou', 0)} com falha.")
+
+@arquivos_cli.command('reindexar-busca')
+@click.option('--lote', default=200, show_default=True, help='Quantidade de arquivos por transação.')
+def reindexar_busca(lote):
+    """
+    Reconstrói o índice de pesquisa textual a partir dos arquivos existentes.
+    """
+    from .file_search import obter_indice_busca, indexar_arquivo
+
+    indice = obter_indice_busca()
+    indice.limpar()
+    db.session.commit()
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        arquivos = (
+            Arquivo.query.options(selectinload(Arquivo.texto))
+            .filter(Arquivo.id > ultimo_id)
+            .order_by(Arquivo.id)
+            .limit(lote)
+            .all()
+        )
+        if not arquivos:
+            break
+
+        for arquivo in arquivos:
+            indexar_arquivo(arquivo)
+        ultimo_id = arquivos[-1].id
+        total += len(arquivos)
+
+        db.session.commit()
+        db.session.expunge_all()
+        click.echo(f'{total} arquivos indexados.')
+
+    click.echo(f'Índice de pesquisa ({indice.nome}) reconstruído: {total} arquivos.')
+
+@arquivos_cli.command('indexar-similaridade')
+@click.option('--lote', default=200, show_default=True, help='Quantidade de arquivos por transação.')
+def indexar_similaridade_arquivos(lote):
+    """
+    Calcula as assinaturas MinHash dos arquivos com texto extraído.
+
+    Usado para incluir os arquivos existentes na detecção de documentos
+    quase idênticos; os novos são indexados ao fim da extração.
+    """
+    from .file_similaridade import indexar_similaridade
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        arquivos = (
+            Arquivo.query.options(selectinload(Arquivo.texto))
+            .filter(Arquivo.id > ultimo_id, Arquivo.status_extracao == 'concluido')
+            .order_by(Arquivo.id)
+            .limit(lote)
+            .all()
+        )
+        if not arquivos:
+            break
+
+        for arquivo in arquivos:
+            indexar_similaridade(arquivo)
+        ultimo_id = arquivos[-1].id
+        total += len(arquivos)
+
+        db.session.commit()
+        db.session.expunge_all()
+        click.echo(f'{total} arquivos processados.')
+
+    click.echo(f'Índice de similaridade reconstruído: {total} arquivos.')
+
+@arquivos_cli.command('fragmentar-versoes')
+def fragmentar_versoes():
+    """
+    Fragmenta as versões anteriores que ainda guardam o conteúdo inteiro.
+
+    Inclui versões cuja fragmentação falhou ou foi interrompida pelo
+    encerramento da aplicação. O comando aguarda a conclusão.
+    """
+    from .file_models import VersaoArquivo
+    from .file_versoes import agendar_fragmentacao
+    from .file_workers import obter_pool_extracao
+
+    versoes = VersaoArquivo.query.filter(VersaoArquivo.blob_id.isnot(None)).order_by(VersaoArquivo.id).all()
+    for versao in versoes:
+        agendar_fragmentacao(versao)
+
+    click.echo(f'{len(versoes)} versões enviadas para fragmentação. Aguardando conclusão...')
+    obter_pool_extracao().aguardar()
+
+    pendentes = VersaoArquivo.query.filter(
+        VersaoArquivo.id.in_([versao.id for versao in versoes]), VersaoArquivo.blob_id.isnot(None)
+    ).count() if versoes else 0
+    click.echo(f'Fragmentação concluída: {len(versoes) - pendentes} versões fragmentadas, {pendentes} com falha.')
+
+@arquivos_cli.command('verificar-antivirus')
+@click.option('--todos', is_flag=True, help='Incluir os arquivos enviados com a verificação desabilitada.')
+def verificar_antivirus(todos):
+    """
+    Verifica os arquivos cuja verificação antivírus ficou pendente.
+
+    Arquivos enviados enquanto o verificador não respondia são verificados a
+    partir do conteúdo armazenado (conteúdos repetidos, uma única vez).
+    Arquivos com ameaça detectada são colocados em quarentena.
+    """
+    from .file_antivirus import obter_verificador, aplicar_verificacao, VERIFICACAO_PENDENTE, VERIFICACAO_QUARENTENA
+
+    if obter_verificador() is None:
+        click.echo('A verificação antivírus está desabilitada (ANTIVIRUS_BACKEND).')
+        return
+
+    condicao = Arquivo.status_verificacao == VERIFICACAO_PENDENTE
+    if todos:
+        condicao = or_(condicao, Arquivo.status_verificacao.is_(None))
+
+    arquivos = Arquivo.query.filter(condicao, Arquivo.blob_id.isnot(None)).order_by(Arquivo.id).all()
+    totais = {}
+    for arquivo in arquivos:
+        status = aplicar_verificacao(arquivo)
+        db.session.commit()
+        totais[status] = totais.get(status, 0) + 1
+
+    click.echo(f"{len(arquivos)} arquivos verificados: {totais.get('limpo', 0)} limpos, "
+               f"{totais.get(VERIFICACAO_QUARENTENA, 0)} em quarentena, {totais.get(VERIFICACAO_PENDENTE, 0)} ainda pendentes.")
+
+@arquivos_cli.command('liberar-quarentena')
+@click.argument('arquivo_id', type=int)
+def liberar_quarentena(arquivo_id):
+    """
+    Libera da quarentena um arquivo (falso positivo) e os demais com o mesmo conteúdo.
+
+    O conteúdo passa a ser considerado limpo e a extração de texto é agendada.
+    """
+    from .file_antivirus import registrar_veredito, VERIFICACAO_LIMPO, VERIFICACAO_QUARENTENA
+    from .file_workers import agendar_extracao
+    from admin.admin_models import LogSistema
+
+    arquivo = Arquivo.query.get(arquivo_id)
+    if arquivo is None or arquivo.status_verificacao != VERIFICACAO_QUARENTENA:
+        click.echo('Arquivo não encontrado ou fora da quarentena.')
+        return
+
+    arquivos = Arquivo.query.filter_by(hash_conteudo=arquivo.hash_conteudo, status_verificacao=VERIFICACAO_QUARENTENA).all()
+    ameaca = arquivo.ameaca_detectada
+    registrar_veredito(arquivo.hash_conteudo, {'infectado': False, 'ameaca': None, 'erro': None})
+    for liberado in arquivos:
+        liberado.status_verificacao = VERIFICACAO_LIMPO
+        liberado.ameaca_detectada = None
+    db.session.add(LogSistema(
+        tipo='seguranca',
+        nivel='info',
+        mensagem=f'Conteúdo liberado da quarentena (falso positivo: {ameaca})',
+        detalhes={'hash_conteudo': arquivo.hash_conteudo, 'arquivos': [liberado.id for liberado in arquivos]}
+    ))
+    db.session.commit()
+
+    for liberado in arquivos:
+        agendar_extracao(liberado)
+
+    click.echo(f'{len(arquivos)} arquivo(s) liberado(s) da quarentena.')
+
+@arquivos_cli.command('migrar-textos')
+@click.option('--lote', default=200, show_default=True, help='Quantidade de arquivos por transação.')
+def migrar_textos(lote):
+    """
+    Move o texto extraído e os metadados da tabela arquivos para arquivos_texto.
+
+    Os valores são compactados e as colunas antigas são esvaziadas a cada
+    lote, de modo que o comando pode ser interrompido e executado novamente.
+    Em SQLite, execute VACUUM ao final para liberar o espaço.
+    """
+    colunas = {coluna['name'] for coluna in inspect(db.engine).get_columns('arquivos')}
+    if not {'conteudo_texto', 'metadados'} <= colunas:
+        click.echo('A tabela arquivos não possui as colunas antigas; nada a migrar.')
+        return
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        registros = db.session.execute(
+            text(
+                "SELECT id, conteudo_texto, metadados FROM arquivos "
+                "WHERE id > :ultimo_id AND (conteudo_texto IS NOT NULL OR metadados IS NOT NULL) "
+                "ORDER BY id LIMIT :lote"
+            ),
+            {'ultimo_id': ultimo_id, 'lote': lote}
+        ).fetchall()
+        if not registros:
+            break
+
+        for arquivo_id, conteudo_texto, metadados in registros:
+            arquivo = Arquivo.query.get(arquivo_id)
+
+            # Valores já gravados na nova tabela têm precedência
+            if arquivo.conteudo_texto is None:
+                arquivo.conteudo_texto = conteudo_texto
+            if arquivo.metadados is None:
+                arquivo.metadados = metadados
+
+            db.session.execute(
+                text("UPDATE arquivos SET conteudo_texto = NULL, metadados = NULL WHERE id = :id"),
+                {'id': arquivo_id}
+            )
+
+        ultimo_id = registros[-1][0]
+        total += len(registros)
+
+        db.session.commit()
+        db.session.expunge_all()
+        click.echo(f'{total} arquivos migrados.')
+
+    click.echo(f'Migração concluída: {total} arquivos com texto e metadados em arquivos_texto.')
+
+@arquivos_cli.command('compactar-conteudo')
+@click.option('--lote', default=100, show_default=True, help='Quantidade de blobs por transação.')
+@click.option('--workers', default=2, show_default=True, help='Quantidade de blobs compactados simultaneamente.')
+def compactar_conteudo_armazenado(lote, workers):
+    """
+    Compacta o conteúdo já armazenado conforme BLOB_COMPRESSAO.
+
+    Blobs ainda não compactados (ou compactados com outro algoritmo) são
+    avaliados pelo tipo MIME e pela razão de compressão medida. Pode ser
+    executado com a aplicação em funcionamento: cada blob é substituído
+    atomicamente e os arquivos com extração em andamento ficam para a
+    próxima execução. Cada lote é confirmado separadamente.
+    """
+    from .file_workers import STATUS_PENDENTE, STATUS_PROCESSANDO
+
+    algoritmo = current_app.config.get('BLOB_COMPRESSAO')
+    if not algoritmo:
+        click.echo('BLOB_COMPRESSAO não está configurado; nada a compactar.')
+        return
+
+    app = current_app._get_current_object()
+
+    def compactar(hash_conteudo):
+        with app.app_context():
+            try:
+                return compactar_conteudo(hash_conteudo)
+            except Exception as e:
+                click.echo(f'Erro ao compactar o blob {hash_conteudo}: {str(e)}')
+                return None
+
+    total_avaliados = 0
+    total_compactados = 0
+    total_bytes = 0
+    total_economizado = 0
+    ultimo_id = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            blobs = (
+                Blob.query
+                .filter(Blob.id > ultimo_id, or_(Blob.compressao.is_(None), Blob.compressao != algoritmo))
+                .order_by(Blob.id)
+                .limit(lote)
+                .all()
+            )
+            if not blobs:
+                break
+            ultimo_id = blobs[-1].id
+
+            # Tipo MIME e estado da extração dos arquivos de cada blob
+            arquivos = (
+                Arquivo.query.options(selectinload(Arquivo.texto))
+                .filter(Arquivo.blob_id.in_([blob.id for blob in blobs]))
+                .all()
+            )
+            tipos = {}
+            em_extracao = set()
+            for arquivo in arquivos:
+                tipos.setdefault(arquivo.blob_id, json.loads(arquivo.metadados or '{}').get('mime_type'))
+                if arquivo.status_extracao in (STATUS_PENDENTE, STATUS_PROCESSANDO):
+                    em_extracao.add(arquivo.blob_id)
+
+            elegiveis = [
+                blob for blob in blobs
+                if blob.id not in em_extracao and deve_compactar(blob, tipos.get(blob.id) or '')
+            ]
+            resultados = executor.map(compactar, [blob.hash_conteudo for blob in elegiveis])
+
+            for blob, tamanho_compactado in zip(elegiveis, resultados):
+                total_avaliados += 1
+                total_bytes += blob.tamanho
+                economizado = aplicar_compressao(blob, tamanho_compactado)
+                if tamanho_compactado is not None:
+                    total_compactados += 1
+                    total_economizado += economizado
+
+            db.session.commit()
+            db.session.expunge_all()
+            click.echo(f'{total_avaliados} blobs avaliados, {total_compactados} compactados '
+                       f'({total_economizado / (1024 * 1024):.1f} MB economizados).')
+
+    economia = total_economizado / total_bytes if total_bytes else 0.0
+    click.echo(f'Compressão concluída ({algoritmo}): {total_compactados} de {total_avaliados} blobs compactados, '
+               f'{total_economizado / (1024 * 1024):.1f} MB economizados de {total_bytes / (1024 * 1024):.1f} MB '
+               f'avaliados ({economia:.0%}).')
+
+@arquivos_cli.command('limpar-sessoes-upload')
+def limpar_sessoes_upload():
+    """
+    Remove as sessões de upload em blocos expiradas e os blocos recebidos.
+
+    Deve ser agendado periodicamente (por exemplo, diariamente via cron).
+    """
+    from .file_sessoes import limpar_sessoes_expiradas
+
+    removidas = limpar_sessoes_expiradas()
+    click.echo(f'{removidas} sessões de upload expiradas removidas.')
+
+@arquivos_cli.command('reconciliar-uso')
+def reconciliar_uso_armazenamento():
+    """
+    Recalcula os contadores de uso de armazenamento e corrige os divergentes.
+
+    Deve ser agendado periodicamente (por exemplo, diariamente via cron).
+    """
+    from .file_cotas import reconciliar_uso
+
+    correcoes = reconciliar_uso()
+    for correcao in correcoes:
+        anterior = correcao['anterior']
+        corrigido = correcao['corrigido']
+        click.echo(f"{correcao['escopo']} {correcao['referencia_id']}: "
+                   f"{anterior['arquivos']} arquivos, {anterior['bytes_arquivos'] + anterior['bytes_versoes']} bytes -> "
+                   f"{corrigido['arquivos']} arquivos, {corrigido['bytes_arquivos'] + corrigido['bytes_versoes']} bytes")
+    click.echo(f'Reconciliação concluída: {len(correcoes)} contador(es) corrigido(s).')
+
+@arquivos_cli.command('definir-cota')
+@click.option('--usuario', 'usuario_id', default=None, type=int, help='ID do usuário.')
+@click.option('--instituicao', 'instituicao_id', default=None, type=int, help='ID da instituição.')
+@click.option('--limite-mb', default=None, type=float, help='Cota em MB (0 = sem limite; omitido = cota padrão).')
+def definir_cota(usuario_id, instituicao_id, limite_mb):
+    """
+    Define a cota de armazenamento de um usuário ou de uma instituição.
+    """
+    from .file_cotas import obter_uso, resumo_uso, ESCOPO_USUARIO, ESCOPO_INSTITUICAO
+
+    if (usuario_id is None) == (instituicao_id is None):
+        raise click.UsageError('Informe --usuario ou --instituicao.')
+
+    escopo, referencia_id = (ESCOPO_USUARIO, usuario_id) if usuario_id is not None else (ESCOPO_INSTITUICAO, instituicao_id)
+    uso = obter_uso(escopo, referencia_id)
+    uso.limite_bytes = None if limite_mb is None else int(limite_mb * 1024 * 1024)
+    db.session.commit()
+
+    resumo = resumo_uso(escopo, referencia_id)
+    limite = f"{resumo['limite_bytes'] / (1024 * 1024):.1f} MB" if resumo['limite_bytes'] else 'sem limite'
+    click.echo(f"Cota de {escopo} {referencia_id}: {limite} ({resumo['bytes_usados'] / (1024 * 1024):.1f} MB usados).")
+
+@arquivos_cli.command('manutencao')
+@click.option('--prefixos', default=None, type=int, help='Prefixos de hash verificados nesta execução (padrão: MANUTENCAO_PREFIXOS_POR_EXECUCAO).')
+def manutencao_armazenamento(prefixos):
+    """
+    Remove temporários esquecidos, blobs sem registro e miniaturas órfãs.
+
+    Cada execução verifica apenas parte dos blobs e das miniaturas,
+    continuando de onde a anterior parou. Deve ser agendado periodicamente
+    (por exemplo, a cada hora via cron).
+    """
+    from .file_manutencao import executar_manutencao
+
+    resumo = executar_manutencao(prefixos)
+
+    for area, totais in sorted(resumo['areas'].items()):
+        if totais['arquivos']:
+            click.echo(f"{area}: {totais['arquivos']} removidos ({totais['bytes'] / (1024 * 1024):.1f} MB)")
+    for alerta in resumo['uso']['alertas']:
+        click.echo(f'Aviso: {alerta}')
+
+    inicio, fim = resumo['prefixos']
+    click.echo(f"Manutenção concluída (prefixos {inicio}-{fim}): {resumo['arquivos_removidos']} arquivos removidos, "
+               f"{resumo['bytes_liberados'] / (1024 * 1024):.1f} MB liberados.")
+
+@arquivos_cli.command('verificar-integridade')
+@click.option('--workers', default=None, type=int, help='Blobs verificados simultaneamente (padrão: INTEGRIDADE_WORKERS).')
+@click.option('--taxa-mb', default=None, type=float, help='Taxa total de leitura em MB/s (padrão: INTEGRIDADE_TAXA_BYTES; 0 sem limite).')
+@click.option('--lote', default=None, type=int, help='Quantidade de blobs por transação (padrão: INTEGRIDADE_LOTE).')
+@click.option('--tempo-maximo', default=None, type=int, help='Parar após esta quantidade de segundos (a próxima execução continua de onde parou).')
+def verificar_integridade_conteudo(workers, taxa_mb, lote, tempo_maximo):
+    """
+    Relê o conteúdo armazenado e compara o SHA-256 com o hash registrado.
+
+    Divergências e conteúdo ausente são registrados nos logs do sistema com
+    nível critical. O progresso é guardado a cada lote; com --tempo-maximo,
+    o comando pode ser agendado via cron para percorrer o armazenamento aos
+    poucos.
+    """
+    from .file_integridade import verificar_integridade, estimar_duracao_passagem
+
+    taxa = int(taxa_mb * 1024 * 1024) if taxa_mb is not None else None
+    total, duracao = estimar_duracao_passagem(taxa)
+    if duracao is not None:
+        click.echo(f'Passagem completa: {total / (1024 * 1024):.1f} MB, cerca de {duracao / 3600:.1f} h na taxa configurada.')
+
+    resultado = verificar_integridade(workers=workers, bytes_por_segundo=taxa, lote=lote, tempo_maximo=tempo_maximo)
+
+    click.echo(f"{resultado['blobs']} blobs verificados ({resultado['bytes'] / (1024 * 1024):.1f} MB), "
+               f"{resultado['falhas']} com conteúdo divergente ou ausente.")
+    if resultado['passagem_concluida']:
+        click.echo('Passagem concluída; a próxima execução recomeça do primeiro blob.')
@@ -0,0 +1,397 @@
+"""
+Cotas de armazenamento e contadores de uso do sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+
+O uso de cada usuário, de cada instituição e do sistema é mantido em
+UsoArmazenamento e atualizado na mesma transação que cria, substitui ou
+exclui o arquivo. A verificação da cota é feita no próprio UPDATE do
+contador, de modo que uploads simultâneos não ultrapassam o limite, e nem
+ela nem os totais do painel administrativo somam a tabela de arquivos.
+Alterações feitas fora desse fluxo (restauração de backup, edição direta
+no banco) são corrigidas por reconciliar_uso, executado periodicamente
+(flask arquivos reconciliar-uso).
+"""
+
+import datetime
+from flask import current_app
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+
+# Importar modelos
+from .file_models import Arquivo, VersaoArquivo, UsoArmazenamento
+
+# Importar extensões da aplicação
+from auth import db
+
+# Escopos dos contadores
+ESCOPO_USUARIO = 'usuario'
+ESCOPO_INSTITUICAO = 'instituicao'
+ESCOPO_TOTAL = 'total'
+
+# referencia_id da linha com o total do sistema
+REFERENCIA_TOTAL = 0
+
+MENSAGENS_COTA = {
+    ESCOPO_USUARIO: 'O arquivo excede o espaço disponível na sua cota de armazenamento.',
+    ESCOPO_INSTITUICAO: 'O arquivo excede o espaço disponível na cota de armazenamento da instituição.',
+}
+
+
+class CotaExcedida(ValueError):
+    """
+    O conteúdo não cabe na cota de armazenamento do usuário ou da instituição.
+
+    Args:
+        escopo: ESCOPO_USUARIO ou ESCOPO_INSTITUICAO
+    """
+
+    def __init__(self, escopo):
+        super().__init__(MENSAGENS_COTA[escopo])
+        self.escopo = escopo
+
+
+def limite_padrao(escopo):
+    """Retorna a cota configurada para o escopo, em bytes (0: sem limite)."""
+    if escopo == ESCOPO_USUARIO:
+        return current_app.config.get('COTA_USUARIO_BYTES', 1024 * 1024 * 1024)
+    if escopo == ESCOPO_INSTITUICAO:
+        return current_app.config.get('COTA_INSTITUICAO_BYTES', 10 * 1024 * 1024 * 1024)
+    return 0
+
+def limite_efetivo(uso):
+    """Retorna a cota de um registro de uso: a definida para ele ou a padrão do escopo (0: sem limite)."""
+    return uso.limite_bytes if uso.limite_bytes is not None else limite_padrao(uso.escopo)
+
+def _filtro_escopo(escopo, referencia_id):
+    if escopo == ESCOPO_USUARIO:
+        return [Arquivo.usuario_id == referencia_id]
+    if escopo == ESCOPO_INSTITUICAO:
+        return [Arquivo.instituicao_id == referencia_id]
+    return []
+
+def calcular_uso(escopo, referencia_id):
+    """
+    Calcula o uso de um escopo a partir das tabelas de arquivos e versões.
+
+    Consulta usada apenas na criação e na reconciliação dos contadores.
+
+    Args:
+        escopo: Um dos escopos ESCOPO_*
+        referencia_id: ID do usuário ou da instituição (REFERENCIA_TOTAL no total)
+
+    Returns:
+        Dicionário com arquivos, bytes_arquivos e bytes_versoes
+    """
+    filtro = _filtro_escopo(escopo, referencia_id)
+
+    arquivos, bytes_arquivos = db.session.query(
+        func.count(Arquivo.id), func.coalesce(func.sum(Arquivo.tamanho), 0)
+    ).filter(*filtro).one()
+    bytes_versoes = db.session.query(
+        func.coalesce(func.sum(VersaoArquivo.tamanho), 0)
+    ).join(Arquivo, VersaoArquivo.arquivo_id == Arquivo.id).filter(*filtro).scalar()
+
+    return {'arquivos': arquivos, 'bytes_arquivos': int(bytes_arquivos), 'bytes_versoes': int(bytes_versoes)}
+
+def obter_uso(escopo, referencia_id):
+    """
+    Retorna o registro de uso de um escopo, criando-o se necessário.
+
+    O registro inexistente é criado com o uso calculado (calcular_uso). A
+    alteração é feita na sessão atual; o commit fica a cargo do chamador.
+
+    Args:
+        escopo: Um dos escopos ESCOPO_*
+        referencia_id: ID do usuário ou da instituição (REFERENCIA_TOTAL no total)
+
+    Returns:
+        Objeto UsoArmazenamento
+    """
+    uso = UsoArmazenamento.query.filter_by(escopo=escopo, referencia_id=referencia_id).first()
+
+    if uso is None:
+        valores = calcular_uso(escopo, referencia_id)
+        try:
+            with db.session.begin_nested():
+                uso = UsoArmazenamento(
+                    escopo=escopo,
+                    referencia_id=referencia_id,
+                    data_reconciliacao=datetime.datetime.now(),
+                    **valores
+                )
+                db.session.add(uso)
+        except IntegrityError:
+            # Outra requisição criou o registro simultaneamente
+            uso = UsoArmazenamento.query.filter_by(escopo=escopo, referencia_id=referencia_id).one()
+
+    return uso
+
+def consultar_uso(escopo, referencia_id):
+    """
+    Retorna o registro de uso de um escopo sem criá-lo.
+
+    Para um escopo ainda sem registro, retorna um objeto fora da sessão com
+    o uso calculado, de modo que consultas não gravem no banco.
+
+    Args:
+        escopo: Um dos escopos ESCOPO_*
+        referencia_id: ID do usuário ou da instituição (REFERENCIA_TOTAL no total)
+
+    Returns:
+        Objeto UsoArmazenamento
+    """
+    uso = UsoArmazenamento.query.filter_by(escopo=escopo, referencia_id=referencia_id).first()
+    if uso is None:
+        uso = UsoArmazenamento(escopo=escopo, referencia_id=referencia_id, limite_bytes=None,
+                               **calcular_uso(escopo, referencia_id))
+    return uso
+
+def _escopos(usuario_id, instituicao_id):
+    escopos = [(ESCOPO_USUARIO, usuario_id)]
+    if instituicao_id:
+        escopos.append((ESCOPO_INSTITUICAO, int(instituicao_id)))
+    return escopos
+
+def _atualizar_uso(escopo, referencia_id, arquivos, bytes_arquivos, bytes_versoes, verificar_cota):
+    """Aplica a variação ao contador; retorna False se ela não couber na cota."""
+    uso = obter_uso(escopo, referencia_id)
+    variacao = bytes_arquivos + bytes_versoes
+
+    consulta = UsoArmazenamento.query.filter(UsoArmazenamento.id == uso.id)
+    if verificar_cota and variacao > 0:
+        # Cota verificada no próprio UPDATE: a linha fica bloqueada até o
+        # commit e o próximo upload simultâneo já vê o uso atualizado
+        limite = func.coalesce(UsoArmazenamento.limite_bytes, limite_padrao(escopo))
+        consulta = consulta.filter(or_(
+            limite == 0,
+            UsoArmazenamento.bytes_arquivos + UsoArmazenamento.bytes_versoes + variacao <= limite
+        ))
+
+    atualizados = consulta.update({
+        'arquivos': UsoArmazenamento.arquivos + arquivos,
+        'bytes_arquivos': UsoArmazenamento.bytes_arquivos + bytes_arquivos,
+        'bytes_versoes': UsoArmazenamento.bytes_versoes + bytes_versoes,
+        'data_atualizacao': func.now()
+    }, synchronize_session=False)
+    db.session.expire(uso)
+
+    return atualizados == 1
+
+def registrar_uso(usuario_id, instituicao_id, bytes_arquivos, bytes_versoes=0, arquivos=0):
+    """
+    Aplica uma variação de uso aos contadores do usuário, da instituição e do sistema.
+
+    Variações positivas são recusadas se não couberem na cota do usuário ou
+    da instituição. Deve ser chamada antes de a alteração correspondente ser
+    adicionada à sessão (o contador inexistente é criado com o uso
+    calculado). A alteração é feita na sessão atual; o commit fica a cargo
+    do chamador, que deve desfazer a transação se CotaExcedida for lançada.
+
+    Args:
+        usuario_id: ID do proprietário do arquivo
+        instituicao_id: ID da instituição do arquivo (opcional)
+        bytes_arquivos: Variação dos bytes das versões atuais
+        bytes_versoes: Variação dos bytes das versões anteriores
+        arquivos: Variação da quantidade de arquivos
+
+    Raises:
+        CotaExcedida: Se a variação não couber em uma das cotas
+    """
+    for escopo, referencia_id in _escopos(usuario_id, instituicao_id):
+        if not _atualizar_uso(escopo, referencia_id, arquivos, bytes_arquivos, bytes_versoes, verificar_cota=True):
+            raise CotaExcedida(escopo)
+
+    _atualizar_uso(ESCOPO_TOTAL, REFERENCIA_TOTAL, arquivos, bytes_arquivos, bytes_versoes, verificar_cota=False)
+
+def _bytes_versoes_arquivo(arquivo):
+    return db.session.query(
+        func.coalesce(func.sum(VersaoArquivo.tamanho), 0)
+    ).filter(VersaoArquivo.arquivo_id == arquivo.id).scalar()
+
+def registrar_exclusao(arquivo):
+    """
+    Desconta dos contadores o arquivo a ser excluído, com suas versões anteriores.
+
+    Deve ser chamada antes de remover as versões e excluir o arquivo.
+
+    Args:
+        arquivo: Objeto Arquivo
+    """
+    registrar_uso(arquivo.usuario_id, arquivo.instituicao_id, -arquivo.tamanho,
+                  -_bytes_versoes_arquivo(arquivo), arquivos=-1)
+
+def transferir_instituicao(arquivo, instituicao_id):
+    """
+    Transfere o uso de um arquivo para outra instituição.
+
+    Deve ser chamada antes de alterar arquivo.instituicao_id.
+
+    Args:
+        arquivo: Objeto Arquivo
+        instituicao_id: ID da nova instituição (ou None)
+
+    Raises:
+        CotaExcedida: Se o arquivo não couber na cota da nova instituição
+    """
+    if arquivo.instituicao_id == instituicao_id:
+        return
+
+    bytes_versoes = _bytes_versoes_arquivo(arquivo)
+    if instituicao_id:
+        if not _atualizar_uso(ESCOPO_INSTITUICAO, instituicao_id, 1, arquivo.tamanho, bytes_versoes, verificar_cota=True):
+            raise CotaExcedida(ESCOPO_INSTITUICAO)
+    if arquivo.instituicao_id:
+        _atualizar_uso(ESCOPO_INSTITUICAO, arquivo.instituicao_id, -1, -arquivo.tamanho, -bytes_versoes,
+                       verificar_cota=False)
+
+def espaco_disponivel(usuario_id, instituicao_id=None):
+    """
+    Retorna o espaço ainda disponível para o usuário (e a instituição).
+
+    Args:
+        usuario_id: ID do usuário
+        instituicao_id: ID da instituição (opcional)
+
+    Returns:
+        Menor espaço disponível entre as cotas, em bytes, ou None se não houver limite
+    """
+    disponivel = None
+
+    for escopo, referencia_id in _escopos(usuario_id, instituicao_id):
+        uso = consultar_uso(escopo, referencia_id)
+        limite = limite_efetivo(uso)
+        if limite:
+            restante = max(0, limite - uso.bytes_usados)
+            disponivel = restante if disponivel is None else min(disponivel, restante)
+
+    return disponivel
+
+def verificar_espaco(usuario_id, instituicao_id, tamanho):
+    """
+    Verifica, sem reservar o espaço, se um conteúdo cabe nas cotas.
+
+    Usada antes de receber o conteúdo; a cota é verificada novamente ao
+    registrar o arquivo (registrar_uso).
+
+    Args:
+        usuario_id: ID do usuário
+        instituicao_id: ID da instituição (opcional)
+        tamanho: Tamanho do conteúdo em bytes
+
+    Raises:
+        CotaExcedida: Se o conteúdo não couber em uma das cotas
+    """
+    for escopo, referencia_id in _escopos(usuario_id, instituicao_id):
+        uso = consultar_uso(escopo, referencia_id)
+        limite = limite_efetivo(uso)
+        if limite and uso.bytes_usados + tamanho > limite:
+            raise CotaExcedida(escopo)
+
+def resumo_uso(escopo, referencia_id):
+    """
+    Retorna o uso de um escopo em formato serializável (JSON).
+
+    Args:
+        escopo: Um dos escopos ESCOPO_*
+        referencia_id: ID do usuário ou da instituição (REFERENCIA_TOTAL no total)
+
+    Returns:
+        Dicionário com arquivos, bytes usados (total, arquivos e versões) e limite (None: sem limite)
+    """
+    uso = consultar_uso(escopo, referencia_id)
+    limite = limite_efetivo(uso)
+
+    return {
+        'arquivos': uso.arquivos,
+        'bytes_usados': uso.bytes_usados,
+        'bytes_arquivos': uso.bytes_arquivos,
+        'bytes_versoes': uso.bytes_versoes,
+        'limite_bytes': limite or None,
+        'bytes_disponiveis': max(0, limite - uso.bytes_usados) if limite else None
+    }
+
+def maiores_consumidores(escopo, limite=10):
+    """
+    Retorna os registros de uso com mais bytes usados em um escopo.
+
+    Args:
+        escopo: ESCOPO_USUARIO ou ESCOPO_INSTITUICAO
+        limite: Quantidade máxima de registros
+
+    Returns:
+        Lista de objetos UsoArmazenamento
+    """
+    return UsoArmazenamento.query.filter_by(escopo=escopo).order_by(
+        (UsoArmazenamento.bytes_arquivos + UsoArmazenamento.bytes_versoes).desc()
+    ).limit(limite).all()
+
+def _uso_esperado():
+    """Calcula o uso de todos os escopos com uma consulta agrupada por escopo."""
+    esperado = {}
+
+    def registro(escopo, referencia_id):
+        return esperado.setdefault((escopo, referencia_id), {'arquivos': 0, 'bytes_arquivos': 0, 'bytes_versoes': 0})
+
+    for escopo, coluna in ((ESCOPO_USUARIO, Arquivo.usuario_id), (ESCOPO_INSTITUICAO, Arquivo.instituicao_id)):
+        for referencia_id, arquivos, bytes_arquivos in db.session.query(
+            coluna, func.count(Arquivo.id), func.sum(Arquivo.tamanho)
+        ).filter(coluna.isnot(None)).group_by(coluna):
+            registro(escopo, referencia_id).update(arquivos=arquivos, bytes_arquivos=int(bytes_arquivos or 0))
+
+        for referencia_id, bytes_versoes in db.session.query(
+            coluna, func.sum(VersaoArquivo.tamanho)
+        ).join(Arquivo, VersaoArquivo.arquivo_id == Arquivo.id).filter(coluna.isnot(None)).group_by(coluna):
+            registro(escopo, referencia_id)['bytes_versoes'] = int(bytes_versoes or 0)
+
+    esperado[(ESCOPO_TOTAL, REFERENCIA_TOTAL)] = calcular_uso(ESCOPO_TOTAL, REFERENCIA_TOTAL)
+    return esperado
+
+def reconciliar_uso():
+    """
+    Recalcula os contadores de uso e corrige os que estiverem divergentes.
+
+    Os registros divergentes são bloqueados e recalculados antes da
+    correção, um por transação, para que uploads e exclusões em andamento
+    não sejam contados duas vezes nem perdidos. Registros ausentes de
+    usuários e instituições com arquivos são criados.
+
+    Returns:
+        Lista de dicionários com escopo, referencia_id, valores anteriores e corrigidos
+    """
+    agora = datetime.datetime.now()
+    esperado = _uso_esperado()
+    campos = ('arquivos', 'bytes_arquivos', 'bytes_versoes')
+
+    atuais = {
+        (uso.escopo, uso.referencia_id): {campo: getattr(uso, campo) for campo in campos}
+        for uso in UsoArmazenamento.query
+    }
+    for chave in atuais:
+        # Registros sem arquivos devem estar zerados
+        esperado.setdefault(chave, {'arquivos': 0, 'bytes_arquivos': 0, 'bytes_versoes': 0})
+
+    correcoes = []
+    for (escopo, referencia_id), valores in esperado.items():
+        if atuais.get((escopo, referencia_id)) == valores:
+            continue
+
+        uso = UsoArmazenamento.query.filter_by(escopo=escopo, referencia_id=referencia_id).with_for_update().first()
+        if uso is None:
+            obter_uso(escopo, referencia_id)
+        else:
+            valores = calcular_uso(escopo, referencia_id)
+            anteriores = {campo: getattr(uso, campo) for campo in campos}
+            if anteriores != valores:
+                for campo, valor in valores.items():
+                    setattr(uso, campo, valor)
+                correcoes.append({'escopo': escopo, 'referencia_id': referencia_id,
+                                  'anterior': anteriores, 'corrigido': valores})
+            uso.data_reconciliacao = agora
+        db.session.commit()
+
+    UsoArmazenamento.query.filter(
+        or_(UsoArmazenamento.data_reconciliacao.is_(None), UsoArmazenamento.data_reconciliacao < agora)
+    ).update({'data_reconciliacao': agora}, synchronize_session=False)
+    db.session.commit()
+
+    return correcoes
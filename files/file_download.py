@@ -0,0 +1,356 @@
+"""
+Envio do conteúdo de arquivos para o sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import io
+import os
+import time
+import mimetypes
+import threading
+from collections import OrderedDict
+from flask import send_file, current_app, request
+from werkzeug.utils import send_file as send_file_werkzeug
+
+# Importar modelos e utilitários
+from .file_models import ArquivoConteudo
+from .file_storage import obter_blob_store
+from .file_antivirus import em_quarentena
+from .file_urls_assinadas import derivar_chave, montar_url
+
+# Quantidade de conteúdos pedidos uma vez lembrados como candidatos ao cache
+MAXIMO_CANDIDATOS_CACHE = 1024
+
+
+class CacheConteudo:
+    """
+    Cache em memória (LRU) do conteúdo de arquivos pequenos e muito baixados.
+
+    O conteúdo é identificado pelo hash, de modo que nunca fica
+    desatualizado e arquivos com o mesmo conteúdo compartilham a entrada.
+    Um conteúdo só é guardado quando pedido pela segunda vez enquanto ainda
+    é lembrado como candidato, para que downloads isolados não tirem do
+    cache os arquivos populares. O total guardado não passa de limite_bytes.
+    """
+
+    def __init__(self, limite_bytes, tamanho_maximo_item, maximo_candidatos=MAXIMO_CANDIDATOS_CACHE):
+        self.limite_bytes = limite_bytes
+        self.tamanho_maximo_item = tamanho_maximo_item
+        self.maximo_candidatos = maximo_candidatos
+        self.total_bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self._itens = OrderedDict()
+        self._candidatos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, hash_conteudo):
+        """
+        Retorna o conteúdo em cache, ou None.
+
+        Args:
+            hash_conteudo: Hash SHA-256 do conteúdo
+
+        Returns:
+            Bytes do conteúdo ou None
+        """
+        with self._lock:
+            dados = self._itens.get(hash_conteudo)
+            if dados is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(hash_conteudo)
+            self.acertos += 1
+            return dados
+
+    def admitir(self, hash_conteudo, tamanho):
+        """
+        Indica se um conteúdo ausente do cache deve ser lido e guardado.
+
+        Na primeira chamada o conteúdo passa a ser candidato; na seguinte,
+        enquanto ainda é lembrado, é admitido.
+
+        Args:
+            hash_conteudo: Hash SHA-256 do conteúdo
+            tamanho: Tamanho do conteúdo em bytes
+
+        Returns:
+            Boolean indicando se o conteúdo deve ser guardado
+        """
+        if tamanho is None or tamanho > self.tamanho_maximo_item or tamanho > self.limite_bytes:
+            return False
+
+        with self._lock:
+            if self._candidatos.pop(hash_conteudo, None) is not None:
+                return True
+
+            self._candidatos[hash_conteudo] = True
+            if len(self._candidatos) > self.maximo_candidatos:
+                self._candidatos.popitem(last=False)
+            return False
+
+    def gravar(self, hash_conteudo, dados):
+        """
+        Guarda um conteúdo, removendo os usados há mais tempo se necessário.
+
+        Args:
+            hash_conteudo: Hash SHA-256 do conteúdo
+            dados: Bytes do conteúdo
+        """
+        if len(dados) > self.tamanho_maximo_item or len(dados) > self.limite_bytes:
+            return
+
+        with self._lock:
+            anterior = self._itens.pop(hash_conteudo, None)
+            if anterior is not None:
+                self.total_bytes -= len(anterior)
+
+            self._itens[hash_conteudo] = dados
+            self.total_bytes += len(dados)
+
+            while self.total_bytes > self.limite_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self.total_bytes -= len(removido)
+                self.remocoes += 1
+
+    def remover(self, hash_conteudo):
+        """Remove um conteúdo do cache."""
+        with self._lock:
+            dados = self._itens.pop(hash_conteudo, None)
+            if dados is not None:
+                self.total_bytes -= len(dados)
+
+    def estatisticas(self):
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            Dicionário com itens, bytes, limite, acertos, falhas, taxa de acertos e remoções
+        """
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'itens': len(self._itens),
+                'bytes': self.total_bytes,
+                'limite_bytes': self.limite_bytes,
+                'tamanho_maximo_item': self.tamanho_maximo_item,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acertos': self.acertos / consultas if consultas else 0.0,
+                'remocoes': self.remocoes
+            }
+
+
+def obter_cache_conteudo():
+    """
+    Retorna o cache de conteúdo em memória da aplicação, criando-o se necessário.
+
+    O cache é próprio de cada processo.
+
+    Returns:
+        Instância de CacheConteudo
+    """
+    cache = current_app.extensions.get('cache_conteudo')
+
+    if cache is None:
+        cache = CacheConteudo(
+            current_app.config.get('CACHE_CONTEUDO_LIMITE_BYTES', 64 * 1024 * 1024),
+            current_app.config.get('CACHE_CONTEUDO_TAMANHO_MAXIMO_ARQUIVO', 1024 * 1024)
+        )
+        current_app.extensions['cache_conteudo'] = cache
+
+    return cache
+
+def _ler_conteudo(origem):
+    """Lê todo o conteúdo de um caminho ou stream."""
+    if isinstance(origem, str):
+        with open(origem, 'rb') as f:
+            return f.read()
+    with origem:
+        return origem.read()
+
+def _caminho_relativo_blob(hash_conteudo):
+    """Retorna (caminho completo, caminho relativo à raiz) de um blob local, ou None."""
+    store = obter_blob_store()
+    caminho = store.caminho_local(hash_conteudo)
+    raiz = getattr(store, 'raiz', None)
+    if not caminho or not raiz or not os.path.exists(caminho):
+        return None
+    return caminho, os.path.relpath(caminho, raiz)
+
+def gerar_url_download_assinada(arquivo, como_anexo=True):
+    """
+    Gera uma URL de download assinada (HMAC) e com validade curta.
+
+    A URL aponta para o caminho do blob no servidor de downloads
+    (DOWNLOAD_URL_ASSINADA_BASE), que a verifica sem consultar a aplicação
+    (file_urls_assinadas.VerificadorDownloads). O acesso ao arquivo deve ser
+    verificado antes de gerar a URL.
+
+    Args:
+        arquivo: Objeto Arquivo
+        como_anexo: Se o navegador deve baixar o arquivo (True) ou exibi-lo (False)
+
+    Returns:
+        Tupla (URL, momento de expiração em segundos desde a época) ou None
+        se as URLs assinadas não estiverem configuradas, o conteúdo não
+        estiver em disco local sem compressão ou o arquivo estiver em quarentena
+    """
+    base = current_app.config.get('DOWNLOAD_URL_ASSINADA_BASE')
+    if not base or not arquivo.blob_id or not arquivo.hash_conteudo or em_quarentena(arquivo):
+        return None
+
+    caminhos = _caminho_relativo_blob(arquivo.hash_conteudo)
+    if caminhos is None:
+        return None
+
+    expira = int(time.time()) + current_app.config.get('DOWNLOAD_URL_ASSINADA_VALIDADE', 300)
+    url = montar_url(
+        base,
+        caminhos[1],
+        derivar_chave(current_app.config['SECRET_KEY']),
+        arquivo.hash_conteudo,
+        expira,
+        arquivo.nome,
+        'attachment' if como_anexo else 'inline'
+    )
+    return url, expira
+
+def _enviar_por_offload(arquivo, como_anexo):
+    """
+    Responde sem o conteúdo, com X-Sendfile ou X-Accel-Redirect para que o
+    servidor web envie o blob (inclusive requisições com Range).
+
+    Returns:
+        Resposta Flask ou None se o conteúdo não estiver em disco local sem
+        compressão
+    """
+    caminhos = _caminho_relativo_blob(arquivo.hash_conteudo)
+    if caminhos is None:
+        return None
+    caminho, caminho_relativo = caminhos
+
+    resposta = send_file_werkzeug(
+        caminho,
+        request.environ,
+        mimetype=obter_tipo_mime_download(arquivo),
+        as_attachment=como_anexo,
+        download_name=arquivo.nome,
+        conditional=False,
+        etag=arquivo.hash_conteudo,
+        last_modified=arquivo.data_atualizacao,
+        use_x_sendfile=True,
+        response_class=current_app.response_class
+    )
+
+    if current_app.config['DOWNLOAD_OFFLOAD_CABECALHO'] == 'X-Accel-Redirect':
+        del resposta.headers['X-Sendfile']
+        prefixo = current_app.config.get('DOWNLOAD_OFFLOAD_PREFIXO', '/blobs-internos/')
+        resposta.headers['X-Accel-Redirect'] = prefixo.rstrip('/') + '/' + caminho_relativo.replace(os.sep, '/')
+
+    # Apenas ETag e Last-Modified são tratados aqui; Range fica com o servidor web
+    resposta = resposta.make_conditional(request.environ)
+    if resposta.status_code == 304:
+        resposta.headers.pop('X-Sendfile', None)
+        resposta.headers.pop('X-Accel-Redirect', None)
+
+    if not arquivo.publico:
+        resposta.cache_control.private = True
+
+    return resposta
+
+def obter_tipo_mime_download(arquivo):
+    """
+    Determina o tipo MIME usado no envio de um arquivo.
+
+    Args:
+        arquivo: Objeto Arquivo
+
+    Returns:
+        String contendo o tipo MIME
+    """
+    return mimetypes.guess_type(arquivo.nome)[0] or 'application/octet-stream'
+
+def enviar_conteudo_arquivo(arquivo, como_anexo=True):
+    """
+    Envia o conteúdo de um arquivo diretamente do armazenamento, em blocos.
+
+    O hash_conteudo é usado como ETag, de modo que requisições com
+    If-None-Match recebem 304 sem que o conteúdo seja lido. Requisições com
+    Range recebem 206 apenas com o intervalo solicitado, permitindo que o
+    visualizador de PDF do navegador carregue as páginas sob demanda.
+    Nenhuma cópia temporária do arquivo é gravada. Conteúdos pequenos e
+    baixados com frequência são enviados do cache em memória (CacheConteudo).
+    Com DOWNLOAD_OFFLOAD_CABECALHO configurado, o envio de blobs em disco é
+    delegado ao servidor web (X-Sendfile ou X-Accel-Redirect).
+    Conteúdos compactados no armazenamento são descompactados em blocos
+    durante o envio (sem suporte a Range).
+
+    Args:
+        arquivo: Objeto Arquivo
+        como_anexo: Se o navegador deve baixar o arquivo (True) ou exibi-lo (False)
+
+    Returns:
+        Resposta Flask ou None se o conteúdo não for encontrado ou o arquivo
+        estiver em quarentena
+    """
+    if em_quarentena(arquivo):
+        return None
+
+    cache = obter_cache_conteudo()
+    hash_conteudo = arquivo.hash_conteudo
+
+    # Com um servidor web à frente, o envio é delegado a ele (sendfile)
+    if arquivo.blob_id and current_app.config.get('DOWNLOAD_OFFLOAD_CABECALHO'):
+        resposta = _enviar_por_offload(arquivo, como_anexo)
+        if resposta is not None:
+            return resposta
+
+    # Arquivos populares e pequenos são enviados da memória, sem acesso ao
+    # armazenamento nem ao banco de dados
+    dados = cache.obter(hash_conteudo) if hash_conteudo else None
+
+    if dados is not None:
+        origem = io.BytesIO(dados)
+    elif arquivo.blob_id:
+        store = obter_blob_store()
+
+        # Conteúdo ausente do armazenamento: o chamador responde 404
+        if not store.existe(hash_conteudo):
+            return None
+
+        # Backends locais permitem que o tamanho seja obtido do disco,
+        # o que habilita o suporte a Range; conteúdo compactado é lido
+        # pelo leitor que descompacta em blocos
+        origem = store.caminho_local(hash_conteudo) or store.abrir(hash_conteudo)
+
+        if cache.admitir(hash_conteudo, arquivo.tamanho):
+            dados = _ler_conteudo(origem)
+            cache.gravar(hash_conteudo, dados)
+            origem = io.BytesIO(dados)
+    else:
+        # Conteúdo legado ainda armazenado no banco de dados
+        arquivo_conteudo = ArquivoConteudo.query.filter_by(arquivo_id=arquivo.id).first()
+        if not arquivo_conteudo:
+            return None
+        if hash_conteudo and cache.admitir(hash_conteudo, arquivo.tamanho):
+            cache.gravar(hash_conteudo, arquivo_conteudo.conteudo)
+        origem = io.BytesIO(arquivo_conteudo.conteudo)
+
+    resposta = send_file(
+        origem,
+        mimetype=obter_tipo_mime_download(arquivo),
+        as_attachment=como_anexo,
+        download_name=arquivo.nome,
+        conditional=True,
+        etag=arquivo.hash_conteudo or True,
+        last_modified=arquivo.data_atualizacao
+    )
+
+    # Arquivos privados não devem ser mantidos em caches compartilhados;
+    # o navegador revalida pelo ETag a cada acesso
+    if not arquivo.publico:
+        resposta.cache_control.private = True
+
+    return resposta
@@ -0,0 +1,291 @@
+"""
+Exportação de vários arquivos em um pacote ZIP gerado em fluxo
+Serra Projetos Educacionais
+
+O pacote é montado enquanto é enviado: cada arquivo é lido do armazenamento
+em blocos e os bytes do ZIP são repassados ao cliente à medida que são
+produzidos, sem cópia em disco e com uso de memória constante, qualquer que
+seja o tamanho do pacote. Como a saída não permite retorno, os tamanhos e o
+CRC de cada entrada são gravados após os dados (descritor de dados do ZIP).
+"""
+
+import io
+import os
+import datetime
+import mimetypes
+import zipfile
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import or_
+
+# Importar modelos e utilitários
+from .file_models import Arquivo, ArquivoConteudo, ArquivoTarefa
+from .file_storage import (obter_blob_store, estimar_razao_compressao, TAMANHO_BLOCO,
+                           TAMANHO_AMOSTRA_COMPRESSAO)
+from .file_permissions import filtro_acesso_arquivos
+from .file_antivirus import VERIFICACAO_QUARENTENA
+
+# Tipos cujo conteúdo já é compactado (PDF, formatos do Office baseados em
+# ZIP, imagens e pacotes): são incluídos sem nova compressão (ZIP_STORED)
+TIPOS_COMPACTADOS = {
+    'application/pdf',
+    'application/zip',
+    'application/gzip',
+    'application/x-7z-compressed',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.oasis.opendocument.text',
+    'application/vnd.oasis.opendocument.spreadsheet',
+    'image/jpeg',
+    'image/png',
+    'image/gif',
+    'image/webp',
+    'audio/mpeg',
+    'video/mp4',
+}
+
+# Nome da entrada que lista os arquivos cujo conteúdo não foi encontrado
+NOME_INDISPONIVEIS = 'ARQUIVOS_INDISPONIVEIS.txt'
+
+# Menor data aceita pelo formato ZIP
+DATA_MINIMA_ZIP = (1980, 1, 1, 0, 0, 0)
+
+
+class SaidaZip:
+    """
+    Destino de escrita do ZipFile que acumula os bytes produzidos até que
+    sejam retirados pelo gerador da resposta.
+
+    Não oferece tell() nem seek(), o que faz o zipfile gravar os tamanhos de
+    cada entrada em um descritor de dados após o conteúdo.
+    """
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        """Retorna (e descarta) os bytes acumulados desde a última retirada."""
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def consultar_arquivos_exportacao(tarefa_id=None, instituicao_id=None, ids=None):
+    """
+    Retorna os arquivos acessíveis ao usuário atual (exceto os em quarentena)
+    de uma tarefa, de uma instituição ou de uma seleção de IDs.
+
+    Args:
+        tarefa_id: ID da tarefa cujos anexos são exportados (opcional)
+        instituicao_id: ID da instituição cujos documentos são exportados (opcional)
+        ids: Lista de IDs de arquivos selecionados (opcional)
+
+    Returns:
+        Lista de objetos Arquivo, em ordem de nome
+    """
+    # Arquivos em quarentena não são exportados
+    query = Arquivo.query.filter(
+        filtro_acesso_arquivos(),
+        or_(Arquivo.status_verificacao.is_(None), Arquivo.status_verificacao != VERIFICACAO_QUARENTENA)
+    )
+
+    if tarefa_id is not None:
+        query = query.join(ArquivoTarefa, ArquivoTarefa.arquivo_id == Arquivo.id).filter(
+            ArquivoTarefa.tarefa_id == tarefa_id
+        )
+    if instituicao_id is not None:
+        query = query.filter(Arquivo.instituicao_id == instituicao_id)
+    if ids is not None:
+        query = query.filter(Arquivo.id.in_(ids))
+
+    maximo = current_app.config.get('EXPORTACAO_ZIP_MAXIMO_ARQUIVOS', 1000)
+    return query.distinct().order_by(Arquivo.nome, Arquivo.id).limit(maximo).all()
+
+def _nome_entrada(nome, usados):
+    """Retorna um nome de entrada seguro e único no pacote."""
+    nome = nome.replace('/', '_').replace('\\', '_').strip().lstrip('.') or 'arquivo'
+    base, extensao = os.path.splitext(nome)
+
+    candidato = nome
+    contador = 2
+    while candidato.lower() in usados:
+        candidato = f'{base} ({contador}){extensao}'
+        contador += 1
+
+    usados.add(candidato.lower())
+    return candidato
+
+def preparar_itens(arquivos):
+    """
+    Reúne, antes do envio, os dados necessários para gerar o pacote.
+
+    Os itens não dependem da sessão do banco de dados, de modo que o pacote
+    pode ser gerado depois que a requisição já começou a responder.
+
+    Args:
+        arquivos: Lista de objetos Arquivo
+
+    Returns:
+        Lista de dicionários (um por arquivo)
+    """
+    usados = set()
+    itens = []
+    for arquivo in arquivos:
+        data = arquivo.data_atualizacao or arquivo.data_upload or datetime.datetime.now()
+        itens.append({
+            'arquivo_id': arquivo.id,
+            'nome': _nome_entrada(arquivo.nome, usados),
+            'tamanho': arquivo.tamanho or 0,
+            'hash_conteudo': arquivo.hash_conteudo,
+            'blob': arquivo.blob_id is not None,
+            'compactado': bool(arquivo.blob and arquivo.blob.compressao),
+            'mime_type': mimetypes.guess_type(arquivo.nome)[0],
+            'data': max(data.timetuple()[:6], DATA_MINIMA_ZIP)
+        })
+    return itens
+
+def escolher_compressao(item, amostra):
+    """
+    Escolhe o método de uma entrada: ZIP_STORED para conteúdo que já é
+    compactado e ZIP_DEFLATED para o restante.
+
+    Conteúdo compactado no armazenamento comprovadamente se beneficia da
+    compressão; os tipos de TIPOS_COMPACTADOS não; para os demais, decide
+    a razão medida no início do conteúdo (como na compressão em repouso).
+
+    Args:
+        item: Dicionário retornado por preparar_itens
+        amostra: Primeiros bytes do conteúdo
+
+    Returns:
+        zipfile.ZIP_STORED ou zipfile.ZIP_DEFLATED
+    """
+    if item['compactado']:
+        return zipfile.ZIP_DEFLATED
+    if item['mime_type'] in TIPOS_COMPACTADOS:
+        return zipfile.ZIP_STORED
+
+    razao = estimar_razao_compressao(amostra[:TAMANHO_AMOSTRA_COMPRESSAO], 'zlib', 1)
+    if razao > current_app.config.get('BLOB_COMPRESSAO_RAZAO_MAXIMA', 0.9):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def _abrir_conteudo(item, store):
+    """Abre o conteúdo de um item para leitura, ou retorna None se não existir."""
+    if item['blob']:
+        try:
+            return store.abrir(item['hash_conteudo'])
+        except FileNotFoundError:
+            return None
+
+    # Conteúdo legado ainda armazenado no banco de dados
+    arquivo_conteudo = ArquivoConteudo.query.filter_by(arquivo_id=item['arquivo_id']).first()
+    return io.BytesIO(arquivo_conteudo.conteudo) if arquivo_conteudo else None
+
+def _ler_amostra(origem):
+    """Lê o início do conteúdo, usado na escolha do método de compressão."""
+    partes = []
+    total = 0
+    while total < TAMANHO_AMOSTRA_COMPRESSAO:
+        bloco = origem.read(TAMANHO_BLOCO)
+        if not bloco:
+            break
+        partes.append(bloco)
+        total += len(bloco)
+    return b''.join(partes)
+
+def gerar_zip(itens, store=None):
+    """
+    Gera os bytes de um pacote ZIP com o conteúdo dos itens, em blocos.
+
+    O cabeçalho de cada entrada é enviado assim que o início do conteúdo é
+    lido. Arquivos cujo conteúdo não existe no armazenamento são omitidos e
+    listados na entrada ARQUIVOS_INDISPONIVEIS.txt, ao final do pacote.
+
+    Args:
+        itens: Lista retornada por preparar_itens
+        store: Armazenamento de blobs (padrão: o da aplicação)
+
+    Yields:
+        Blocos de bytes do pacote
+    """
+    store = store or obter_blob_store()
+    saida = SaidaZip()
+    indisponiveis = []
+
+    with zipfile.ZipFile(saida, 'w', allowZip64=True) as pacote:
+        for item in itens:
+            origem = _abrir_conteudo(item, store)
+            if origem is None:
+                indisponiveis.append(item['nome'])
+                continue
+
+            with origem:
+                amostra = _ler_amostra(origem)
+
+                info = zipfile.ZipInfo(item['nome'], date_time=item['data'])
+                info.compress_type = escolher_compressao(item, amostra)
+                info.external_attr = 0o644 << 16
+                # Com o tamanho informado, o zipfile decide se a entrada precisa de ZIP64
+                info.file_size = item['tamanho']
+
+                with pacote.open(info, 'w') as entrada:
+                    entrada.write(amostra)
+                    dados = saida.retirar()
+                    if dados:
+                        yield dados
+
+                    while True:
+                        bloco = origem.read(TAMANHO_BLOCO)
+                        if not bloco:
+                            break
+                        entrada.write(bloco)
+                        dados = saida.retirar()
+                        if dados:
+                            yield dados
+
+            dados = saida.retirar()
+            if dados:
+                yield dados
+
+        if indisponiveis:
+            pacote.writestr(
+                zipfile.ZipInfo(NOME_INDISPONIVEIS, date_time=datetime.datetime.now().timetuple()[:6]),
+                'Conteúdo não encontrado no armazenamento:\n' + '\n'.join(indisponiveis) + '\n'
+            )
+
+    # Diretório central
+    dados = saida.retirar()
+    if dados:
+        yield dados
+
+def enviar_zip(arquivos, nome_pacote):
+    """
+    Responde com um pacote ZIP dos arquivos, gerado durante o envio.
+
+    A resposta não tem Content-Length (o tamanho final só é conhecido ao
+    término) e desabilita o buffer do proxy, para que os primeiros bytes
+    cheguem ao cliente imediatamente.
+
+    Args:
+        arquivos: Lista de objetos Arquivo
+        nome_pacote: Nome do arquivo .zip oferecido ao navegador
+
+    Returns:
+        Resposta Flask
+    """
+    itens = preparar_itens(arquivos)
+    store = obter_blob_store()
+
+    resposta = Response(stream_with_context(gerar_zip(itens, store)), mimetype='application/zip')
+    resposta.headers.set('Content-Disposition', 'attachment', filename=nome_pacote)
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    resposta.headers['Cache-Control'] = 'no-store'
+    return resposta
@@ -0,0 +1,286 @@
+"""
+Verificação de integridade do conteúdo armazenado
+Serra Projetos Educacionais
+
+Relê o conteúdo de cada blob, recalcula o SHA-256 e compara com o hash
+registrado nos arquivos que o utilizam, para detectar corrupção silenciosa
+do armazenamento. Os blobs são verificados em paralelo, com a taxa de
+leitura total limitada para não competir com as requisições, e o progresso
+é guardado em Configuracao, de modo que uma passagem completa pode ser
+dividida em várias execuções.
+"""
+
+import os
+import json
+import time
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func
+
+# Importar modelos e utilitários
+from .file_models import Arquivo, Blob
+from .file_storage import obter_blob_store, TAMANHO_BLOCO
+
+# Importar modelos de outros módulos
+from admin.admin_models import Configuracao, Estatistica, LogSistema
+
+# Importar extensões da aplicação
+from auth import db
+
+# Chave em Configuracao com o progresso da passagem atual
+CHAVE_PROGRESSO = 'verificacao_integridade.progresso'
+
+# Estatistica em que cada passagem completa é registrada
+CATEGORIA_ESTATISTICA = 'arquivos'
+SUBCATEGORIA_ESTATISTICA = 'verificacao_integridade'
+
+# Erro de _verificar_blob quando o arquivo do blob não é encontrado
+ERRO_AUSENTE = 'Conteúdo ausente no armazenamento'
+
+
+class LimitadorTaxa:
+    """
+    Limita a taxa total de leitura (bytes por segundo) compartilhada por várias threads.
+
+    Cada leitura reserva o intervalo de tempo correspondente ao seu tamanho
+    e espera até o início dele, de modo que a soma das leituras de todas as
+    threads não ultrapassa a taxa configurada.
+    """
+
+    def __init__(self, bytes_por_segundo):
+        self.bytes_por_segundo = bytes_por_segundo
+        self._lock = threading.Lock()
+        self._proximo = time.monotonic()
+
+    def consumir(self, quantidade):
+        """Aguarda até que a leitura de quantidade bytes caiba na taxa."""
+        if not self.bytes_por_segundo:
+            return
+
+        with self._lock:
+            agora = time.monotonic()
+            inicio = max(self._proximo, agora)
+            self._proximo = inicio + quantidade / self.bytes_por_segundo
+
+        if inicio > agora:
+            time.sleep(inicio - agora)
+
+
+def _descartar_cache_pagina(arquivo):
+    """Evita que a leitura completa dos blobs desloque do cache do sistema os arquivos mais acessados."""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(arquivo.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+def calcular_hash_armazenado(store, hash_conteudo, limitador=None):
+    """
+    Relê o conteúdo de um blob e calcula o SHA-256 (do conteúdo original, já descompactado).
+
+    Args:
+        store: Armazenamento de blobs
+        hash_conteudo: Hash registrado do blob
+        limitador: LimitadorTaxa compartilhado (opcional)
+
+    Returns:
+        Tupla (hash calculado, bytes lidos)
+
+    Raises:
+        FileNotFoundError: Se o conteúdo não existir no armazenamento
+    """
+    sha256 = hashlib.sha256()
+    total = 0
+
+    with store.abrir(hash_conteudo) as origem:
+        while True:
+            bloco = origem.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            if limitador:
+                limitador.consumir(len(bloco))
+            sha256.update(bloco)
+            total += len(bloco)
+        _descartar_cache_pagina(origem)
+
+    return sha256.hexdigest(), total
+
+def _verificar_blob(store, hash_conteudo, limitador):
+    """Verifica um blob, retornando (hash calculado, bytes lidos, erro)."""
+    try:
+        calculado, lidos = calcular_hash_armazenado(store, hash_conteudo, limitador)
+        return calculado, lidos, None
+    except FileNotFoundError:
+        return None, 0, ERRO_AUSENTE
+    except Exception as e:
+        # Conteúdo compactado corrompido não pode ser lido
+        return None, 0, f'Erro ao ler o conteúdo: {str(e)}'
+
+def _blob_em_uso(blob_id):
+    """
+    Confere no banco, com uma consulta nova, se o blob ainda está registrado
+    e referenciado.
+
+    Um blob removido por remover_conteudo_orfao durante o lote (o arquivo é
+    apagado antes do commit que remove o registro) não é uma falha.
+    """
+    referencias = db.session.query(Blob.referencias).filter(Blob.id == blob_id).scalar()
+    return bool(referencias)
+
+def _obter_progresso():
+    """Retorna o registro de progresso em Configuracao e seu valor, criando-o se necessário."""
+    configuracao = Configuracao.query.filter_by(chave=CHAVE_PROGRESSO).first()
+    if configuracao is None:
+        configuracao = Configuracao(
+            chave=CHAVE_PROGRESSO,
+            descricao='Progresso da verificação de integridade do conteúdo armazenado.',
+            tipo='json',
+            categoria='sistema'
+        )
+        db.session.add(configuracao)
+
+    progresso = json.loads(configuracao.valor or '{}')
+    progresso.setdefault('ultimo_blob_id', 0)
+    progresso.setdefault('inicio', datetime.datetime.now().isoformat())
+    progresso.setdefault('blobs', 0)
+    progresso.setdefault('bytes', 0)
+    progresso.setdefault('falhas', 0)
+    return configuracao, progresso
+
+def _registrar_falha(blob, arquivos, calculado, erro):
+    """Registra em LogSistema (nível critical) um blob corrompido ou ausente."""
+    divergentes = [
+        arquivo_id for arquivo_id, hash_arquivo in arquivos
+        if calculado is None or hash_arquivo != calculado
+    ]
+    mensagem = erro or f'Conteúdo divergente do hash registrado: blob {blob.hash_conteudo}'
+
+    db.session.add(LogSistema(
+        tipo='erro',
+        nivel='critical',
+        mensagem=f'Verificação de integridade: {mensagem} (arquivos {", ".join(map(str, divergentes)) or "nenhum"})',
+        detalhes={
+            'blob_id': blob.id,
+            'hash_registrado': blob.hash_conteudo,
+            'hash_calculado': calculado,
+            'arquivos': divergentes
+        }
+    ))
+
+def estimar_duracao_passagem(bytes_por_segundo=None):
+    """
+    Estima a duração de uma passagem completa na taxa de leitura informada.
+
+    Args:
+        bytes_por_segundo: Taxa de leitura (padrão: INTEGRIDADE_TAXA_BYTES)
+
+    Returns:
+        Tupla (total de bytes, segundos estimados ou None sem limite de taxa)
+    """
+    taxa = bytes_por_segundo or current_app.config.get('INTEGRIDADE_TAXA_BYTES')
+    total = int(db.session.query(func.coalesce(func.sum(Blob.tamanho), 0)).scalar())
+    return total, (total / taxa if taxa else None)
+
+def verificar_integridade(workers=None, bytes_por_segundo=None, lote=None, tempo_maximo=None):
+    """
+    Executa (ou continua) uma passagem de verificação de integridade.
+
+    Os blobs são verificados em ordem de id a partir do ponto em que a
+    execução anterior parou. O progresso é confirmado a cada lote, de modo
+    que uma execução interrompida perde no máximo um lote. Ao fim de uma
+    passagem, os totais são registrados em Estatistica e a próxima execução
+    recomeça do primeiro blob.
+
+    Args:
+        workers: Quantidade de blobs verificados simultaneamente (padrão: INTEGRIDADE_WORKERS)
+        bytes_por_segundo: Taxa total de leitura (padrão: INTEGRIDADE_TAXA_BYTES; 0 sem limite)
+        lote: Quantidade de blobs por transação (padrão: INTEGRIDADE_LOTE)
+        tempo_maximo: Segundos após os quais a execução para ao fim do lote em andamento (opcional)
+
+    Returns:
+        Dicionário com blobs e bytes verificados nesta execução, falhas
+        encontradas e se a passagem foi concluída
+    """
+    workers = workers or current_app.config.get('INTEGRIDADE_WORKERS', 2)
+    if bytes_por_segundo is None:
+        bytes_por_segundo = current_app.config.get('INTEGRIDADE_TAXA_BYTES', 16 * 1024 * 1024)
+    lote = lote or current_app.config.get('INTEGRIDADE_LOTE', 100)
+
+    store = obter_blob_store()
+    limitador = LimitadorTaxa(bytes_por_segundo)
+    inicio = time.monotonic()
+    resultado = {'blobs': 0, 'bytes': 0, 'falhas': 0, 'passagem_concluida': False}
+
+    configuracao, progresso = _obter_progresso()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            blobs = (
+                Blob.query
+                .filter(Blob.id > progresso['ultimo_blob_id'])
+                .order_by(Blob.id)
+                .limit(lote)
+                .all()
+            )
+
+            if not blobs:
+                # Passagem concluída
+                db.session.add(Estatistica(
+                    categoria=CATEGORIA_ESTATISTICA,
+                    subcategoria=SUBCATEGORIA_ESTATISTICA,
+                    dados={chave: progresso[chave] for chave in ('blobs', 'bytes', 'falhas')},
+                    periodo_inicio=datetime.datetime.fromisoformat(progresso['inicio']),
+                    periodo_fim=datetime.datetime.now()
+                ))
+                configuracao.valor = '{}'
+                db.session.commit()
+                resultado['passagem_concluida'] = True
+                break
+
+            # Hash registrado de cada arquivo dos blobs do lote
+            arquivos = {}
+            for arquivo_id, blob_id, hash_arquivo in db.session.query(
+                Arquivo.id, Arquivo.blob_id, Arquivo.hash_conteudo
+            ).filter(Arquivo.blob_id.in_([blob.id for blob in blobs])):
+                arquivos.setdefault(blob_id, []).append((arquivo_id, hash_arquivo))
+
+            verificacoes = executor.map(
+                lambda hash_conteudo: _verificar_blob(store, hash_conteudo, limitador),
+                [blob.hash_conteudo for blob in blobs]
+            )
+
+            falhas = 0
+            for blob, (calculado, lidos, erro) in zip(blobs, verificacoes):
+                if erro == ERRO_AUSENTE:
+                    if not _blob_em_uso(blob.id):
+                        continue
+                    # compactar pode ter trocado o arquivo entre _localizar e open
+                    calculado, lidos, erro = _verificar_blob(store, blob.hash_conteudo, limitador)
+                    if erro == ERRO_AUSENTE and not _blob_em_uso(blob.id):
+                        continue
+
+                resultado['bytes'] += lidos
+
+                hashes_registrados = {blob.hash_conteudo} | {hash_arquivo for _, hash_arquivo in arquivos.get(blob.id, [])}
+                if erro or hashes_registrados != {calculado}:
+                    falhas += 1
+                    _registrar_falha(blob, arquivos.get(blob.id, []), calculado, erro)
+
+            resultado['blobs'] += len(blobs)
+            resultado['falhas'] += falhas
+
+            progresso['ultimo_blob_id'] = blobs[-1].id
+            progresso['blobs'] += len(blobs)
+            progresso['bytes'] += sum(blob.tamanho for blob in blobs)
+            progresso['falhas'] += falhas
+            configuracao.valor = json.dumps(progresso)
+            db.session.commit()
+
+            if tempo_maximo and time.monotonic() - inicio >= tempo_maximo:
+                break
+
+    return resultado
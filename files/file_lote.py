@@ -0,0 +1,233 @@
+"""
+Upload em lote (vários arquivos ou pacote ZIP) para o sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import os
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Importar utilitários
+from .file_storage import obter_blob_store, remover_conteudo_orfao
+from .file_pipeline import ReceptorUpload, criar_arquivo
+from .file_workers import agendar_extracao
+from .file_antivirus import obter_verificador
+from .file_cotas import CotaExcedida
+
+# Importar extensões da aplicação
+from auth import db
+
+STATUS_CRIADO = 'criado'
+STATUS_ERRO = 'erro'
+
+
+class LimiteLote:
+    """
+    Controla, entre as threads que descompactam um pacote, o total de bytes
+    extraídos, para recusar pacotes cujo conteúdo descompactado excede o
+    limite (bombas de compressão).
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def reservar(self, quantidade):
+        """
+        Soma bytes ao total extraído.
+
+        Returns:
+            Boolean indicando se o total continua dentro do limite
+        """
+        with self._lock:
+            self.total_bytes += quantidade
+            return self.total_bytes <= self.limite_bytes
+
+
+class StreamLimitado:
+    """Stream de leitura que interrompe a extração quando o limite do lote é excedido."""
+
+    def __init__(self, stream, limite):
+        self.stream = stream
+        self.limite = limite
+        self.excedido = False
+
+    def read(self, tamanho=-1):
+        dados = self.stream.read(tamanho)
+        if dados and not self.limite.reservar(len(dados)):
+            self.excedido = True
+            return b''
+        return dados
+
+
+def listar_entradas_zip(caminho_zip, maximo_arquivos):
+    """
+    Lista os arquivos de um pacote ZIP, ignorando diretórios e arquivos ocultos.
+
+    Apenas o diretório central do ZIP é lido.
+
+    Args:
+        caminho_zip: Caminho do pacote ZIP
+        maximo_arquivos: Quantidade máxima de arquivos aceita
+
+    Returns:
+        Lista de objetos ZipInfo
+
+    Raises:
+        ValueError: Se o pacote for inválido ou tiver arquivos demais
+    """
+    try:
+        with zipfile.ZipFile(caminho_zip) as pacote:
+            entradas = [
+                info for info in pacote.infolist()
+                if not info.is_dir()
+                and not os.path.basename(info.filename).startswith('.')
+                and not info.filename.startswith('__MACOSX/')
+            ]
+    except zipfile.BadZipFile:
+        raise ValueError('Pacote ZIP inválido.')
+
+    if len(entradas) > maximo_arquivos:
+        raise ValueError(f'O pacote excede o limite de {maximo_arquivos} arquivos.')
+
+    return entradas
+
+def _extrair_entrada(caminho_zip, info, diretorio, limite_bytes_arquivo, limite, verificador=None):
+    """
+    Extrai uma entrada do pacote por meio de um ReceptorUpload.
+
+    Cada chamada abre o próprio ZipFile, de modo que as entradas podem ser
+    descompactadas em threads diferentes. A identificação do tipo, a
+    validação, o hash, o tamanho e o envio ao verificador antivírus são
+    feitos na mesma passagem.
+    """
+    nome = os.path.basename(info.filename)
+    receptor = ReceptorUpload(nome, diretorio, limite_bytes=limite_bytes_arquivo, verificador=verificador)
+
+    if limite_bytes_arquivo is not None and info.file_size > limite_bytes_arquivo:
+        receptor.rejeitar('O arquivo excede o tamanho máximo permitido.')
+        return receptor
+
+    try:
+        with zipfile.ZipFile(caminho_zip) as pacote, pacote.open(info) as origem:
+            stream = StreamLimitado(origem, limite)
+            receptor.consumir_stream(stream)
+            if stream.excedido:
+                receptor.rejeitar('O conteúdo descompactado do pacote excede o tamanho máximo permitido.')
+    except Exception as e:
+        print(f"Erro ao extrair arquivo do pacote: {str(e)}")
+        receptor.rejeitar('Não foi possível extrair o arquivo do pacote.')
+
+    return receptor.finalizar()
+
+def extrair_pacote_zip(caminho_zip, maximo_arquivos, limite_bytes_arquivo=None, limite_bytes_total=None, workers=4):
+    """
+    Extrai os arquivos de um pacote ZIP em paralelo.
+
+    Args:
+        caminho_zip: Caminho do pacote ZIP recebido
+        maximo_arquivos: Quantidade máxima de arquivos no pacote
+        limite_bytes_arquivo: Tamanho máximo de cada arquivo descompactado (opcional)
+        limite_bytes_total: Tamanho máximo do conteúdo descompactado (opcional)
+        workers: Quantidade de threads de extração
+
+    Returns:
+        Lista de objetos ReceptorUpload finalizados, na ordem do pacote
+
+    Raises:
+        ValueError: Se o pacote for inválido ou tiver arquivos demais
+    """
+    entradas = listar_entradas_zip(caminho_zip, maximo_arquivos)
+    diretorio = obter_blob_store().diretorio_temporario()
+    verificador = obter_verificador()
+    limite = LimiteLote(limite_bytes_total if limite_bytes_total is not None else float('inf'))
+
+    if not entradas:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(entradas)))) as executor:
+        return list(executor.map(
+            lambda info: _extrair_entrada(caminho_zip, info, diretorio, limite_bytes_arquivo, limite, verificador),
+            entradas
+        ))
+
+def registrar_lote(recebidos, usuario_id, instituicao_id=None, publico=False, metadados=None):
+    """
+    Cria os registros dos arquivos de um lote, um commit por arquivo.
+
+    A falha de um arquivo desfaz apenas o seu registro; os demais são
+    mantidos. A extração de texto de cada arquivo criado é agendada logo
+    após o seu commit.
+
+    Args:
+        recebidos: Lista de objetos ReceptorUpload finalizados
+        usuario_id: ID do usuário que enviou os arquivos
+        instituicao_id: ID da instituição associada (opcional)
+        publico: Se os arquivos são públicos
+        metadados: Dicionário com metadados adicionais (opcional)
+
+    Returns:
+        Lista de dicionários com o resultado de cada arquivo
+    """
+    resultados = []
+
+    for recebido in recebidos:
+        resultado = {'nome': recebido.nome_arquivo}
+
+        if recebido.rejeitado:
+            resultado.update(status=STATUS_ERRO, erro=recebido.erro)
+            resultados.append(resultado)
+            continue
+
+        try:
+            novo_arquivo = criar_arquivo(
+                recebido,
+                recebido.nome_arquivo,
+                usuario_id=usuario_id,
+                instituicao_id=instituicao_id,
+                publico=publico,
+                metadados=metadados
+            )
+            db.session.commit()
+        except CotaExcedida as e:
+            db.session.rollback()
+            resultado.update(status=STATUS_ERRO, erro=str(e))
+            resultados.append(resultado)
+            continue
+        except Exception as e:
+            db.session.rollback()
+            remover_conteudo_orfao(recebido.hash_conteudo)
+            print(f"Erro ao registrar arquivo do lote: {str(e)}")
+            resultado.update(status=STATUS_ERRO, erro='Não foi possível registrar o arquivo.')
+            resultados.append(resultado)
+            continue
+
+        agendar_extracao(novo_arquivo)
+
+        resultado.update(
+            status=STATUS_CRIADO,
+            id=novo_arquivo.id,
+            tipo=novo_arquivo.tipo,
+            tamanho=novo_arquivo.tamanho,
+            status_extracao=novo_arquivo.status_extracao,
+            status_verificacao=novo_arquivo.status_verificacao
+        )
+        resultados.append(resultado)
+
+    return resultados
+
+def configurar_requisicao_lote(requisicao):
+    """
+    Ajusta os limites da requisição para um upload em lote.
+
+    Deve ser chamada antes do primeiro acesso a request.files.
+
+    Args:
+        requisicao: Objeto de requisição atual
+    """
+    requisicao.max_content_length = current_app.config.get('LOTE_MAX_CONTENT_LENGTH')
+    requisicao.limite_bytes_arquivo = current_app.config.get('MAX_CONTENT_LENGTH')
+    requisicao.aceitar_zip = True
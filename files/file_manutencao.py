@@ -0,0 +1,384 @@
+"""
+Manutenção do armazenamento do sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+
+Remove arquivos temporários esquecidos, blobs sem registro no banco de
+dados e miniaturas de conteúdos removidos, e verifica o uso de disco. Os
+diretórios grandes (blobs e miniaturas) são percorridos aos poucos: cada
+execução avança alguns prefixos de hash a partir do ponto em que a anterior
+parou, guardado em Configuracao.
+"""
+
+import os
+import shutil
+import datetime
+import tempfile
+from flask import current_app
+from sqlalchemy import func
+
+# Importar modelos e utilitários
+from .file_models import Blob
+from .file_storage import obter_blob_store, SUFIXOS_COMPRESSAO
+from .file_thumbnails import obter_cache_miniaturas
+
+# Importar modelos de outros módulos
+from admin.admin_models import Configuracao, Estatistica, LogSistema
+
+# Importar extensões da aplicação
+from auth import db
+
+# Prefixos de hash (primeiro nível de diretórios dos blobs e das miniaturas)
+PREFIXOS = [f'{i:02x}' for i in range(256)]
+
+# Chaves em Configuracao com o próximo prefixo a verificar em cada área
+CHAVE_CURSOR_BLOBS = 'manutencao_armazenamento.cursor_blobs'
+CHAVE_CURSOR_MINIATURAS = 'manutencao_armazenamento.cursor_miniaturas'
+
+# Estatistica em que o resultado de cada execução é registrado
+CATEGORIA_ESTATISTICA = 'arquivos'
+SUBCATEGORIA_ESTATISTICA = 'manutencao_armazenamento'
+
+def _remover(caminho):
+    """Remove um arquivo e retorna o espaço liberado (0 se ele já não existir)."""
+    try:
+        tamanho = os.path.getsize(caminho)
+        os.remove(caminho)
+        return tamanho
+    except FileNotFoundError:
+        return 0
+
+def _somar(resultado, area, quantidade, liberados):
+    """Acumula no resultado a quantidade de arquivos e os bytes liberados de uma área."""
+    atual = resultado.setdefault(area, {'arquivos': 0, 'bytes': 0})
+    atual['arquivos'] += quantidade
+    atual['bytes'] += liberados
+
+def _remover_antigos(diretorio, limite, filtro=None):
+    """
+    Remove os arquivos de um diretório (sem subdiretórios) modificados antes do limite.
+
+    Args:
+        diretorio: Diretório verificado
+        limite: Momento (segundos desde a época) antes do qual os arquivos são removidos
+        filtro: Função que recebe o nome e indica se o arquivo pode ser removido (opcional)
+
+    Returns:
+        Tupla (quantidade de arquivos, bytes liberados)
+    """
+    quantidade = 0
+    liberados = 0
+
+    if not os.path.isdir(diretorio):
+        return quantidade, liberados
+
+    with os.scandir(diretorio) as entradas:
+        for entrada in entradas:
+            if not entrada.is_file(follow_symlinks=False) or (filtro and not filtro(entrada.name)):
+                continue
+            try:
+                if entrada.stat().st_mtime >= limite:
+                    continue
+            except FileNotFoundError:
+                continue
+            tamanho = _remover(entrada.path)
+            if tamanho or not os.path.exists(entrada.path):
+                quantidade += 1
+                liberados += tamanho
+
+    return quantidade, liberados
+
+def limpar_temporarios(resultado):
+    """
+    Remove os arquivos temporários antigos de todas as áreas (diretórios pequenos).
+
+    São removidas as cópias deixadas em UPLOAD_FOLDER pelos downloads da
+    versão anterior, as exportações de dados em instance/temp, as miniaturas
+    antigas gravadas no diretório temporário do sistema e os uploads
+    interrompidos no diretório de recebimento dos blobs.
+
+    Args:
+        resultado: Dicionário em que os totais de cada área são acumulados
+    """
+    limite = datetime.datetime.now().timestamp() - current_app.config.get('MANUTENCAO_IDADE_TEMPORARIOS', 60 * 60)
+
+    pasta_uploads = os.path.join(current_app.root_path, current_app.config.get('UPLOAD_FOLDER') or 'uploads')
+    _somar(resultado, 'uploads', *_remover_antigos(pasta_uploads, limite))
+
+    _somar(resultado, 'exportacoes', *_remover_antigos(os.path.join(current_app.instance_path, 'temp'), limite))
+
+    _somar(resultado, 'temporario_sistema', *_remover_antigos(
+        tempfile.gettempdir(), limite, filtro=lambda nome: nome.endswith('_thumb.png')
+    ))
+
+    # Apenas o diretório próprio do armazenamento local (o padrão é o temporário do sistema)
+    store = obter_blob_store()
+    if getattr(store, 'raiz', None):
+        _somar(resultado, 'recebimento', *_remover_antigos(store.diretorio_temporario(), limite))
+
+    from .file_sessoes import limpar_sessoes_expiradas
+    _somar(resultado, 'sessoes_upload', limpar_sessoes_expiradas(), 0)
+
+def _proximos_prefixos(chave, quantidade):
+    """
+    Retorna os próximos prefixos de uma área e avança o cursor guardado em Configuracao.
+
+    O cursor volta ao início após o último prefixo, de modo que todas as
+    entradas são verificadas a cada 256 / quantidade execuções.
+
+    Args:
+        chave: Chave do cursor em Configuracao
+        quantidade: Quantidade de prefixos desta execução
+
+    Returns:
+        Lista de prefixos
+    """
+    configuracao = Configuracao.query.filter_by(chave=chave).first()
+    if configuracao is None:
+        configuracao = Configuracao(
+            chave=chave,
+            valor=PREFIXOS[0],
+            descricao='Próximo prefixo de hash verificado pela manutenção do armazenamento.',
+            tipo='string',
+            categoria='sistema'
+        )
+        db.session.add(configuracao)
+
+    inicio = PREFIXOS.index(configuracao.valor) if configuracao.valor in PREFIXOS else 0
+    quantidade = min(quantidade, len(PREFIXOS))
+    prefixos = [PREFIXOS[(inicio + i) % len(PREFIXOS)] for i in range(quantidade)]
+    configuracao.valor = PREFIXOS[(inicio + quantidade) % len(PREFIXOS)]
+
+    return prefixos
+
+def _hash_do_nome(nome):
+    """Retorna o hash de um arquivo de blob (com ou sem sufixo de compressão)."""
+    for sufixo in SUFIXOS_COMPRESSAO.values():
+        if nome.endswith(sufixo):
+            return nome[:-len(sufixo)]
+    return nome
+
+def _hashes_registrados(hashes):
+    """Retorna quais dos hashes têm registro em Blob."""
+    registrados = set()
+    hashes = list(hashes)
+    for inicio in range(0, len(hashes), 500):
+        registrados.update(
+            hash_conteudo for (hash_conteudo,) in
+            db.session.query(Blob.hash_conteudo).filter(Blob.hash_conteudo.in_(hashes[inicio:inicio + 500]))
+        )
+    return registrados
+
+def limpar_blobs_orfaos(prefixos, resultado):
+    """
+    Remove os blobs sem registro no banco de dados e os temporários antigos
+    nos diretórios dos prefixos informados.
+
+    Apenas arquivos mais antigos que MANUTENCAO_IDADE_BLOBS_ORFAOS são
+    removidos, pois um upload grava o blob antes de confirmar o registro.
+
+    Args:
+        prefixos: Prefixos de hash (primeiro nível de diretórios) verificados
+        resultado: Dicionário em que os totais são acumulados
+    """
+    store = obter_blob_store()
+    raiz = getattr(store, 'raiz', None)
+    if not raiz:
+        return
+
+    agora = datetime.datetime.now().timestamp()
+    limite_orfaos = agora - current_app.config.get('MANUTENCAO_IDADE_BLOBS_ORFAOS', 24 * 60 * 60)
+    limite_temporarios = agora - current_app.config.get('MANUTENCAO_IDADE_TEMPORARIOS', 60 * 60)
+
+    for prefixo in prefixos:
+        candidatos = {}
+        for diretorio, _, nomes in os.walk(os.path.join(raiz, prefixo)):
+            for nome in nomes:
+                caminho = os.path.join(diretorio, nome)
+                try:
+                    modificacao = os.path.getmtime(caminho)
+                except FileNotFoundError:
+                    continue
+
+                # Gravações interrompidas (blobs, compressão)
+                if nome.startswith('.'):
+                    if modificacao < limite_temporarios:
+                        _somar(resultado, 'blobs_temporarios', 1, _remover(caminho))
+                    continue
+
+                if modificacao < limite_orfaos:
+                    candidatos.setdefault(_hash_do_nome(nome), []).append(caminho)
+
+        if not candidatos:
+            continue
+
+        registrados = _hashes_registrados(candidatos)
+        for hash_conteudo, caminhos in candidatos.items():
+            if hash_conteudo in registrados:
+                continue
+            for caminho in caminhos:
+                _somar(resultado, 'blobs_orfaos', 1, _remover(caminho))
+
+def limpar_miniaturas_orfas(prefixos, resultado):
+    """
+    Remove as miniaturas e páginas renderizadas de conteúdos que não existem mais.
+
+    Args:
+        prefixos: Prefixos de hash (diretórios do cache) verificados
+        resultado: Dicionário em que os totais são acumulados
+    """
+    cache = obter_cache_miniaturas()
+    limite_temporarios = datetime.datetime.now().timestamp() - current_app.config.get('MANUTENCAO_IDADE_TEMPORARIOS', 60 * 60)
+
+    for prefixo in prefixos:
+        diretorio = os.path.join(cache.raiz, prefixo)
+        if not os.path.isdir(diretorio):
+            continue
+
+        _somar(resultado, 'miniaturas_temporarias', *_remover_antigos(
+            diretorio, limite_temporarios, filtro=lambda nome: nome.startswith('.tmp_')
+        ))
+
+        imagens = {}
+        for nome in os.listdir(diretorio):
+            if not nome.startswith('.'):
+                imagens.setdefault(nome.split('_', 1)[0], []).append(os.path.join(diretorio, nome))
+        if not imagens:
+            continue
+
+        registrados = _hashes_registrados(imagens)
+        for hash_conteudo, caminhos in imagens.items():
+            if hash_conteudo in registrados:
+                continue
+            liberados = 0
+            for caminho in caminhos:
+                try:
+                    liberados += os.path.getsize(caminho)
+                except FileNotFoundError:
+                    pass
+            # Remove as imagens e zera o total em memória do cache
+            cache.remover(hash_conteudo)
+            _somar(resultado, 'miniaturas_orfas', len(caminhos), liberados)
+
+def verificar_uso_armazenamento():
+    """
+    Calcula o uso do armazenamento e compara com os limites configurados.
+
+    O total dos blobs é obtido do banco de dados (tamanho em disco de cada
+    blob), sem percorrer os diretórios.
+
+    Returns:
+        Dicionário com bytes dos blobs, limite, espaço livre em disco e a
+        lista de alertas
+    """
+    store = obter_blob_store()
+    total_blobs = db.session.query(
+        func.coalesce(func.sum(func.coalesce(Blob.tamanho_armazenado, Blob.tamanho)), 0)
+    ).scalar()
+
+    uso = {
+        'blobs_bytes': int(total_blobs),
+        'blobs_limite_bytes': current_app.config.get('MANUTENCAO_LIMITE_BLOBS_BYTES'),
+        'disco_total_bytes': None,
+        'disco_livre_bytes': None,
+        'alertas': []
+    }
+
+    if uso['blobs_limite_bytes'] and uso['blobs_bytes'] > uso['blobs_limite_bytes']:
+        uso['alertas'].append(
+            f"Blobs ocupam {uso['blobs_bytes'] / (1024 ** 3):.1f} GB, acima do limite de "
+            f"{uso['blobs_limite_bytes'] / (1024 ** 3):.1f} GB."
+        )
+
+    raiz = getattr(store, 'raiz', None)
+    if raiz:
+        disco = shutil.disk_usage(raiz)
+        uso['disco_total_bytes'] = disco.total
+        uso['disco_livre_bytes'] = disco.free
+
+        fracao_minima = current_app.config.get('MANUTENCAO_ESPACO_LIVRE_MINIMO', 0.1)
+        if fracao_minima and disco.free < disco.total * fracao_minima:
+            uso['alertas'].append(
+                f'Espaço livre no disco do armazenamento ({disco.free / disco.total:.0%}) abaixo do mínimo de {fracao_minima:.0%}.'
+            )
+
+    return uso
+
+def executar_manutencao(prefixos_por_execucao=None):
+    """
+    Executa uma etapa da manutenção do armazenamento.
+
+    Os temporários são verificados por inteiro; blobs e miniaturas, apenas
+    nos próximos prefixos de hash (MANUTENCAO_PREFIXOS_POR_EXECUCAO). O
+    resultado é registrado em Estatistica e os alertas de uso de disco em
+    LogSistema.
+
+    Args:
+        prefixos_por_execucao: Quantidade de prefixos verificados (padrão: configuração)
+
+    Returns:
+        Dicionário com o resultado por área, o total liberado, os prefixos
+        verificados e o uso do armazenamento
+    """
+    inicio = datetime.datetime.now()
+    quantidade = prefixos_por_execucao or current_app.config.get('MANUTENCAO_PREFIXOS_POR_EXECUCAO', 16)
+    areas = {}
+
+    limpar_temporarios(areas)
+
+    prefixos_blobs = _proximos_prefixos(CHAVE_CURSOR_BLOBS, quantidade)
+    limpar_blobs_orfaos(prefixos_blobs, areas)
+
+    prefixos_miniaturas = _proximos_prefixos(CHAVE_CURSOR_MINIATURAS, quantidade)
+    limpar_miniaturas_orfas(prefixos_miniaturas, areas)
+
+    uso = verificar_uso_armazenamento()
+
+    resumo = {
+        'areas': areas,
+        'arquivos_removidos': sum(area['arquivos'] for area in areas.values()),
+        'bytes_liberados': sum(area['bytes'] for area in areas.values()),
+        'prefixos': [prefixos_blobs[0], prefixos_blobs[-1]],
+        'uso': uso
+    }
+
+    db.session.add(Estatistica(
+        categoria=CATEGORIA_ESTATISTICA,
+        subcategoria=SUBCATEGORIA_ESTATISTICA,
+        dados=resumo,
+        periodo_inicio=inicio,
+        periodo_fim=datetime.datetime.now()
+    ))
+
+    for alerta in uso['alertas']:
+        db.session.add(LogSistema(tipo='erro', nivel='warning', mensagem=alerta, detalhes={'uso': uso}))
+
+    db.session.commit()
+    return resumo
+
+def resumo_manutencao(dias=30):
+    """
+    Resume as execuções recentes da manutenção para os administradores.
+
+    Args:
+        dias: Período considerado no total de espaço liberado
+
+    Returns:
+        Dicionário com a última execução (ou None), a quantidade de
+        execuções e os bytes liberados no período
+    """
+    desde = datetime.datetime.now() - datetime.timedelta(days=dias)
+    execucoes = (
+        Estatistica.query
+        .filter_by(categoria=CATEGORIA_ESTATISTICA, subcategoria=SUBCATEGORIA_ESTATISTICA)
+        .filter(Estatistica.periodo_fim >= desde)
+        .order_by(Estatistica.periodo_fim.desc())
+        .all()
+    )
+
+    return {
+        'ultima_execucao': execucoes[0].periodo_fim if execucoes else None,
+        'ultimo_resultado': execucoes[0].dados if execucoes else None,
+        'execucoes': len(execucoes),
+        'bytes_liberados': sum((execucao.dados or {}).get('bytes_liberados', 0) for execucao in execucoes),
+        'dias': dias
+    }
@@ -3,12 +3,13 @@ Modelos para o sistema de gerenciamento de arquivos do Sistema de Consultoria Ed
 Serra Projetos Educacionais
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, LargeBinary
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Text, Boolean, LargeBinary, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import datetime
 import os
+import zlib
 import hashlib
 import magic
 import uuid
@@ -26,12 +27,17 @@ class Arquivo(Base):
     extensao = Column(String(10), nullable=False)
     tamanho = Column(Integer, nullable=False)
     caminho = Column(String(255), nullable=False)
-    hash_conteudo = Column(String(64), nullable=True)
-    conteudo_texto = Column(Text, nullable=True)
-    metadados = Column(Text, nullable=True)  # JSON serializado
+    hash_conteudo = Column(String(64), nullable=True, index=True)
+    blob_id = Column(Integer, ForeignKey('blobs.id'), nullable=True)
     usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
     instituicao_id = Column(Integer, ForeignKey('instituicoes.id'), nullable=True)
     publico = Column(Boolean, default=False, nullable=False)
+    status_extracao = Column(String(20), default='pendente', nullable=False)  # 'pendente', 'processando', 'concluido', 'falhou'
+    erro_extracao = Column(Text, nullable=True)
+    falha_extracao = Column(String(30), nullable=True)  # tipo da falha: 'erro', 'tempo_esgotado', 'limite_cpu', 'limite_memoria', 'encerrado'
+    data_extracao = Column(DateTime, nullable=True)
+    status_verificacao = Column(String(20), nullable=True, index=True)  # None (não verificado), 'limpo', 'pendente', 'quarentena'
+    ameaca_detectada = Column(String(255), nullable=True)
     data_upload = Column(DateTime, default=func.now(), nullable=False)
     data_atualizacao = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
     
@@ -39,6 +45,42 @@ class Arquivo(Base):
     usuario = relationship("Usuario", back_populates="arquivos")
     instituicao = relationship("Instituicao", back_populates="arquivos")
     tarefas = relationship("ArquivoTarefa", back_populates="arquivo")
+    blob = relationship("Blob", back_populates="arquivos")
+    texto = relationship("ArquivoTexto", back_populates="arquivo", uselist=False, cascade="all, delete-orphan")
+    paginas = relationship("PaginaArquivo", back_populates="arquivo", lazy="dynamic", cascade="all, delete-orphan",
+                           order_by="PaginaArquivo.numero")
+    versoes = relationship("VersaoArquivo", back_populates="arquivo", lazy="dynamic", cascade="all, delete-orphan",
+                           order_by="VersaoArquivo.numero")
+    
+    # Texto extraído e metadados ficam em arquivos_texto e só são carregados
+    # quando acessados, para que listagens não leiam o texto de cada arquivo
+    def _obter_texto(self):
+        if self.texto is None:
+            self.texto = ArquivoTexto()
+        return self.texto
+    
+    @property
+    def conteudo_texto(self):
+        return self.texto.conteudo_texto if self.texto else None
+    
+    @conteudo_texto.setter
+    def conteudo_texto(self, valor):
+        self._obter_texto().conteudo_texto = valor
+    
+    @property
+    def tamanho_armazenado(self):
+        """Tamanho ocupado no armazenamento (menor que tamanho se o conteúdo estiver compactado)."""
+        if self.blob is not None and self.blob.tamanho_armazenado is not None:
+            return self.blob.tamanho_armazenado
+        return self.tamanho
+    
+    @property
+    def metadados(self):
+        return self.texto.metadados if self.texto else None
+    
+    @metadados.setter
+    def metadados(self, valor):
+        self._obter_texto().metadados = valor
     
     @staticmethod
     def gerar_nome_arquivo(nome_original):
@@ -99,40 +141,170 @@ class Arquivo(Base):
         Returns:
             String contendo o texto extraído ou None se não for possível extrair
         """
-        texto = None
-        
-        try:
-            # Texto simples
-            if tipo_mime == 'text/plain':
-                with open(caminho_arquivo, 'r', encoding='utf-8', errors='ignore') as f:
-                    texto = f.read()
-            
-            # PDF
-            elif tipo_mime == 'application/pdf':
-                import PyPDF2
-                with open(caminho_arquivo, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    texto = ""
-                    for page in reader.pages:
-                        texto += page.extract_text() + "\n"
-            
-            # Documentos do Word
-            elif tipo_mime in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-                import docx2txt
-                texto = docx2txt.process(caminho_arquivo)
-            
-        except Exception as e:
-            print(f"Erro ao extrair texto: {str(e)}")
-            texto = None
-        
-        return texto
+        from .file_utils import extrair_texto_arquivo
+        return extrair_texto_arquivo(caminho_arquivo, tipo_mime)
     
     def __repr__(self):
         return f"<Arquivo(id={self.id}, nome='{self.nome}', tipo='{self.tipo}', tamanho={self.tamanho})>"
 
 
+class Blob(Base):
+    """Modelo para o conteúdo deduplicado dos arquivos, endereçado pelo hash SHA-256."""
+    __tablename__ = 'blobs'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash_conteudo = Column(String(64), nullable=False, unique=True)
+    tamanho = Column(Integer, nullable=False)
+    backend = Column(String(20), default='local', nullable=False)
+    compressao = Column(String(10), nullable=True)  # None (sem compressão), 'zlib' ou 'zstd'
+    tamanho_armazenado = Column(Integer, nullable=True)  # bytes em disco (None: igual a tamanho)
+    referencias = Column(Integer, default=0, nullable=False)
+    data_criacao = Column(DateTime, default=func.now(), nullable=False)
+    
+    # Relacionamentos
+    arquivos = relationship("Arquivo", back_populates="blob")
+    
+    def __repr__(self):
+        return f"<Blob(id={self.id}, hash_conteudo='{self.hash_conteudo}', referencias={self.referencias})>"
+
+
+class VerificacaoConteudo(Base):
+    """
+    Modelo para o resultado da verificação antivírus de um conteúdo, pelo hash SHA-256.
+
+    Funciona como cache dos vereditos: uploads de um conteúdo já verificado
+    não são verificados novamente enquanto o veredito for válido.
+    """
+    __tablename__ = 'verificacoes_conteudo'
+    
+    hash_conteudo = Column(String(64), primary_key=True)
+    resultado = Column(String(20), nullable=False)  # 'limpo' ou 'infectado'
+    ameaca = Column(String(255), nullable=True)
+    verificador = Column(String(100), nullable=True)  # backend que emitiu o veredito
+    data_verificacao = Column(DateTime, default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<VerificacaoConteudo(hash_conteudo='{self.hash_conteudo}', resultado='{self.resultado}')>"
+
+
+class UsoArmazenamento(Base):
+    """
+    Modelo para o uso de armazenamento de um usuário, de uma instituição ou do sistema.
+
+    Os contadores são atualizados na mesma transação do upload, da nova
+    versão e da exclusão dos arquivos (file_cotas), de modo que a
+    verificação da cota e os totais do painel administrativo leem uma única
+    linha. A reconciliação periódica corrige eventuais diferenças.
+    """
+    __tablename__ = 'uso_armazenamento'
+    __table_args__ = (UniqueConstraint('escopo', 'referencia_id', name='uq_uso_armazenamento'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    escopo = Column(String(20), nullable=False)  # 'usuario', 'instituicao' ou 'total'
+    referencia_id = Column(Integer, nullable=False)  # ID do usuário ou da instituição (0 no total)
+    arquivos = Column(Integer, default=0, nullable=False)
+    bytes_arquivos = Column(BigInteger, default=0, nullable=False)  # versões atuais dos arquivos
+    bytes_versoes = Column(BigInteger, default=0, nullable=False)  # versões anteriores
+    limite_bytes = Column(BigInteger, nullable=True)  # None: cota padrão da configuração; 0: sem limite
+    data_atualizacao = Column(DateTime, default=func.now(), nullable=False)
+    data_reconciliacao = Column(DateTime, nullable=True)
+
+    @property
+    def bytes_usados(self):
+        """Bytes contabilizados na cota (arquivos e versões anteriores)."""
+        return self.bytes_arquivos + self.bytes_versoes
+
+    def __repr__(self):
+        return f"<UsoArmazenamento(escopo='{self.escopo}', referencia_id={self.referencia_id}, bytes_usados={self.bytes_usados})>"
+
+
+class ArquivoTexto(Base):
+    """
+    Modelo para o texto extraído e os metadados (JSON serializado) de um arquivo.
+    
+    Os valores são armazenados compactados com zlib e descompactados apenas
+    quando acessados.
+    """
+    __tablename__ = 'arquivos_texto'
+    
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), primary_key=True)
+    conteudo_texto_compactado = Column(LargeBinary, nullable=True)
+    metadados_compactados = Column(LargeBinary, nullable=True)
+    
+    # Relacionamentos
+    arquivo = relationship("Arquivo", back_populates="texto")
+    
+    @staticmethod
+    def compactar(valor):
+        """Compacta um texto para armazenamento (None é mantido)."""
+        if valor is None:
+            return None
+        return zlib.compress(valor.encode('utf-8'), 6)
+    
+    @staticmethod
+    def descompactar(valor):
+        """Descompacta um texto armazenado (None é mantido)."""
+        if valor is None:
+            return None
+        return zlib.decompress(valor).decode('utf-8')
+    
+    @property
+    def conteudo_texto(self):
+        return self.descompactar(self.conteudo_texto_compactado)
+    
+    @conteudo_texto.setter
+    def conteudo_texto(self, valor):
+        self.conteudo_texto_compactado = self.compactar(valor)
+    
+    @property
+    def metadados(self):
+        return self.descompactar(self.metadados_compactados)
+    
+    @metadados.setter
+    def metadados(self, valor):
+        self.metadados_compactados = self.compactar(valor)
+    
+    def __repr__(self):
+        return f"<ArquivoTexto(arquivo_id={self.arquivo_id})>"
+
+
+class PaginaArquivo(Base):
+    """
+    Modelo para o texto extraído de cada página de um arquivo (PDF).
+    
+    Permite que o visualizador e a pesquisa leiam apenas as páginas
+    necessárias. O texto é armazenado compactado, como em ArquivoTexto.
+    """
+    __tablename__ = 'arquivos_paginas'
+    __table_args__ = (UniqueConstraint('arquivo_id', 'numero', name='uq_arquivo_pagina'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), nullable=False, index=True)
+    numero = Column(Integer, nullable=False)  # a partir de 1
+    texto_compactado = Column(LargeBinary, nullable=True)
+    
+    # Relacionamentos
+    arquivo = relationship("Arquivo", back_populates="paginas")
+    
+    @property
+    def texto(self):
+        return ArquivoTexto.descompactar(self.texto_compactado)
+    
+    @texto.setter
+    def texto(self, valor):
+        self.texto_compactado = ArquivoTexto.compactar(valor)
+    
+    def __repr__(self):
+        return f"<PaginaArquivo(arquivo_id={self.arquivo_id}, numero={self.numero})>"
+
+
 class ArquivoConteudo(Base):
-    """Modelo para armazenar o conteúdo binário dos arquivos."""
+    """
+    Modelo legado para o conteúdo binário dos arquivos armazenado no banco de dados.
+    
+    Mantido apenas para a migração para o armazenamento de blobs
+    (flask arquivos migrar-conteudo).
+    """
     __tablename__ = 'arquivos_conteudo'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -161,3 +333,175 @@ class ArquivoTarefa(Base):
     
     def __repr__(self):
         return f"<ArquivoTarefa(id={self.id}, arquivo_id={self.arquivo_id}, tarefa_id={self.tarefa_id})>"
+
+
+class IndiceTermo(Base):
+    """
+    Modelo para o índice invertido da pesquisa textual (usado quando o banco
+    de dados não oferece SQLite FTS5).
+    
+    Cada linha guarda a frequência de um termo já normalizado (sem acentos e
+    reduzido ao radical) em um arquivo, com ocorrências no nome ponderadas.
+    """
+    __tablename__ = 'indice_termos'
+    
+    termo = Column(String(64), primary_key=True)
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), primary_key=True, index=True)
+    frequencia = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<IndiceTermo(termo='{self.termo}', arquivo_id={self.arquivo_id}, frequencia={self.frequencia})>"
+
+
+class IndicePagina(Base):
+    """
+    Modelo para o índice invertido por página (usado quando o banco de dados
+    não oferece SQLite FTS5), que indica em quais páginas cada termo ocorre.
+    """
+    __tablename__ = 'indice_paginas'
+    
+    termo = Column(String(64), primary_key=True)
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), primary_key=True, index=True)
+    pagina = Column(Integer, primary_key=True)
+    
+    def __repr__(self):
+        return f"<IndicePagina(termo='{self.termo}', arquivo_id={self.arquivo_id}, pagina={self.pagina})>"
+
+
+class IndiceDocumento(Base):
+    """Modelo para o comprimento (em termos) de cada arquivo no índice invertido."""
+    __tablename__ = 'indice_documentos'
+    
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), primary_key=True)
+    comprimento = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<IndiceDocumento(arquivo_id={self.arquivo_id}, comprimento={self.comprimento})>"
+
+
+class AssinaturaArquivo(Base):
+    """
+    Modelo para a assinatura MinHash do texto extraído de um arquivo, usada
+    na detecção de documentos quase idênticos.
+    """
+    __tablename__ = 'assinaturas_arquivos'
+    
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), primary_key=True)
+    assinatura = Column(LargeBinary, nullable=False)  # valores mínimos (uint64) concatenados
+    total_trechos = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<AssinaturaArquivo(arquivo_id={self.arquivo_id}, total_trechos={self.total_trechos})>"
+
+
+class BandaSimilaridade(Base):
+    """
+    Modelo para o índice LSH das assinaturas: cada arquivo tem uma linha por
+    banda com o hash dos valores da banda. Arquivos com o mesmo hash em
+    alguma banda são candidatos a quase idênticos.
+    """
+    __tablename__ = 'bandas_similaridade'
+    
+    banda = Column(Integer, primary_key=True)
+    valor = Column(BigInteger, primary_key=True)
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), primary_key=True, index=True)
+    
+    def __repr__(self):
+        return f"<BandaSimilaridade(banda={self.banda}, valor={self.valor}, arquivo_id={self.arquivo_id})>"
+
+
+class SessaoUpload(Base):
+    """
+    Modelo para uma sessão de upload em blocos (retomável).
+    
+    Os blocos recebidos ficam em disco (file_sessoes); a sessão guarda o
+    tamanho e o hash esperados e, após a conclusão, o arquivo criado.
+    """
+    __tablename__ = 'sessoes_upload'
+    
+    id = Column(String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False, index=True)
+    nome = Column(String(255), nullable=False)
+    tamanho = Column(Integer, nullable=False)
+    tamanho_bloco = Column(Integer, nullable=False)
+    hash_conteudo = Column(String(64), nullable=True)
+    instituicao_id = Column(Integer, ForeignKey('instituicoes.id'), nullable=True)
+    publico = Column(Boolean, default=False, nullable=False)
+    status = Column(String(20), default='aberta', nullable=False)  # 'aberta', 'concluida'
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='SET NULL'), nullable=True)
+    data_criacao = Column(DateTime, default=func.now(), nullable=False)
+    data_expiracao = Column(DateTime, nullable=False, index=True)
+    
+    @property
+    def total_blocos(self):
+        """Quantidade de blocos do arquivo."""
+        return max(1, -(-self.tamanho // self.tamanho_bloco))
+    
+    def __repr__(self):
+        return f"<SessaoUpload(id='{self.id}', nome='{self.nome}', tamanho={self.tamanho}, status='{self.status}')>"
+
+
+class VersaoArquivo(Base):
+    """
+    Modelo para as versões anteriores de um arquivo.
+
+    A versão atual é o próprio Arquivo (com o conteúdo inteiro em seu blob);
+    cada substituição do conteúdo guarda aqui a versão substituída. O
+    conteúdo da versão é dividido em fragmentos definidos pelo conteúdo
+    (FragmentoVersao), de modo que versões parecidas compartilham os
+    fragmentos iguais. Até a fragmentação terminar, a versão mantém a
+    referência ao blob com o conteúdo inteiro.
+    """
+    __tablename__ = 'versoes_arquivo'
+    __table_args__ = (UniqueConstraint('arquivo_id', 'numero', name='uq_versao_arquivo'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    arquivo_id = Column(Integer, ForeignKey('arquivos.id', ondelete='CASCADE'), nullable=False, index=True)
+    numero = Column(Integer, nullable=False)  # a partir de 1
+    nome = Column(String(255), nullable=False)
+    tamanho = Column(Integer, nullable=False)
+    hash_conteudo = Column(String(64), nullable=False)
+    blob_id = Column(Integer, ForeignKey('blobs.id'), nullable=True)  # conteúdo inteiro, até a fragmentação
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=True)
+    comentario = Column(String(255), nullable=True)
+    texto_compactado = Column(LargeBinary, nullable=True)  # texto extraído, para comparação entre versões
+    data_criacao = Column(DateTime, nullable=False)
+    data_substituicao = Column(DateTime, default=func.now(), nullable=False)
+    
+    # Relacionamentos
+    arquivo = relationship("Arquivo", back_populates="versoes")
+    blob = relationship("Blob")
+    fragmentos = relationship("FragmentoVersao", back_populates="versao", cascade="all, delete-orphan",
+                              order_by="FragmentoVersao.posicao")
+    
+    @property
+    def texto(self):
+        return ArquivoTexto.descompactar(self.texto_compactado)
+    
+    @texto.setter
+    def texto(self, valor):
+        self.texto_compactado = ArquivoTexto.compactar(valor)
+    
+    def __repr__(self):
+        return f"<VersaoArquivo(arquivo_id={self.arquivo_id}, numero={self.numero})>"
+
+
+class FragmentoVersao(Base):
+    """
+    Modelo para a sequência de fragmentos que compõe o conteúdo de uma versão.
+    
+    Cada fragmento é um blob (endereçado pelo hash do seu conteúdo), com uma
+    referência por ocorrência em uma versão.
+    """
+    __tablename__ = 'versoes_arquivo_fragmentos'
+    
+    versao_id = Column(Integer, ForeignKey('versoes_arquivo.id', ondelete='CASCADE'), primary_key=True)
+    posicao = Column(Integer, primary_key=True)  # a partir de 0
+    blob_id = Column(Integer, ForeignKey('blobs.id'), nullable=False, index=True)
+    
+    # Relacionamentos
+    versao = relationship("VersaoArquivo", back_populates="fragmentos")
+    blob = relationship("Blob")
+    
+    def __repr__(self):
+        return f"<FragmentoVersao(versao_id={self.versao_id}, posicao={self.posicao})>"
@@ -0,0 +1,129 @@
+"""
+Regras de acesso aos arquivos do sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+from functools import wraps
+from flask import g, jsonify, flash, redirect, url_for, abort
+from flask_login import current_user
+from sqlalchemy import or_
+
+# Importar modelos
+from .file_models import Arquivo
+
+# Importar extensões da aplicação
+from auth import db
+
+def obter_instituicoes_usuario(usuario=None):
+    """
+    Retorna os IDs das instituições do usuário.
+
+    O conjunto é calculado uma vez por requisição (guardado em flask.g).
+
+    Args:
+        usuario: Usuário (padrão: usuário atual)
+
+    Returns:
+        frozenset com os IDs das instituições
+    """
+    usuario = usuario or current_user
+    cache = g.setdefault('instituicoes_usuarios', {})
+
+    if usuario.id not in cache:
+        cache[usuario.id] = frozenset(ui.instituicao_id for ui in usuario.instituicoes)
+
+    return cache[usuario.id]
+
+def filtro_acesso_arquivos(usuario=None):
+    """
+    Retorna a condição SQL dos arquivos que o usuário pode acessar.
+
+    São os arquivos públicos, os do próprio usuário e os das instituições
+    do usuário, as mesmas regras de pode_acessar_arquivo.
+
+    Args:
+        usuario: Usuário (padrão: usuário atual)
+
+    Returns:
+        Expressão SQLAlchemy para uso em filter()
+    """
+    usuario = usuario or current_user
+    condicoes = [Arquivo.publico == True, Arquivo.usuario_id == usuario.id]
+
+    instituicoes = obter_instituicoes_usuario(usuario)
+    if instituicoes:
+        condicoes.append(Arquivo.instituicao_id.in_(sorted(instituicoes)))
+
+    return or_(*condicoes)
+
+def pode_acessar_arquivo(arquivo, usuario=None):
+    """
+    Verifica se o usuário pode acessar um arquivo.
+
+    Args:
+        arquivo: Objeto Arquivo
+        usuario: Usuário (padrão: usuário atual)
+
+    Returns:
+        Boolean indicando se o acesso é permitido
+    """
+    usuario = usuario or current_user
+
+    if arquivo.publico or arquivo.usuario_id == usuario.id:
+        return True
+
+    return arquivo.instituicao_id is not None and arquivo.instituicao_id in obter_instituicoes_usuario(usuario)
+
+def obter_arquivo(arquivo_id):
+    """
+    Carrega um arquivo uma única vez por requisição.
+
+    Args:
+        arquivo_id: ID do arquivo
+
+    Returns:
+        Objeto Arquivo ou None
+    """
+    cache = g.setdefault('arquivos_carregados', {})
+
+    if arquivo_id not in cache:
+        cache[arquivo_id] = db.session.get(Arquivo, arquivo_id)
+
+    return cache[arquivo_id]
+
+def arquivo_access_required(f):
+    """
+    Decorador que verifica o acesso ao arquivo da rota (páginas HTML).
+
+    O arquivo carregado é passado para a rota no argumento 'arquivo'.
+    """
+    @wraps(f)
+    def decorated_function(arquivo_id, *args, **kwargs):
+        arquivo = obter_arquivo(arquivo_id)
+        if arquivo is None:
+            abort(404)
+
+        if not pode_acessar_arquivo(arquivo):
+            flash('Você não tem permissão para acessar este arquivo.', 'danger')
+            return redirect(url_for('files.listar_arquivos'))
+
+        return f(arquivo_id, *args, arquivo=arquivo, **kwargs)
+    return decorated_function
+
+def api_arquivo_access_required(f):
+    """
+    Decorador que verifica o acesso ao arquivo da rota (API JSON).
+
+    O arquivo carregado é passado para a rota no argumento 'arquivo'.
+    """
+    @wraps(f)
+    def decorated_function(arquivo_id, *args, **kwargs):
+        arquivo = obter_arquivo(arquivo_id)
+        if arquivo is None:
+            return jsonify({'error': 'Arquivo não encontrado'}), 404
+
+        if not pode_acessar_arquivo(arquivo):
+            return jsonify({'error': 'Acesso negado'}), 403
+
+        return f(arquivo_id, *args, arquivo=arquivo, **kwargs)
+    return decorated_function
@@ -0,0 +1,511 @@
+"""
+Pipeline de recebimento de uploads em passagem única para o sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import zipfile
+import tempfile
+import magic
+from functools import wraps
+from flask import Request, request
+from flask_login import current_user
+from werkzeug.utils import secure_filename
+from sqlalchemy import insert, select, literal, or_
+
+# Importar modelos e utilitários
+from .file_models import Arquivo, PaginaArquivo
+from .file_utils import validar_arquivo, obter_tipo_arquivo
+from .file_storage import obter_blob_store, registrar_blob
+from .file_search import indexar_arquivo
+from .file_permissions import filtro_acesso_arquivos
+from .file_similaridade import copiar_similaridade
+from .file_antivirus import obter_verificador, aplicar_verificacao, VERIFICACAO_QUARENTENA
+from .file_cotas import registrar_uso, espaco_disponivel, MENSAGENS_COTA, ESCOPO_USUARIO
+
+# Importar extensões da aplicação
+from auth import db
+
+# Quantidade de bytes iniciais usada para identificar o tipo MIME
+TAMANHO_AMOSTRA_MIME = 8192
+
+# Tamanho dos blocos usados ao consumir streams
+TAMANHO_BLOCO = 64 * 1024
+
+MIME_DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+class ReceptorUpload:
+    """
+    Recebe o conteúdo de um upload em uma única passagem.
+
+    Cada bloco recebido é usado ao mesmo tempo para identificar o tipo MIME
+    (a partir dos primeiros bytes), calcular o SHA-256 e o tamanho e gravar o
+    conteúdo em um arquivo temporário no mesmo sistema de arquivos do
+    armazenamento de blobs, de onde ele é apenas renomeado para o destino final.
+
+    Se o tipo identificado não for aceito por validar_arquivo, o arquivo
+    temporário é descartado e o restante do conteúdo deixa de ser gravado ou
+    processado. Com validar=False (pacotes ZIP de upload em lote) o tipo é
+    apenas identificado.
+
+    Com um verificador antivírus, os blocos aceitos também são enviados a
+    ele durante o recebimento (atributo verificacao); o resultado é obtido
+    em criar_arquivo, que antes consulta o cache de vereditos pelo hash.
+
+    Com limite_cota (espaço disponível na cota do usuário), o upload que
+    não cabe na cota é rejeitado assim que a excede, sem receber o restante;
+    a cota é verificada novamente ao registrar o arquivo (criar_arquivo).
+
+    Implementa a interface de arquivo esperada pelo parser de formulários do
+    Werkzeug (write, seek, read, readline, tell e close).
+    """
+
+    def __init__(self, nome_arquivo, diretorio=None, limite_bytes=None, validar=True, verificador=None, limite_cota=None):
+        self.nome_arquivo = nome_arquivo
+        self.mime_type = None
+        self.hash_conteudo = None
+        self.tamanho = 0
+        self.erro = None
+        self.finalizado = False
+        self.limite_bytes = limite_bytes
+        self.limite_cota = limite_cota
+        self.validar = validar
+        self.verificador = verificador
+        self.verificacao = None
+        self._sha256 = hashlib.sha256()
+        self._amostra = bytearray()
+        self._verificar_docx = False
+
+        fd, self.caminho_temporario = tempfile.mkstemp(dir=diretorio, prefix='.upload_')
+        self._arquivo = os.fdopen(fd, 'w+b')
+
+    @property
+    def rejeitado(self):
+        """Indica se o upload foi rejeitado durante o recebimento."""
+        return self.erro is not None
+
+    def write(self, dados):
+        tamanho_bloco = len(dados)
+
+        if self.erro or self.finalizado:
+            return tamanho_bloco
+
+        # Acumular os primeiros bytes até haver o suficiente para identificar o tipo
+        if self.mime_type is None:
+            self._amostra += dados
+            if len(self._amostra) < TAMANHO_AMOSTRA_MIME:
+                return tamanho_bloco
+            self._processar_amostra()
+            return tamanho_bloco
+
+        self._consumir(dados)
+        return tamanho_bloco
+
+    def _processar_amostra(self):
+        """Identifica o tipo MIME pela amostra inicial e grava os bytes acumulados."""
+        amostra = bytes(self._amostra)
+        self._amostra = bytearray()
+
+        self.mime_type = magic.Magic(mime=True).from_buffer(amostra)
+
+        # Documentos DOCX são arquivos ZIP; a confirmação é feita ao finalizar
+        extensao = os.path.splitext(self.nome_arquivo)[1].lower()
+        if self.mime_type == 'application/zip' and extensao == '.docx':
+            self.mime_type = MIME_DOCX
+            self._verificar_docx = True
+
+        if self.validar and not validar_arquivo(self.nome_arquivo, self.mime_type):
+            self.rejeitar('Tipo de arquivo não permitido.')
+            return
+
+        self._consumir(amostra)
+
+    def _consumir(self, dados):
+        """Atualiza hash e tamanho e grava o bloco no arquivo temporário."""
+        if self.limite_bytes is not None and self.tamanho + len(dados) > self.limite_bytes:
+            self.rejeitar('O arquivo excede o tamanho máximo permitido.')
+            return
+        if self.limite_cota is not None and self.tamanho + len(dados) > self.limite_cota:
+            self.rejeitar(MENSAGENS_COTA[ESCOPO_USUARIO])
+            return
+
+        self._sha256.update(dados)
+        self.tamanho += len(dados)
+        self._arquivo.write(dados)
+
+        if self.verificador is not None:
+            if self.verificacao is None:
+                self.verificacao = self.verificador.iniciar()
+            self.verificacao.enviar(dados)
+
+    def _concluir_amostra(self):
+        """Processa a amostra pendente de arquivos menores que TAMANHO_AMOSTRA_MIME."""
+        if self.mime_type is None and not self.erro:
+            self._processar_amostra()
+
+    def seek(self, posicao, origem=0):
+        # Chamado pelo Werkzeug ao término de cada parte do formulário
+        self._concluir_amostra()
+        if self._arquivo.closed:
+            return 0
+        return self._arquivo.seek(posicao, origem)
+
+    def tell(self):
+        return self._arquivo.tell() if not self._arquivo.closed else self.tamanho
+
+    def read(self, tamanho=-1):
+        self._concluir_amostra()
+        return self._arquivo.read(tamanho)
+
+    def readline(self, tamanho=-1):
+        self._concluir_amostra()
+        return self._arquivo.readline(tamanho)
+
+    def flush(self):
+        if not self._arquivo.closed:
+            self._arquivo.flush()
+
+    def close(self):
+        if not self._arquivo.closed:
+            self._arquivo.close()
+
+    def consumir_stream(self, stream):
+        """
+        Consome um stream binário até o fim.
+
+        Args:
+            stream: Objeto com método read()
+
+        Returns:
+            O próprio receptor
+        """
+        for bloco in iter(lambda: stream.read(TAMANHO_BLOCO), b''):
+            self.write(bloco)
+            if self.erro:
+                break
+        return self
+
+    def finalizar(self):
+        """
+        Conclui o recebimento, fechando o arquivo temporário e calculando o hash.
+
+        Returns:
+            O próprio receptor
+        """
+        if self.finalizado:
+            return self
+
+        self._concluir_amostra()
+        self.close()
+        self.finalizado = True
+
+        if self.erro:
+            return self
+
+        if self.tamanho == 0:
+            self.rejeitar('O arquivo enviado está vazio.')
+            return self
+
+        # Confirmar que o ZIP recebido é de fato um documento do Word
+        # (apenas o diretório central do ZIP é lido)
+        if self._verificar_docx:
+            try:
+                with zipfile.ZipFile(self.caminho_temporario) as zf:
+                    if 'word/document.xml' not in zf.namelist():
+                        self.rejeitar('Tipo de arquivo não permitido.')
+                        return self
+            except zipfile.BadZipFile:
+                self.rejeitar('Tipo de arquivo não permitido.')
+                return self
+
+        self.hash_conteudo = self._sha256.hexdigest()
+        return self
+
+    def rejeitar(self, mensagem):
+        """
+        Rejeita o upload, descartando o conteúdo já gravado.
+
+        Args:
+            mensagem: Mensagem de erro para o usuário
+        """
+        self.erro = mensagem
+        self.descartar()
+
+    def descartar(self):
+        """Remove o arquivo temporário, se ainda existir, e encerra a verificação não concluída."""
+        self.close()
+        if self.verificacao is not None:
+            self.verificacao.cancelar()
+        if os.path.exists(self.caminho_temporario):
+            os.remove(self.caminho_temporario)
+
+
+class RequisicaoUpload(Request):
+    """
+    Classe de requisição que entrega os arquivos de formulários multipart
+    diretamente a instâncias de ReceptorUpload, quando habilitado pelo
+    decorador upload_em_fluxo.
+
+    Rotas de upload em lote podem definir limite_bytes_arquivo (tamanho
+    máximo de cada arquivo) e aceitar_zip (pacotes ZIP recebidos sem validação
+    de tipo, para serem abertos pela própria rota). limite_cota é o espaço
+    disponível na cota do usuário, definido por upload_em_fluxo.
+    """
+    receber_em_fluxo = False
+    limite_bytes_arquivo = None
+    limite_cota = None
+    aceitar_zip = False
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not self.receber_em_fluxo or not filename:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        # Pacotes ZIP não são verificados; os arquivos extraídos deles são
+        pacote_zip = self.aceitar_zip and filename.lower().endswith('.zip')
+        receptor = ReceptorUpload(
+            filename,
+            obter_blob_store().diretorio_temporario(),
+            limite_bytes=None if pacote_zip else self.limite_bytes_arquivo,
+            validar=not pacote_zip,
+            verificador=None if pacote_zip else obter_verificador(),
+            limite_cota=None if pacote_zip else self.limite_cota
+        )
+        self.receptores_upload.append(receptor)
+        return receptor
+
+
+def upload_em_fluxo(f):
+    """
+    Decorador que habilita o recebimento de uploads em passagem única na rota.
+
+    Os arquivos temporários de uploads não aproveitados são removidos ao final
+    da requisição. Arquivos maiores que o espaço disponível na cota do
+    usuário são rejeitados durante o recebimento.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if isinstance(request._get_current_object(), RequisicaoUpload):
+            request.receber_em_fluxo = True
+            request.receptores_upload = []
+            if current_user.is_authenticated:
+                request.limite_cota = espaco_disponivel(current_user.id)
+
+        try:
+            return f(*args, **kwargs)
+        finally:
+            for receptor in getattr(request, 'receptores_upload', []):
+                receptor.descartar()
+    return decorated_function
+
+def receber_upload(arquivo):
+    """
+    Obtém o receptor com o conteúdo de um arquivo enviado.
+
+    Em rotas com upload_em_fluxo o conteúdo já foi processado durante a
+    leitura da requisição; caso contrário, o stream é consumido uma vez.
+
+    Args:
+        arquivo: Objeto FileStorage do Werkzeug
+
+    Returns:
+        Objeto ReceptorUpload finalizado
+    """
+    if isinstance(arquivo.stream, ReceptorUpload):
+        return arquivo.stream.finalizar()
+
+    receptor = ReceptorUpload(arquivo.filename, obter_blob_store().diretorio_temporario(), verificador=obter_verificador())
+    if hasattr(request, 'receptores_upload'):
+        request.receptores_upload.append(receptor)
+
+    return receptor.consumir_stream(arquivo.stream).finalizar()
+
+def criar_arquivo(recebido, nome_original, usuario_id, instituicao_id=None, publico=False, metadados=None):
+    """
+    Cria o registro de um arquivo a partir de um upload recebido.
+
+    O conteúdo é movido para o armazenamento de blobs sem nova leitura e o
+    resultado da verificação antivírus é aplicado (arquivos com ameaça ficam
+    em quarentena). A alteração é feita na sessão atual; o commit fica a
+    cargo do chamador, que deve em seguida chamar agendar_extracao
+    (file_workers) para extrair o texto.
+
+    Args:
+        recebido: Objeto ReceptorUpload finalizado e não rejeitado
+        nome_original: Nome original do arquivo
+        usuario_id: ID do usuário que enviou o arquivo
+        instituicao_id: ID da instituição associada (opcional)
+        publico: Se o arquivo é público
+        metadados: Dicionário com metadados adicionais (opcional)
+
+    Returns:
+        Objeto Arquivo criado
+
+    Raises:
+        CotaExcedida: Se o arquivo não couber na cota do usuário ou da instituição
+    """
+    # Contabilizar o uso antes de mover o conteúdo; a cota é verificada no
+    # mesmo UPDATE do contador
+    registrar_uso(usuario_id, instituicao_id, recebido.tamanho, arquivos=1)
+
+    # Gerar nome seguro e único para o arquivo
+    nome_seguro = secure_filename(nome_original)
+    nome_base, extensao = os.path.splitext(nome_seguro)
+    nome_arquivo = f"{nome_base}_{uuid.uuid4().hex}{extensao}"
+
+    # Mover o conteúdo para o armazenamento de blobs (deduplicado por hash; a
+    # compressão é feita em segundo plano, após a extração de texto)
+    blob = registrar_blob(recebido.hash_conteudo, recebido.tamanho, recebido.caminho_temporario)
+
+    dados_metadados = {'mime_type': recebido.mime_type}
+    dados_metadados.update(metadados or {})
+
+    novo_arquivo = Arquivo(
+        nome=nome_seguro,
+        tipo=obter_tipo_arquivo(recebido.mime_type),
+        extensao=extensao[1:].lower(),
+        tamanho=recebido.tamanho,
+        caminho=nome_arquivo,
+        hash_conteudo=recebido.hash_conteudo,
+        metadados=json.dumps(dados_metadados),
+        usuario_id=usuario_id,
+        instituicao_id=instituicao_id,
+        publico=publico,
+        blob=blob
+    )
+
+    db.session.add(novo_arquivo)
+    aplicar_verificacao(novo_arquivo, recebido)
+    
+    # Indexar o nome para pesquisa; o conteúdo é indexado após a extração
+    db.session.flush()
+    indexar_arquivo(novo_arquivo)
+    
+    return novo_arquivo
+
+def localizar_conteudo_acessivel(hash_conteudo, usuario):
+    """
+    Localiza um arquivo com o conteúdo informado ao qual o usuário tem acesso.
+
+    Apenas arquivos que o usuário pode acessar (filtro_acesso_arquivos) são
+    considerados, de modo que a existência de um conteúdo não
+    pode ser descoberta por quem não tem acesso a nenhum arquivo com ele.
+    Arquivos com a extração concluída têm preferência.
+
+    Args:
+        hash_conteudo: Hash SHA-256 do conteúdo
+        usuario: Usuário que envia o arquivo
+
+    Returns:
+        Objeto Arquivo ou None
+    """
+    origem = Arquivo.query.filter(
+        Arquivo.hash_conteudo == hash_conteudo,
+        Arquivo.blob_id.isnot(None),
+        or_(Arquivo.status_verificacao.is_(None), Arquivo.status_verificacao != VERIFICACAO_QUARENTENA),
+        filtro_acesso_arquivos(usuario)
+    ).order_by(
+        (Arquivo.status_extracao == 'concluido').desc(),
+        Arquivo.id.desc()
+    ).first()
+
+    # O conteúdo precisa continuar disponível no armazenamento
+    if origem is None or not obter_blob_store().existe(hash_conteudo):
+        return None
+
+    return origem
+
+def criar_arquivo_por_hash(origem, nome_original, usuario_id, instituicao_id=None, publico=False, metadados=None):
+    """
+    Cria o registro de um arquivo que reutiliza o conteúdo de outro.
+
+    Nenhum byte é transferido ou gravado: o blob tem sua contagem de
+    referências incrementada e, se a extração do arquivo de origem estiver
+    concluída, o texto (compactado), as páginas e os metadados do documento
+    são copiados sem nova extração. A alteração é feita na sessão atual; o
+    commit fica a cargo do chamador, que deve chamar agendar_extracao
+    (file_workers) se o arquivo ficar com a extração pendente.
+
+    Args:
+        origem: Arquivo acessível com o mesmo conteúdo (localizar_conteudo_acessivel)
+        nome_original: Nome original do arquivo
+        usuario_id: ID do usuário que enviou o arquivo
+        instituicao_id: ID da instituição associada (opcional)
+        publico: Se o arquivo é público
+        metadados: Dicionário com metadados adicionais (opcional)
+
+    Returns:
+        Objeto Arquivo criado
+
+    Raises:
+        ValueError: Se o nome não for compatível com o tipo do conteúdo
+        CotaExcedida: Se o arquivo não couber na cota do usuário ou da instituição
+    """
+    dados_origem = json.loads(origem.metadados or '{}')
+    mime_type = dados_origem.get('mime_type')
+
+    nome_seguro = secure_filename(nome_original)
+    if not validar_arquivo(nome_seguro, mime_type):
+        raise ValueError('Tipo de arquivo não permitido.')
+
+    nome_base, extensao = os.path.splitext(nome_seguro)
+    nome_arquivo = f"{nome_base}_{uuid.uuid4().hex}{extensao}"
+
+    # O conteúdo compartilhado também conta na cota de quem o registra
+    registrar_uso(usuario_id, instituicao_id, origem.tamanho, arquivos=1)
+
+    blob = registrar_blob(origem.hash_conteudo, origem.tamanho)
+
+    # Metadados do documento da origem; os do upload não são herdados
+    dados_metadados = {
+        chave: valor for chave, valor in dados_origem.items()
+        if chave not in ('upload_ip', 'user_agent', 'upload_lote', 'upload_sessao')
+    }
+    dados_metadados.update(metadados or {})
+    dados_metadados['mime_type'] = mime_type
+
+    extracao_concluida = origem.status_extracao == 'concluido'
+
+    novo_arquivo = Arquivo(
+        nome=nome_seguro,
+        tipo=origem.tipo,
+        extensao=extensao[1:].lower(),
+        tamanho=origem.tamanho,
+        caminho=nome_arquivo,
+        hash_conteudo=origem.hash_conteudo,
+        metadados=json.dumps(dados_metadados, default=str),
+        usuario_id=usuario_id,
+        instituicao_id=instituicao_id,
+        publico=publico,
+        blob=blob
+    )
+
+    db.session.add(novo_arquivo)
+
+    # Veredito do cache (o conteúdo da origem já foi verificado) ou nova verificação
+    aplicar_verificacao(novo_arquivo)
+
+    if extracao_concluida:
+        # Texto copiado já compactado, sem descompactar
+        novo_arquivo.texto.conteudo_texto_compactado = origem.texto.conteudo_texto_compactado
+        novo_arquivo.status_extracao = 'concluido'
+        novo_arquivo.data_extracao = origem.data_extracao
+
+    db.session.flush()
+
+    if extracao_concluida:
+        db.session.execute(
+            insert(PaginaArquivo).from_select(
+                ['arquivo_id', 'numero', 'texto_compactado'],
+                select(literal(novo_arquivo.id), PaginaArquivo.numero, PaginaArquivo.texto_compactado)
+                .where(PaginaArquivo.arquivo_id == origem.id)
+            )
+        )
+        copiar_similaridade(origem.id, novo_arquivo.id)
+
+    indexar_arquivo(novo_arquivo)
+
+    return novo_arquivo
@@ -3,21 +3,31 @@ Rotas para o sistema de gerenciamento de arquivos do Sistema de Consultoria Educ
 Serra Projetos Educacionais
 """
 
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, current_app, send_file
+from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, current_app, abort
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
 import os
-import json
-import uuid
-import magic
-import hashlib
 import datetime
-import mimetypes
-from functools import wraps
 
 # Importar modelos e configurações
-from .file_models import Arquivo, ArquivoConteudo, ArquivoTarefa
-from .file_utils import validar_arquivo, extrair_texto_arquivo, gerar_thumbnail
+from .file_models import Arquivo, ArquivoTarefa, PaginaArquivo, SessaoUpload
+from .file_utils import gerar_thumbnail
+from .file_storage import liberar_blob, remover_conteudo_orfao, PADRAO_HASH
+from .file_pipeline import upload_em_fluxo, receber_upload, criar_arquivo, localizar_conteudo_acessivel, criar_arquivo_por_hash
+from .file_download import enviar_conteudo_arquivo, gerar_url_download_assinada
+from .file_exportacao import consultar_arquivos_exportacao, enviar_zip
+from .file_antivirus import em_quarentena
+from .file_cotas import (registrar_exclusao, transferir_instituicao, resumo_uso, CotaExcedida,
+                         ESCOPO_USUARIO, ESCOPO_INSTITUICAO)
+from .file_permissions import (arquivo_access_required, api_arquivo_access_required, filtro_acesso_arquivos,
+                               obter_instituicoes_usuario)
+from .file_workers import agendar_extracao
+from .file_lote import configurar_requisicao_lote, extrair_pacote_zip, registrar_lote, STATUS_CRIADO
+from .file_sessoes import criar_sessao, estado_sessao, gravar_bloco, concluir_sessao, cancelar_sessao, ErroSessaoUpload
+from .file_search import aplicar_pesquisa, localizar_paginas, gerar_trechos, remover_arquivo_indice
+from .file_similaridade import buscar_similares, remover_similaridade
+from .file_versoes import (criar_versao, agendar_fragmentacao, listar_versoes, obter_versao, numero_versao_atual,
+                           enviar_conteudo_versao, comparar_versoes, remover_versoes)
+from .file_thumbnails import enviar_imagem_pagina, obter_total_paginas, LARGURA_MINIATURA, LARGURA_PAGINA
 from .file_forms import UploadArquivoForm, PesquisaArquivoForm
 
 # Importar extensões da aplicação
@@ -31,6 +41,9 @@ UPLOAD_FOLDER = os.path.join(current_app.root_path, 'uploads')
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt'}
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB
 
+# Quantidade máxima de páginas retornadas por requisição na API de páginas
+MAXIMO_PAGINAS_POR_REQUISICAO = 50
+
 # Criar diretório de uploads se não existir
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -47,28 +60,6 @@ def allowed_file(filename):
     """
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Decorador para verificar permissões de acesso a arquivos
-def arquivo_access_required(f):
-    @wraps(f)
-    def decorated_function(arquivo_id, *args, **kwargs):
-        arquivo = Arquivo.query.get_or_404(arquivo_id)
-        
-        # Verificar se o usuário tem acesso ao arquivo
-        if not arquivo.publico and arquivo.usuario_id != current_user.id:
-            # Verificar se o usuário pertence à mesma instituição
-            if not arquivo.instituicao_id or not current_user.instituicoes:
-                flash('Você não tem permissão para acessar este arquivo.', 'danger')
-                return redirect(url_for('files.listar_arquivos'))
-            
-            # Verificar se o usuário pertence à instituição do arquivo
-            user_instituicoes = [ui.instituicao_id for ui in current_user.instituicoes]
-            if arquivo.instituicao_id not in user_instituicoes:
-                flash('Você não tem permissão para acessar este arquivo.', 'danger')
-                return redirect(url_for('files.listar_arquivos'))
-        
-        return f(arquivo_id, *args, **kwargs)
-    return decorated_function
-
 # Rotas
 @files_bp.route('/arquivos')
 @login_required
@@ -83,28 +74,28 @@ def listar_arquivos():
     termo = request.args.get('termo', '')
     
     # Construir query base
-    query = Arquivo.query.filter(
-        (Arquivo.usuario_id == current_user.id) |
-        (Arquivo.publico == True)
-    )
+    query = Arquivo.query.filter(filtro_acesso_arquivos())
     
     # Aplicar filtros
     if tipo:
         query = query.filter(Arquivo.tipo == tipo)
     
     if termo:
-        query = query.filter(
-            (Arquivo.nome.ilike(f'%{termo}%')) |
-            (Arquivo.conteudo_texto.ilike(f'%{termo}%'))
-        )
-    
-    # Ordenar por data de upload (mais recentes primeiro)
-    arquivos = query.order_by(Arquivo.data_upload.desc()).all()
+        # Pesquisa no índice textual, ordenada por relevância
+        arquivos = aplicar_pesquisa(query, termo).all()
+        paginas = localizar_paginas(arquivos, termo)
+        trechos = gerar_trechos(arquivos, termo, paginas)
+    else:
+        # Ordenar por data de upload (mais recentes primeiro)
+        arquivos = query.order_by(Arquivo.data_upload.desc()).all()
+        paginas = {}
+        trechos = {}
     
-    return render_template('files/listar_arquivos.html', arquivos=arquivos, form=form)
+    return render_template('files/listar_arquivos.html', arquivos=arquivos, form=form, trechos=trechos, paginas=paginas)
 
 @files_bp.route('/arquivos/upload', methods=['GET', 'POST'])
 @login_required
+@upload_em_fluxo
 def upload_arquivo():
     """
     Página e processamento de upload de arquivos.
@@ -121,95 +112,43 @@ def upload_arquivo():
         
         if arquivo and allowed_file(arquivo.filename):
             try:
-                # Gerar nome seguro e único para o arquivo
-                nome_original = secure_filename(arquivo.filename)
-                nome_base, extensao = os.path.splitext(nome_original)
-                nome_arquivo = f"{nome_base}_{uuid.uuid4().hex}{extensao}"
+                # Conteúdo já identificado, validado, medido e com hash
+                # calculado durante o recebimento da requisição
+                recebido = receber_upload(arquivo)
                 
-                # Caminho completo para salvar o arquivo
-                caminho_arquivo = os.path.join(UPLOAD_FOLDER, nome_arquivo)
-                
-                # Salvar arquivo temporariamente
-                arquivo.save(caminho_arquivo)
-                
-                # Verificar tipo MIME
-                mime_type = magic.Magic(mime=True).from_file(caminho_arquivo)
-                
-                # Validar tipo de arquivo
-                if not validar_arquivo(caminho_arquivo, mime_type):
-                    os.remove(caminho_arquivo)
-                    flash('Tipo de arquivo não permitido.', 'danger')
+                if recebido.rejeitado:
+                    flash(recebido.erro, 'danger')
                     return render_template('files/upload_arquivo.html', form=form)
                 
-                # Calcular hash do arquivo
-                hash_arquivo = hashlib.sha256()
-                with open(caminho_arquivo, "rb") as f:
-                    for byte_block in iter(lambda: f.read(4096), b""):
-                        hash_arquivo.update(byte_block)
-                hash_conteudo = hash_arquivo.hexdigest()
-                
-                # Extrair texto do arquivo
-                conteudo_texto = extrair_texto_arquivo(caminho_arquivo, mime_type)
-                
-                # Obter tamanho do arquivo
-                tamanho_arquivo = os.path.getsize(caminho_arquivo)
-                
-                # Determinar tipo de arquivo para categorização
-                tipo_arquivo = 'outro'
-                if mime_type == 'application/pdf':
-                    tipo_arquivo = 'pdf'
-                elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-                    tipo_arquivo = 'doc'
-                elif mime_type == 'text/plain':
-                    tipo_arquivo = 'txt'
-                
                 # Criar registro de arquivo no banco de dados
-                novo_arquivo = Arquivo(
-                    nome=nome_original,
-                    tipo=tipo_arquivo,
-                    extensao=extensao[1:].lower(),
-                    tamanho=tamanho_arquivo,
-                    caminho=nome_arquivo,
-                    hash_conteudo=hash_conteudo,
-                    conteudo_texto=conteudo_texto,
-                    metadados=json.dumps({
-                        'mime_type': mime_type,
-                        'upload_ip': request.remote_addr,
-                        'user_agent': request.user_agent.string
-                    }),
+                novo_arquivo = criar_arquivo(
+                    recebido,
+                    arquivo.filename,
                     usuario_id=current_user.id,
                     instituicao_id=form.instituicao_id.data if form.instituicao_id.data != 0 else None,
-                    publico=form.publico.data
-                )
-                
-                db.session.add(novo_arquivo)
-                db.session.flush()  # Para obter o ID do arquivo
-                
-                # Ler conteúdo do arquivo para armazenar no banco de dados
-                with open(caminho_arquivo, 'rb') as f:
-                    conteudo_binario = f.read()
-                
-                # Criar registro de conteúdo do arquivo
-                arquivo_conteudo = ArquivoConteudo(
-                    arquivo_id=novo_arquivo.id,
-                    conteudo=conteudo_binario
+                    publico=form.publico.data,
+                    metadados={
+                        'upload_ip': request.remote_addr,
+                        'user_agent': request.user_agent.string
+                    }
                 )
                 
-                db.session.add(arquivo_conteudo)
                 db.session.commit()
                 
-                # Remover arquivo temporário
-                os.remove(caminho_arquivo)
+                # Extrair o texto em segundo plano, sem bloquear a requisição
+                agendar_extracao(novo_arquivo)
                 
-                flash('Arquivo enviado com sucesso!', 'success')
+                if em_quarentena(novo_arquivo):
+                    flash(f'O arquivo foi colocado em quarentena: a verificação antivírus detectou {novo_arquivo.ameaca_detectada}.', 'danger')
+                else:
+                    flash('Arquivo enviado com sucesso!', 'success')
                 return redirect(url_for('files.listar_arquivos'))
                 
+            except CotaExcedida as e:
+                db.session.rollback()
+                flash(str(e), 'danger')
             except Exception as e:
                 db.session.rollback()
-                # Remover arquivo temporário em caso de erro
-                if os.path.exists(caminho_arquivo):
-                    os.remove(caminho_arquivo)
-                
                 flash(f'Erro ao processar arquivo: {str(e)}', 'danger')
         else:
             flash('Tipo de arquivo não permitido. Apenas PDF, DOC, DOCX e TXT são aceitos.', 'danger')
@@ -219,43 +158,138 @@ def upload_arquivo():
 @files_bp.route('/arquivos/<int:arquivo_id>')
 @login_required
 @arquivo_access_required
-def visualizar_arquivo(arquivo_id):
+def visualizar_arquivo(arquivo_id, arquivo):
     """
     Visualiza detalhes de um arquivo específico.
     """
-    arquivo = Arquivo.query.get_or_404(arquivo_id)
+    # Páginas do PDF exibidas como imagens carregadas sob demanda
+    total_paginas = obter_total_paginas(arquivo)
+    
+    # Documentos quase idênticos acessíveis ao usuário (painel "Documentos semelhantes")
+    similares = buscar_similares(arquivo)
+    
+    # Histórico de versões (a atual primeiro)
+    versoes = listar_versoes(arquivo)['versoes']
     
-    return render_template('files/visualizar_arquivo.html', arquivo=arquivo)
+    return render_template('files/visualizar_arquivo.html', arquivo=arquivo, total_paginas=total_paginas,
+                           largura_pagina=LARGURA_PAGINA, similares=similares, versoes=versoes)
+
+@files_bp.route('/arquivos/<int:arquivo_id>/extracao')
+@login_required
+@arquivo_access_required
+def status_extracao_arquivo(arquivo_id, arquivo):
+    """
+    Retorna o estado da extração de texto de um arquivo (consultado pela página do arquivo).
+    """
+    return jsonify({
+        'id': arquivo.id,
+        'status_extracao': arquivo.status_extracao,
+        'status_verificacao': arquivo.status_verificacao,
+        'erro_extracao': arquivo.erro_extracao,
+        'falha_extracao': arquivo.falha_extracao,
+        'data_extracao': arquivo.data_extracao.isoformat() if arquivo.data_extracao else None
+    })
 
 @files_bp.route('/arquivos/<int:arquivo_id>/download')
 @login_required
 @arquivo_access_required
-def download_arquivo(arquivo_id):
+def download_arquivo(arquivo_id, arquivo):
     """
     Faz o download de um arquivo específico.
+    
+    Com o parâmetro inline=1 o arquivo é exibido no navegador (visualizador de PDF).
     """
-    arquivo = Arquivo.query.get_or_404(arquivo_id)
-    arquivo_conteudo = ArquivoConteudo.query.filter_by(arquivo_id=arquivo.id).first()
+    como_anexo = request.args.get('inline', '0') != '1'
+    
+    if em_quarentena(arquivo):
+        flash('Este arquivo está em quarentena (ameaça detectada pela verificação antivírus) e não pode ser baixado.', 'danger')
+        return redirect(url_for('files.visualizar_arquivo', arquivo_id=arquivo.id))
     
-    if not arquivo_conteudo:
+    # Com um servidor de downloads configurado, redirecionar para uma URL
+    # assinada de curta duração, servida sem passar pela aplicação
+    assinada = gerar_url_download_assinada(arquivo, como_anexo=como_anexo)
+    if assinada:
+        return redirect(assinada[0])
+    
+    # Enviar o conteúdo diretamente do armazenamento (ETag, Range e GET condicional)
+    resposta = enviar_conteudo_arquivo(arquivo, como_anexo=como_anexo)
+    
+    if resposta is None:
         flash('Conteúdo do arquivo não encontrado.', 'danger')
         return redirect(url_for('files.listar_arquivos'))
     
-    # Criar arquivo temporário para download
-    temp_path = os.path.join(UPLOAD_FOLDER, arquivo.caminho)
-    with open(temp_path, 'wb') as f:
-        f.write(arquivo_conteudo.conteudo)
+    return resposta
+
+def _enviar_exportacao(arquivos, nome_pacote):
+    """Envia o pacote ZIP dos arquivos ou, sem arquivos, volta à listagem."""
+    if not arquivos:
+        flash('Nenhum arquivo disponível para exportação.', 'warning')
+        return redirect(url_for('files.listar_arquivos'))
+
+    return enviar_zip(arquivos, nome_pacote)
+
+@files_bp.route('/arquivos/exportar/tarefa/<int:tarefa_id>')
+@login_required
+def exportar_arquivos_tarefa(tarefa_id):
+    """
+    Baixa em um pacote ZIP os arquivos anexados a uma tarefa (apenas os acessíveis ao usuário).
+    """
+    arquivos = consultar_arquivos_exportacao(tarefa_id=tarefa_id)
+    return _enviar_exportacao(arquivos, f'tarefa_{tarefa_id}.zip')
+
+@files_bp.route('/arquivos/exportar/instituicao/<int:instituicao_id>')
+@login_required
+def exportar_arquivos_instituicao(instituicao_id):
+    """
+    Baixa em um pacote ZIP os documentos de uma instituição (apenas os acessíveis ao usuário).
+    """
+    arquivos = consultar_arquivos_exportacao(instituicao_id=instituicao_id)
+    return _enviar_exportacao(arquivos, f'instituicao_{instituicao_id}.zip')
+
+@files_bp.route('/arquivos/exportar', methods=['GET', 'POST'])
+@login_required
+def exportar_arquivos_selecionados():
+    """
+    Baixa em um pacote ZIP os arquivos selecionados.
+
+    Os IDs são informados no parâmetro 'ids', repetido ou separado por vírgulas.
+    """
+    valores = request.values.getlist('ids')
+    try:
+        ids = sorted({int(valor) for campo in valores for valor in campo.split(',') if valor.strip()})
+    except ValueError:
+        ids = []
+
+    arquivos = consultar_arquivos_exportacao(ids=ids) if ids else []
+    return _enviar_exportacao(arquivos, 'arquivos.zip')
+
+@files_bp.route('/arquivos/<int:arquivo_id>/miniatura')
+@login_required
+@arquivo_access_required
+def miniatura_arquivo(arquivo_id, arquivo):
+    """
+    Envia a miniatura (primeira página) de um arquivo PDF.
+    """
+    resposta = enviar_imagem_pagina(arquivo, 1, LARGURA_MINIATURA)
+    if resposta is None:
+        abort(404)
+    
+    return resposta
+
+@files_bp.route('/arquivos/<int:arquivo_id>/paginas/<int:pagina>')
+@login_required
+@arquivo_access_required
+def pagina_arquivo(arquivo_id, pagina, arquivo):
+    """
+    Envia a imagem de uma página de um arquivo PDF (renderizada sob demanda).
+    """
+    largura = request.args.get('largura', LARGURA_PAGINA, type=int)
     
-    # Determinar tipo MIME
-    mime_type = mimetypes.guess_type(arquivo.nome)[0] or 'application/octet-stream'
+    resposta = enviar_imagem_pagina(arquivo, pagina, largura)
+    if resposta is None:
+        abort(404)
     
-    # Enviar arquivo
-    return send_file(
-        temp_path,
-        mimetype=mime_type,
-        as_attachment=True,
-        download_name=arquivo.nome
-    )
+    return resposta
 
 @files_bp.route('/arquivos/<int:arquivo_id>/excluir', methods=['POST'])
 @login_required
@@ -271,11 +305,29 @@ def excluir_arquivo(arquivo_id):
         return redirect(url_for('files.listar_arquivos'))
     
     try:
+        # Descontar o arquivo e suas versões do uso de armazenamento
+        registrar_exclusao(arquivo)
+        
+        # Liberar a referência ao conteúdo armazenado
+        hash_orfao = liberar_blob(arquivo.blob)
+        
+        # Liberar os fragmentos e blobs das versões anteriores
+        hashes_versoes = remover_versoes(arquivo)
+        
+        # Remover o arquivo do índice de pesquisa
+        remover_arquivo_indice(arquivo.id)
+        remover_similaridade(arquivo.id)
+        
         # Excluir arquivo do banco de dados
-        # A exclusão em cascata cuidará do conteúdo do arquivo
+        # A exclusão em cascata cuidará do conteúdo legado do arquivo
         db.session.delete(arquivo)
         db.session.commit()
         
+        # Remover o conteúdo se nenhum outro arquivo o referencia
+        remover_conteudo_orfao(hash_orfao)
+        for hash_versao in hashes_versoes:
+            remover_conteudo_orfao(hash_versao)
+        
         flash('Arquivo excluído com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -308,8 +360,10 @@ def editar_arquivo(arquivo_id):
     
     if form.validate_on_submit():
         try:
-            # Atualizar informações do arquivo
-            arquivo.instituicao_id = form.instituicao_id.data if form.instituicao_id.data != 0 else None
+            # Atualizar informações do arquivo (o uso passa para a nova instituição)
+            instituicao_id = form.instituicao_id.data if form.instituicao_id.data != 0 else None
+            transferir_instituicao(arquivo, instituicao_id)
+            arquivo.instituicao_id = instituicao_id
             arquivo.publico = form.publico.data
             
             db.session.commit()
@@ -317,6 +371,9 @@ def editar_arquivo(arquivo_id):
             flash('Informações do arquivo atualizadas com sucesso!', 'success')
             return redirect(url_for('files.visualizar_arquivo', arquivo_id=arquivo.id))
             
+        except CotaExcedida as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao atualizar informações do arquivo: {str(e)}', 'danger')
@@ -348,23 +405,22 @@ def api_listar_arquivos():
     termo = request.args.get('termo', '')
     
     # Construir query base
-    query = Arquivo.query.filter(
-        (Arquivo.usuario_id == current_user.id) |
-        (Arquivo.publico == True)
-    )
+    query = Arquivo.query.filter(filtro_acesso_arquivos())
     
     # Aplicar filtros
     if tipo:
         query = query.filter(Arquivo.tipo == tipo)
     
     if termo:
-        query = query.filter(
-            (Arquivo.nome.ilike(f'%{termo}%')) |
-            (Arquivo.conteudo_texto.ilike(f'%{termo}%'))
-        )
-    
-    # Ordenar por data de upload (mais recentes primeiro)
-    arquivos = query.order_by(Arquivo.data_upload.desc()).all()
+        # Pesquisa no índice textual, ordenada por relevância
+        arquivos = aplicar_pesquisa(query, termo).all()
+        paginas = localizar_paginas(arquivos, termo)
+        trechos = gerar_trechos(arquivos, termo, paginas)
+    else:
+        # Ordenar por data de upload (mais recentes primeiro)
+        arquivos = query.order_by(Arquivo.data_upload.desc()).all()
+        paginas = {}
+        trechos = {}
     
     # Formatar resposta
     resultado = []
@@ -379,30 +435,34 @@ def api_listar_arquivos():
             'instituicao_id': arquivo.instituicao_id,
             'publico': arquivo.publico,
             'data_upload': arquivo.data_upload.isoformat(),
-            'data_atualizacao': arquivo.data_atualizacao.isoformat()
+            'data_atualizacao': arquivo.data_atualizacao.isoformat(),
+            'trecho': str(trechos[arquivo.id]) if arquivo.id in trechos else None,
+            'paginas': paginas.get(arquivo.id, [])
         })
     
     return jsonify(resultado)
 
+@files_bp.route('/api/arquivos/uso', methods=['GET'])
+@login_required
+def api_uso_armazenamento():
+    """
+    API para consultar o uso de armazenamento e as cotas do usuário e de suas instituições.
+    """
+    return jsonify({
+        'usuario': resumo_uso(ESCOPO_USUARIO, current_user.id),
+        'instituicoes': [
+            dict(resumo_uso(ESCOPO_INSTITUICAO, ui.instituicao_id), id=ui.instituicao_id, nome=ui.instituicao.nome)
+            for ui in current_user.instituicoes
+        ]
+    })
+
 @files_bp.route('/api/arquivos/<int:arquivo_id>', methods=['GET'])
 @login_required
-def api_obter_arquivo(arquivo_id):
+@api_arquivo_access_required
+def api_obter_arquivo(arquivo_id, arquivo):
     """
     API para obter informações de um arquivo específico.
     """
-    arquivo = Arquivo.query.get_or_404(arquivo_id)
-    
-    # Verificar se o usuário tem acesso ao arquivo
-    if not arquivo.publico and arquivo.usuario_id != current_user.id:
-        # Verificar se o usuário pertence à mesma instituição
-        if not arquivo.instituicao_id or not current_user.instituicoes:
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        # Verificar se o usuário pertence à instituição do arquivo
-        user_instituicoes = [ui.instituicao_id for ui in current_user.instituicoes]
-        if arquivo.instituicao_id not in user_instituicoes:
-            return jsonify({'error': 'Acesso negado'}), 403
-    
     # Formatar resposta
     resultado = {
         'id': arquivo.id,
@@ -410,116 +470,319 @@ def api_obter_arquivo(arquivo_id):
         'tipo': arquivo.tipo,
         'extensao': arquivo.extensao,
         'tamanho': arquivo.tamanho,
+        'tamanho_armazenado': arquivo.tamanho_armazenado,
         'usuario_id': arquivo.usuario_id,
         'instituicao_id': arquivo.instituicao_id,
         'publico': arquivo.publico,
         'data_upload': arquivo.data_upload.isoformat(),
         'data_atualizacao': arquivo.data_atualizacao.isoformat(),
-        'conteudo_texto': arquivo.conteudo_texto
+        'conteudo_texto': arquivo.conteudo_texto,
+        'status_extracao': arquivo.status_extracao,
+        'status_verificacao': arquivo.status_verificacao
     }
     
     return jsonify(resultado)
 
-@files_bp.route('/api/arquivos', methods=['POST'])
+@files_bp.route('/api/arquivos/<int:arquivo_id>/similares', methods=['GET'])
 @login_required
-def api_upload_arquivo():
+@api_arquivo_access_required
+def api_obter_similares(arquivo_id, arquivo):
     """
-    API para upload de arquivos.
+    API para obter os documentos quase idênticos a um arquivo.
+    
+    Apenas os arquivos que o usuário pode acessar são retornados.
+    """
+    resultado = []
+    for similar, valor in buscar_similares(arquivo):
+        resultado.append({
+            'id': similar.id,
+            'nome': similar.nome,
+            'tipo': similar.tipo,
+            'usuario_id': similar.usuario_id,
+            'instituicao_id': similar.instituicao_id,
+            'data_upload': similar.data_upload.isoformat(),
+            'similaridade': round(valor, 3)
+        })
+    
+    return jsonify(resultado)
+
+@files_bp.route('/api/arquivos/<int:arquivo_id>/versoes', methods=['GET'])
+@login_required
+@api_arquivo_access_required
+def api_listar_versoes(arquivo_id, arquivo):
+    """
+    API para listar as versões de um arquivo (a atual primeiro).
+    
+    Inclui a soma dos tamanhos das versões e o espaço efetivamente ocupado
+    pelo histórico (fragmentos compartilhados entre versões contam uma vez).
     """
+    return jsonify(listar_versoes(arquivo))
+
+@files_bp.route('/api/arquivos/<int:arquivo_id>/versoes', methods=['POST'])
+@login_required
+@upload_em_fluxo
+def api_criar_versao(arquivo_id):
+    """
+    API para enviar uma nova versão do conteúdo de um arquivo.
+    
+    O conteúdo atual passa a ser a versão anterior mais recente. Campos:
+    arquivo (obrigatório) e comentario (opcional).
+    """
+    arquivo = Arquivo.query.get_or_404(arquivo_id)
+    
+    # Verificar se o usuário é o proprietário do arquivo
+    if arquivo.usuario_id != current_user.id:
+        return jsonify({'error': 'Acesso negado'}), 403
+    
     if 'arquivo' not in request.files:
         return jsonify({'error': 'Nenhum arquivo enviado'}), 400
     
-    arquivo = request.files['arquivo']
+    enviado = request.files['arquivo']
     
-    if arquivo.filename == '':
+    if enviado.filename == '':
         return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
     
-    if not allowed_file(arquivo.filename):
+    if not allowed_file(enviado.filename):
         return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
     
     try:
-        # Gerar nome seguro e único para o arquivo
-        nome_original = secure_filename(arquivo.filename)
-        nome_base, extensao = os.path.splitext(nome_original)
-        nome_arquivo = f"{nome_base}_{uuid.uuid4().hex}{extensao}"
-        
-        # Caminho completo para salvar o arquivo
-        caminho_arquivo = os.path.join(UPLOAD_FOLDER, nome_arquivo)
+        recebido = receber_upload(enviado)
         
-        # Salvar arquivo temporariamente
-        arquivo.save(caminho_arquivo)
+        if recebido.rejeitado:
+            return jsonify({'error': recebido.erro}), 400
         
-        # Verificar tipo MIME
-        mime_type = magic.Magic(mime=True).from_file(caminho_arquivo)
+        try:
+            versao = criar_versao(
+                arquivo,
+                recebido,
+                enviado.filename,
+                usuario_id=current_user.id,
+                comentario=(request.form.get('comentario') or '').strip()[:255] or None,
+                metadados={
+                    'upload_ip': request.remote_addr,
+                    'user_agent': request.user_agent.string
+                }
+            )
+        except CotaExcedida as e:
+            db.session.rollback()
+            recebido.descartar()
+            return jsonify({'error': str(e)}), 413
+        except ValueError as e:
+            db.session.rollback()
+            recebido.descartar()
+            return jsonify({'error': str(e)}), 409
         
-        # Validar tipo de arquivo
-        if not validar_arquivo(caminho_arquivo, mime_type):
-            os.remove(caminho_arquivo)
-            return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
+        db.session.commit()
         
-        # Calcular hash do arquivo
-        hash_arquivo = hashlib.sha256()
-        with open(caminho_arquivo, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                hash_arquivo.update(byte_block)
-        hash_conteudo = hash_arquivo.hexdigest()
+        # Extrair o texto da nova versão e fragmentar a anterior em segundo plano
+        agendar_extracao(arquivo)
+        agendar_fragmentacao(versao)
         
-        # Extrair texto do arquivo
-        conteudo_texto = extrair_texto_arquivo(caminho_arquivo, mime_type)
+        return jsonify({
+            'id': arquivo.id,
+            'versao': versao.numero + 1,
+            'nome': arquivo.nome,
+            'tamanho': arquivo.tamanho,
+            'hash_conteudo': arquivo.hash_conteudo,
+            'status_extracao': arquivo.status_extracao,
+            'status_verificacao': arquivo.status_verificacao
+        }), 201
         
-        # Obter tamanho do arquivo
-        tamanho_arquivo = os.path.getsize(caminho_arquivo)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/api/arquivos/<int:arquivo_id>/versoes/<int:numero>/download', methods=['GET'])
+@login_required
+@api_arquivo_access_required
+def api_download_versao(arquivo_id, numero, arquivo):
+    """
+    API para baixar o conteúdo de uma versão específica de um arquivo.
+    
+    Com o parâmetro inline=1 o arquivo é exibido no navegador.
+    """
+    como_anexo = request.args.get('inline', '0') != '1'
+    
+    versao = obter_versao(arquivo, numero)
+    if versao is None:
+        # A versão atual é o próprio arquivo
+        if numero == numero_versao_atual(arquivo):
+            if em_quarentena(arquivo):
+                return jsonify({'error': 'Arquivo em quarentena (ameaça detectada pela verificação antivírus)'}), 403
+            resposta = enviar_conteudo_arquivo(arquivo, como_anexo=como_anexo)
+            if resposta is not None:
+                return resposta
+        return jsonify({'error': 'Versão não encontrada'}), 404
+    
+    return enviar_conteudo_versao(arquivo, versao, como_anexo=como_anexo)
+
+@files_bp.route('/api/arquivos/<int:arquivo_id>/versoes/diferencas', methods=['GET'])
+@login_required
+@api_arquivo_access_required
+def api_comparar_versoes(arquivo_id, arquivo):
+    """
+    API para comparar o texto extraído de duas versões de um arquivo.
+    
+    Parâmetros: de e para (números das versões; padrão: a versão anterior e
+    a atual) e contexto (linhas ao redor de cada alteração, padrão 3).
+    """
+    atual = numero_versao_atual(arquivo)
+    para = request.args.get('para', atual, type=int)
+    de = request.args.get('de', para - 1, type=int)
+    contexto = min(max(request.args.get('contexto', 3, type=int), 0), 50)
+    
+    if not (1 <= de <= atual and 1 <= para <= atual):
+        return jsonify({'error': 'Versão não encontrada'}), 404
+    
+    resultado = comparar_versoes(arquivo, de, para, contexto=contexto)
+    if resultado is None:
+        return jsonify({'error': 'O texto de uma das versões ainda não foi extraído'}), 409
+    
+    return jsonify(resultado)
+
+@files_bp.route('/api/arquivos/<int:arquivo_id>/url-download', methods=['GET'])
+@login_required
+@api_arquivo_access_required
+def api_url_download_arquivo(arquivo_id, arquivo):
+    """
+    API para obter uma URL de download assinada e de curta duração.
+    
+    Com o parâmetro inline=1 a URL exibe o arquivo no navegador.
+    """
+    if em_quarentena(arquivo):
+        return jsonify({'error': 'Arquivo em quarentena (ameaça detectada pela verificação antivírus)'}), 403
+    
+    assinada = gerar_url_download_assinada(arquivo, como_anexo=request.args.get('inline', '0') != '1')
+    if assinada is None:
+        return jsonify({'error': 'URLs de download assinadas não estão disponíveis'}), 404
+    
+    url, expira = assinada
+    return jsonify({
+        'url': url,
+        'expira': datetime.datetime.fromtimestamp(expira, datetime.timezone.utc).isoformat()
+    })
+
+@files_bp.route('/api/arquivos/<int:arquivo_id>/paginas', methods=['GET'])
+@login_required
+@api_arquivo_access_required
+def api_obter_paginas_arquivo(arquivo_id, arquivo):
+    """
+    API para obter o texto de um intervalo de páginas de um arquivo.
+    
+    Parâmetros: inicio e fim (números de página, inclusive). Arquivos sem
+    texto por página (DOCX, TXT) são tratados como uma única página.
+    """
+    inicio = request.args.get('inicio', 1, type=int)
+    fim = request.args.get('fim', inicio, type=int)
+    
+    if inicio < 1 or fim < inicio:
+        return jsonify({'error': 'Intervalo de páginas inválido'}), 400
+    
+    if fim - inicio + 1 > MAXIMO_PAGINAS_POR_REQUISICAO:
+        return jsonify({'error': f'Solicite no máximo {MAXIMO_PAGINAS_POR_REQUISICAO} páginas por vez'}), 400
+    
+    total_paginas = arquivo.paginas.count()
+    
+    if total_paginas:
+        registros = arquivo.paginas.filter(PaginaArquivo.numero.between(inicio, fim)).all()
+        paginas = [{'numero': p.numero, 'texto': p.texto} for p in registros]
+    else:
+        # Documento sem divisão em páginas
+        total_paginas = 1 if arquivo.conteudo_texto is not None else 0
+        paginas = [{'numero': 1, 'texto': arquivo.conteudo_texto}] if inicio == 1 and total_paginas else []
+    
+    return jsonify({
+        'arquivo_id': arquivo.id,
+        'status_extracao': arquivo.status_extracao,
+        'status_verificacao': arquivo.status_verificacao,
+        'total_paginas': total_paginas,
+        'inicio': inicio,
+        'fim': min(fim, total_paginas),
+        'paginas': paginas
+    })
+
+def _instituicao_informada():
+    """
+    Valida o 'instituicao_id' enviado pelo cliente em um upload.
+
+    O ID vem do formulário ou do corpo JSON e só é aceito se o usuário
+    atual pertencer à instituição; o uso do arquivo é cobrado da cota dela.
+
+    Returns:
+        Tupla (instituicao_id, resposta de erro); instituicao_id é None se
+        nenhuma instituição foi informada, e a resposta de erro é None se o
+        ID for válido
+    """
+    if request.is_json:
+        valor = (request.get_json(silent=True) or {}).get('instituicao_id')
+    else:
+        valor = request.form.get('instituicao_id')
+
+    if valor in (None, '', 0, '0'):
+        return None, None
+
+    try:
+        if isinstance(valor, bool):
+            raise ValueError(valor)
+        instituicao_id = int(valor)
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': 'Instituição inválida'}), 400)
+
+    if instituicao_id not in obter_instituicoes_usuario():
+        return None, (jsonify({'error': 'Você não pertence a esta instituição'}), 403)
+
+    return instituicao_id, None
+
+@files_bp.route('/api/arquivos', methods=['POST'])
+@login_required
+@upload_em_fluxo
+def api_upload_arquivo():
+    """
+    API para upload de arquivos.
+    """
+    if 'arquivo' not in request.files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    
+    arquivo = request.files['arquivo']
+    
+    if arquivo.filename == '':
+        return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+    
+    if not allowed_file(arquivo.filename):
+        return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
+    
+    instituicao_id, erro = _instituicao_informada()
+    if erro:
+        return erro
+    
+    try:
+        # Conteúdo já identificado, validado, medido e com hash
+        # calculado durante o recebimento da requisição
+        recebido = receber_upload(arquivo)
         
-        # Determinar tipo de arquivo para categorização
-        tipo_arquivo = 'outro'
-        if mime_type == 'application/pdf':
-            tipo_arquivo = 'pdf'
-        elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-            tipo_arquivo = 'doc'
-        elif mime_type == 'text/plain':
-            tipo_arquivo = 'txt'
+        if recebido.rejeitado:
+            return jsonify({'error': recebido.erro}), 400
         
         # Obter parâmetros adicionais
-        instituicao_id = request.form.get('instituicao_id', None)
         publico = request.form.get('publico', 'false').lower() == 'true'
         
         # Criar registro de arquivo no banco de dados
-        novo_arquivo = Arquivo(
-            nome=nome_original,
-            tipo=tipo_arquivo,
-            extensao=extensao[1:].lower(),
-            tamanho=tamanho_arquivo,
-            caminho=nome_arquivo,
-            hash_conteudo=hash_conteudo,
-            conteudo_texto=conteudo_texto,
-            metadados=json.dumps({
-                'mime_type': mime_type,
-                'upload_ip': request.remote_addr,
-                'user_agent': request.user_agent.string
-            }),
+        novo_arquivo = criar_arquivo(
+            recebido,
+            arquivo.filename,
             usuario_id=current_user.id,
             instituicao_id=instituicao_id,
-            publico=publico
-        )
-        
-        db.session.add(novo_arquivo)
-        db.session.flush()  # Para obter o ID do arquivo
-        
-        # Ler conteúdo do arquivo para armazenar no banco de dados
-        with open(caminho_arquivo, 'rb') as f:
-            conteudo_binario = f.read()
-        
-        # Criar registro de conteúdo do arquivo
-        arquivo_conteudo = ArquivoConteudo(
-            arquivo_id=novo_arquivo.id,
-            conteudo=conteudo_binario
+            publico=publico,
+            metadados={
+                'upload_ip': request.remote_addr,
+                'user_agent': request.user_agent.string
+            }
         )
         
-        db.session.add(arquivo_conteudo)
         db.session.commit()
         
-        # Remover arquivo temporário
-        os.remove(caminho_arquivo)
+        # Extrair o texto em segundo plano, sem bloquear a requisição
+        agendar_extracao(novo_arquivo)
         
         # Formatar resposta
         resultado = {
@@ -532,19 +795,307 @@ def api_upload_arquivo():
             'instituicao_id': novo_arquivo.instituicao_id,
             'publico': novo_arquivo.publico,
             'data_upload': novo_arquivo.data_upload.isoformat(),
-            'data_atualizacao': novo_arquivo.data_atualizacao.isoformat()
+            'data_atualizacao': novo_arquivo.data_atualizacao.isoformat(),
+            'status_extracao': novo_arquivo.status_extracao,
+            'status_verificacao': novo_arquivo.status_verificacao
         }
         
         return jsonify(resultado), 201
         
+    except CotaExcedida as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/api/arquivos/hash', methods=['POST'])
+@login_required
+def api_upload_por_hash():
+    """
+    API para criar um arquivo a partir do hash do conteúdo, sem enviá-lo.
+
+    Recebe JSON com 'hash' (SHA-256 do conteúdo), 'nome' e, opcionalmente,
+    'instituicao_id' e 'publico'. Se o usuário tiver acesso a um arquivo com
+    o mesmo conteúdo, o novo arquivo reutiliza o conteúdo, o texto extraído
+    e os metadados. Caso contrário, a resposta é 404 (a mesma quando o
+    conteúdo não existe) e o arquivo deve ser enviado normalmente.
+    """
+    dados = request.get_json(silent=True) or {}
+    hash_conteudo = (dados.get('hash') or '').lower()
+    nome = dados.get('nome') or ''
+
+    if not PADRAO_HASH.match(hash_conteudo):
+        return jsonify({'error': 'Hash SHA-256 inválido'}), 400
+
+    if not nome or not allowed_file(nome):
+        return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
+
+    instituicao_id, erro = _instituicao_informada()
+    if erro:
+        return erro
+
+    origem = localizar_conteudo_acessivel(hash_conteudo, current_user)
+    if origem is None:
+        return jsonify({'error': 'Conteúdo não encontrado; envie o arquivo.'}), 404
+
+    try:
+        novo_arquivo = criar_arquivo_por_hash(
+            origem,
+            nome,
+            usuario_id=current_user.id,
+            instituicao_id=instituicao_id,
+            publico=bool(dados.get('publico', False)),
+            metadados={
+                'upload_ip': request.remote_addr,
+                'user_agent': request.user_agent.string
+            }
+        )
+
+        db.session.commit()
+
+        # Sem extração reaproveitável, extrair como em um upload comum
+        if novo_arquivo.status_extracao != 'concluido':
+            agendar_extracao(novo_arquivo)
+
+    except CotaExcedida as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        # Remover arquivo temporário em caso de erro
-        if os.path.exists(caminho_arquivo):
-            os.remove(caminho_arquivo)
-        
         return jsonify({'error': str(e)}), 500
 
+    return jsonify({
+        'id': novo_arquivo.id,
+        'nome': novo_arquivo.nome,
+        'tipo': novo_arquivo.tipo,
+        'extensao': novo_arquivo.extensao,
+        'tamanho': novo_arquivo.tamanho,
+        'usuario_id': novo_arquivo.usuario_id,
+        'instituicao_id': novo_arquivo.instituicao_id,
+        'publico': novo_arquivo.publico,
+        'data_upload': novo_arquivo.data_upload.isoformat(),
+        'data_atualizacao': novo_arquivo.data_atualizacao.isoformat(),
+        'status_extracao': novo_arquivo.status_extracao,
+        'status_verificacao': novo_arquivo.status_verificacao
+    }), 201
+
+
+@files_bp.route('/api/arquivos/lote', methods=['POST'])
+@login_required
+@upload_em_fluxo
+def api_upload_lote():
+    """
+    API para upload de vários arquivos em uma requisição.
+
+    Aceita vários arquivos no campo 'arquivos' e/ou pacotes ZIP (no mesmo
+    campo, com extensão .zip). Os arquivos dos pacotes são extraídos em
+    paralelo e cada arquivo é validado e registrado separadamente, de modo
+    que a falha de um não impede o registro dos demais.
+    """
+    # Limites do lote definidos antes da leitura do formulário
+    configurar_requisicao_lote(request)
+
+    enviados = [arquivo for arquivo in request.files.getlist('arquivos') if arquivo.filename]
+    if not enviados:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+
+    instituicao_id, erro = _instituicao_informada()
+    if erro:
+        return erro
+
+    maximo_arquivos = current_app.config.get('LOTE_MAXIMO_ARQUIVOS', 500)
+    recebidos = []
+
+    try:
+        for arquivo in enviados:
+            recebido = receber_upload(arquivo)
+
+            if not arquivo.filename.lower().endswith('.zip'):
+                recebidos.append(recebido)
+                continue
+
+            if recebido.rejeitado:
+                return jsonify({'error': f'{arquivo.filename}: {recebido.erro}'}), 400
+
+            extraidos = extrair_pacote_zip(
+                recebido.caminho_temporario,
+                maximo_arquivos - len(recebidos),
+                limite_bytes_arquivo=current_app.config.get('MAX_CONTENT_LENGTH'),
+                limite_bytes_total=current_app.config.get('LOTE_LIMITE_DESCOMPACTADO'),
+                workers=current_app.config.get('LOTE_WORKERS', 4)
+            )
+            request.receptores_upload.extend(extraidos)
+            recebidos.extend(extraidos)
+            recebido.descartar()
+
+        if len(recebidos) > maximo_arquivos:
+            return jsonify({'error': f'O lote excede o limite de {maximo_arquivos} arquivos.'}), 400
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Obter parâmetros adicionais
+    publico = request.form.get('publico', 'false').lower() == 'true'
+
+    resultados = registrar_lote(
+        recebidos,
+        usuario_id=current_user.id,
+        instituicao_id=instituicao_id,
+        publico=publico,
+        metadados={
+            'upload_ip': request.remote_addr,
+            'user_agent': request.user_agent.string,
+            'upload_lote': True
+        }
+    )
+
+    criados = sum(1 for resultado in resultados if resultado['status'] == STATUS_CRIADO)
+
+    return jsonify({
+        'total': len(resultados),
+        'criados': criados,
+        'erros': len(resultados) - criados,
+        'arquivos': resultados
+    }), 201 if criados else 400
+
+def _obter_sessao_upload(sessao_id):
+    """Retorna a sessão de upload do usuário atual, ou None."""
+    return SessaoUpload.query.filter_by(id=sessao_id, usuario_id=current_user.id).first()
+
+@files_bp.route('/api/uploads', methods=['POST'])
+@login_required
+def api_criar_sessao_upload():
+    """
+    API para iniciar um upload em blocos (retomável).
+
+    Recebe JSON com 'nome', 'tamanho' e, opcionalmente, 'hash' (SHA-256 do
+    arquivo completo), 'tamanho_bloco', 'instituicao_id' e 'publico'. Os
+    blocos são enviados em seguida com PUT /api/uploads/<id>/<offset>.
+    """
+    dados = request.get_json(silent=True) or {}
+    nome = dados.get('nome') or ''
+
+    if not nome or not allowed_file(nome):
+        return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
+
+    instituicao_id, erro = _instituicao_informada()
+    if erro:
+        return erro
+
+    try:
+        sessao = criar_sessao(
+            current_user.id,
+            nome,
+            dados.get('tamanho'),
+            hash_conteudo=dados.get('hash'),
+            tamanho_bloco=dados.get('tamanho_bloco'),
+            instituicao_id=instituicao_id,
+            publico=bool(dados.get('publico', False))
+        )
+        db.session.commit()
+    except ErroSessaoUpload as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.codigo
+
+    return jsonify(estado_sessao(sessao)), 201
+
+@files_bp.route('/api/uploads/<sessao_id>', methods=['GET'])
+@login_required
+def api_estado_sessao_upload(sessao_id):
+    """
+    API para consultar os blocos recebidos de um upload em blocos.
+    """
+    sessao = _obter_sessao_upload(sessao_id)
+    if sessao is None:
+        return jsonify({'error': 'Sessão de upload não encontrada'}), 404
+
+    return jsonify(estado_sessao(sessao))
+
+@files_bp.route('/api/uploads/<sessao_id>/<int:offset>', methods=['PUT'])
+@login_required
+def api_enviar_bloco_upload(sessao_id, offset):
+    """
+    API para enviar um bloco de um upload em blocos.
+
+    O corpo da requisição é o conteúdo do bloco e o cabeçalho X-Hash-Bloco
+    traz o seu SHA-256. Reenviar um bloco já recebido o substitui.
+    """
+    sessao = _obter_sessao_upload(sessao_id)
+    if sessao is None:
+        return jsonify({'error': 'Sessão de upload não encontrada'}), 404
+
+    if request.content_length is None:
+        return jsonify({'error': 'Informe o tamanho do bloco (Content-Length)'}), 411
+
+    try:
+        gravar_bloco(sessao, offset, request.stream, request.content_length, request.headers.get('X-Hash-Bloco'))
+    except ErroSessaoUpload as e:
+        return jsonify({'error': str(e)}), e.codigo
+
+    return jsonify(estado_sessao(sessao))
+
+@files_bp.route('/api/uploads/<sessao_id>/concluir', methods=['POST'])
+@login_required
+def api_concluir_sessao_upload(sessao_id):
+    """
+    API para concluir um upload em blocos e criar o arquivo.
+
+    Aceita JSON com 'hash' (SHA-256 do arquivo completo), se ele não tiver
+    sido informado ao iniciar o upload.
+    """
+    sessao = _obter_sessao_upload(sessao_id)
+    if sessao is None:
+        return jsonify({'error': 'Sessão de upload não encontrada'}), 404
+
+    dados = request.get_json(silent=True) or {}
+
+    try:
+        novo_arquivo = concluir_sessao(
+            sessao,
+            hash_conteudo=dados.get('hash'),
+            metadados={
+                'upload_ip': request.remote_addr,
+                'user_agent': request.user_agent.string
+            }
+        )
+    except ErroSessaoUpload as e:
+        return jsonify({'error': str(e)}), e.codigo
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'id': novo_arquivo.id,
+        'nome': novo_arquivo.nome,
+        'tipo': novo_arquivo.tipo,
+        'extensao': novo_arquivo.extensao,
+        'tamanho': novo_arquivo.tamanho,
+        'usuario_id': novo_arquivo.usuario_id,
+        'instituicao_id': novo_arquivo.instituicao_id,
+        'publico': novo_arquivo.publico,
+        'data_upload': novo_arquivo.data_upload.isoformat(),
+        'data_atualizacao': novo_arquivo.data_atualizacao.isoformat(),
+        'status_extracao': novo_arquivo.status_extracao,
+        'status_verificacao': novo_arquivo.status_verificacao
+    }), 201
+
+@files_bp.route('/api/uploads/<sessao_id>', methods=['DELETE'])
+@login_required
+def api_cancelar_sessao_upload(sessao_id):
+    """
+    API para cancelar um upload em blocos, descartando os blocos recebidos.
+    """
+    sessao = _obter_sessao_upload(sessao_id)
+    if sessao is None:
+        return jsonify({'error': 'Sessão de upload não encontrada'}), 404
+
+    cancelar_sessao(sessao)
+    return jsonify({'message': 'Upload cancelado'})
+
+
 @files_bp.route('/api/arquivos/<int:arquivo_id>', methods=['DELETE'])
 @login_required
 def api_excluir_arquivo(arquivo_id):
@@ -558,11 +1109,29 @@ def api_excluir_arquivo(arquivo_id):
         return jsonify({'error': 'Acesso negado'}), 403
     
     try:
+        # Descontar o arquivo e suas versões do uso de armazenamento
+        registrar_exclusao(arquivo)
+        
+        # Liberar a referência ao conteúdo armazenado
+        hash_orfao = liberar_blob(arquivo.blob)
+        
+        # Liberar os fragmentos e blobs das versões anteriores
+        hashes_versoes = remover_versoes(arquivo)
+        
+        # Remover o arquivo do índice de pesquisa
+        remover_arquivo_indice(arquivo.id)
+        remover_similaridade(arquivo.id)
+        
         # Excluir arquivo do banco de dados
-        # A exclusão em cascata cuidará do conteúdo do arquivo
+        # A exclusão em cascata cuidará do conteúdo legado do arquivo
         db.session.delete(arquivo)
         db.session.commit()
         
+        # Remover o conteúdo se nenhum outro arquivo o referencia
+        remover_conteudo_orfao(hash_orfao)
+        for hash_versao in hashes_versoes:
+            remover_conteudo_orfao(hash_versao)
+        
         return jsonify({'message': 'Arquivo excluído com sucesso'}), 200
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,222 @@
+"""
+Execução isolada do processamento de documentos do sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+
+Cada tarefa (extração de texto, metadados, páginas e miniaturas de PDFs)
+é executada em um processo próprio, com limites de tempo de CPU e de
+memória e um tempo máximo de execução medido pelo processo que a enviou.
+Um documento malformado que trave, consuma memória sem limite ou derrube o
+interpretador encerra apenas o seu processo, e a falha é retornada como
+FalhaSandbox, com o tipo identificado.
+"""
+
+import time
+import signal
+import multiprocessing
+from flask import current_app
+
+# Tipos de falha (gravados em Arquivo.falha_extracao)
+FALHA_ERRO = 'erro'
+FALHA_TEMPO_ESGOTADO = 'tempo_esgotado'
+FALHA_LIMITE_CPU = 'limite_cpu'
+FALHA_LIMITE_MEMORIA = 'limite_memoria'
+FALHA_ENCERRADO = 'encerrado'
+
+# Módulos carregados uma única vez pelo servidor de processos (forkserver),
+# para que cada tarefa não repita as importações da aplicação e dos leitores
+MODULOS_PRECARREGADOS = [
+    'files.file_workers',
+    'files.file_thumbnails',
+    'files.file_versoes',
+    'fitz',
+    'PyPDF2',
+    'docx',
+]
+
+# Tempo de espera pelo término do processo após o envio do resultado
+ESPERA_TERMINO = 5
+
+_contexto = None
+
+
+class FalhaSandbox(Exception):
+    """
+    Falha de uma tarefa executada em processo isolado.
+
+    Args:
+        tipo: Um dos tipos FALHA_*
+        mensagem: Descrição da falha
+        detalhes: Dicionário com informações adicionais (sinal, código de
+            saída, exceção e duração)
+    """
+
+    def __init__(self, tipo, mensagem, **detalhes):
+        super().__init__(mensagem)
+        self.tipo = tipo
+        self.mensagem = mensagem
+        self.detalhes = detalhes
+
+    def como_dict(self):
+        """Retorna a falha em formato serializável (JSON)."""
+        return {'tipo': self.tipo, 'mensagem': self.mensagem, **self.detalhes}
+
+
+def obter_contexto():
+    """
+    Retorna o contexto do multiprocessing usado nas tarefas isoladas.
+
+    Usa o forkserver quando disponível (cada tarefa é um fork de um processo
+    limpo, com os módulos já carregados) e spawn nos demais sistemas.
+    """
+    global _contexto
+
+    if _contexto is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            contexto = multiprocessing.get_context('forkserver')
+            contexto.set_forkserver_preload(MODULOS_PRECARREGADOS)
+        else:
+            contexto = multiprocessing.get_context('spawn')
+        _contexto = contexto
+
+    return _contexto
+
+def limites_configurados(tempo_maximo=None):
+    """
+    Retorna os limites configurados na aplicação, como argumentos de executar_isolado.
+
+    Args:
+        tempo_maximo: Tempo máximo em segundos (padrão: EXTRACAO_TEMPO_MAXIMO)
+
+    Returns:
+        Dicionário com limite_cpu, limite_memoria e tempo_maximo
+    """
+    if tempo_maximo is None:
+        tempo_maximo = current_app.config.get('EXTRACAO_TEMPO_MAXIMO', 120)
+
+    return {
+        'limite_cpu': current_app.config.get('EXTRACAO_LIMITE_CPU', 60),
+        'limite_memoria': current_app.config.get('EXTRACAO_LIMITE_MEMORIA', 512 * 1024 * 1024),
+        'tempo_maximo': tempo_maximo
+    }
+
+def aplicar_limites(limite_cpu, limite_memoria):
+    """
+    Aplica limites de recursos ao processo atual.
+
+    Ao exceder o tempo de CPU o processo recebe SIGXCPU e é encerrado; ao
+    exceder a memória as alocações falham com MemoryError.
+
+    Args:
+        limite_cpu: Tempo máximo de CPU em segundos
+        limite_memoria: Espaço de endereçamento máximo em bytes
+    """
+    import resource
+
+    if limite_cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (limite_cpu, limite_cpu + 5))
+    if limite_memoria:
+        resource.setrlimit(resource.RLIMIT_AS, (limite_memoria, limite_memoria))
+
+def _executar_no_processo(conexao, funcao, argumentos, limite_cpu, limite_memoria):
+    """Função executada no processo isolado: aplica os limites, executa e envia o resultado."""
+    aplicar_limites(limite_cpu, limite_memoria)
+
+    try:
+        mensagem = ('ok', funcao(*argumentos))
+    except MemoryError:
+        mensagem = ('memoria', None)
+    except BaseException as e:
+        mensagem = ('erro', (type(e).__name__, str(e)[:1000]))
+
+    try:
+        conexao.send(mensagem)
+    except MemoryError:
+        conexao.send(('memoria', None))
+    except Exception as e:
+        conexao.send(('erro', (type(e).__name__, f'Resultado não pôde ser enviado: {str(e)[:500]}')))
+    finally:
+        conexao.close()
+
+def _falha_por_codigo_saida(codigo, duracao):
+    """Identifica a falha de um processo encerrado sem enviar o resultado."""
+    if codigo is not None and codigo < 0:
+        try:
+            nome_sinal = signal.Signals(-codigo).name
+        except ValueError:
+            nome_sinal = str(-codigo)
+
+        if -codigo == signal.SIGXCPU:
+            return FalhaSandbox(FALHA_LIMITE_CPU, 'O processamento excedeu o limite de tempo de CPU.',
+                                sinal=nome_sinal, duracao=duracao)
+        return FalhaSandbox(FALHA_ENCERRADO, f'O processo de processamento foi encerrado pelo sinal {nome_sinal}.',
+                            sinal=nome_sinal, duracao=duracao)
+
+    return FalhaSandbox(FALHA_ENCERRADO, f'O processo de processamento terminou sem resultado (código {codigo}).',
+                        codigo_saida=codigo, duracao=duracao)
+
+def executar_isolado(funcao, argumentos=(), limite_cpu=None, limite_memoria=None, tempo_maximo=None):
+    """
+    Executa uma função em um processo novo, com limites de recursos.
+
+    A chamada aguarda o término do processo. Ao exceder tempo_maximo o
+    processo é encerrado (SIGKILL).
+
+    Args:
+        funcao: Função de nível de módulo (serializável com pickle)
+        argumentos: Tupla de argumentos da função (serializáveis)
+        limite_cpu: Tempo máximo de CPU em segundos (opcional)
+        limite_memoria: Espaço de endereçamento máximo em bytes (opcional)
+        tempo_maximo: Tempo máximo de execução em segundos (opcional)
+
+    Returns:
+        O valor retornado pela função
+
+    Raises:
+        FalhaSandbox: Se a função lançar uma exceção, exceder um dos limites
+            ou o processo for encerrado
+    """
+    contexto = obter_contexto()
+    receptor, emissor = contexto.Pipe(duplex=False)
+    processo = contexto.Process(
+        target=_executar_no_processo,
+        args=(emissor, funcao, argumentos, limite_cpu, limite_memoria),
+        daemon=True
+    )
+
+    inicio = time.monotonic()
+    processo.start()
+    emissor.close()
+
+    mensagem = None
+    try:
+        # poll também retorna quando o processo termina sem enviar nada
+        if receptor.poll(tempo_maximo):
+            try:
+                mensagem = receptor.recv()
+            except EOFError:
+                pass
+        else:
+            processo.kill()
+            processo.join()
+            raise FalhaSandbox(FALHA_TEMPO_ESGOTADO, f'O processamento excedeu o tempo máximo de {tempo_maximo} s.',
+                               duracao=round(time.monotonic() - inicio, 3))
+    finally:
+        receptor.close()
+
+    processo.join(ESPERA_TERMINO)
+    if processo.is_alive():
+        processo.kill()
+        processo.join()
+    duracao = round(time.monotonic() - inicio, 3)
+
+    if mensagem is None:
+        raise _falha_por_codigo_saida(processo.exitcode, duracao)
+
+    situacao, conteudo = mensagem
+    if situacao == 'memoria':
+        raise FalhaSandbox(FALHA_LIMITE_MEMORIA, 'O processamento excedeu o limite de memória.', duracao=duracao)
+    if situacao == 'erro':
+        nome_excecao, descricao = conteudo
+        raise FalhaSandbox(FALHA_ERRO, descricao or nome_excecao, excecao=nome_excecao, duracao=duracao)
+
+    return conteudo
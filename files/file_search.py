@@ -0,0 +1,542 @@
+"""
+Pesquisa textual nos arquivos do sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import re
+import math
+import unicodedata
+from collections import Counter
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import text, func, case, select, tuple_, bindparam, Integer, Float
+from sqlalchemy.exc import OperationalError
+
+# Importar modelos
+from .file_models import Arquivo, ArquivoTexto, PaginaArquivo, IndiceTermo, IndicePagina, IndiceDocumento
+
+# Importar extensões da aplicação
+from auth import db
+
+# Peso das ocorrências no nome do arquivo em relação ao conteúdo
+PESO_NOME = 5
+
+# Parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Quantidade máxima de arquivos com trecho destacado por pesquisa
+MAXIMO_TRECHOS = 50
+
+# Quantidade máxima de páginas informadas por arquivo em um resultado
+MAXIMO_PAGINAS_RESULTADO = 20
+
+# No índice FTS5 por página, o rowid é arquivo_id * FATOR_ROWID_PAGINA + página,
+# o que permite remover as páginas de um arquivo por intervalo de rowid
+FATOR_ROWID_PAGINA = 100000
+
+# Palavras (sem acentos) ignoradas na indexação e na pesquisa
+PALAVRAS_VAZIAS = {
+    'a', 'ao', 'aos', 'as', 'com', 'como', 'da', 'das', 'de', 'do', 'dos', 'e',
+    'ela', 'elas', 'ele', 'eles', 'em', 'entre', 'era', 'essa', 'esse', 'esta',
+    'este', 'eu', 'foi', 'ha', 'isso', 'isto', 'ja', 'lhe', 'mais', 'mas', 'me',
+    'mesmo', 'na', 'nas', 'nao', 'no', 'nos', 'o', 'os', 'ou', 'para', 'pela',
+    'pelas', 'pelo', 'pelos', 'por', 'qual', 'que', 'quando', 'se', 'sem', 'ser',
+    'seu', 'seus', 'so', 'sua', 'suas', 'tambem', 'te', 'tem', 'um', 'uma', 'umas',
+    'uns', 'voce'
+}
+
+# Sufixos removidos pelo radicalizador, do mais longo para o mais curto
+# (versão reduzida do algoritmo RSLP, aplicada a palavras sem acentos)
+SUFIXOS_PLURAL = [
+    ('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'),
+    ('res', 'r'), ('les', 'l'), ('zes', 'z'), ('ns', 'm'), ('s', '')
+]
+SUFIXOS_NOMINAIS = [
+    'amentos', 'imentos', 'amento', 'imento', 'adoras', 'adores', 'adora', 'ador',
+    'edora', 'edor', 'idora', 'idor', 'acao', 'icao', 'ucao', 'encia', 'ancia',
+    'mente', 'idade', 'logia', 'ismo', 'ista', 'avel', 'ivel', 'eza', 'ante',
+    'osa', 'oso', 'ica', 'ico', 'iva', 'ivo'
+]
+SUFIXOS_VERBAIS = [
+    'ariam', 'eriam', 'iriam', 'assem', 'essem', 'issem', 'aram', 'eram', 'iram',
+    'avam', 'arem', 'erem', 'irem', 'ando', 'endo', 'indo', 'ado', 'ada', 'ido',
+    'ida', 'ar', 'er', 'ir', 'ou', 'am', 'em'
+]
+
+# Tamanho mínimo do radical após a remoção de um sufixo
+TAMANHO_MINIMO_RADICAL = 3
+
+PADRAO_PALAVRA = re.compile(r'[^\W_]+')
+
+def remover_acentos(texto):
+    """
+    Remove os acentos e converte o texto para minúsculas.
+
+    Args:
+        texto: Texto original
+
+    Returns:
+        Texto sem acentos e em minúsculas
+    """
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+def _remover_sufixo(palavra, sufixos):
+    for sufixo in sufixos:
+        if isinstance(sufixo, tuple):
+            sufixo, substituto = sufixo
+        else:
+            substituto = ''
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= TAMANHO_MINIMO_RADICAL:
+            return palavra[:-len(sufixo)] + substituto, True
+    return palavra, False
+
+def radical(palavra):
+    """
+    Reduz uma palavra (já sem acentos) ao seu radical.
+
+    O mesmo radicalizador é usado na indexação e na pesquisa, de modo que
+    "avaliações", "avaliação" e "avaliar" correspondem ao mesmo termo.
+
+    Args:
+        palavra: Palavra em minúsculas e sem acentos
+
+    Returns:
+        String contendo o radical
+    """
+    if len(palavra) <= TAMANHO_MINIMO_RADICAL or palavra.isdigit():
+        return palavra
+
+    if not palavra.endswith('ss'):
+        palavra, _ = _remover_sufixo(palavra, SUFIXOS_PLURAL)
+
+    palavra, removido = _remover_sufixo(palavra, SUFIXOS_NOMINAIS)
+    if not removido:
+        palavra, _ = _remover_sufixo(palavra, SUFIXOS_VERBAIS)
+
+    # Remover a vogal temática final
+    if len(palavra) > TAMANHO_MINIMO_RADICAL and palavra[-1] in 'aeo':
+        palavra = palavra[:-1]
+
+    return palavra
+
+def analisar_texto(texto):
+    """
+    Converte um texto na lista de termos usada pelo índice.
+
+    Args:
+        texto: Texto original
+
+    Returns:
+        Lista de radicais, na ordem em que aparecem no texto
+    """
+    if not texto:
+        return []
+
+    termos = []
+    for palavra in PADRAO_PALAVRA.findall(remover_acentos(texto)):
+        if palavra in PALAVRAS_VAZIAS:
+            continue
+        termos.append(radical(palavra)[:64])
+    return termos
+
+def analisar_consulta(consulta):
+    """
+    Converte o texto digitado pelo usuário nos termos distintos da pesquisa.
+
+    Args:
+        consulta: Texto da pesquisa
+
+    Returns:
+        Lista de radicais distintos
+    """
+    return list(dict.fromkeys(analisar_texto(consulta)))
+
+
+class IndiceFTS5:
+    """
+    Índice de pesquisa em uma tabela virtual FTS5 do SQLite.
+
+    A tabela guarda os termos já normalizados (um documento por arquivo, com
+    rowid igual ao id do arquivo) e a ordenação usa a função bm25 do FTS5.
+    """
+    nome = 'fts5'
+    tabela = 'arquivos_busca'
+    tabela_paginas = 'arquivos_paginas_busca'
+
+    def preparar(self):
+        """Cria as tabelas virtuais, se ainda não existirem."""
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.tabela} "
+            f"USING fts5(nome, conteudo, tokenize='unicode61')"
+        ))
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.tabela_paginas} "
+            f"USING fts5(conteudo, arquivo_id UNINDEXED, pagina UNINDEXED, tokenize='unicode61')"
+        ))
+        db.session.commit()
+
+    def indexar(self, arquivo_id, termos_nome, termos_conteudo):
+        self.remover(arquivo_id)
+        db.session.execute(
+            text(f"INSERT INTO {self.tabela} (rowid, nome, conteudo) VALUES (:id, :nome, :conteudo)"),
+            {'id': arquivo_id, 'nome': ' '.join(termos_nome), 'conteudo': ' '.join(termos_conteudo)}
+        )
+
+    def indexar_paginas(self, arquivo_id, termos_paginas):
+        self._remover_paginas(arquivo_id)
+        if termos_paginas:
+            db.session.execute(
+                text(f"INSERT INTO {self.tabela_paginas} (rowid, conteudo, arquivo_id, pagina) "
+                     f"VALUES (:rowid, :conteudo, :arquivo_id, :pagina)"),
+                [
+                    {'rowid': arquivo_id * FATOR_ROWID_PAGINA + numero, 'conteudo': ' '.join(termos),
+                     'arquivo_id': arquivo_id, 'pagina': numero}
+                    for numero, termos in termos_paginas
+                ]
+            )
+
+    def _remover_paginas(self, arquivo_id):
+        db.session.execute(
+            text(f"DELETE FROM {self.tabela_paginas} WHERE rowid BETWEEN :inicio AND :fim"),
+            {'inicio': arquivo_id * FATOR_ROWID_PAGINA, 'fim': (arquivo_id + 1) * FATOR_ROWID_PAGINA - 1}
+        )
+
+    def remover(self, arquivo_id):
+        db.session.execute(text(f"DELETE FROM {self.tabela} WHERE rowid = :id"), {'id': arquivo_id})
+        self._remover_paginas(arquivo_id)
+
+    def limpar(self):
+        db.session.execute(text(f"DELETE FROM {self.tabela}"))
+        db.session.execute(text(f"DELETE FROM {self.tabela_paginas}"))
+
+    def paginas_encontradas(self, arquivo_ids, termos):
+        """Retorna pares (arquivo_id, página) das páginas que contêm todos os termos."""
+        consulta = ' '.join(f'"{termo}"' for termo in termos)
+        return db.session.execute(
+            text(
+                f"SELECT arquivo_id, pagina FROM {self.tabela_paginas} "
+                f"WHERE {self.tabela_paginas} MATCH :consulta AND arquivo_id IN :ids "
+                f"ORDER BY arquivo_id, pagina"
+            ).bindparams(bindparam('ids', expanding=True)),
+            {'consulta': consulta, 'ids': list(arquivo_ids)}
+        ).fetchall()
+
+    def subconsulta(self, termos):
+        """
+        Retorna uma subconsulta (arquivo_id, pontuacao) com os arquivos que
+        contêm todos os termos; pontuações maiores indicam maior relevância.
+        """
+        consulta = ' '.join(f'"{termo}"' for termo in termos)
+        return text(
+            f"SELECT rowid AS arquivo_id, -bm25({self.tabela}, {float(PESO_NOME)}, 1.0) AS pontuacao "
+            f"FROM {self.tabela} WHERE {self.tabela} MATCH :consulta"
+        ).bindparams(consulta=consulta).columns(arquivo_id=Integer, pontuacao=Float).subquery('busca')
+
+
+class IndiceInvertido:
+    """
+    Índice de pesquisa portável, em tabelas comuns (indice_termos e
+    indice_documentos), com pontuação BM25 calculada pelo banco de dados.
+    """
+    nome = 'invertido'
+
+    def preparar(self):
+        pass
+
+    def indexar(self, arquivo_id, termos_nome, termos_conteudo):
+        self.remover(arquivo_id)
+
+        frequencias = Counter(termos_conteudo)
+        for termo in termos_nome:
+            frequencias[termo] += PESO_NOME
+
+        db.session.add(IndiceDocumento(
+            arquivo_id=arquivo_id,
+            comprimento=len(termos_conteudo) + PESO_NOME * len(termos_nome)
+        ))
+        db.session.add_all([
+            IndiceTermo(termo=termo, arquivo_id=arquivo_id, frequencia=frequencia)
+            for termo, frequencia in frequencias.items()
+        ])
+
+    def indexar_paginas(self, arquivo_id, termos_paginas):
+        IndicePagina.query.filter_by(arquivo_id=arquivo_id).delete(synchronize_session=False)
+        db.session.add_all([
+            IndicePagina(termo=termo, arquivo_id=arquivo_id, pagina=numero)
+            for numero, termos in termos_paginas
+            for termo in set(termos)
+        ])
+
+    def remover(self, arquivo_id):
+        IndiceTermo.query.filter_by(arquivo_id=arquivo_id).delete(synchronize_session=False)
+        IndicePagina.query.filter_by(arquivo_id=arquivo_id).delete(synchronize_session=False)
+        IndiceDocumento.query.filter_by(arquivo_id=arquivo_id).delete(synchronize_session=False)
+
+    def limpar(self):
+        IndiceTermo.query.delete(synchronize_session=False)
+        IndicePagina.query.delete(synchronize_session=False)
+        IndiceDocumento.query.delete(synchronize_session=False)
+
+    def paginas_encontradas(self, arquivo_ids, termos):
+        """Retorna pares (arquivo_id, página) das páginas que contêm todos os termos."""
+        return (
+            db.session.query(IndicePagina.arquivo_id, IndicePagina.pagina)
+            .filter(IndicePagina.arquivo_id.in_(list(arquivo_ids)), IndicePagina.termo.in_(termos))
+            .group_by(IndicePagina.arquivo_id, IndicePagina.pagina)
+            .having(func.count(IndicePagina.termo) == len(termos))
+            .order_by(IndicePagina.arquivo_id, IndicePagina.pagina)
+            .all()
+        )
+
+    def subconsulta(self, termos):
+        """
+        Retorna uma subconsulta (arquivo_id, pontuacao) com os arquivos que
+        contêm todos os termos; pontuações maiores indicam maior relevância.
+        """
+        total_documentos, comprimento_medio = db.session.query(
+            func.count(IndiceDocumento.arquivo_id),
+            func.avg(IndiceDocumento.comprimento)
+        ).one()
+
+        frequencia_documentos = dict(
+            db.session.query(IndiceTermo.termo, func.count(IndiceTermo.arquivo_id))
+            .filter(IndiceTermo.termo.in_(termos))
+            .group_by(IndiceTermo.termo)
+            .all()
+        )
+
+        # Peso de cada termo (IDF do BM25); termos ausentes não têm resultados
+        idf = {
+            termo: math.log(1 + (total_documentos - df + 0.5) / (df + 0.5))
+            for termo, df in frequencia_documentos.items()
+        }
+        peso = case(idf, value=IndiceTermo.termo, else_=0.0) if idf else 0.0
+
+        normalizacao = BM25_K1 * (1 - BM25_B + BM25_B * IndiceDocumento.comprimento / float(comprimento_medio or 1))
+        pontuacao = func.sum(
+            peso * IndiceTermo.frequencia * (BM25_K1 + 1) / (IndiceTermo.frequencia + normalizacao)
+        )
+
+        return (
+            select(IndiceTermo.arquivo_id.label('arquivo_id'), pontuacao.label('pontuacao'))
+            .join(IndiceDocumento, IndiceDocumento.arquivo_id == IndiceTermo.arquivo_id)
+            .where(IndiceTermo.termo.in_(termos))
+            .group_by(IndiceTermo.arquivo_id)
+            .having(func.count(IndiceTermo.termo) == len(termos))
+            .subquery('busca')
+        )
+
+
+def obter_indice_busca():
+    """
+    Retorna o índice de pesquisa da aplicação.
+
+    Usa FTS5 quando o banco de dados é SQLite com FTS5 disponível e o índice
+    invertido em tabelas comuns nos demais casos.
+
+    Returns:
+        Instância de IndiceFTS5 ou IndiceInvertido
+    """
+    indice = current_app.extensions.get('indice_busca')
+
+    if indice is None:
+        indice = IndiceInvertido()
+        if db.engine.dialect.name == 'sqlite':
+            try:
+                IndiceFTS5().preparar()
+                indice = IndiceFTS5()
+            except OperationalError as e:
+                db.session.rollback()
+                print(f"FTS5 indisponível, usando índice invertido: {str(e)}")
+        current_app.extensions['indice_busca'] = indice
+
+    return indice
+
+def indexar_arquivo(arquivo):
+    """
+    Atualiza o arquivo no índice de pesquisa (nome, texto extraído e texto de cada página).
+
+    A alteração é feita na sessão atual; o commit fica a cargo do chamador.
+
+    Args:
+        arquivo: Objeto Arquivo já gravado (com id)
+    """
+    indice = obter_indice_busca()
+    indice.indexar(
+        arquivo.id,
+        analisar_texto(arquivo.nome),
+        analisar_texto(arquivo.conteudo_texto)
+    )
+    indice.indexar_paginas(
+        arquivo.id,
+        [(pagina.numero, analisar_texto(pagina.texto)) for pagina in arquivo.paginas]
+    )
+
+def remover_arquivo_indice(arquivo_id):
+    """
+    Remove um arquivo do índice de pesquisa.
+
+    Args:
+        arquivo_id: ID do arquivo
+    """
+    obter_indice_busca().remover(arquivo_id)
+
+def aplicar_pesquisa(query, consulta):
+    """
+    Restringe uma consulta de arquivos aos que correspondem à pesquisa,
+    ordenados por relevância (BM25).
+
+    Args:
+        query: Consulta SQLAlchemy sobre Arquivo
+        consulta: Texto da pesquisa
+
+    Returns:
+        Consulta filtrada e ordenada
+    """
+    termos = analisar_consulta(consulta)
+
+    # Pesquisa apenas com palavras vazias ou símbolos: comparar com o nome
+    if not termos:
+        return query.filter(Arquivo.nome.ilike(f'%{consulta}%')).order_by(Arquivo.data_upload.desc())
+
+    busca = obter_indice_busca().subconsulta(termos)
+    return (
+        query.join(busca, busca.c.arquivo_id == Arquivo.id)
+        .order_by(busca.c.pontuacao.desc(), Arquivo.data_upload.desc())
+    )
+
+def gerar_trecho(texto, consulta, tamanho=30):
+    """
+    Gera um trecho do texto em torno das palavras pesquisadas, destacadas com <mark>.
+
+    Args:
+        texto: Texto do arquivo
+        consulta: Texto da pesquisa
+        tamanho: Quantidade de palavras do trecho
+
+    Returns:
+        Objeto Markup com o trecho, ou None se não houver correspondência
+    """
+    termos = set(analisar_consulta(consulta))
+    if not texto or not termos:
+        return None
+
+    palavras = list(PADRAO_PALAVRA.finditer(texto))
+    # Cada palavra distinta é radicalizada uma única vez
+    radicalizadas = {}
+    posicoes, radicais = [], []
+    for i, palavra in enumerate(palavras):
+        original = palavra.group()
+        termo = radicalizadas.get(original)
+        if termo is None:
+            termo = radicalizadas[original] = radical(remover_acentos(original))
+        if termo in termos:
+            posicoes.append(i)
+            radicais.append(termo)
+    if not posicoes:
+        return None
+
+    # Escolher a janela com mais termos distintos da pesquisa: a janela
+    # [inicio, inicio + tamanho) avança de uma ocorrência para a seguinte e
+    # a contagem dos termos nela é atualizada, em tempo linear
+    melhor_inicio, melhor_total = posicoes[0], 0
+    na_janela = Counter()
+    fim = 0
+    for i, inicio in enumerate(posicoes):
+        while fim < len(posicoes) and posicoes[fim] < inicio + tamanho:
+            na_janela[radicais[fim]] += 1
+            fim += 1
+        if len(na_janela) > melhor_total:
+            melhor_inicio, melhor_total = inicio, len(na_janela)
+        na_janela[radicais[i]] -= 1
+        if not na_janela[radicais[i]]:
+            del na_janela[radicais[i]]
+
+    primeira = max(0, melhor_inicio - tamanho // 4)
+    ultima = min(len(palavras), primeira + tamanho) - 1
+    destacadas = {p for p in posicoes if primeira <= p <= ultima}
+
+    partes = ['…' if primeira > 0 else '']
+    cursor = palavras[primeira].start()
+    for i in range(primeira, ultima + 1):
+        palavra = palavras[i]
+        partes.append(escape(texto[cursor:palavra.start()]))
+        if i in destacadas:
+            partes.append(Markup('<mark>{}</mark>').format(palavra.group()))
+        else:
+            partes.append(escape(palavra.group()))
+        cursor = palavra.end()
+    if ultima < len(palavras) - 1:
+        partes.append('…')
+
+    # As partes já estão escapadas; apenas as quebras de linha são compactadas
+    return Markup(re.sub(r'\s+', ' ', ''.join(str(p) for p in partes)).strip())
+
+def localizar_paginas(arquivos, consulta):
+    """
+    Identifica as páginas em que a pesquisa foi encontrada em cada arquivo.
+
+    Args:
+        arquivos: Lista de objetos Arquivo, em ordem de relevância
+        consulta: Texto da pesquisa
+
+    Returns:
+        Dicionário {id do arquivo: lista de números de página}
+    """
+    termos = analisar_consulta(consulta)
+    ids = [arquivo.id for arquivo in arquivos[:MAXIMO_TRECHOS]]
+    if not termos or not ids:
+        return {}
+
+    paginas = {}
+    for arquivo_id, numero in obter_indice_busca().paginas_encontradas(ids, termos):
+        encontradas = paginas.setdefault(arquivo_id, [])
+        if len(encontradas) < MAXIMO_PAGINAS_RESULTADO:
+            encontradas.append(numero)
+    return paginas
+
+def gerar_trechos(arquivos, consulta, paginas=None):
+    """
+    Gera os trechos destacados dos primeiros arquivos de um resultado de pesquisa.
+
+    Quando a página do resultado é conhecida, apenas o texto dessa página é
+    carregado; nos demais casos é usado o texto completo do arquivo.
+
+    Args:
+        arquivos: Lista de objetos Arquivo, em ordem de relevância
+        consulta: Texto da pesquisa
+        paginas: Dicionário retornado por localizar_paginas (opcional)
+
+    Returns:
+        Dicionário {id do arquivo: trecho}
+    """
+    paginas = paginas or {}
+    ids = [arquivo.id for arquivo in arquivos[:MAXIMO_TRECHOS]]
+    if not ids:
+        return {}
+
+    trechos = {}
+
+    # Primeira página com resultado de cada arquivo paginado
+    primeiras = [(arquivo_id, paginas[arquivo_id][0]) for arquivo_id in ids if paginas.get(arquivo_id)]
+    if primeiras:
+        registros = PaginaArquivo.query.filter(
+            tuple_(PaginaArquivo.arquivo_id, PaginaArquivo.numero).in_(primeiras)
+        ).all()
+        for pagina in registros:
+            trecho = gerar_trecho(pagina.texto, consulta)
+            if trecho:
+                trechos[pagina.arquivo_id] = trecho
+
+    # Texto completo dos demais arquivos, carregado em uma única consulta
+    restantes = [arquivo_id for arquivo_id in ids if arquivo_id not in trechos]
+    if restantes:
+        textos = ArquivoTexto.query.filter(ArquivoTexto.arquivo_id.in_(restantes)).all()
+        for arquivo_texto in textos:
+            trecho = gerar_trecho(arquivo_texto.conteudo_texto, consulta)
+            if trecho:
+                trechos[arquivo_texto.arquivo_id] = trecho
+
+    return trechos
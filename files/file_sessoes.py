@@ -0,0 +1,363 @@
+"""
+Uploads em blocos retomáveis para o sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import os
+import re
+import shutil
+import hashlib
+import datetime
+import tempfile
+from flask import current_app
+
+# Importar modelos e utilitários
+from .file_models import Arquivo, SessaoUpload
+from .file_storage import obter_blob_store, remover_conteudo_orfao, PADRAO_HASH
+from .file_pipeline import ReceptorUpload, criar_arquivo, TAMANHO_BLOCO
+from .file_workers import agendar_extracao
+from .file_antivirus import obter_verificador, consultar_veredito
+from .file_cotas import verificar_espaco, CotaExcedida
+
+# Importar extensões da aplicação
+from auth import db
+
+# Estados da sessão persistidos em SessaoUpload.status
+STATUS_ABERTA = 'aberta'
+STATUS_CONCLUINDO = 'concluindo'
+STATUS_CONCLUIDA = 'concluida'
+
+# Menor tamanho de bloco aceito (o último bloco pode ser menor)
+TAMANHO_BLOCO_MINIMO = 256 * 1024
+
+# Nome dos arquivos de bloco: <índice>.bloco
+PADRAO_BLOCO = re.compile(r'^(\d+)\.bloco$')
+
+
+class ErroSessaoUpload(Exception):
+    """Erro de uma operação de upload em blocos, com o código HTTP da resposta."""
+
+    def __init__(self, mensagem, codigo=400):
+        super().__init__(mensagem)
+        self.codigo = codigo
+
+
+def _raiz_sessoes():
+    """Retorna o diretório em que ficam os blocos das sessões."""
+    return current_app.config.get('UPLOAD_SESSOES_PATH') or os.path.join(current_app.instance_path, 'upload_sessoes')
+
+def _diretorio_sessao(sessao_id):
+    """Retorna o diretório com os blocos de uma sessão."""
+    return os.path.join(_raiz_sessoes(), sessao_id)
+
+def _caminho_bloco(sessao_id, indice):
+    return os.path.join(_diretorio_sessao(sessao_id), f'{indice:06d}.bloco')
+
+def criar_sessao(usuario_id, nome, tamanho, hash_conteudo=None, tamanho_bloco=None, instituicao_id=None, publico=False):
+    """
+    Cria uma sessão de upload em blocos.
+
+    A alteração é feita na sessão do banco de dados; o commit fica a cargo
+    do chamador.
+
+    Args:
+        usuario_id: ID do usuário que envia o arquivo
+        nome: Nome original do arquivo
+        tamanho: Tamanho total do arquivo em bytes
+        hash_conteudo: SHA-256 esperado do arquivo completo (opcional; pode ser informado na conclusão)
+        tamanho_bloco: Tamanho dos blocos em bytes (opcional)
+        instituicao_id: ID da instituição associada (opcional; o chamador verifica
+            se o usuário pertence a ela)
+        publico: Se o arquivo é público
+
+    Returns:
+        Objeto SessaoUpload criado
+
+    Raises:
+        ErroSessaoUpload: Se os parâmetros forem inválidos ou o arquivo não
+            couber na cota do usuário ou da instituição
+    """
+    tamanho_maximo = current_app.config.get('UPLOAD_SESSAO_TAMANHO_MAXIMO', 1024 * 1024 * 1024)
+    if not isinstance(tamanho, int) or tamanho <= 0:
+        raise ErroSessaoUpload('Tamanho do arquivo inválido.')
+    if tamanho > tamanho_maximo:
+        raise ErroSessaoUpload('O arquivo excede o tamanho máximo permitido.', 413)
+
+    # Recusar antes de receber os blocos o arquivo que não cabe na cota
+    try:
+        verificar_espaco(usuario_id, instituicao_id, tamanho)
+    except CotaExcedida as e:
+        raise ErroSessaoUpload(str(e), 413)
+
+    if hash_conteudo is not None:
+        hash_conteudo = hash_conteudo.lower()
+        if not PADRAO_HASH.match(hash_conteudo):
+            raise ErroSessaoUpload('Hash SHA-256 inválido.')
+
+    # O bloco precisa caber em uma requisição (MAX_CONTENT_LENGTH)
+    tamanho_bloco_maximo = current_app.config.get('MAX_CONTENT_LENGTH') or 10 * 1024 * 1024
+    tamanho_bloco = tamanho_bloco or current_app.config.get('UPLOAD_SESSAO_TAMANHO_BLOCO', 5 * 1024 * 1024)
+    if not isinstance(tamanho_bloco, int) or not TAMANHO_BLOCO_MINIMO <= tamanho_bloco <= tamanho_bloco_maximo:
+        raise ErroSessaoUpload(
+            f'O tamanho do bloco deve estar entre {TAMANHO_BLOCO_MINIMO} e {tamanho_bloco_maximo} bytes.'
+        )
+
+    validade = current_app.config.get('UPLOAD_SESSAO_VALIDADE', 24 * 60 * 60)
+    sessao = SessaoUpload(
+        usuario_id=usuario_id,
+        nome=nome,
+        tamanho=tamanho,
+        tamanho_bloco=tamanho_bloco,
+        hash_conteudo=hash_conteudo,
+        instituicao_id=instituicao_id,
+        publico=publico,
+        status=STATUS_ABERTA,
+        data_expiracao=datetime.datetime.now() + datetime.timedelta(seconds=validade)
+    )
+    db.session.add(sessao)
+    db.session.flush()
+
+    os.makedirs(_diretorio_sessao(sessao.id), exist_ok=True)
+    return sessao
+
+def blocos_recebidos(sessao):
+    """
+    Lista os índices dos blocos já recebidos de uma sessão.
+
+    Args:
+        sessao: Objeto SessaoUpload
+
+    Returns:
+        Lista ordenada de índices
+    """
+    diretorio = _diretorio_sessao(sessao.id)
+    if not os.path.isdir(diretorio):
+        return []
+
+    indices = []
+    for nome in os.listdir(diretorio):
+        encontrado = PADRAO_BLOCO.match(nome)
+        if encontrado:
+            indices.append(int(encontrado.group(1)))
+    return sorted(indices)
+
+def estado_sessao(sessao):
+    """
+    Retorna o estado de uma sessão, para que o cliente retome o envio.
+
+    Args:
+        sessao: Objeto SessaoUpload
+
+    Returns:
+        Dicionário serializável em JSON
+    """
+    recebidos = set(blocos_recebidos(sessao)) if sessao.status == STATUS_ABERTA else set(range(sessao.total_blocos))
+    pendentes = [indice for indice in range(sessao.total_blocos) if indice not in recebidos]
+
+    return {
+        'id': sessao.id,
+        'nome': sessao.nome,
+        'tamanho': sessao.tamanho,
+        'tamanho_bloco': sessao.tamanho_bloco,
+        'total_blocos': sessao.total_blocos,
+        'bytes_recebidos': sessao.tamanho - sum(_tamanho_bloco(sessao, indice) for indice in pendentes),
+        'offsets_pendentes': [indice * sessao.tamanho_bloco for indice in pendentes],
+        'status': sessao.status,
+        'arquivo_id': sessao.arquivo_id,
+        'data_expiracao': sessao.data_expiracao.isoformat()
+    }
+
+def _tamanho_bloco(sessao, indice):
+    """Tamanho esperado de um bloco (o último pode ser menor)."""
+    return min(sessao.tamanho_bloco, sessao.tamanho - indice * sessao.tamanho_bloco)
+
+def gravar_bloco(sessao, offset, stream, tamanho, hash_bloco):
+    """
+    Grava um bloco da sessão a partir de um stream, verificando tamanho e hash.
+
+    O bloco é gravado em um arquivo temporário e só passa a contar como
+    recebido após a verificação; reenviar um bloco o substitui.
+
+    Args:
+        sessao: Objeto SessaoUpload aberto
+        offset: Posição do bloco no arquivo, em bytes (múltiplo do tamanho do bloco)
+        stream: Stream com o conteúdo do bloco
+        tamanho: Tamanho informado do bloco (Content-Length)
+        hash_bloco: SHA-256 do bloco, em hexadecimal
+
+    Raises:
+        ErroSessaoUpload: Se o bloco for inválido ou estiver corrompido
+    """
+    if sessao.status != STATUS_ABERTA:
+        raise ErroSessaoUpload('A sessão de upload já foi concluída.', 409)
+
+    if offset < 0 or offset % sessao.tamanho_bloco or offset >= sessao.tamanho:
+        raise ErroSessaoUpload('Offset inválido para esta sessão.')
+
+    indice = offset // sessao.tamanho_bloco
+    esperado = _tamanho_bloco(sessao, indice)
+    if tamanho != esperado:
+        raise ErroSessaoUpload(f'O bloco no offset {offset} deve ter {esperado} bytes.')
+
+    if not hash_bloco or not PADRAO_HASH.match(hash_bloco.lower()):
+        raise ErroSessaoUpload('Hash SHA-256 do bloco não informado ou inválido.')
+
+    diretorio = _diretorio_sessao(sessao.id)
+    os.makedirs(diretorio, exist_ok=True)
+    sha256 = hashlib.sha256()
+    gravados = 0
+
+    fd, caminho_temporario = tempfile.mkstemp(dir=diretorio, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as destino:
+            while gravados <= esperado:
+                dados = stream.read(min(TAMANHO_BLOCO, esperado + 1 - gravados))
+                if not dados:
+                    break
+                sha256.update(dados)
+                destino.write(dados)
+                gravados += len(dados)
+
+        if gravados != esperado:
+            raise ErroSessaoUpload(f'O bloco no offset {offset} deve ter {esperado} bytes.')
+        if sha256.hexdigest() != hash_bloco.lower():
+            raise ErroSessaoUpload('O hash do bloco não confere; envie o bloco novamente.', 422)
+
+        os.replace(caminho_temporario, _caminho_bloco(sessao.id, indice))
+    finally:
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+
+def concluir_sessao(sessao, hash_conteudo=None, metadados=None):
+    """
+    Monta o arquivo a partir dos blocos e cria o registro do Arquivo.
+
+    Os blocos são lidos em sequência por um ReceptorUpload, que identifica e
+    valida o tipo, calcula o hash e grava o conteúdo no diretório temporário
+    do armazenamento de blobs, sem carregar o arquivo em memória. Concluir
+    novamente uma sessão concluída retorna o mesmo arquivo.
+
+    Args:
+        sessao: Objeto SessaoUpload
+        hash_conteudo: SHA-256 esperado do arquivo completo (se não informado na criação)
+        metadados: Dicionário com metadados adicionais (opcional)
+
+    Returns:
+        Objeto Arquivo criado
+
+    Raises:
+        ErroSessaoUpload: Se faltarem blocos, o hash não conferir, o tipo não
+            for permitido ou o arquivo não couber na cota
+    """
+    if sessao.status == STATUS_CONCLUIDA and sessao.arquivo_id:
+        arquivo = Arquivo.query.get(sessao.arquivo_id)
+        if arquivo is not None:
+            return arquivo
+
+    hash_esperado = (hash_conteudo or sessao.hash_conteudo or '').lower()
+    if not PADRAO_HASH.match(hash_esperado):
+        raise ErroSessaoUpload('Informe o hash SHA-256 do arquivo completo.')
+
+    pendentes = sorted(set(range(sessao.total_blocos)) - set(blocos_recebidos(sessao)))
+    if pendentes:
+        raise ErroSessaoUpload(f'Faltam {len(pendentes)} bloco(s) para concluir o upload.', 409)
+
+    # Reservar a sessão para que conclusões simultâneas não criem dois arquivos
+    reservada = SessaoUpload.query.filter_by(id=sessao.id, status=STATUS_ABERTA).update(
+        {'status': STATUS_CONCLUINDO}, synchronize_session=False
+    )
+    db.session.commit()
+    if not reservada:
+        raise ErroSessaoUpload('A sessão de upload já está sendo concluída.', 409)
+
+    # Com o hash conhecido antes da montagem, um conteúdo já verificado não
+    # é enviado ao verificador antivírus
+    verificador = None if consultar_veredito(hash_esperado) else obter_verificador()
+    receptor = ReceptorUpload(sessao.nome, obter_blob_store().diretorio_temporario(), limite_bytes=sessao.tamanho,
+                              verificador=verificador)
+    conteudo_registrado = False
+    try:
+        for indice in range(sessao.total_blocos):
+            with open(_caminho_bloco(sessao.id, indice), 'rb') as bloco:
+                receptor.consumir_stream(bloco)
+            if receptor.erro:
+                break
+        receptor.finalizar()
+
+        if receptor.rejeitado:
+            raise ErroSessaoUpload(receptor.erro)
+        if receptor.hash_conteudo != hash_esperado:
+            raise ErroSessaoUpload('O hash do arquivo montado não confere com o hash informado.', 422)
+
+        conteudo_registrado = True
+        try:
+            novo_arquivo = criar_arquivo(
+                receptor,
+                sessao.nome,
+                usuario_id=sessao.usuario_id,
+                instituicao_id=sessao.instituicao_id,
+                publico=sessao.publico,
+                metadados=dict(metadados or {}, upload_sessao=sessao.id)
+            )
+        except CotaExcedida as e:
+            raise ErroSessaoUpload(str(e), 413)
+        sessao.status = STATUS_CONCLUIDA
+        sessao.arquivo_id = novo_arquivo.id
+        db.session.commit()
+
+    except Exception:
+        db.session.rollback()
+        receptor.descartar()
+        if conteudo_registrado:
+            remover_conteudo_orfao(receptor.hash_conteudo)
+        SessaoUpload.query.filter_by(id=sessao.id).update({'status': STATUS_ABERTA}, synchronize_session=False)
+        db.session.commit()
+        raise
+
+    # Os blocos não são mais necessários
+    shutil.rmtree(_diretorio_sessao(sessao.id), ignore_errors=True)
+
+    # Extrair o texto em segundo plano, sem bloquear a requisição
+    agendar_extracao(novo_arquivo)
+
+    return novo_arquivo
+
+def cancelar_sessao(sessao):
+    """
+    Remove uma sessão e os blocos recebidos.
+
+    Args:
+        sessao: Objeto SessaoUpload
+    """
+    shutil.rmtree(_diretorio_sessao(sessao.id), ignore_errors=True)
+    db.session.delete(sessao)
+    db.session.commit()
+
+def limpar_sessoes_expiradas():
+    """
+    Remove as sessões expiradas e os diretórios de blocos sem sessão.
+
+    Returns:
+        Quantidade de sessões removidas
+    """
+    agora = datetime.datetime.now()
+    removidas = 0
+
+    for sessao in SessaoUpload.query.filter(SessaoUpload.data_expiracao < agora).all():
+        shutil.rmtree(_diretorio_sessao(sessao.id), ignore_errors=True)
+        db.session.delete(sessao)
+        removidas += 1
+    db.session.commit()
+
+    # Diretórios deixados por sessões removidas de outra forma (apenas os
+    # antigos, para não remover o de uma sessão ainda não confirmada)
+    raiz = _raiz_sessoes()
+    if os.path.isdir(raiz):
+        existentes = {sessao_id for (sessao_id,) in db.session.query(SessaoUpload.id)}
+        limite = agora.timestamp() - current_app.config.get('UPLOAD_SESSAO_VALIDADE', 24 * 60 * 60)
+        for nome in os.listdir(raiz):
+            caminho = os.path.join(raiz, nome)
+            if nome not in existentes and os.path.getmtime(caminho) < limite:
+                shutil.rmtree(caminho, ignore_errors=True)
+
+    return removidas
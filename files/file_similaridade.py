@@ -0,0 +1,336 @@
+"""
+Detecção de documentos quase idênticos (MinHash e LSH sobre o texto extraído)
+Serra Projetos Educacionais
+"""
+
+import struct
+import hashlib
+from itertools import groupby
+from flask import current_app
+from sqlalchemy import select, func, tuple_, insert, literal, and_
+
+# Importar modelos e utilitários
+from .file_models import Arquivo, AssinaturaArquivo, BandaSimilaridade
+from .file_search import PADRAO_PALAVRA, remover_acentos
+from .file_permissions import filtro_acesso_arquivos
+
+# Importar extensões da aplicação
+from auth import db
+
+# Quantidade de valores da assinatura MinHash
+TAMANHO_ASSINATURA = 128
+
+# Bandas do índice LSH, com TAMANHO_ASSINATURA / BANDAS valores cada. Com 16
+# bandas de 8 valores, um par com similaridade 0,8 vira candidato com
+# probabilidade de ~95%; com similaridade 0,5, de ~6%
+BANDAS = 16
+VALORES_BANDA = TAMANHO_ASSINATURA // BANDAS
+
+# Palavras consecutivas em cada trecho comparado (shingle)
+PALAVRAS_TRECHO = 5
+
+# Textos com menos trechos distintos não recebem assinatura
+MINIMO_TRECHOS = 20
+
+# Candidatos (os com mais bandas em comum) comparados em uma busca
+MAXIMO_CANDIDATOS = 200
+
+# Quantidade de assinaturas carregadas por consulta no relatório de grupos
+LOTE_ASSINATURAS = 500
+
+MASCARA_64 = (1 << 64) - 1
+
+# Constante ímpar usada para distinguir os valores copiados na densificação
+CONSTANTE_DENSIFICACAO = 0x9E3779B97F4A7C15
+
+def _hash_64(dados):
+    """Hash de 64 bits, estável entre processos."""
+    return int.from_bytes(hashlib.blake2b(dados, digest_size=8).digest(), 'big')
+
+def calcular_assinatura(texto):
+    """
+    Calcula a assinatura MinHash do texto de um documento.
+
+    O texto é dividido em trechos de PALAVRAS_TRECHO palavras (sem acentos,
+    em minúsculas). É usado o MinHash de permutação única: cada trecho recebe
+    um único hash, cujos bits baixos escolhem a posição da assinatura e os
+    demais o valor; cada posição guarda o menor valor. Posições sem trecho
+    recebem o valor da próxima posição preenchida (densificação por
+    rotação). O custo é linear no tamanho do texto, em vez de
+    TAMANHO_ASSINATURA hashes por trecho.
+
+    Args:
+        texto: Texto extraído do documento
+
+    Returns:
+        Tupla (assinatura em bytes, quantidade de trechos) ou None se o
+        texto for curto demais
+    """
+    palavras = PADRAO_PALAVRA.findall(remover_acentos(texto or ''))
+    trechos = {
+        ' '.join(palavras[i:i + PALAVRAS_TRECHO])
+        for i in range(len(palavras) - PALAVRAS_TRECHO + 1)
+    }
+    if len(trechos) < MINIMO_TRECHOS:
+        return None
+
+    minimos = [None] * TAMANHO_ASSINATURA
+    for trecho in trechos:
+        valor = _hash_64(trecho.encode('utf-8'))
+        posicao = valor % TAMANHO_ASSINATURA
+        valor //= TAMANHO_ASSINATURA
+        if minimos[posicao] is None or valor < minimos[posicao]:
+            minimos[posicao] = valor
+
+    assinatura = list(minimos)
+    for posicao in range(TAMANHO_ASSINATURA):
+        distancia = 1
+        while assinatura[posicao] is None:
+            origem = minimos[(posicao + distancia) % TAMANHO_ASSINATURA]
+            if origem is not None:
+                assinatura[posicao] = (origem ^ (distancia * CONSTANTE_DENSIFICACAO)) & MASCARA_64
+            distancia += 1
+
+    return struct.pack(f'<{TAMANHO_ASSINATURA}Q', *assinatura), len(trechos)
+
+def desempacotar_assinatura(dados):
+    """Converte a assinatura gravada na lista de valores."""
+    return struct.unpack(f'<{TAMANHO_ASSINATURA}Q', dados)
+
+def valores_bandas(assinatura):
+    """
+    Calcula o hash de cada banda de uma assinatura.
+
+    Args:
+        assinatura: Assinatura em bytes
+
+    Returns:
+        Lista com um inteiro de 64 bits com sinal por banda
+    """
+    tamanho_banda = VALORES_BANDA * 8
+    return [
+        int.from_bytes(
+            hashlib.blake2b(assinatura[banda * tamanho_banda:(banda + 1) * tamanho_banda], digest_size=8).digest(),
+            'big',
+            signed=True
+        )
+        for banda in range(BANDAS)
+    ]
+
+def similaridade(assinatura_a, assinatura_b):
+    """
+    Estima a similaridade de Jaccard entre dois documentos pelas assinaturas.
+
+    Args:
+        assinatura_a: Valores da primeira assinatura (desempacotar_assinatura)
+        assinatura_b: Valores da segunda assinatura
+
+    Returns:
+        Fração de posições iguais, entre 0 e 1
+    """
+    return sum(1 for a, b in zip(assinatura_a, assinatura_b) if a == b) / TAMANHO_ASSINATURA
+
+def remover_similaridade(arquivo_id):
+    """
+    Remove a assinatura e as bandas de um arquivo.
+
+    Args:
+        arquivo_id: ID do arquivo
+    """
+    BandaSimilaridade.query.filter_by(arquivo_id=arquivo_id).delete(synchronize_session=False)
+    AssinaturaArquivo.query.filter_by(arquivo_id=arquivo_id).delete(synchronize_session=False)
+
+def indexar_similaridade(arquivo, assinatura=None):
+    """
+    Grava a assinatura do texto de um arquivo e suas bandas no índice LSH.
+
+    A alteração é feita na sessão atual; o commit fica a cargo do chamador.
+
+    Args:
+        arquivo: Objeto Arquivo já gravado (com id)
+        assinatura: Resultado de calcular_assinatura já obtido no processo de
+            extração (padrão: calculada a partir de arquivo.conteudo_texto)
+    """
+    remover_similaridade(arquivo.id)
+
+    if assinatura is None:
+        assinatura = calcular_assinatura(arquivo.conteudo_texto)
+        if assinatura is None:
+            return
+
+    dados, total_trechos = assinatura
+    db.session.add(AssinaturaArquivo(arquivo_id=arquivo.id, assinatura=dados, total_trechos=total_trechos))
+    db.session.execute(
+        insert(BandaSimilaridade),
+        [{'banda': banda, 'valor': valor, 'arquivo_id': arquivo.id} for banda, valor in enumerate(valores_bandas(dados))]
+    )
+
+def copiar_similaridade(origem_id, destino_id):
+    """
+    Copia a assinatura e as bandas de um arquivo com o mesmo texto.
+
+    Args:
+        origem_id: ID do arquivo de origem
+        destino_id: ID do novo arquivo
+    """
+    db.session.execute(
+        insert(AssinaturaArquivo).from_select(
+            ['arquivo_id', 'assinatura', 'total_trechos'],
+            select(literal(destino_id), AssinaturaArquivo.assinatura, AssinaturaArquivo.total_trechos)
+            .where(AssinaturaArquivo.arquivo_id == origem_id)
+        )
+    )
+    db.session.execute(
+        insert(BandaSimilaridade).from_select(
+            ['banda', 'valor', 'arquivo_id'],
+            select(BandaSimilaridade.banda, BandaSimilaridade.valor, literal(destino_id))
+            .where(BandaSimilaridade.arquivo_id == origem_id)
+        )
+    )
+
+def buscar_similares(arquivo, usuario=None, limite=None, limiar=None):
+    """
+    Busca os documentos quase idênticos a um arquivo que o usuário pode acessar.
+
+    Apenas os arquivos com alguma banda igual são comparados (consulta
+    indexada por banda), de modo que o custo não depende do total de
+    arquivos, mas dos candidatos encontrados.
+
+    Args:
+        arquivo: Objeto Arquivo
+        usuario: Usuário (padrão: usuário atual)
+        limite: Quantidade máxima de resultados (padrão: SIMILARIDADE_MAXIMO_RESULTADOS)
+        limiar: Similaridade mínima (padrão: SIMILARIDADE_LIMIAR)
+
+    Returns:
+        Lista de tuplas (Arquivo, similaridade), da maior para a menor similaridade
+    """
+    limite = limite or current_app.config.get('SIMILARIDADE_MAXIMO_RESULTADOS', 10)
+    limiar = limiar if limiar is not None else current_app.config.get('SIMILARIDADE_LIMIAR', 0.8)
+
+    registro = db.session.get(AssinaturaArquivo, arquivo.id)
+    if registro is None:
+        return []
+
+    referencia = desempacotar_assinatura(registro.assinatura)
+    pares = list(enumerate(valores_bandas(registro.assinatura)))
+
+    candidatos = (
+        select(BandaSimilaridade.arquivo_id)
+        .where(
+            tuple_(BandaSimilaridade.banda, BandaSimilaridade.valor).in_(pares),
+            BandaSimilaridade.arquivo_id != arquivo.id
+        )
+        .group_by(BandaSimilaridade.arquivo_id)
+        .order_by(func.count().desc())
+        .limit(MAXIMO_CANDIDATOS)
+    )
+
+    linhas = (
+        db.session.query(Arquivo, AssinaturaArquivo.assinatura)
+        .join(AssinaturaArquivo, AssinaturaArquivo.arquivo_id == Arquivo.id)
+        .filter(Arquivo.id.in_(candidatos), filtro_acesso_arquivos(usuario))
+        .all()
+    )
+
+    similares = []
+    for candidato, assinatura in linhas:
+        valor = similaridade(referencia, desempacotar_assinatura(assinatura))
+        if valor >= limiar:
+            similares.append((candidato, valor))
+
+    similares.sort(key=lambda item: (-item[1], -item[0].id))
+    return similares[:limite]
+
+def _carregar_assinaturas(arquivo_ids):
+    """Carrega as assinaturas dos arquivos em lotes."""
+    assinaturas = {}
+    arquivo_ids = sorted(arquivo_ids)
+    for inicio in range(0, len(arquivo_ids), LOTE_ASSINATURAS):
+        lote = arquivo_ids[inicio:inicio + LOTE_ASSINATURAS]
+        for arquivo_id, dados in db.session.execute(
+            select(AssinaturaArquivo.arquivo_id, AssinaturaArquivo.assinatura)
+            .where(AssinaturaArquivo.arquivo_id.in_(lote))
+        ):
+            assinaturas[arquivo_id] = desempacotar_assinatura(dados)
+    return assinaturas
+
+def agrupar_quase_identicos(limiar=None, maximo_grupos=100):
+    """
+    Agrupa os arquivos quase idênticos de todo o sistema.
+
+    Percorre apenas as bandas com mais de um arquivo; em cada uma, os
+    arquivos são comparados com o primeiro e unidos ao seu grupo se a
+    similaridade alcançar o limiar. O custo é proporcional ao tamanho do
+    índice, sem comparação de todos os pares de arquivos.
+
+    Args:
+        limiar: Similaridade mínima (padrão: SIMILARIDADE_LIMIAR)
+        maximo_grupos: Quantidade máxima de grupos retornados (os maiores)
+
+    Returns:
+        Lista de dicionários com 'arquivos' (objetos Arquivo) e
+        'similaridade_minima' (em relação ao primeiro arquivo do grupo)
+    """
+    limiar = limiar if limiar is not None else current_app.config.get('SIMILARIDADE_LIMIAR', 0.8)
+
+    repetidas = (
+        select(BandaSimilaridade.banda, BandaSimilaridade.valor)
+        .group_by(BandaSimilaridade.banda, BandaSimilaridade.valor)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    linhas = db.session.execute(
+        select(BandaSimilaridade.banda, BandaSimilaridade.valor, BandaSimilaridade.arquivo_id)
+        .join(repetidas, and_(
+            BandaSimilaridade.banda == repetidas.c.banda,
+            BandaSimilaridade.valor == repetidas.c.valor
+        ))
+        .order_by(BandaSimilaridade.banda, BandaSimilaridade.valor, BandaSimilaridade.arquivo_id)
+    )
+    baldes = [
+        [linha.arquivo_id for linha in grupo]
+        for _, grupo in groupby(linhas, key=lambda linha: (linha.banda, linha.valor))
+    ]
+    if not baldes:
+        return []
+
+    assinaturas = _carregar_assinaturas({arquivo_id for balde in baldes for arquivo_id in balde})
+
+    # Conjuntos disjuntos (union-find) dos arquivos quase idênticos
+    pais = {}
+
+    def raiz(arquivo_id):
+        pais.setdefault(arquivo_id, arquivo_id)
+        while pais[arquivo_id] != arquivo_id:
+            pais[arquivo_id] = pais[pais[arquivo_id]]
+            arquivo_id = pais[arquivo_id]
+        return arquivo_id
+
+    for balde in baldes:
+        primeiro = balde[0]
+        for arquivo_id in balde[1:]:
+            if raiz(arquivo_id) == raiz(primeiro):
+                continue
+            if similaridade(assinaturas[primeiro], assinaturas[arquivo_id]) >= limiar:
+                pais[raiz(arquivo_id)] = raiz(primeiro)
+
+    grupos = {}
+    for arquivo_id in pais:
+        grupos.setdefault(raiz(arquivo_id), []).append(arquivo_id)
+
+    maiores = sorted((sorted(ids) for ids in grupos.values() if len(ids) > 1), key=lambda ids: (-len(ids), ids[0]))
+    maiores = maiores[:maximo_grupos]
+
+    arquivos = {
+        arquivo.id: arquivo
+        for arquivo in Arquivo.query.filter(Arquivo.id.in_([i for ids in maiores for i in ids])).all()
+    } if maiores else {}
+
+    resultado = []
+    for ids in maiores:
+        resultado.append({
+            'arquivos': [arquivos[i] for i in ids if i in arquivos],
+            'similaridade_minima': min(similaridade(assinaturas[ids[0]], assinaturas[i]) for i in ids[1:])
+        })
+    return resultado
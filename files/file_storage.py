@@ -0,0 +1,654 @@
+"""
+Armazenamento de conteúdo endereçado por hash para o sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import io
+import os
+import re
+import zlib
+import shutil
+import tempfile
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+# Importar modelos
+from .file_models import Blob
+
+# Importar extensões da aplicação
+from auth import db
+
+# Tamanho dos blocos usados na leitura e gravação de conteúdo
+TAMANHO_BLOCO = 64 * 1024
+
+# Formato esperado para o hash SHA-256 em hexadecimal
+PADRAO_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+# Algoritmos de compressão dos blobs e sufixo do arquivo compactado em disco
+SUFIXOS_COMPRESSAO = {
+    'zlib': '.zz',
+    'zstd': '.zst',
+}
+
+# Nível usado quando BLOB_COMPRESSAO_NIVEL não é informado
+NIVEL_PADRAO_COMPRESSAO = {
+    'zlib': 6,
+    'zstd': 3,
+}
+
+# Tamanho do início do conteúdo compactado para estimar a taxa de compressão
+TAMANHO_AMOSTRA_COMPRESSAO = 256 * 1024
+
+
+class LeitorZlib(io.RawIOBase):
+    """
+    Leitura descompactada, em blocos, de um arquivo gravado com zlib.
+
+    Apenas um bloco compactado e a saída pedida ficam em memória, de modo
+    que arquivos grandes são enviados sem serem descompactados por inteiro.
+    """
+
+    def __init__(self, arquivo):
+        self._arquivo = arquivo
+        self._descompactador = zlib.decompressobj()
+        self._pendente = b''
+        self._saida = b''
+        self._fim = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        tamanho = len(destino)
+
+        while not self._saida:
+            if self._pendente:
+                # max_length limita a memória usada por blocos muito compactados
+                self._saida = self._descompactador.decompress(self._pendente, tamanho)
+                self._pendente = self._descompactador.unconsumed_tail
+            elif not self._fim:
+                self._pendente = self._arquivo.read(TAMANHO_BLOCO)
+                self._fim = not self._pendente
+            else:
+                self._saida = self._descompactador.flush()
+                if not self._saida:
+                    return 0
+
+        dados, self._saida = self._saida[:tamanho], self._saida[tamanho:]
+        destino[:len(dados)] = dados
+        return len(dados)
+
+    def close(self):
+        if not self.closed:
+            self._arquivo.close()
+        super().close()
+
+
+def _obter_zstd():
+    """Importa o módulo zstandard (dependência opcional)."""
+    import zstandard
+    return zstandard
+
+def abrir_descompactado(arquivo, algoritmo):
+    """
+    Envolve um arquivo compactado em um leitor que descompacta em blocos.
+
+    Args:
+        arquivo: Objeto de arquivo binário com o conteúdo compactado
+        algoritmo: 'zlib' ou 'zstd'
+
+    Returns:
+        Objeto de arquivo binário com o conteúdo original
+    """
+    if algoritmo == 'zstd':
+        return io.BufferedReader(_obter_zstd().ZstdDecompressor().stream_reader(arquivo, closefd=True), TAMANHO_BLOCO)
+    return io.BufferedReader(LeitorZlib(arquivo), TAMANHO_BLOCO)
+
+def _criar_compactador(algoritmo, nivel):
+    """Retorna funções (compactar bloco, finalizar) para o algoritmo."""
+    if algoritmo == 'zstd':
+        compactador = _obter_zstd().ZstdCompressor(level=nivel).compressobj()
+        return compactador.compress, compactador.flush
+
+    compactador = zlib.compressobj(nivel)
+    return compactador.compress, compactador.flush
+
+def estimar_razao_compressao(amostra, algoritmo, nivel=None):
+    """
+    Mede a razão entre o tamanho compactado e o original de uma amostra.
+
+    Args:
+        amostra: Bytes do início do conteúdo
+        algoritmo: 'zlib' ou 'zstd'
+        nivel: Nível de compressão (padrão: NIVEL_PADRAO_COMPRESSAO)
+
+    Returns:
+        Razão (1.0 = sem ganho)
+    """
+    if not amostra:
+        return 1.0
+
+    compactar, finalizar = _criar_compactador(algoritmo, nivel or NIVEL_PADRAO_COMPRESSAO[algoritmo])
+    return len(compactar(amostra) + finalizar()) / len(amostra)
+
+
+class BlobStore:
+    """
+    Interface para backends de armazenamento de conteúdo endereçado por hash.
+
+    Cada conteúdo é identificado pelo SHA-256 já calculado em
+    Arquivo.hash_conteudo, de modo que bytes idênticos são armazenados uma única vez.
+    """
+    nome = None
+
+    def existe(self, hash_conteudo):
+        """Verifica se o conteúdo está presente no armazenamento."""
+        raise NotImplementedError
+
+    def abrir(self, hash_conteudo):
+        """Retorna um objeto de arquivo binário para leitura do conteúdo."""
+        raise NotImplementedError
+
+    def tamanho(self, hash_conteudo):
+        """Retorna o tamanho em bytes do conteúdo armazenado."""
+        raise NotImplementedError
+
+    def gravar_arquivo(self, caminho_origem, hash_conteudo):
+        """Move um arquivo já gravado em disco para o armazenamento."""
+        raise NotImplementedError
+
+    def gravar_stream(self, stream, hash_conteudo):
+        """Grava o conteúdo lido de um objeto de arquivo binário."""
+        raise NotImplementedError
+
+    def remover(self, hash_conteudo):
+        """Remove o conteúdo do armazenamento, se existir."""
+        raise NotImplementedError
+
+    def caminho_local(self, hash_conteudo):
+        """
+        Retorna o caminho em disco do conteúdo ou None se o backend não for
+        local ou se o conteúdo estiver compactado.
+        """
+        return None
+
+    def compactar(self, hash_conteudo, algoritmo, nivel=None, razao_maxima=1.0):
+        """
+        Substitui o conteúdo armazenado pela versão compactada, se valer a pena.
+
+        Returns:
+            Tamanho compactado em bytes ou None se o conteúdo foi mantido
+        """
+        return None
+
+    def extrair_temporario(self, hash_conteudo):
+        """
+        Grava uma cópia descompactada do conteúdo em diretorio_temporario().
+
+        Usada quando caminho_local() retorna None e um caminho em disco é
+        necessário; a cópia deve ser removida pelo chamador.
+
+        Returns:
+            Caminho da cópia
+        """
+        fd, caminho = tempfile.mkstemp(dir=self.diretorio_temporario(), prefix='.descompactado_')
+        try:
+            with os.fdopen(fd, 'wb') as destino, self.abrir(hash_conteudo) as origem:
+                shutil.copyfileobj(origem, destino, TAMANHO_BLOCO)
+        except Exception:
+            os.remove(caminho)
+            raise
+        return caminho
+
+    def diretorio_temporario(self):
+        """Retorna o diretório para arquivos em recebimento antes de serem armazenados."""
+        return tempfile.gettempdir()
+
+    def gravar_bytes(self, dados, hash_conteudo):
+        """Grava o conteúdo a partir de bytes em memória."""
+        return self.gravar_stream(io.BytesIO(dados), hash_conteudo)
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Backend de armazenamento em sistema de arquivos local.
+
+    Os blobs são distribuídos em subdiretórios pelos primeiros caracteres do
+    hash (ex.: ab/cd/abcd...), evitando diretórios com milhares de entradas.
+    """
+    nome = 'local'
+
+    def __init__(self, raiz, niveis=2):
+        self.raiz = os.path.abspath(raiz)
+        self.niveis = niveis
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def _caminho(self, hash_conteudo):
+        """
+        Monta o caminho do blob a partir do hash.
+
+        Args:
+            hash_conteudo: Hash SHA-256 em hexadecimal
+
+        Returns:
+            Caminho completo do blob em disco
+        """
+        if not hash_conteudo or not PADRAO_HASH.match(hash_conteudo):
+            raise ValueError(f'Hash de conteúdo inválido: {hash_conteudo!r}')
+
+        partes = [hash_conteudo[i * 2:i * 2 + 2] for i in range(self.niveis)]
+        return os.path.join(self.raiz, *partes, hash_conteudo)
+
+    def _localizar(self, hash_conteudo):
+        """
+        Localiza o arquivo do blob em disco, compactado ou não.
+
+        Returns:
+            Tupla (caminho, algoritmo de compressão ou None) ou (None, None)
+        """
+        caminho = self._caminho(hash_conteudo)
+        if os.path.exists(caminho):
+            return caminho, None
+
+        for algoritmo, sufixo in SUFIXOS_COMPRESSAO.items():
+            if os.path.exists(caminho + sufixo):
+                return caminho + sufixo, algoritmo
+
+        return None, None
+
+    def existe(self, hash_conteudo):
+        return self._localizar(hash_conteudo)[0] is not None
+
+    def abrir(self, hash_conteudo):
+        caminho, algoritmo = self._localizar(hash_conteudo)
+        if caminho is None:
+            raise FileNotFoundError(f'Conteúdo não encontrado: {hash_conteudo}')
+
+        arquivo = open(caminho, 'rb')
+        return abrir_descompactado(arquivo, algoritmo) if algoritmo else arquivo
+
+    def tamanho(self, hash_conteudo):
+        # Tamanho em disco (compactado, se for o caso)
+        caminho, _ = self._localizar(hash_conteudo)
+        if caminho is None:
+            raise FileNotFoundError(f'Conteúdo não encontrado: {hash_conteudo}')
+        return os.path.getsize(caminho)
+
+    def compressao(self, hash_conteudo):
+        """Retorna o algoritmo com que o conteúdo está compactado em disco ou None."""
+        return self._localizar(hash_conteudo)[1]
+
+    def caminho_local(self, hash_conteudo):
+        # Conteúdo compactado não pode ser lido diretamente do disco
+        caminho = self._caminho(hash_conteudo)
+        if not os.path.exists(caminho) and self.compressao(hash_conteudo):
+            return None
+        return caminho
+
+    def compactar(self, hash_conteudo, algoritmo, nivel=None, razao_maxima=1.0):
+        """
+        Substitui o blob pela versão compactada com o algoritmo informado.
+
+        A razão de compressão é estimada no início do conteúdo antes de
+        compactá-lo por inteiro e conferida ao final; se for maior que
+        razao_maxima, o blob é mantido como está. Um blob compactado com
+        outro algoritmo é recompactado. A versão compactada é gravada em
+        arquivo temporário e renomeada antes da remoção da anterior, de modo
+        que leituras simultâneas sempre encontram o conteúdo.
+
+        Args:
+            hash_conteudo: Hash SHA-256 do conteúdo
+            algoritmo: 'zlib' ou 'zstd'
+            nivel: Nível de compressão (padrão: NIVEL_PADRAO_COMPRESSAO)
+            razao_maxima: Maior razão compactado/original aceita
+
+        Returns:
+            Tamanho compactado em bytes ou None se o conteúdo foi mantido
+        """
+        if algoritmo not in SUFIXOS_COMPRESSAO:
+            raise ValueError(f'Algoritmo de compressão desconhecido: {algoritmo}')
+
+        atual, algoritmo_atual = self._localizar(hash_conteudo)
+        if atual is None:
+            raise FileNotFoundError(f'Conteúdo não encontrado: {hash_conteudo}')
+        if algoritmo_atual == algoritmo:
+            return os.path.getsize(atual)
+
+        nivel = nivel or NIVEL_PADRAO_COMPRESSAO[algoritmo]
+        destino = self._caminho(hash_conteudo) + SUFIXOS_COMPRESSAO[algoritmo]
+
+        with self.abrir(hash_conteudo) as origem:
+            amostra = origem.read(TAMANHO_AMOSTRA_COMPRESSAO)
+            if estimar_razao_compressao(amostra, algoritmo, nivel) > razao_maxima:
+                return None
+
+            compactar, finalizar = _criar_compactador(algoritmo, nivel)
+            tamanho_original = 0
+            fd, caminho_temp = tempfile.mkstemp(dir=os.path.dirname(destino), prefix='.tmp_')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    bloco = amostra
+                    while bloco:
+                        tamanho_original += len(bloco)
+                        f.write(compactar(bloco))
+                        bloco = origem.read(TAMANHO_BLOCO)
+                    f.write(finalizar())
+
+                tamanho_compactado = os.path.getsize(caminho_temp)
+                if tamanho_compactado > tamanho_original * razao_maxima:
+                    os.remove(caminho_temp)
+                    return None
+
+                os.replace(caminho_temp, destino)
+            except Exception:
+                if os.path.exists(caminho_temp):
+                    os.remove(caminho_temp)
+                raise
+
+        os.remove(atual)
+        return tamanho_compactado
+
+    def diretorio_temporario(self):
+        # No mesmo sistema de arquivos, para que o armazenamento seja apenas uma renomeação
+        diretorio = os.path.join(self.raiz, '.recebimento')
+        os.makedirs(diretorio, exist_ok=True)
+        return diretorio
+
+    def gravar_arquivo(self, caminho_origem, hash_conteudo):
+        destino = self._caminho(hash_conteudo)
+
+        # Conteúdo já armazenado (compactado ou não): descartar a cópia recebida
+        if self.existe(hash_conteudo):
+            os.remove(caminho_origem)
+            return destino
+
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try:
+            os.replace(caminho_origem, destino)
+        except OSError:
+            # Origem em outro sistema de arquivos
+            shutil.move(caminho_origem, destino)
+
+        return destino
+
+    def gravar_stream(self, stream, hash_conteudo):
+        destino = self._caminho(hash_conteudo)
+
+        if self.existe(hash_conteudo):
+            return destino
+
+        diretorio = os.path.dirname(destino)
+        os.makedirs(diretorio, exist_ok=True)
+
+        # Gravar em arquivo temporário no mesmo diretório e renomear atomicamente
+        fd, caminho_temp = tempfile.mkstemp(dir=diretorio, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(stream, f, TAMANHO_BLOCO)
+            os.replace(caminho_temp, destino)
+        except Exception:
+            if os.path.exists(caminho_temp):
+                os.remove(caminho_temp)
+            raise
+
+        return destino
+
+    def remover(self, hash_conteudo):
+        caminho = self._caminho(hash_conteudo)
+        removido = False
+        for candidato in [caminho] + [caminho + sufixo for sufixo in SUFIXOS_COMPRESSAO.values()]:
+            if os.path.exists(candidato):
+                os.remove(candidato)
+                removido = True
+        return removido
+
+
+# Backends disponíveis, indexados pelo valor de BLOB_STORAGE_BACKEND
+BACKENDS = {
+    'local': LocalBlobStore,
+}
+
+def registrar_backend(nome, classe):
+    """
+    Registra um novo backend de armazenamento.
+
+    Args:
+        nome: Nome do backend, usado em BLOB_STORAGE_BACKEND
+        classe: Subclasse de BlobStore
+    """
+    BACKENDS[nome] = classe
+
+def obter_blob_store():
+    """
+    Retorna a instância do backend de armazenamento configurado na aplicação.
+
+    Returns:
+        Instância de BlobStore
+    """
+    store = current_app.extensions.get('blob_store')
+
+    if store is None:
+        nome_backend = current_app.config.get('BLOB_STORAGE_BACKEND', 'local')
+        if nome_backend not in BACKENDS:
+            raise ValueError(f'Backend de armazenamento desconhecido: {nome_backend}')
+
+        raiz = current_app.config.get('BLOB_STORAGE_PATH') or os.path.join(current_app.instance_path, 'blobs')
+        store = BACKENDS[nome_backend](raiz)
+        current_app.extensions['blob_store'] = store
+
+    return store
+
+def deve_compactar(blob, mime_type=None):
+    """
+    Verifica se um blob deve ser compactado conforme a configuração.
+
+    São compactados apenas os tipos MIME de BLOB_COMPRESSAO_TIPOS com pelo
+    menos BLOB_COMPRESSAO_TAMANHO_MINIMO bytes que ainda não estejam
+    compactados com o algoritmo de BLOB_COMPRESSAO.
+
+    Args:
+        blob: Objeto Blob
+        mime_type: Tipo MIME do conteúdo (None: não verificar o tipo)
+
+    Returns:
+        Boolean indicando se o blob deve ser compactado
+    """
+    algoritmo = current_app.config.get('BLOB_COMPRESSAO')
+    if not algoritmo or blob.compressao == algoritmo:
+        return False
+
+    if mime_type is not None and mime_type not in current_app.config.get('BLOB_COMPRESSAO_TIPOS', ()):
+        return False
+
+    return blob.tamanho >= current_app.config.get('BLOB_COMPRESSAO_TAMANHO_MINIMO', 4096)
+
+def compactar_conteudo(hash_conteudo):
+    """
+    Compacta um conteúdo do armazenamento com os parâmetros configurados.
+
+    Não altera o banco de dados e pode ser chamada fora da thread da
+    requisição; o resultado deve ser gravado com aplicar_compressao.
+
+    Args:
+        hash_conteudo: Hash SHA-256 do conteúdo
+
+    Returns:
+        Tamanho compactado em bytes ou None se o conteúdo foi mantido
+    """
+    return obter_blob_store().compactar(
+        hash_conteudo,
+        current_app.config['BLOB_COMPRESSAO'],
+        nivel=current_app.config.get('BLOB_COMPRESSAO_NIVEL'),
+        razao_maxima=current_app.config.get('BLOB_COMPRESSAO_RAZAO_MAXIMA', 0.9)
+    )
+
+def aplicar_compressao(blob, tamanho_compactado):
+    """
+    Registra no blob o resultado de compactar_conteudo.
+
+    Args:
+        blob: Objeto Blob
+        tamanho_compactado: Valor retornado por compactar_conteudo
+
+    Returns:
+        Bytes economizados em relação ao armazenamento anterior
+    """
+    if tamanho_compactado is None:
+        return 0
+
+    tamanho_anterior = blob.tamanho_armazenado or blob.tamanho
+    blob.compressao = current_app.config['BLOB_COMPRESSAO']
+    blob.tamanho_armazenado = tamanho_compactado
+    return tamanho_anterior - tamanho_compactado
+
+def compactar_blob(blob, mime_type=None):
+    """
+    Compacta o conteúdo de um blob conforme a configuração BLOB_COMPRESSAO.
+
+    O conteúdo só é substituído se a razão de compressão medida não passar
+    de BLOB_COMPRESSAO_RAZAO_MAXIMA. A alteração do blob é feita na sessão
+    atual; o commit fica a cargo do chamador.
+
+    Args:
+        blob: Objeto Blob
+        mime_type: Tipo MIME do conteúdo (None: não verificar o tipo)
+
+    Returns:
+        Bytes economizados em relação ao armazenamento anterior
+    """
+    if not deve_compactar(blob, mime_type):
+        return 0
+
+    return aplicar_compressao(blob, compactar_conteudo(blob.hash_conteudo))
+
+def _bloquear_blob(hash_conteudo, tamanho, backend):
+    """
+    Retorna o registro do blob bloqueado (SELECT ... FOR UPDATE), criando-o se necessário.
+
+    O registro serve de trava para o conteúdo armazenado: registrar_blob
+    grava o arquivo e remover_conteudo_orfao o apaga sempre com ele
+    bloqueado, até o commit da transação.
+
+    Returns:
+        Tupla (blob, criado)
+    """
+    blob = Blob.query.filter_by(hash_conteudo=hash_conteudo).with_for_update().populate_existing().first()
+    if blob is not None:
+        return blob, False
+
+    try:
+        with db.session.begin_nested():
+            blob = Blob(
+                hash_conteudo=hash_conteudo,
+                tamanho=tamanho,
+                backend=backend,
+                referencias=0
+            )
+            db.session.add(blob)
+        return blob, True
+    except IntegrityError:
+        # Outra transação registrou o mesmo conteúdo simultaneamente
+        return Blob.query.filter_by(hash_conteudo=hash_conteudo).with_for_update().populate_existing().one(), False
+
+def registrar_blob(hash_conteudo, tamanho, caminho_origem=None):
+    """
+    Garante que o conteúdo esteja armazenado e incrementa sua contagem de referências.
+
+    A alteração é feita na sessão atual; o commit fica a cargo do chamador.
+    O registro do blob fica bloqueado até o commit, de modo que uma remoção
+    simultânea do mesmo conteúdo (remover_conteudo_orfao) espera ou é impedida.
+    O conteúdo é gravado sem compressão; a compressão (compactar_blob) é
+    feita depois, fora da requisição.
+
+    Args:
+        hash_conteudo: Hash SHA-256 do conteúdo
+        tamanho: Tamanho do conteúdo em bytes
+        caminho_origem: Caminho de um arquivo a ser movido para o armazenamento (opcional)
+
+    Returns:
+        Objeto Blob referenciado
+
+    Raises:
+        FileNotFoundError: Se caminho_origem não for informado e o conteúdo não estiver armazenado
+    """
+    store = obter_blob_store()
+    blob, _ = _bloquear_blob(hash_conteudo, tamanho, store.nome)
+
+    # Gravado só depois do bloqueio: o conteúdo não pode ser apagado entre a
+    # gravação e o incremento das referências
+    if caminho_origem:
+        store.gravar_arquivo(caminho_origem, hash_conteudo)
+    elif not store.existe(hash_conteudo):
+        raise FileNotFoundError(f'Conteúdo não encontrado no armazenamento: {hash_conteudo}')
+
+    # Incremento feito no banco para não perder atualizações concorrentes
+    blob.referencias = Blob.referencias + 1
+    db.session.flush()
+
+    return blob
+
+def liberar_blob(blob):
+    """
+    Decrementa a contagem de referências de um blob.
+
+    Quando não restam referências, o registro é removido da sessão e o hash é
+    retornado para que o conteúdo seja apagado após o commit, com
+    remover_conteudo_orfao.
+
+    Args:
+        blob: Objeto Blob
+
+    Returns:
+        Hash do conteúdo a ser removido ou None
+    """
+    if blob is None:
+        return None
+
+    blob.referencias = Blob.referencias - 1
+    db.session.flush()
+
+    if blob.referencias <= 0:
+        hash_conteudo = blob.hash_conteudo
+        db.session.delete(blob)
+        return hash_conteudo
+
+    return None
+
+def remover_conteudo_orfao(hash_conteudo):
+    """
+    Remove do armazenamento um conteúdo que não é mais referenciado.
+
+    Deve ser chamada após o commit que removeu o registro do blob (ou que
+    desfez um upload), pois conclui a transação atual. A contagem de
+    referências é conferida e o arquivo é apagado com o registro do blob
+    bloqueado, a mesma trava de registrar_blob: um upload simultâneo do
+    mesmo conteúdo espera a remoção e grava o arquivo de novo, ou impede
+    a remoção.
+
+    Args:
+        hash_conteudo: Hash SHA-256 do conteúdo
+
+    Returns:
+        Boolean indicando se o conteúdo foi removido
+    """
+    if not hash_conteudo:
+        return False
+
+    store = obter_blob_store()
+
+    try:
+        blob, _ = _bloquear_blob(hash_conteudo, 0, store.nome)
+
+        # Um novo upload pode ter voltado a referenciar o mesmo conteúdo
+        if blob.referencias > 0:
+            db.session.rollback()
+            return False
+
+        removido = store.remover(hash_conteudo)
+        db.session.delete(blob)
+        db.session.commit()
+        return removido
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao remover conteúdo órfão: {str(e)}")
+        return False
@@ -0,0 +1,373 @@
+"""
+Miniaturas e pré-visualização de páginas para o sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import os
+import json
+import tempfile
+import threading
+from flask import current_app, send_file
+
+# Importar utilitários
+from .file_storage import obter_blob_store, PADRAO_HASH
+from .file_antivirus import em_quarentena
+from .file_sandbox import executar_isolado, limites_configurados, FalhaSandbox
+
+# Importar extensões da aplicação
+from auth import db
+
+# Larguras (em pixels) aceitas para renderização; limitar as opções evita
+# que variações arbitrárias na URL ocupem o cache
+LARGURAS_PERMITIDAS = (200, 400, 800, 1200)
+
+# Largura da miniatura exibida nas listagens
+LARGURA_MINIATURA = 200
+
+# Largura das páginas exibidas no visualizador
+LARGURA_PAGINA = 800
+
+# Fração do limite mantida após uma limpeza, para evitar limpezas a cada gravação
+FRACAO_APOS_LIMPEZA = 0.9
+
+# Validade das imagens no cache do navegador (as URLs incluem o hash do conteúdo)
+TEMPO_CACHE_IMAGENS = 365 * 24 * 60 * 60
+
+
+class CacheMiniaturas:
+    """
+    Cache em disco de imagens renderizadas, com tamanho máximo e remoção
+    das menos usadas (LRU).
+
+    Cada imagem é identificada pelo hash do conteúdo, pela largura e pela
+    página, de modo que arquivos com o mesmo conteúdo compartilham as
+    imagens e uma página é renderizada apenas uma vez. A data de modificação
+    de cada imagem é atualizada a cada acesso e usada como ordem de uso.
+    """
+
+    def __init__(self, raiz, limite_bytes):
+        self.raiz = raiz
+        self.limite_bytes = limite_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def _caminho(self, hash_conteudo, largura, pagina):
+        if not PADRAO_HASH.match(hash_conteudo or ''):
+            raise ValueError('Hash de conteúdo inválido.')
+        return os.path.join(self.raiz, hash_conteudo[:2], f'{hash_conteudo}_{largura}_{pagina}.png')
+
+    def obter(self, hash_conteudo, largura, pagina):
+        """
+        Retorna o caminho da imagem em cache, ou None se ela não existir.
+
+        Args:
+            hash_conteudo: Hash SHA-256 do conteúdo do arquivo
+            largura: Largura da imagem em pixels
+            pagina: Número da página (a partir de 1)
+
+        Returns:
+            Caminho da imagem ou None
+        """
+        caminho = self._caminho(hash_conteudo, largura, pagina)
+        try:
+            # Marcar como usada recentemente
+            os.utime(caminho)
+        except FileNotFoundError:
+            return None
+        return caminho
+
+    def gravar(self, hash_conteudo, largura, pagina, dados):
+        """
+        Grava uma imagem no cache, removendo as menos usadas se o limite for excedido.
+
+        Args:
+            hash_conteudo: Hash SHA-256 do conteúdo do arquivo
+            largura: Largura da imagem em pixels
+            pagina: Número da página (a partir de 1)
+            dados: Bytes da imagem PNG
+
+        Returns:
+            Caminho da imagem gravada
+        """
+        caminho = self._caminho(hash_conteudo, largura, pagina)
+        diretorio = os.path.dirname(caminho)
+        os.makedirs(diretorio, exist_ok=True)
+
+        fd, caminho_temporario = tempfile.mkstemp(dir=diretorio, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                destino.write(dados)
+            os.replace(caminho_temporario, caminho)
+        except Exception:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._calcular_total()
+            else:
+                self._total_bytes += len(dados)
+
+            if self._total_bytes > self.limite_bytes:
+                self._limpar()
+
+        return caminho
+
+    def _listar(self):
+        """Retorna (data de uso, tamanho, caminho) de cada imagem do cache."""
+        imagens = []
+        for diretorio, _, nomes in os.walk(self.raiz):
+            for nome in nomes:
+                if nome.startswith('.tmp_'):
+                    continue
+                caminho = os.path.join(diretorio, nome)
+                try:
+                    estado = os.stat(caminho)
+                except FileNotFoundError:
+                    continue
+                imagens.append((estado.st_mtime, estado.st_size, caminho))
+        return imagens
+
+    def _calcular_total(self):
+        return sum(tamanho for _, tamanho, _ in self._listar())
+
+    def _limpar(self):
+        """Remove as imagens usadas há mais tempo até ficar abaixo do limite."""
+        imagens = sorted(self._listar())
+        total = sum(tamanho for _, tamanho, _ in imagens)
+        alvo = self.limite_bytes * FRACAO_APOS_LIMPEZA
+
+        for _, tamanho, caminho in imagens:
+            if total <= alvo:
+                break
+            try:
+                os.remove(caminho)
+                total -= tamanho
+            except FileNotFoundError:
+                pass
+
+        self._total_bytes = total
+
+    def remover(self, hash_conteudo):
+        """Remove todas as imagens de um conteúdo."""
+        diretorio = os.path.join(self.raiz, hash_conteudo[:2])
+        if not os.path.isdir(diretorio):
+            return
+        for nome in os.listdir(diretorio):
+            if nome.startswith(f'{hash_conteudo}_'):
+                try:
+                    os.remove(os.path.join(diretorio, nome))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self._total_bytes = None
+
+
+def obter_cache_miniaturas():
+    """
+    Retorna o cache de miniaturas da aplicação, criando-o se necessário.
+
+    Returns:
+        Instância de CacheMiniaturas
+    """
+    cache = current_app.extensions.get('cache_miniaturas')
+
+    if cache is None:
+        raiz = current_app.config.get('MINIATURAS_PATH') or os.path.join(current_app.instance_path, 'miniaturas')
+        cache = CacheMiniaturas(raiz, current_app.config.get('MINIATURAS_LIMITE_BYTES', 256 * 1024 * 1024))
+        current_app.extensions['cache_miniaturas'] = cache
+
+    return cache
+
+def renderizar_pagina(documento, pagina, largura):
+    """
+    Renderiza uma página de um documento PyMuPDF já aberto como PNG.
+
+    A página é renderizada diretamente na largura solicitada, sem
+    redimensionamento posterior.
+
+    Args:
+        documento: Documento aberto com fitz.open
+        pagina: Número da página (a partir de 1)
+        largura: Largura da imagem em pixels
+
+    Returns:
+        Bytes da imagem PNG
+    """
+    import fitz  # PyMuPDF
+
+    pagina_pdf = documento.load_page(pagina - 1)
+    escala = largura / pagina_pdf.rect.width
+    pixmap = pagina_pdf.get_pixmap(matrix=fitz.Matrix(escala, escala), alpha=False)
+    return pixmap.tobytes('png')
+
+def _processar_pdf_isolado(caminho, pagina, largura):
+    """
+    Função executada no processo isolado: abre o PDF com PyMuPDF e renderiza
+    uma página.
+
+    Returns:
+        Tupla (total de páginas, bytes PNG da página ou None)
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(caminho) as documento:
+        total = documento.page_count
+        if pagina is None or pagina < 1 or pagina > total:
+            return total, None
+        return total, renderizar_pagina(documento, pagina, largura)
+
+def _processar_pdf(arquivo, pagina=None, largura=None):
+    """
+    Abre o PDF de um arquivo em um processo isolado, com os limites de
+    EXTRACAO_LIMITE_* e o tempo máximo MINIATURAS_TEMPO_MAXIMO.
+
+    Uma falha do processo (tempo, memória ou encerramento) é registrada nos
+    metadados do arquivo, e o mesmo conteúdo não é aberto de novo.
+
+    Args:
+        arquivo: Objeto Arquivo (PDF)
+        pagina: Número da página a renderizar (None para apenas contar as páginas)
+        largura: Largura da imagem em pixels
+
+    Returns:
+        Tupla (total de páginas, bytes PNG ou None) ou None em caso de falha
+    """
+    metadados = json.loads(arquivo.metadados or '{}')
+    falha = metadados.get('falha_renderizacao')
+    if falha and falha.get('hash_conteudo') == arquivo.hash_conteudo:
+        return None
+
+    store = obter_blob_store()
+    caminho = store.caminho_local(arquivo.hash_conteudo)
+    temporario = False
+
+    try:
+        # Conteúdo compactado: o processo isolado lê uma cópia descompactada
+        if not caminho:
+            caminho = store.extrair_temporario(arquivo.hash_conteudo)
+            temporario = True
+
+        limites = limites_configurados(current_app.config.get('MINIATURAS_TEMPO_MAXIMO', 15))
+        return executar_isolado(_processar_pdf_isolado, (caminho, pagina, largura), **limites)
+    except FalhaSandbox as e:
+        print(f"Erro ao processar PDF do arquivo {arquivo.id}: {e.como_dict()}")
+        try:
+            metadados['falha_renderizacao'] = dict(e.como_dict(), hash_conteudo=arquivo.hash_conteudo)
+            arquivo.metadados = json.dumps(metadados, default=str)
+            db.session.commit()
+        except Exception as erro:
+            db.session.rollback()
+            print(f"Erro ao registrar falha de renderização: {str(erro)}")
+        return None
+    except Exception as e:
+        print(f"Erro ao processar PDF: {str(e)}")
+        return None
+    finally:
+        if temporario:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+def obter_imagem_pagina(arquivo, pagina=1, largura=LARGURA_MINIATURA):
+    """
+    Retorna o caminho da imagem de uma página do arquivo, renderizando-a se necessário.
+
+    A renderização é feita em um processo isolado (_processar_pdf).
+
+    Args:
+        arquivo: Objeto Arquivo
+        pagina: Número da página (a partir de 1)
+        largura: Largura da imagem em pixels (uma das LARGURAS_PERMITIDAS)
+
+    Returns:
+        Caminho da imagem PNG ou None se não for possível gerá-la (inclusive
+        para arquivos em quarentena, que não são abertos)
+    """
+    if arquivo.tipo != 'pdf' or not arquivo.hash_conteudo or largura not in LARGURAS_PERMITIDAS:
+        return None
+    if em_quarentena(arquivo):
+        return None
+
+    cache = obter_cache_miniaturas()
+    caminho = cache.obter(arquivo.hash_conteudo, largura, pagina)
+    if caminho:
+        return caminho
+
+    if pagina < 1:
+        return None
+
+    resultado = _processar_pdf(arquivo, pagina, largura)
+    if resultado is None or resultado[1] is None:
+        return None
+
+    return cache.gravar(arquivo.hash_conteudo, largura, pagina, resultado[1])
+
+def obter_total_paginas(arquivo):
+    """
+    Retorna o número de páginas de um PDF.
+
+    O valor é guardado nos metadados do arquivo na primeira consulta.
+
+    Args:
+        arquivo: Objeto Arquivo
+
+    Returns:
+        Número de páginas, ou 0 se o arquivo não for um PDF legível
+    """
+    if arquivo.tipo != 'pdf' or not arquivo.hash_conteudo or em_quarentena(arquivo):
+        return 0
+
+    metadados = json.loads(arquivo.metadados or '{}')
+    if 'paginas' in metadados:
+        return metadados['paginas']
+
+    resultado = _processar_pdf(arquivo)
+    if resultado is None:
+        return 0
+    total = resultado[0]
+
+    try:
+        metadados = json.loads(arquivo.metadados or '{}')
+        metadados['paginas'] = total
+        arquivo.metadados = json.dumps(metadados)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao gravar número de páginas: {str(e)}")
+
+    return total
+
+def enviar_imagem_pagina(arquivo, pagina=1, largura=LARGURA_MINIATURA):
+    """
+    Envia a imagem de uma página do arquivo com cabeçalhos de cache de longa duração.
+
+    Args:
+        arquivo: Objeto Arquivo
+        pagina: Número da página (a partir de 1)
+        largura: Largura da imagem em pixels
+
+    Returns:
+        Resposta Flask ou None se não for possível gerar a imagem
+    """
+    caminho = obter_imagem_pagina(arquivo, pagina, largura)
+    if caminho is None:
+        return None
+
+    resposta = send_file(
+        caminho,
+        mimetype='image/png',
+        conditional=True,
+        etag=f'{arquivo.hash_conteudo}-{largura}-{pagina}',
+        max_age=TEMPO_CACHE_IMAGENS
+    )
+    resposta.cache_control.immutable = True
+
+    if not arquivo.publico:
+        resposta.cache_control.private = True
+        resposta.cache_control.public = False
+
+    return resposta
@@ -0,0 +1,248 @@
+"""
+URLs de download assinadas (HMAC) e verificador WSGI independente do Flask
+Serra Projetos Educacionais
+
+Este módulo usa apenas a biblioteca padrão, para que o verificador possa
+ser executado em um processo próprio, sem a aplicação, o ORM ou o banco de
+dados:
+
+    DOWNLOAD_SECRET_KEY=... BLOB_STORAGE_PATH=instance/blobs \\
+        python files/file_urls_assinadas.py --porta 8081
+
+Em produção o verificador pode ser servido por qualquer servidor WSGI e,
+com DOWNLOAD_OFFLOAD_CABECALHO=X-Accel-Redirect, apenas valida a assinatura
+e delega o envio do conteúdo (sendfile) ao Nginx.
+"""
+
+import os
+import re
+import hmac
+import time
+import hashlib
+import mimetypes
+import unicodedata
+from urllib.parse import parse_qs, quote, urlencode
+
+# Hash SHA-256 em hexadecimal (mesmo formato de file_storage.PADRAO_HASH)
+PADRAO_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+# Disposições aceitas na URL
+DISPOSICOES = ('attachment', 'inline')
+
+# Tamanho dos blocos enviados quando o servidor não oferece wsgi.file_wrapper
+TAMANHO_BLOCO = 64 * 1024
+
+def derivar_chave(segredo):
+    """
+    Deriva a chave das assinaturas de download a partir do SECRET_KEY.
+
+    Uma chave própria evita que assinaturas de download sejam aceitas em
+    outros usos do SECRET_KEY (sessões, tokens CSRF) e vice-versa.
+
+    Args:
+        segredo: SECRET_KEY da aplicação (str ou bytes)
+
+    Returns:
+        Chave em bytes
+    """
+    if isinstance(segredo, str):
+        segredo = segredo.encode('utf-8')
+    return hmac.new(segredo, b'files.download-assinado', hashlib.sha256).digest()
+
+def assinar(chave, hash_conteudo, expira, nome, disposicao):
+    """
+    Calcula a assinatura de uma URL de download.
+
+    O nome e a disposição fazem parte da mensagem assinada, de modo que não
+    podem ser alterados na URL.
+
+    Args:
+        chave: Chave derivada (derivar_chave)
+        hash_conteudo: Hash SHA-256 do conteúdo
+        expira: Momento de expiração (segundos desde a época)
+        nome: Nome do arquivo enviado ao navegador
+        disposicao: 'attachment' ou 'inline'
+
+    Returns:
+        Assinatura em hexadecimal
+    """
+    mensagem = f'{hash_conteudo}\n{int(expira)}\n{disposicao}\n{nome}'.encode('utf-8')
+    return hmac.new(chave, mensagem, hashlib.sha256).hexdigest()
+
+def montar_url(base, caminho_relativo, chave, hash_conteudo, expira, nome, disposicao):
+    """
+    Monta uma URL de download assinada.
+
+    Args:
+        base: URL base do servidor de downloads (ex.: /downloads ou https://arquivos.exemplo.org)
+        caminho_relativo: Caminho do blob relativo à raiz do armazenamento
+        chave: Chave derivada (derivar_chave)
+        hash_conteudo: Hash SHA-256 do conteúdo
+        expira: Momento de expiração (segundos desde a época)
+        nome: Nome do arquivo enviado ao navegador
+        disposicao: 'attachment' ou 'inline'
+
+    Returns:
+        URL assinada
+    """
+    parametros = urlencode({
+        'expira': int(expira),
+        'disposicao': disposicao,
+        'nome': nome,
+        'assinatura': assinar(chave, hash_conteudo, expira, nome, disposicao)
+    })
+    caminho = '/'.join(quote(parte) for parte in caminho_relativo.split(os.sep))
+    return f"{base.rstrip('/')}/{caminho}?{parametros}"
+
+def verificar(chave, hash_conteudo, expira, nome, disposicao, assinatura, agora=None):
+    """
+    Verifica a assinatura e a validade de uma URL de download.
+
+    Args:
+        chave: Chave derivada (derivar_chave)
+        hash_conteudo: Hash SHA-256 do conteúdo
+        expira: Momento de expiração informado na URL
+        nome: Nome informado na URL
+        disposicao: Disposição informada na URL
+        assinatura: Assinatura informada na URL
+        agora: Momento atual (padrão: time.time())
+
+    Returns:
+        Boolean indicando se a URL é válida
+    """
+    try:
+        expira = int(expira)
+    except (TypeError, ValueError):
+        return False
+
+    if expira < (agora if agora is not None else time.time()):
+        return False
+
+    if not PADRAO_HASH.match(hash_conteudo or '') or disposicao not in DISPOSICOES or not assinatura:
+        return False
+
+    esperada = assinar(chave, hash_conteudo, expira, nome, disposicao)
+    return hmac.compare_digest(esperada, assinatura)
+
+def cabecalho_disposicao(nome, disposicao):
+    """Monta o Content-Disposition com o nome em ASCII e em UTF-8 (RFC 6266)."""
+    nome_ascii = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii').replace('"', '').replace('\\', '') or 'arquivo'
+    return f"{disposicao}; filename=\"{nome_ascii}\"; filename*=UTF-8''{quote(nome)}"
+
+
+class VerificadorDownloads:
+    """
+    Aplicação WSGI que serve URLs de download assinadas.
+
+    A URL contém o caminho do blob (ab/cd/<hash>); o caminho em disco é
+    recalculado a partir do hash, sem usar o restante da URL. Com
+    cabecalho_offload, a resposta não leva o conteúdo, apenas o cabeçalho
+    X-Accel-Redirect (Nginx) ou X-Sendfile (Apache, lighttpd) para que o
+    servidor web envie o arquivo; caso contrário o conteúdo é enviado com
+    wsgi.file_wrapper (sendfile, quando o servidor WSGI oferece).
+    """
+
+    def __init__(self, raiz, segredo, niveis=2, cabecalho_offload=None, prefixo_offload='/blobs-internos/'):
+        self.raiz = os.path.abspath(raiz)
+        self.chave = derivar_chave(segredo)
+        self.niveis = niveis
+        self.cabecalho_offload = cabecalho_offload
+        self.prefixo_offload = prefixo_offload
+
+    def _responder_erro(self, start_response, status):
+        corpo = status.encode('utf-8')
+        start_response(status, [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', str(len(corpo)))])
+        return [corpo]
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return self._responder_erro(start_response, '405 Method Not Allowed')
+
+        hash_conteudo = environ.get('PATH_INFO', '').rstrip('/').rsplit('/', 1)[-1]
+        parametros = {chave: valores[0] for chave, valores in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        nome = parametros.get('nome', '')
+        disposicao = parametros.get('disposicao', '')
+
+        if not verificar(self.chave, hash_conteudo, parametros.get('expira'), nome, disposicao,
+                         parametros.get('assinatura')):
+            return self._responder_erro(start_response, '403 Forbidden')
+
+        partes = [hash_conteudo[i * 2:i * 2 + 2] for i in range(self.niveis)]
+        caminho_relativo = '/'.join(partes + [hash_conteudo])
+        caminho = os.path.join(self.raiz, *partes, hash_conteudo)
+
+        try:
+            tamanho = os.path.getsize(caminho)
+        except OSError:
+            return self._responder_erro(start_response, '404 Not Found')
+
+        etag = f'"{hash_conteudo}"'
+        restante = max(0, int(parametros['expira']) - int(time.time()))
+        cabecalhos = [
+            ('Content-Type', mimetypes.guess_type(nome)[0] or 'application/octet-stream'),
+            ('Content-Disposition', cabecalho_disposicao(nome, disposicao)),
+            ('ETag', etag),
+            ('Cache-Control', f'private, max-age={restante}')
+        ]
+
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            start_response('304 Not Modified', cabecalhos)
+            return []
+
+        if self.cabecalho_offload == 'X-Accel-Redirect':
+            start_response('200 OK', cabecalhos + [('X-Accel-Redirect', self.prefixo_offload.rstrip('/') + '/' + caminho_relativo)])
+            return []
+
+        if self.cabecalho_offload == 'X-Sendfile':
+            start_response('200 OK', cabecalhos + [('X-Sendfile', caminho)])
+            return []
+
+        start_response('200 OK', cabecalhos + [('Content-Length', str(tamanho))])
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+
+        arquivo = open(caminho, 'rb')
+        if 'wsgi.file_wrapper' in environ:
+            return environ['wsgi.file_wrapper'](arquivo, TAMANHO_BLOCO)
+        return _ler_em_blocos(arquivo)
+
+
+def _ler_em_blocos(arquivo):
+    with arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+            yield bloco
+
+def criar_verificador():
+    """
+    Cria o verificador a partir das variáveis de ambiente.
+
+    DOWNLOAD_SECRET_KEY (ou SECRET_KEY), BLOB_STORAGE_PATH,
+    DOWNLOAD_OFFLOAD_CABECALHO e DOWNLOAD_OFFLOAD_PREFIXO.
+
+    Returns:
+        Instância de VerificadorDownloads
+    """
+    segredo = os.environ.get('DOWNLOAD_SECRET_KEY') or os.environ.get('SECRET_KEY')
+    if not segredo:
+        raise RuntimeError('Defina DOWNLOAD_SECRET_KEY com o SECRET_KEY da aplicação.')
+
+    return VerificadorDownloads(
+        os.environ.get('BLOB_STORAGE_PATH', 'instance/blobs'),
+        segredo,
+        cabecalho_offload=os.environ.get('DOWNLOAD_OFFLOAD_CABECALHO') or None,
+        prefixo_offload=os.environ.get('DOWNLOAD_OFFLOAD_PREFIXO', '/blobs-internos/')
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    from wsgiref.simple_server import make_server
+
+    parser = argparse.ArgumentParser(description='Verificador de URLs de download assinadas.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8081)
+    args = parser.parse_args()
+
+    with make_server(args.host, args.porta, criar_verificador()) as servidor:
+        print(f'Verificador de downloads em http://{args.host}:{args.porta}/')
+        servidor.serve_forever()
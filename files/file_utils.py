@@ -7,17 +7,17 @@ import os
 import magic
 import hashlib
 import PyPDF2
-import docx2txt
-import tempfile
-from PIL import Image
 from werkzeug.utils import secure_filename
 
 def validar_arquivo(caminho_arquivo, mime_type):
     """
     Valida se o arquivo é de um tipo permitido.
     
+    Apenas a extensão do caminho é consultada, de modo que a validação pode ser
+    feita com o nome do arquivo enviado antes de o conteúdo ser gravado.
+    
     Args:
-        caminho_arquivo: Caminho completo para o arquivo
+        caminho_arquivo: Caminho completo ou nome do arquivo
         mime_type: Tipo MIME do arquivo
         
     Returns:
@@ -53,49 +53,172 @@ def validar_arquivo(caminho_arquivo, mime_type):
     
     return True
 
-def extrair_texto_arquivo(caminho_arquivo, mime_type):
+def obter_tipo_arquivo(mime_type):
     """
-    Extrai o texto de um arquivo, se possível.
+    Determina o tipo de arquivo usado para categorização a partir do tipo MIME.
+    
+    Args:
+        mime_type: Tipo MIME do arquivo
+        
+    Returns:
+        String contendo o tipo ('pdf', 'doc', 'txt' ou 'outro')
+    """
+    if mime_type == 'application/pdf':
+        return 'pdf'
+    elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
+        return 'doc'
+    elif mime_type == 'text/plain':
+        return 'txt'
+    return 'outro'
+
+MIME_DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Propriedades do PDF (nomes do PyMuPDF e do PyPDF2) gravadas nos metadados
+PROPRIEDADES_PDF = {
+    'titulo': ('title', '/Title'),
+    'autor': ('author', '/Author'),
+    'assunto': ('subject', '/Subject'),
+    'palavras_chave': ('keywords', '/Keywords'),
+    'produtor': ('producer', '/Producer'),
+    'criador': ('creator', '/Creator'),
+    'data_criacao': ('creationDate', '/CreationDate'),
+}
+
+def _analisar_pdf_fitz(caminho_arquivo, largura_miniatura):
+    """Analisa um PDF com PyMuPDF, abrindo o documento uma única vez."""
+    import fitz  # PyMuPDF
+    
+    resultado = {'metadados': {}, 'miniatura': None}
+    
+    with fitz.open(caminho_arquivo) as doc:
+        resultado['total_paginas'] = doc.page_count
+        resultado['paginas'] = [page.get_text() for page in doc]
+        
+        info = doc.metadata or {}
+        for chave, (nome_fitz, _) in PROPRIEDADES_PDF.items():
+            if info.get(nome_fitz):
+                resultado['metadados'][chave] = info[nome_fitz]
+        
+        if largura_miniatura and doc.page_count > 0:
+            from .file_thumbnails import renderizar_pagina
+            resultado['miniatura'] = renderizar_pagina(doc, 1, largura_miniatura)
+    
+    return resultado
+
+def _analisar_pdf_pypdf2(caminho_arquivo):
+    """Analisa um PDF com PyPDF2 (sem miniatura), quando o PyMuPDF não está instalado."""
+    resultado = {'metadados': {}, 'miniatura': None}
+    
+    with open(caminho_arquivo, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        resultado['total_paginas'] = len(reader.pages)
+        resultado['paginas'] = [page.extract_text() or '' for page in reader.pages]
+        
+        info = reader.metadata or {}
+        for chave, (_, nome_pypdf2) in PROPRIEDADES_PDF.items():
+            if info.get(nome_pypdf2):
+                resultado['metadados'][chave] = str(info.get(nome_pypdf2))
+    
+    return resultado
+
+def _analisar_docx(caminho_arquivo):
+    """Analisa um documento do Word com python-docx, abrindo-o uma única vez."""
+    import docx
+    
+    doc = docx.Document(caminho_arquivo)
+    
+    partes = [paragrafo.text for paragrafo in doc.paragraphs]
+    for tabela in doc.tables:
+        for linha in tabela.rows:
+            partes.append('\t'.join(celula.text for celula in linha.cells))
+    
+    metadados = {'paragrafos': len(doc.paragraphs)}
+    core_properties = doc.core_properties
+    for chave, propriedade in [('titulo', 'title'), ('autor', 'author'), ('assunto', 'subject'),
+                               ('palavras_chave', 'keywords'), ('data_criacao', 'created'),
+                               ('data_modificacao', 'modified')]:
+        valor = getattr(core_properties, propriedade, None)
+        if valor:
+            metadados[chave] = valor.isoformat() if hasattr(valor, 'isoformat') else valor
+    
+    return {
+        'paginas': None,
+        'total_paginas': None,
+        'texto': '\n'.join(partes),
+        'metadados': metadados,
+        'miniatura': None
+    }
+
+def analisar_documento(caminho_arquivo, mime_type, largura_miniatura=None, propagar_erros=False):
+    """
+    Analisa um documento em uma única passagem.
+    
+    Cada arquivo é aberto e interpretado uma só vez para obter o texto, o
+    texto de cada página, os metadados, o número de páginas e a miniatura
+    da primeira página. PDFs são lidos com PyMuPDF (ou PyPDF2, se o PyMuPDF
+    não estiver instalado) e documentos do Word com python-docx.
     
     Args:
         caminho_arquivo: Caminho completo para o arquivo
         mime_type: Tipo MIME do arquivo
+        largura_miniatura: Largura da miniatura em pixels (None para não gerar)
+        propagar_erros: Se as exceções devem ser propagadas em vez de retornar um resultado vazio
         
     Returns:
-        String contendo o texto extraído ou None se não for possível extrair
+        Dicionário com 'texto', 'paginas' (lista de textos por página ou None),
+        'total_paginas', 'metadados' e 'miniatura' (bytes PNG ou None)
     """
-    texto = None
+    resultado = {'texto': None, 'paginas': None, 'total_paginas': None, 'metadados': {}, 'miniatura': None}
     
     try:
         # Texto simples
         if mime_type == 'text/plain':
             with open(caminho_arquivo, 'r', encoding='utf-8', errors='ignore') as f:
-                texto = f.read()
+                resultado['texto'] = f.read()
         
         # PDF
         elif mime_type == 'application/pdf':
-            texto = ""
-            with open(caminho_arquivo, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        texto += page_text + "\n"
+            try:
+                resultado.update(_analisar_pdf_fitz(caminho_arquivo, largura_miniatura))
+            except ImportError:
+                resultado.update(_analisar_pdf_pypdf2(caminho_arquivo))
+            
+            # Juntar as páginas de uma vez (concatenações sucessivas são quadráticas)
+            resultado['texto'] = '\n'.join(resultado['paginas'])
+            resultado['metadados']['paginas'] = resultado['total_paginas']
         
         # Documentos do Word
-        elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-            texto = docx2txt.process(caminho_arquivo)
+        elif mime_type in ['application/msword', MIME_DOCX]:
+            resultado.update(_analisar_docx(caminho_arquivo))
         
     except Exception as e:
-        print(f"Erro ao extrair texto: {str(e)}")
-        texto = None
+        if propagar_erros:
+            raise
+        print(f"Erro ao analisar documento: {str(e)}")
     
-    return texto
+    return resultado
+
+def extrair_texto_arquivo(caminho_arquivo, mime_type, propagar_erros=False):
+    """
+    Extrai o texto de um arquivo, se possível.
+    
+    Args:
+        caminho_arquivo: Caminho completo para o arquivo
+        mime_type: Tipo MIME do arquivo
+        propagar_erros: Se as exceções devem ser propagadas em vez de retornar None
+        
+    Returns:
+        String contendo o texto extraído ou None se não for possível extrair
+    """
+    return analisar_documento(caminho_arquivo, mime_type, propagar_erros=propagar_erros)['texto']
 
 def gerar_thumbnail(caminho_arquivo, mime_type, tamanho=(200, 200)):
     """
     Gera uma miniatura para o arquivo, se possível.
     
+    A miniatura é guardada no cache de miniaturas (file_thumbnails), pelo
+    hash do conteúdo, e reaproveitada nas chamadas seguintes.
+    
     Args:
         caminho_arquivo: Caminho completo para o arquivo
         mime_type: Tipo MIME do arquivo
@@ -110,22 +233,19 @@ def gerar_thumbnail(caminho_arquivo, mime_type, tamanho=(200, 200)):
         # PDF
         if mime_type == 'application/pdf':
             import fitz  # PyMuPDF
+            from .file_thumbnails import obter_cache_miniaturas, renderizar_pagina
             
-            # Criar nome para a miniatura
-            nome_base = os.path.splitext(os.path.basename(caminho_arquivo))[0]
-            thumbnail_path = os.path.join(tempfile.gettempdir(), f"{nome_base}_thumb.png")
+            cache = obter_cache_miniaturas()
+            hash_conteudo = calcular_hash_arquivo(caminho_arquivo)
+            largura = tamanho[0]
             
-            # Abrir PDF e renderizar primeira página
-            doc = fitz.open(caminho_arquivo)
-            if doc.page_count > 0:
-                page = doc.load_page(0)
-                pix = page.get_pixmap()
-                pix.save(thumbnail_path)
-                
-                # Redimensionar para o tamanho desejado
-                img = Image.open(thumbnail_path)
-                img.thumbnail(tamanho)
-                img.save(thumbnail_path)
+            thumbnail_path = cache.obter(hash_conteudo, largura, 1)
+            if thumbnail_path is None:
+                # Abrir PDF e renderizar a primeira página já na largura desejada
+                doc = fitz.open(caminho_arquivo)
+                if doc.page_count > 0:
+                    thumbnail_path = cache.gravar(hash_conteudo, largura, 1, renderizar_pagina(doc, 1, largura))
+                doc.close()
         
         # Documentos do Word (não é possível gerar miniaturas diretamente)
         # Para documentos de texto, podemos usar ícones padrão
@@ -176,49 +296,8 @@ def obter_metadados_arquivo(caminho_arquivo, mime_type):
         metadados['data_modificacao'] = os.path.getmtime(caminho_arquivo)
         metadados['mime_type'] = mime_type
         
-        # PDF
-        if mime_type == 'application/pdf':
-            with open(caminho_arquivo, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                metadados['paginas'] = len(reader.pages)
-                
-                if reader.metadata:
-                    info = reader.metadata
-                    if info.get('/Title'):
-                        metadados['titulo'] = info.get('/Title')
-                    if info.get('/Author'):
-                        metadados['autor'] = info.get('/Author')
-                    if info.get('/Subject'):
-                        metadados['assunto'] = info.get('/Subject')
-                    if info.get('/Keywords'):
-                        metadados['palavras_chave'] = info.get('/Keywords')
-                    if info.get('/Producer'):
-                        metadados['produtor'] = info.get('/Producer')
-                    if info.get('/Creator'):
-                        metadados['criador'] = info.get('/Creator')
-                    if info.get('/CreationDate'):
-                        metadados['data_criacao'] = info.get('/CreationDate')
-        
-        # Documentos do Word
-        elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-            import docx
-            
-            doc = docx.Document(caminho_arquivo)
-            metadados['paragrafos'] = len(doc.paragraphs)
-            
-            core_properties = doc.core_properties
-            if hasattr(core_properties, 'title') and core_properties.title:
-                metadados['titulo'] = core_properties.title
-            if hasattr(core_properties, 'author') and core_properties.author:
-                metadados['autor'] = core_properties.author
-            if hasattr(core_properties, 'subject') and core_properties.subject:
-                metadados['assunto'] = core_properties.subject
-            if hasattr(core_properties, 'keywords') and core_properties.keywords:
-                metadados['palavras_chave'] = core_properties.keywords
-            if hasattr(core_properties, 'created') and core_properties.created:
-                metadados['data_criacao'] = core_properties.created
-            if hasattr(core_properties, 'modified') and core_properties.modified:
-                metadados['data_modificacao'] = core_properties.modified
+        # Metadados do documento (PDF e Word)
+        metadados.update(analisar_documento(caminho_arquivo, mime_type)['metadados'])
         
     except Exception as e:
         print(f"Erro ao obter metadados: {str(e)}")
@@ -227,14 +306,27 @@ def obter_metadados_arquivo(caminho_arquivo, mime_type):
 
 def verificar_virus(caminho_arquivo):
     """
-    Verifica se o arquivo contém vírus (simulação).
+    Verifica se o arquivo contém vírus, com o verificador antivírus configurado.
+    
+    Uploads são verificados durante o recebimento (file_antivirus); esta
+    função atende arquivos avulsos em disco.
     
     Args:
         caminho_arquivo: Caminho completo para o arquivo
         
     Returns:
-        Boolean indicando se o arquivo está livre de vírus
+        Boolean indicando se o arquivo está livre de vírus (True também
+        quando a verificação está desabilitada ou o verificador não responde)
     """
-    # Simulação de verificação de vírus
-    # Em um ambiente de produção, seria integrado com um antivírus real
-    return True
+    from .file_antivirus import obter_verificador
+    
+    verificador = obter_verificador()
+    if verificador is None:
+        return True
+    
+    with open(caminho_arquivo, 'rb') as origem:
+        resultado = verificador.verificar_stream(origem)
+    
+    if resultado['erro']:
+        print(f"Erro na verificação antivírus: {resultado['erro']}")
+    return not resultado['infectado']
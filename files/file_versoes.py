@@ -0,0 +1,677 @@
+"""
+Versões de arquivos com fragmentação definida pelo conteúdo
+Serra Projetos Educacionais
+
+Substituir o conteúdo de um arquivo cria uma nova versão: o Arquivo passa a
+apontar para o conteúdo novo e o anterior é guardado em VersaoArquivo. O
+conteúdo das versões anteriores é dividido em fragmentos com FastCDC (os
+pontos de corte dependem apenas dos bytes próximos, de modo que uma edição
+altera só os fragmentos em que ocorre) e cada fragmento é gravado como um
+blob. Versões parecidas compartilham os fragmentos iguais, e o espaço
+ocupado pelo histórico cresce com o tamanho das edições, não com a
+quantidade de versões.
+
+A fragmentação é feita no pool de processos de extração, fora da
+requisição. Até ela terminar a versão mantém o blob com o conteúdo inteiro.
+"""
+
+import io
+import os
+import json
+import uuid
+import difflib
+import hashlib
+import datetime
+import mimetypes
+from collections import Counter
+from flask import current_app, send_file
+from werkzeug.utils import secure_filename
+from sqlalchemy import insert, func
+
+# Importar modelos e utilitários
+from .file_models import Blob, PaginaArquivo, VersaoArquivo, FragmentoVersao
+from .file_utils import obter_tipo_arquivo
+from .file_storage import obter_blob_store, registrar_blob, liberar_blob, remover_conteudo_orfao, compactar_blob, TAMANHO_BLOCO
+from .file_search import indexar_arquivo
+from .file_similaridade import remover_similaridade
+from .file_antivirus import aplicar_verificacao
+from .file_cotas import registrar_uso
+
+# Importar extensões da aplicação
+from auth import db
+
+# Tamanhos dos fragmentos (FastCDC): nenhum corte antes do mínimo, corte
+# forçado no máximo e tamanho médio em torno de MEDIA_FRAGMENTO
+MINIMO_FRAGMENTO = 16 * 1024
+MEDIA_FRAGMENTO = 64 * 1024
+MAXIMO_FRAGMENTO = 256 * 1024
+
+# Normalização do FastCDC (nível 2): antes do tamanho médio o corte exige
+# 18 bits zerados no hash; depois, apenas 14. Os tamanhos ficam
+# concentrados perto da média. São usados os bits mais altos, que dependem
+# dos 64 bytes anteriores
+_MASCARA_RIGOROSA = ((1 << 18) - 1) << 46
+_MASCARA_FOLGADA = ((1 << 14) - 1) << 50
+_MASCARA_64_BITS = (1 << 64) - 1
+
+# Tabela do gear hash: um valor pseudoaleatório fixo de 64 bits por byte
+# (precisa ser a mesma em todas as execuções para que os cortes se repitam)
+_ENGRENAGEM = [int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), 'little') for i in range(256)]
+
+# Bytes lidos por vez ao fragmentar
+TAMANHO_LEITURA = 1024 * 1024
+
+# Quantidade máxima de linhas retornadas na comparação entre versões
+MAXIMO_LINHAS_DIFERENCA = 5000
+
+def encontrar_corte(dados, inicio, fim):
+    """
+    Encontra o fim do fragmento que começa em inicio (FastCDC com gear hash).
+
+    Args:
+        dados: Bytes disponíveis
+        inicio: Posição do início do fragmento
+        fim: Fim dos dados disponíveis (o corte nunca passa daqui)
+
+    Returns:
+        Posição (exclusiva) do fim do fragmento
+    """
+    tamanho = fim - inicio
+    if tamanho <= MINIMO_FRAGMENTO:
+        return fim
+
+    normal = inicio + min(tamanho, MEDIA_FRAGMENTO)
+    limite = inicio + min(tamanho, MAXIMO_FRAGMENTO)
+    engrenagem = _ENGRENAGEM
+    posicao = inicio + MINIMO_FRAGMENTO
+    valor = 0
+
+    for byte in dados[posicao:normal]:
+        posicao += 1
+        valor = ((valor << 1) + engrenagem[byte]) & _MASCARA_64_BITS
+        if not valor & _MASCARA_RIGOROSA:
+            return posicao
+
+    for byte in dados[normal:limite]:
+        posicao += 1
+        valor = ((valor << 1) + engrenagem[byte]) & _MASCARA_64_BITS
+        if not valor & _MASCARA_FOLGADA:
+            return posicao
+
+    return limite
+
+def dividir_fragmentos(origem):
+    """
+    Divide um stream em fragmentos definidos pelo conteúdo.
+
+    Args:
+        origem: Objeto com read()
+
+    Returns:
+        Gerador de bytes de cada fragmento, na ordem
+    """
+    dados = bytearray()
+    posicao = 0
+    terminou = False
+
+    while True:
+        # Manter ao menos um fragmento máximo disponível (exceto no fim)
+        if not terminou and len(dados) - posicao < MAXIMO_FRAGMENTO:
+            del dados[:posicao]
+            posicao = 0
+            bloco = origem.read(TAMANHO_LEITURA)
+            if bloco:
+                dados += bloco
+                continue
+            terminou = True
+
+        if posicao >= len(dados):
+            return
+
+        corte = encontrar_corte(dados, posicao, len(dados))
+        yield bytes(dados[posicao:corte])
+        posicao = corte
+
+def fragmentar_conteudo(caminho_arquivo, store):
+    """
+    Função executada no processo de trabalho: divide o conteúdo em
+    fragmentos e grava no armazenamento os que ainda não existem.
+
+    Args:
+        caminho_arquivo: Caminho do conteúdo em disco
+        store: Armazenamento de blobs
+
+    Returns:
+        Lista de (hash, tamanho) dos fragmentos, na ordem
+    """
+    fragmentos = []
+    with open(caminho_arquivo, 'rb') as origem:
+        for dados in dividir_fragmentos(origem):
+            hash_fragmento = hashlib.sha256(dados).hexdigest()
+            store.gravar_bytes(dados, hash_fragmento)
+            fragmentos.append((hash_fragmento, len(dados)))
+    return fragmentos
+
+
+class LeitorFragmentos(io.RawIOBase):
+    """
+    Stream somente leitura com o conteúdo de uma versão, lido fragmento a
+    fragmento do armazenamento.
+    """
+
+    def __init__(self, store, hashes):
+        self._store = store
+        self._hashes = iter(hashes)
+        self._atual = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while True:
+            if self._atual is None:
+                hash_fragmento = next(self._hashes, None)
+                if hash_fragmento is None:
+                    return 0
+                self._atual = self._store.abrir(hash_fragmento)
+
+            lidos = self._atual.readinto(destino)
+            if lidos:
+                return lidos
+
+            self._atual.close()
+            self._atual = None
+
+    def close(self):
+        if self._atual is not None:
+            self._atual.close()
+            self._atual = None
+        super().close()
+
+
+def numero_versao_atual(arquivo):
+    """Retorna o número da versão atual (a seguinte à última versão anterior)."""
+    ultimo = db.session.query(func.max(VersaoArquivo.numero)).filter(VersaoArquivo.arquivo_id == arquivo.id).scalar()
+    return (ultimo or 0) + 1
+
+def criar_versao(arquivo, recebido, nome_original, usuario_id, comentario=None, metadados=None):
+    """
+    Substitui o conteúdo de um arquivo, guardando o conteúdo atual como versão anterior.
+
+    A versão anterior assume a referência do arquivo ao blob atual; o texto
+    extraído é guardado para comparação. O arquivo recebe o conteúdo novo
+    (com o resultado da verificação antivírus) e volta para a fila de extração. A alteração é feita na sessão atual; o
+    commit fica a cargo do chamador, que deve em seguida chamar
+    agendar_extracao (file_workers) para o arquivo e agendar_fragmentacao
+    para a versão retornada.
+
+    Args:
+        arquivo: Objeto Arquivo com conteúdo no armazenamento de blobs
+        recebido: Objeto ReceptorUpload finalizado e não rejeitado
+        nome_original: Nome original do novo arquivo
+        usuario_id: ID do usuário que enviou a nova versão
+        comentario: Descrição da alteração (opcional)
+        metadados: Dicionário com metadados adicionais do upload (opcional)
+
+    Returns:
+        Objeto VersaoArquivo com o conteúdo substituído
+
+    Raises:
+        ValueError: Se o arquivo não tiver conteúdo no armazenamento de blobs
+            ou o conteúdo novo for igual ao atual
+        CotaExcedida: Se o conteúdo novo não couber na cota do proprietário
+            ou da instituição (a versão anterior continua contabilizada)
+    """
+    if arquivo.blob is None:
+        raise ValueError('O conteúdo deste arquivo ainda não foi migrado para o armazenamento de blobs.')
+    if recebido.hash_conteudo == arquivo.hash_conteudo:
+        raise ValueError('O conteúdo enviado é igual ao da versão atual.')
+
+    # O conteúdo atual passa a ser versão anterior; o novo é contabilizado
+    # na cota do proprietário do arquivo
+    registrar_uso(arquivo.usuario_id, arquivo.instituicao_id,
+                  recebido.tamanho - arquivo.tamanho, bytes_versoes=arquivo.tamanho)
+
+    anteriores = db.session.query(
+        func.max(VersaoArquivo.numero), func.max(VersaoArquivo.data_substituicao)
+    ).filter(VersaoArquivo.arquivo_id == arquivo.id).one()
+    dados_metadados = json.loads(arquivo.metadados or '{}')
+
+    versao = VersaoArquivo(
+        arquivo_id=arquivo.id,
+        numero=(anteriores[0] or 0) + 1,
+        nome=arquivo.nome,
+        tamanho=arquivo.tamanho,
+        hash_conteudo=arquivo.hash_conteudo,
+        blob=arquivo.blob,
+        usuario_id=dados_metadados.get('usuario_versao', arquivo.usuario_id),
+        comentario=dados_metadados.get('comentario_versao'),
+        data_criacao=anteriores[1] or arquivo.data_upload,
+        data_substituicao=datetime.datetime.now()
+    )
+    versao.texto = arquivo.conteudo_texto
+    db.session.add(versao)
+
+    # Conteúdo novo (a referência ao blob anterior passou para a versão)
+    nome_seguro = secure_filename(nome_original)
+    nome_base, extensao = os.path.splitext(nome_seguro)
+    arquivo.blob = registrar_blob(recebido.hash_conteudo, recebido.tamanho, recebido.caminho_temporario)
+    arquivo.hash_conteudo = recebido.hash_conteudo
+    arquivo.tamanho = recebido.tamanho
+    arquivo.nome = nome_seguro
+    arquivo.extensao = extensao[1:].lower()
+    arquivo.tipo = obter_tipo_arquivo(recebido.mime_type)
+    arquivo.caminho = f"{nome_base}_{uuid.uuid4().hex}{extensao}"
+
+    # Texto, páginas e metadados da versão anterior deixam de valer até a nova extração
+    dados_metadados = {'mime_type': recebido.mime_type}
+    dados_metadados.update(metadados or {})
+    dados_metadados['usuario_versao'] = usuario_id
+    if comentario:
+        dados_metadados['comentario_versao'] = comentario
+    arquivo.metadados = json.dumps(dados_metadados)
+    arquivo.conteudo_texto = None
+    PaginaArquivo.query.filter_by(arquivo_id=arquivo.id).delete(synchronize_session=False)
+    arquivo.status_extracao = 'pendente'
+    arquivo.erro_extracao = None
+    aplicar_verificacao(arquivo, recebido)
+
+    db.session.flush()
+    indexar_arquivo(arquivo)
+    remover_similaridade(arquivo.id)
+
+    return versao
+
+def agendar_fragmentacao(versao):
+    """
+    Agenda a fragmentação do conteúdo de uma versão anterior.
+
+    Deve ser chamada após o commit que criou a versão. Usa o pool de
+    extração (ou é executada imediatamente, com EXTRACAO_ASSINCRONA
+    desabilitada).
+
+    Args:
+        versao: Objeto VersaoArquivo com o conteúdo inteiro em um blob
+    """
+    from .file_workers import obter_pool_extracao, _remover_temporario
+
+    if versao.blob is None:
+        return
+
+    store = obter_blob_store()
+    caminho_arquivo = store.caminho_local(versao.hash_conteudo)
+    temporario = False
+
+    try:
+        # Conteúdo compactado: a fragmentação usa uma cópia descompactada
+        if not caminho_arquivo:
+            caminho_arquivo = store.extrair_temporario(versao.hash_conteudo)
+            temporario = True
+    except Exception as e:
+        print(f"Erro ao descompactar conteúdo para fragmentação: {str(e)}")
+        return
+
+    versao_id = versao.id
+
+    if not current_app.config.get('EXTRACAO_ASSINCRONA', True):
+        try:
+            registrar_fragmentos(versao_id, fragmentar_conteudo(caminho_arquivo, store))
+        except Exception as e:
+            registrar_fragmentos(versao_id, erro=str(e))
+        finally:
+            if temporario:
+                _remover_temporario(caminho_arquivo)
+        return
+
+    try:
+        obter_pool_extracao().submeter(
+            fragmentar_conteudo,
+            (caminho_arquivo, store),
+            lambda fragmentos, erro: registrar_fragmentos(versao_id, fragmentos, erro),
+            ao_finalizar=(lambda: _remover_temporario(caminho_arquivo)) if temporario else None
+        )
+    except Exception as e:
+        # A versão continua com o conteúdo inteiro e pode ser fragmentada
+        # pelo comando flask arquivos fragmentar-versoes
+        if temporario:
+            _remover_temporario(caminho_arquivo)
+        print(f"Erro ao agendar fragmentação de versão: {str(e)}")
+
+def _registrar_blobs_fragmentos(fragmentos, mime_type=None):
+    """
+    Registra os blobs dos fragmentos, com uma referência por ocorrência.
+
+    Args:
+        fragmentos: Lista de (hash, tamanho)
+        mime_type: Tipo MIME do arquivo, usado na compressão dos fragmentos novos
+
+    Returns:
+        Dicionário hash -> ID do blob
+    """
+    ocorrencias = Counter(hash_fragmento for hash_fragmento, _ in fragmentos)
+    tamanhos = dict(fragmentos)
+    hashes = list(ocorrencias)
+
+    ids = {}
+    for inicio in range(0, len(hashes), 500):
+        ids.update(
+            db.session.query(Blob.hash_conteudo, Blob.id).filter(Blob.hash_conteudo.in_(hashes[inicio:inicio + 500]))
+        )
+
+    # Fragmentos novos (registrar_blob já conta uma referência)
+    for hash_fragmento in hashes:
+        if hash_fragmento not in ids:
+            blob = registrar_blob(hash_fragmento, tamanhos[hash_fragmento])
+            if mime_type is not None:
+                try:
+                    compactar_blob(blob, mime_type)
+                except Exception as e:
+                    # O fragmento continua armazenado sem compressão
+                    print(f"Erro ao compactar fragmento: {str(e)}")
+            ids[hash_fragmento] = blob.id
+            ocorrencias[hash_fragmento] -= 1
+
+    # Demais referências em poucas atualizações (agrupadas pela quantidade)
+    por_quantidade = {}
+    for hash_fragmento, quantidade in ocorrencias.items():
+        if quantidade:
+            por_quantidade.setdefault(quantidade, []).append(ids[hash_fragmento])
+    for quantidade, blob_ids in por_quantidade.items():
+        for inicio in range(0, len(blob_ids), 500):
+            Blob.query.filter(Blob.id.in_(blob_ids[inicio:inicio + 500])).update(
+                {Blob.referencias: Blob.referencias + quantidade}, synchronize_session=False
+            )
+
+    return ids
+
+def registrar_fragmentos(versao_id, fragmentos=None, erro=None):
+    """
+    Grava a lista de fragmentos de uma versão e libera o blob com o conteúdo inteiro.
+
+    Args:
+        versao_id: ID da versão
+        fragmentos: Lista de (hash, tamanho) retornada por fragmentar_conteudo (opcional)
+        erro: Mensagem de erro, se a fragmentação falhou (opcional)
+    """
+    try:
+        versao = VersaoArquivo.query.get(versao_id)
+        if versao is None or versao.blob is None:
+            return
+
+        if erro:
+            print(f"Erro ao fragmentar versão {versao_id}: {erro}")
+            return
+
+        if sum(tamanho for _, tamanho in fragmentos) != versao.tamanho:
+            print(f"Erro ao fragmentar versão {versao_id}: tamanho dos fragmentos diferente do conteúdo")
+            return
+
+        ids = _registrar_blobs_fragmentos(fragmentos, mimetypes.guess_type(versao.nome)[0])
+        db.session.execute(
+            insert(FragmentoVersao),
+            [
+                {'versao_id': versao.id, 'posicao': posicao, 'blob_id': ids[hash_fragmento]}
+                for posicao, (hash_fragmento, _) in enumerate(fragmentos)
+            ]
+        )
+
+        hash_orfao = liberar_blob(versao.blob)
+        versao.blob = None
+        db.session.commit()
+
+        remover_conteudo_orfao(hash_orfao)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao registrar fragmentos da versão: {str(e)}")
+
+def _liberar_blobs(referencias):
+    """
+    Decrementa as referências de vários blobs de uma vez.
+
+    Args:
+        referencias: Dicionário ID do blob -> quantidade de referências liberadas
+
+    Returns:
+        Lista de hashes a remover com remover_conteudo_orfao após o commit
+    """
+    por_quantidade = {}
+    for blob_id, quantidade in referencias.items():
+        por_quantidade.setdefault(quantidade, []).append(blob_id)
+    for quantidade, blob_ids in por_quantidade.items():
+        for inicio in range(0, len(blob_ids), 500):
+            Blob.query.filter(Blob.id.in_(blob_ids[inicio:inicio + 500])).update(
+                {Blob.referencias: Blob.referencias - quantidade}, synchronize_session=False
+            )
+
+    hashes_orfaos = []
+    blob_ids = list(referencias)
+    for inicio in range(0, len(blob_ids), 500):
+        for blob in Blob.query.filter(Blob.id.in_(blob_ids[inicio:inicio + 500]), Blob.referencias <= 0).all():
+            hashes_orfaos.append(blob.hash_conteudo)
+            db.session.delete(blob)
+
+    return hashes_orfaos
+
+def remover_versoes(arquivo):
+    """
+    Remove as versões anteriores de um arquivo, liberando seus fragmentos e blobs.
+
+    A alteração é feita na sessão atual; o commit fica a cargo do chamador.
+
+    Args:
+        arquivo: Objeto Arquivo
+
+    Returns:
+        Lista de hashes a remover com remover_conteudo_orfao após o commit
+    """
+    versao_ids = [versao_id for (versao_id,) in db.session.query(VersaoArquivo.id).filter_by(arquivo_id=arquivo.id)]
+    if not versao_ids:
+        return []
+
+    referencias = Counter(dict(
+        db.session.query(FragmentoVersao.blob_id, func.count())
+        .filter(FragmentoVersao.versao_id.in_(versao_ids))
+        .group_by(FragmentoVersao.blob_id)
+    ))
+    for (blob_id,) in db.session.query(VersaoArquivo.blob_id).filter(
+        VersaoArquivo.id.in_(versao_ids), VersaoArquivo.blob_id.isnot(None)
+    ):
+        referencias[blob_id] += 1
+
+    FragmentoVersao.query.filter(FragmentoVersao.versao_id.in_(versao_ids)).delete(synchronize_session=False)
+    VersaoArquivo.query.filter(VersaoArquivo.id.in_(versao_ids)).delete(synchronize_session=False)
+
+    return _liberar_blobs(referencias)
+
+def listar_versoes(arquivo):
+    """
+    Lista as versões de um arquivo, da mais recente (a atual) para a mais antiga.
+
+    Args:
+        arquivo: Objeto Arquivo
+
+    Returns:
+        Dicionário com a lista de versões e o espaço ocupado pelo histórico
+        (soma dos tamanhos das versões e bytes efetivamente armazenados)
+    """
+    versoes = VersaoArquivo.query.filter_by(arquivo_id=arquivo.id).order_by(VersaoArquivo.numero.desc()).all()
+    quantidades = dict(
+        db.session.query(FragmentoVersao.versao_id, func.count())
+        .filter(FragmentoVersao.versao_id.in_([versao.id for versao in versoes]))
+        .group_by(FragmentoVersao.versao_id)
+    ) if versoes else {}
+    dados_metadados = json.loads(arquivo.metadados or '{}')
+
+    lista = [{
+        'numero': (versoes[0].numero + 1) if versoes else 1,
+        'atual': True,
+        'nome': arquivo.nome,
+        'tamanho': arquivo.tamanho,
+        'hash_conteudo': arquivo.hash_conteudo,
+        'usuario_id': dados_metadados.get('usuario_versao', arquivo.usuario_id),
+        'comentario': dados_metadados.get('comentario_versao'),
+        'data_criacao': (versoes[0].data_substituicao if versoes else arquivo.data_upload).isoformat(),
+        'armazenamento': 'inteiro',
+        'fragmentos': 0
+    }]
+    for versao in versoes:
+        lista.append({
+            'numero': versao.numero,
+            'atual': False,
+            'nome': versao.nome,
+            'tamanho': versao.tamanho,
+            'hash_conteudo': versao.hash_conteudo,
+            'usuario_id': versao.usuario_id,
+            'comentario': versao.comentario,
+            'data_criacao': versao.data_criacao.isoformat(),
+            'data_substituicao': versao.data_substituicao.isoformat(),
+            'armazenamento': 'inteiro' if versao.blob_id else 'fragmentos',
+            'fragmentos': quantidades.get(versao.id, 0)
+        })
+
+    # Blobs distintos usados pelo histórico (cada fragmento compartilhado conta uma vez)
+    blob_ids = {arquivo.blob_id} | {versao.blob_id for versao in versoes}
+    if versoes:
+        blob_ids.update(
+            blob_id for (blob_id,) in db.session.query(FragmentoVersao.blob_id).distinct()
+            .filter(FragmentoVersao.versao_id.in_([versao.id for versao in versoes]))
+        )
+    blob_ids.discard(None)
+    armazenados = db.session.query(
+        func.coalesce(func.sum(func.coalesce(Blob.tamanho_armazenado, Blob.tamanho)), 0)
+    ).filter(Blob.id.in_(blob_ids)).scalar() if blob_ids else 0
+
+    return {
+        'versoes': lista,
+        'bytes_versoes': sum(item['tamanho'] for item in lista),
+        'bytes_armazenados': int(armazenados)
+    }
+
+def obter_versao(arquivo, numero):
+    """
+    Retorna uma versão anterior de um arquivo.
+
+    Args:
+        arquivo: Objeto Arquivo
+        numero: Número da versão
+
+    Returns:
+        Objeto VersaoArquivo ou None (inclusive para a versão atual)
+    """
+    return VersaoArquivo.query.filter_by(arquivo_id=arquivo.id, numero=numero).first()
+
+def abrir_versao(versao):
+    """
+    Abre o conteúdo de uma versão anterior para leitura.
+
+    Args:
+        versao: Objeto VersaoArquivo
+
+    Returns:
+        Caminho local ou objeto de arquivo (somente leitura)
+    """
+    store = obter_blob_store()
+
+    if versao.blob_id:
+        return store.caminho_local(versao.hash_conteudo) or store.abrir(versao.hash_conteudo)
+
+    hashes = [
+        hash_fragmento for (hash_fragmento,) in
+        db.session.query(Blob.hash_conteudo)
+        .join(FragmentoVersao, FragmentoVersao.blob_id == Blob.id)
+        .filter(FragmentoVersao.versao_id == versao.id)
+        .order_by(FragmentoVersao.posicao)
+    ]
+    return io.BufferedReader(LeitorFragmentos(store, hashes), TAMANHO_BLOCO)
+
+def enviar_conteudo_versao(arquivo, versao, como_anexo=True):
+    """
+    Envia o conteúdo de uma versão anterior, montado a partir dos fragmentos.
+
+    O hash do conteúdo da versão é usado como ETag. Versões fragmentadas são
+    enviadas sem suporte a Range.
+
+    Args:
+        arquivo: Objeto Arquivo
+        versao: Objeto VersaoArquivo
+        como_anexo: Se o navegador deve baixar o arquivo (True) ou exibi-lo (False)
+
+    Returns:
+        Resposta Flask
+    """
+    resposta = send_file(
+        abrir_versao(versao),
+        mimetype=mimetypes.guess_type(versao.nome)[0] or 'application/octet-stream',
+        as_attachment=como_anexo,
+        download_name=versao.nome,
+        conditional=True,
+        etag=versao.hash_conteudo,
+        last_modified=versao.data_substituicao
+    )
+
+    if not arquivo.publico:
+        resposta.cache_control.private = True
+
+    return resposta
+
+def obter_texto_versao(arquivo, numero):
+    """
+    Retorna o texto extraído de uma versão (a atual ou uma anterior).
+
+    Args:
+        arquivo: Objeto Arquivo
+        numero: Número da versão
+
+    Returns:
+        Texto extraído ou None se a versão não existir ou não tiver texto
+    """
+    if numero == numero_versao_atual(arquivo):
+        return arquivo.conteudo_texto if arquivo.status_extracao == 'concluido' else None
+
+    versao = obter_versao(arquivo, numero)
+    return versao.texto if versao else None
+
+def comparar_versoes(arquivo, de, para, contexto=3):
+    """
+    Compara o texto extraído de duas versões (diff unificado, por linha).
+
+    Args:
+        arquivo: Objeto Arquivo
+        de: Número da versão de origem
+        para: Número da versão de destino
+        contexto: Linhas de contexto ao redor de cada alteração
+
+    Returns:
+        Dicionário com as linhas do diff (limitadas a MAXIMO_LINHAS_DIFERENCA),
+        a quantidade de linhas adicionadas e removidas e se o resultado foi
+        truncado, ou None se o texto de alguma das versões não estiver disponível
+    """
+    texto_de = obter_texto_versao(arquivo, de)
+    texto_para = obter_texto_versao(arquivo, para)
+    if texto_de is None or texto_para is None:
+        return None
+
+    linhas = []
+    total_linhas = 0
+    adicionadas = 0
+    removidas = 0
+    for linha in difflib.unified_diff(
+        texto_de.splitlines(), texto_para.splitlines(),
+        fromfile=f'versao_{de}', tofile=f'versao_{para}', n=contexto, lineterm=''
+    ):
+        if linha.startswith('+') and not linha.startswith('+++'):
+            adicionadas += 1
+        elif linha.startswith('-') and not linha.startswith('---'):
+            removidas += 1
+        total_linhas += 1
+        if total_linhas <= MAXIMO_LINHAS_DIFERENCA:
+            linhas.append(linha)
+
+    return {
+        'de': de,
+        'para': para,
+        'linhas': linhas,
+        'linhas_adicionadas': adicionadas,
+        'linhas_removidas': removidas,
+        'truncado': total_linhas > MAXIMO_LINHAS_DIFERENCA
+    }
@@ -0,0 +1,333 @@
+"""
+Extração assíncrona de texto dos arquivos enviados ao sistema de gerenciamento de arquivos
+Serra Projetos Educacionais
+"""
+
+import os
+import json
+import atexit
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Importar modelos e utilitários
+from .file_models import Arquivo, PaginaArquivo
+from .file_utils import analisar_documento
+from .file_storage import obter_blob_store, deve_compactar, compactar_blob
+from .file_search import indexar_arquivo
+from .file_similaridade import calcular_assinatura, indexar_similaridade
+from .file_antivirus import em_quarentena
+from .file_sandbox import executar_isolado, limites_configurados, FalhaSandbox, FALHA_ERRO
+
+# Importar extensões da aplicação
+from auth import db
+
+# Estados da extração persistidos em Arquivo.status_extracao
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_FALHOU = 'falhou'
+
+def _remover_temporario(caminho):
+    """Remove a cópia descompactada usada na extração."""
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+def _executar_extracao(caminho_arquivo, mime_type):
+    """
+    Função executada no processo isolado (análise do documento em uma
+    única passagem e assinatura MinHash do texto).
+    """
+    from .file_thumbnails import LARGURA_MINIATURA
+    resultado = analisar_documento(caminho_arquivo, mime_type, largura_miniatura=LARGURA_MINIATURA, propagar_erros=True)
+    resultado['assinatura'] = calcular_assinatura(resultado.get('texto'))
+    return resultado
+
+
+class PoolExtracao:
+    """
+    Pool para extração de texto fora das requisições HTTP.
+
+    Até max_workers tarefas são executadas ao mesmo tempo, cada uma em um
+    processo próprio (executar_isolado), com limites de tempo de CPU e de
+    memória e tempo máximo de execução. Uma tarefa que exceda os limites ou
+    encerre o processo falha sozinha, sem afetar as demais. O resultado é
+    gravado no Arquivo correspondente por uma thread do próprio pool, dentro
+    de um contexto da aplicação. Outras tarefas pesadas (como a fragmentação
+    de versões) usam o mesmo pool por meio de submeter().
+    """
+
+    def __init__(self, app, max_workers=2, limite_cpu=60, limite_memoria=512 * 1024 * 1024, tempo_maximo=120):
+        self.app = app
+        self.max_workers = max_workers
+        self.limite_cpu = limite_cpu
+        self.limite_memoria = limite_memoria
+        self.tempo_maximo = tempo_maximo
+        self._executor = None
+        self._lock = threading.Lock()
+        self._futuros = set()
+        atexit.register(self.encerrar)
+
+    def _obter_executor(self):
+        """Cria sob demanda as threads que acompanham os processos isolados."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='extracao')
+            return self._executor
+
+    def _executar(self, funcao, argumentos, ao_concluir, ao_finalizar):
+        """Executa uma tarefa em processo isolado e entrega o resultado (thread do pool)."""
+        try:
+            try:
+                resultado = executar_isolado(
+                    funcao,
+                    argumentos,
+                    limite_cpu=self.limite_cpu,
+                    limite_memoria=self.limite_memoria,
+                    tempo_maximo=self.tempo_maximo
+                )
+                erro = None
+            except FalhaSandbox as e:
+                resultado, erro = None, e
+            except Exception as e:
+                # Falha ao criar o processo ou ao enviar os argumentos
+                resultado, erro = None, FalhaSandbox(FALHA_ERRO, str(e), excecao=type(e).__name__)
+
+            with self.app.app_context():
+                ao_concluir(resultado, erro)
+        except Exception as e:
+            print(f"Erro ao registrar resultado de tarefa isolada: {str(e)}")
+        finally:
+            if ao_finalizar:
+                ao_finalizar()
+
+    def submeter(self, funcao, argumentos, ao_concluir, ao_finalizar=None):
+        """
+        Envia uma tarefa qualquer para o pool.
+
+        Args:
+            funcao: Função de nível de módulo executada no processo isolado
+            argumentos: Tupla de argumentos da função
+            ao_concluir: Função chamada com (resultado, erro) em um contexto da
+                aplicação; erro é None ou uma FalhaSandbox
+            ao_finalizar: Função chamada sem argumentos ao final, mesmo em caso de erro (opcional)
+        """
+        futuro = self._obter_executor().submit(self._executar, funcao, argumentos, ao_concluir, ao_finalizar)
+        self._futuros.add(futuro)
+        futuro.add_done_callback(self._futuros.discard)
+        return futuro
+
+    def enviar(self, arquivo_id, caminho_arquivo, mime_type, temporario=False):
+        """
+        Envia a extração de um arquivo para o pool.
+
+        Args:
+            arquivo_id: ID do arquivo
+            caminho_arquivo: Caminho do conteúdo em disco
+            mime_type: Tipo MIME do arquivo
+            temporario: Se caminho_arquivo é uma cópia a ser removida ao final
+        """
+        return self.submeter(
+            _executar_extracao,
+            (caminho_arquivo, mime_type),
+            lambda resultado, erro: _concluir_extracao(arquivo_id, resultado, erro),
+            ao_finalizar=(lambda: _remover_temporario(caminho_arquivo)) if temporario else None
+        )
+
+    def aguardar(self):
+        """Aguarda a conclusão das extrações em andamento."""
+        from concurrent.futures import wait
+        while self._futuros:
+            wait(list(self._futuros))
+
+    def encerrar(self):
+        """Encerra o pool (tarefas em execução terminam nos próprios processos)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def obter_pool_extracao():
+    """
+    Retorna o pool de extração da aplicação, criando-o se necessário.
+
+    Returns:
+        Instância de PoolExtracao
+    """
+    pool = current_app.extensions.get('pool_extracao')
+
+    if pool is None:
+        pool = PoolExtracao(
+            current_app._get_current_object(),
+            max_workers=current_app.config.get('EXTRACAO_WORKERS', 2),
+            **limites_configurados()
+        )
+        current_app.extensions['pool_extracao'] = pool
+
+    return pool
+
+def _concluir_extracao(arquivo_id, resultado, erro):
+    """Grava o resultado da extração e compacta o conteúdo (thread do pool)."""
+    registrar_resultado_extracao(arquivo_id, resultado=resultado, erro=erro)
+    compactar_conteudo_arquivo(arquivo_id)
+
+def compactar_conteudo_arquivo(arquivo_id):
+    """
+    Compacta o conteúdo de um arquivo conforme BLOB_COMPRESSAO, fora da requisição de upload.
+
+    Chamada pelo pool depois da extração, que lê o conteúdo sem compressão.
+    Conteúdo compartilhado com arquivos cuja extração ainda não terminou
+    fica para o comando flask arquivos compactar-conteudo.
+
+    Args:
+        arquivo_id: ID do arquivo
+    """
+    try:
+        arquivo = Arquivo.query.get(arquivo_id)
+        if arquivo is None or arquivo.blob is None:
+            return
+
+        mime_type = json.loads(arquivo.metadados or '{}').get('mime_type') or ''
+        if not deve_compactar(arquivo.blob, mime_type):
+            return
+
+        em_extracao = Arquivo.query.filter(
+            Arquivo.blob_id == arquivo.blob_id,
+            Arquivo.id != arquivo.id,
+            Arquivo.status_extracao.in_((STATUS_PENDENTE, STATUS_PROCESSANDO))
+        ).first()
+        if em_extracao:
+            return
+
+        compactar_blob(arquivo.blob, mime_type)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao compactar conteúdo do arquivo {arquivo_id}: {str(e)}")
+
+def agendar_extracao(arquivo):
+    """
+    Agenda a extração de texto de um arquivo já gravado no banco de dados.
+
+    Deve ser chamada após o commit que criou o arquivo e retorna sem aguardar
+    a extração. Com EXTRACAO_ASSINCRONA desabilitada, a extração é feita
+    imediatamente (também em um processo isolado) e a função retorna ao
+    seu término.
+
+    Args:
+        arquivo: Objeto Arquivo
+    """
+    # Conteúdo com ameaça detectada não é aberto pelos extratores
+    if em_quarentena(arquivo):
+        registrar_resultado_extracao(arquivo.id, erro='Arquivo em quarentena: ameaça detectada pela verificação antivírus.')
+        return
+
+    caminho_arquivo = None
+    temporario = False
+    if arquivo.blob:
+        store = obter_blob_store()
+        caminho_arquivo = store.caminho_local(arquivo.blob.hash_conteudo)
+
+        # Conteúdo compactado: a extração usa uma cópia descompactada
+        if not caminho_arquivo and store.existe(arquivo.blob.hash_conteudo):
+            try:
+                caminho_arquivo = store.extrair_temporario(arquivo.blob.hash_conteudo)
+                temporario = True
+            except Exception as e:
+                print(f"Erro ao descompactar conteúdo para extração: {str(e)}")
+
+    if not caminho_arquivo:
+        registrar_resultado_extracao(arquivo.id, erro='Conteúdo do arquivo não disponível em disco.')
+        return
+
+    mime_type = json.loads(arquivo.metadados or '{}').get('mime_type')
+
+    if not current_app.config.get('EXTRACAO_ASSINCRONA', True):
+        try:
+            resultado = executar_isolado(_executar_extracao, (caminho_arquivo, mime_type), **limites_configurados())
+            registrar_resultado_extracao(arquivo.id, resultado=resultado)
+        except FalhaSandbox as e:
+            registrar_resultado_extracao(arquivo.id, erro=e)
+        except Exception as e:
+            registrar_resultado_extracao(arquivo.id, erro=str(e))
+        finally:
+            if temporario:
+                _remover_temporario(caminho_arquivo)
+        return
+
+    try:
+        arquivo.status_extracao = STATUS_PROCESSANDO
+        arquivo.erro_extracao = None
+        arquivo.falha_extracao = None
+        db.session.commit()
+
+        obter_pool_extracao().enviar(arquivo.id, caminho_arquivo, mime_type, temporario=temporario)
+    except Exception as e:
+        # O arquivo volta para a fila e pode ser reprocessado pelo comando
+        # flask arquivos reprocessar-extracoes
+        db.session.rollback()
+        arquivo.status_extracao = STATUS_PENDENTE
+        db.session.commit()
+        if temporario:
+            _remover_temporario(caminho_arquivo)
+        print(f"Erro ao agendar extração de texto: {str(e)}")
+
+def registrar_resultado_extracao(arquivo_id, resultado=None, erro=None):
+    """
+    Grava o resultado de uma análise no arquivo.
+
+    O texto extraído (completo e por página) é gravado e indexado (pesquisa
+    e documentos quase idênticos), os
+    metadados do documento são acrescentados aos do upload e a miniatura é
+    guardada no cache.
+
+    Args:
+        arquivo_id: ID do arquivo
+        resultado: Dicionário retornado por analisar_documento (opcional)
+        erro: FalhaSandbox ou mensagem de erro, se a extração falhou (opcional)
+    """
+    try:
+        arquivo = Arquivo.query.get(arquivo_id)
+        if arquivo is None:
+            return
+
+        if erro:
+            arquivo.status_extracao = STATUS_FALHOU
+            arquivo.erro_extracao = str(erro)
+            arquivo.falha_extracao = getattr(erro, 'tipo', FALHA_ERRO)
+            if isinstance(erro, FalhaSandbox):
+                print(f"Erro na extração do arquivo {arquivo_id}: {erro.como_dict()}")
+        else:
+            arquivo.status_extracao = STATUS_CONCLUIDO
+            arquivo.erro_extracao = None
+            arquivo.falha_extracao = None
+            arquivo.conteudo_texto = resultado['texto']
+
+            # Texto de cada página (PDF), substituindo o de uma extração anterior
+            PaginaArquivo.query.filter_by(arquivo_id=arquivo.id).delete(synchronize_session=False)
+            for numero, texto_pagina in enumerate(resultado.get('paginas') or [], 1):
+                arquivo.paginas.append(PaginaArquivo(numero=numero, texto=texto_pagina))
+
+            # Metadados do upload (tipo MIME, IP, etc.) têm precedência
+            metadados = dict(resultado['metadados'])
+            metadados.update(json.loads(arquivo.metadados or '{}'))
+            # O documento foi aberto sem falhas: as páginas voltam a ser renderizadas
+            metadados.pop('falha_renderizacao', None)
+            arquivo.metadados = json.dumps(metadados, default=str)
+
+            indexar_arquivo(arquivo)
+            indexar_similaridade(arquivo, resultado.get('assinatura'))
+
+            if resultado.get('miniatura') and arquivo.hash_conteudo:
+                from .file_thumbnails import obter_cache_miniaturas, LARGURA_MINIATURA
+                obter_cache_miniaturas().gravar(arquivo.hash_conteudo, LARGURA_MINIATURA, 1, resultado['miniatura'])
+
+        arquivo.data_extracao = datetime.datetime.now()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao registrar resultado da extração: {str(e)}")
@@ -30,6 +30,87 @@ UPLOAD_FOLDER = 'instance/uploads'
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt'}
 
+# Configurações de upload em lote (vários arquivos ou pacotes ZIP por requisição)
+LOTE_MAXIMO_ARQUIVOS = int(os.environ.get('LOTE_MAXIMO_ARQUIVOS', 500))
+LOTE_MAX_CONTENT_LENGTH = int(os.environ.get('LOTE_MAX_CONTENT_LENGTH', 200 * 1024 * 1024))  # corpo da requisição
+LOTE_LIMITE_DESCOMPACTADO = int(os.environ.get('LOTE_LIMITE_DESCOMPACTADO', 1024 * 1024 * 1024))  # conteúdo dos pacotes ZIP
+LOTE_WORKERS = int(os.environ.get('LOTE_WORKERS', 4))  # threads de extração dos pacotes
+
+# Configurações de upload em blocos (arquivos maiores que MAX_CONTENT_LENGTH, retomáveis)
+UPLOAD_SESSOES_PATH = os.environ.get('UPLOAD_SESSOES_PATH', 'instance/upload_sessoes')
+UPLOAD_SESSAO_TAMANHO_MAXIMO = int(os.environ.get('UPLOAD_SESSAO_TAMANHO_MAXIMO', 1024 * 1024 * 1024))  # 1GB
+UPLOAD_SESSAO_TAMANHO_BLOCO = int(os.environ.get('UPLOAD_SESSAO_TAMANHO_BLOCO', 5 * 1024 * 1024))  # padrão por bloco
+UPLOAD_SESSAO_VALIDADE = int(os.environ.get('UPLOAD_SESSAO_VALIDADE', 24 * 60 * 60))  # segundos
+
+# Configurações de armazenamento de conteúdo (blobs endereçados por SHA-256)
+BLOB_STORAGE_BACKEND = os.environ.get('BLOB_STORAGE_BACKEND', 'local')
+BLOB_STORAGE_PATH = os.environ.get('BLOB_STORAGE_PATH', 'instance/blobs')
+BLOB_COMPRESSAO = os.environ.get('BLOB_COMPRESSAO') or None  # 'zlib', 'zstd' (requer zstandard) ou None
+BLOB_COMPRESSAO_NIVEL = int(os.environ['BLOB_COMPRESSAO_NIVEL']) if os.environ.get('BLOB_COMPRESSAO_NIVEL') else None
+BLOB_COMPRESSAO_TIPOS = os.environ.get(
+    'BLOB_COMPRESSAO_TIPOS',
+    'text/plain,application/msword,application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+).split(',')
+BLOB_COMPRESSAO_RAZAO_MAXIMA = float(os.environ.get('BLOB_COMPRESSAO_RAZAO_MAXIMA', 0.9))  # compactado/original
+BLOB_COMPRESSAO_TAMANHO_MINIMO = int(os.environ.get('BLOB_COMPRESSAO_TAMANHO_MINIMO', 4096))  # bytes
+
+# Configurações do cache de conteúdo em memória (arquivos pequenos e muito baixados, por processo)
+CACHE_CONTEUDO_LIMITE_BYTES = int(os.environ.get('CACHE_CONTEUDO_LIMITE_BYTES', 64 * 1024 * 1024))
+CACHE_CONTEUDO_TAMANHO_MAXIMO_ARQUIVO = int(os.environ.get('CACHE_CONTEUDO_TAMANHO_MAXIMO_ARQUIVO', 1024 * 1024))
+
+# Configurações de URLs de download assinadas (servidas por files/file_urls_assinadas.py ou pelo
+# servidor web, sem passar pela aplicação) e de envio delegado ao servidor web
+DOWNLOAD_URL_ASSINADA_BASE = os.environ.get('DOWNLOAD_URL_ASSINADA_BASE')  # ex.: /downloads (None desabilita)
+DOWNLOAD_URL_ASSINADA_VALIDADE = int(os.environ.get('DOWNLOAD_URL_ASSINADA_VALIDADE', 300))  # segundos
+DOWNLOAD_OFFLOAD_CABECALHO = os.environ.get('DOWNLOAD_OFFLOAD_CABECALHO')  # 'X-Sendfile', 'X-Accel-Redirect' ou None
+DOWNLOAD_OFFLOAD_PREFIXO = os.environ.get('DOWNLOAD_OFFLOAD_PREFIXO', '/blobs-internos/')  # location interna do Nginx
+
+# Configurações da verificação antivírus dos uploads (daemon compatível com o clamd)
+ANTIVIRUS_BACKEND = os.environ.get('ANTIVIRUS_BACKEND') or None  # 'clamd' ou None (desabilitada)
+ANTIVIRUS_ENDERECO = os.environ.get('ANTIVIRUS_ENDERECO', '/var/run/clamav/clamd.ctl')  # socket Unix ou host:porta
+ANTIVIRUS_TIMEOUT = int(os.environ.get('ANTIVIRUS_TIMEOUT', 30))  # segundos
+ANTIVIRUS_VALIDADE_VEREDITO = int(os.environ.get('ANTIVIRUS_VALIDADE_VEREDITO', 7 * 24 * 60 * 60))  # segundos (conteúdo limpo)
+
+# Cotas de armazenamento (arquivos e versões anteriores; 0 = sem limite)
+COTA_USUARIO_BYTES = int(os.environ.get('COTA_USUARIO_BYTES', 1024 * 1024 * 1024))
+COTA_INSTITUICAO_BYTES = int(os.environ.get('COTA_INSTITUICAO_BYTES', 10 * 1024 * 1024 * 1024))
+
+# Configurações da exportação de arquivos em pacotes ZIP (gerados em fluxo durante o download)
+EXPORTACAO_ZIP_MAXIMO_ARQUIVOS = int(os.environ.get('EXPORTACAO_ZIP_MAXIMO_ARQUIVOS', 1000))
+
+# Configurações do cache de miniaturas e páginas renderizadas
+MINIATURAS_PATH = os.environ.get('MINIATURAS_PATH', 'instance/miniaturas')
+MINIATURAS_LIMITE_BYTES = int(os.environ.get('MINIATURAS_LIMITE_BYTES', 256 * 1024 * 1024))
+MINIATURAS_TEMPO_MAXIMO = int(os.environ.get('MINIATURAS_TEMPO_MAXIMO', 15))  # segundos para renderizar uma página em processo isolado
+
+# Configurações da detecção de documentos quase idênticos (MinHash/LSH sobre o texto extraído)
+SIMILARIDADE_LIMIAR = float(os.environ.get('SIMILARIDADE_LIMIAR', 0.8))  # similaridade de Jaccard estimada
+SIMILARIDADE_MAXIMO_RESULTADOS = int(os.environ.get('SIMILARIDADE_MAXIMO_RESULTADOS', 10))
+
+# Configurações da manutenção do armazenamento (flask arquivos manutencao, agendado via cron)
+MANUTENCAO_IDADE_TEMPORARIOS = int(os.environ.get('MANUTENCAO_IDADE_TEMPORARIOS', 60 * 60))  # segundos
+MANUTENCAO_IDADE_BLOBS_ORFAOS = int(os.environ.get('MANUTENCAO_IDADE_BLOBS_ORFAOS', 24 * 60 * 60))  # segundos
+MANUTENCAO_PREFIXOS_POR_EXECUCAO = int(os.environ.get('MANUTENCAO_PREFIXOS_POR_EXECUCAO', 16))  # de 256
+MANUTENCAO_LIMITE_BLOBS_BYTES = int(os.environ['MANUTENCAO_LIMITE_BLOBS_BYTES']) if os.environ.get('MANUTENCAO_LIMITE_BLOBS_BYTES') else None
+MANUTENCAO_ESPACO_LIVRE_MINIMO = float(os.environ.get('MANUTENCAO_ESPACO_LIVRE_MINIMO', 0.1))  # fração do disco
+
+# Configurações da verificação de integridade do conteúdo (flask arquivos verificar-integridade)
+INTEGRIDADE_WORKERS = int(os.environ.get('INTEGRIDADE_WORKERS', 2))
+INTEGRIDADE_TAXA_BYTES = int(os.environ.get('INTEGRIDADE_TAXA_BYTES', 16 * 1024 * 1024))  # bytes/s somando todos os workers (0 sem limite)
+INTEGRIDADE_LOTE = int(os.environ.get('INTEGRIDADE_LOTE', 100))
+
+# Configurações de extração de texto (pool de processos em segundo plano)
+EXTRACAO_ASSINCRONA = os.environ.get('EXTRACAO_ASSINCRONA', 'True') == 'True'
+EXTRACAO_WORKERS = int(os.environ.get('EXTRACAO_WORKERS', 2))
+EXTRACAO_LIMITE_CPU = int(os.environ.get('EXTRACAO_LIMITE_CPU', 60))  # segundos de CPU por arquivo
+EXTRACAO_LIMITE_MEMORIA = int(os.environ.get('EXTRACAO_LIMITE_MEMORIA', 512 * 1024 * 1024))  # bytes por processo
+EXTRACAO_TEMPO_MAXIMO = int(os.environ.get('EXTRACAO_TEMPO_MAXIMO', 120))  # segundos de execução por arquivo (processo encerrado ao exceder)
+
+# Configurações das listas de opções dos formulários de tarefas (cache em memória, por processo)
+OPCOES_TAREFAS_VALIDADE = int(os.environ.get('OPCOES_TAREFAS_VALIDADE', 300))  # segundos (defasagem máxima entre processos)
+OPCOES_TAREFAS_MAXIMO_LISTAS = int(os.environ.get('OPCOES_TAREFAS_MAXIMO_LISTAS', 1000))  # listas (tipo x escopo) guardadas
+OPCOES_TAREFAS_MAXIMO_RENDERIZADAS = int(os.environ.get('OPCOES_TAREFAS_MAXIMO_RENDERIZADAS', 200))  # acima disso, busca incremental
+
 # Configurações de email
 MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
 MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -8,7 +8,7 @@ from flask_login import login_required, current_user
 from sqlalchemy import or_, and_, desc, func
 from datetime import datetime, timedelta
 import json
-import os
+import io
 import hashlib
 import secrets
 from werkzeug.utils import secure_filename
@@ -197,18 +197,12 @@ def data_export():
             ]
         }
         
-        # Criar diretório temporário para o arquivo
-        temp_dir = os.path.join(current_app.instance_path, 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
         # Gerar nome de arquivo único
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"dados_usuario_{current_user.id}_{timestamp}.json"
-        filepath = os.path.join(temp_dir, filename)
         
-        # Salvar dados em arquivo JSON
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(dados_usuario, f, ensure_ascii=False, indent=4)
+        # Gerar o JSON em memória (sem arquivo temporário em disco)
+        conteudo = io.BytesIO(json.dumps(dados_usuario, ensure_ascii=False, indent=4).encode('utf-8'))
         
         # Registrar log
         log = LogSistema(
@@ -222,7 +216,7 @@ def data_export():
         
         # Retornar arquivo para download
         return send_file(
-            filepath,
+            conteudo,
             as_attachment=True,
             download_name=filename,
             mimetype='application/json'
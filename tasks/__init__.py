@@ -17,6 +17,15 @@ def init_app(app):
     Args:
         app: Instância da aplicação Flask
     """
+    # Configurações das listas de opções dos formulários (cache em memória, por processo)
+    app.config.setdefault('OPCOES_TAREFAS_VALIDADE', 300)
+    app.config.setdefault('OPCOES_TAREFAS_MAXIMO_LISTAS', 1000)
+    app.config.setdefault('OPCOES_TAREFAS_MAXIMO_RENDERIZADAS', 200)
+    
+    # Invalidar as listas em cache quando usuários, instituições ou projetos mudarem
+    from .task_opcoes import registrar_invalidacao_opcoes
+    registrar_invalidacao_opcoes()
+    
     # Registrar blueprint
     from .task_routes import tasks_bp
     app.register_blueprint(tasks_bp, url_prefix='/tasks')
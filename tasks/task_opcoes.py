@@ -0,0 +1,403 @@
+"""
+Listas de opções (responsável, instituição e projeto) dos formulários de tarefas
+Serra Projetos Educacionais
+
+As listas são guardadas em memória, por processo, como tuplas compactas
+(id, rótulo) ordenadas pelo rótulo, com um índice de prefixos de palavras
+usado pela busca incremental (/tasks/api/opcoes/<tipo>). Cada lista é
+restrita ao que o usuário pode ver: administradores veem todos os
+registros; os demais usuários veem as próprias instituições, os usuários
+dessas instituições e os projetos próprios ou dessas instituições.
+
+As listas são invalidadas quando os registros de origem mudam (eventos da
+sessão do SQLAlchemy, após o commit) e expiram após OPCOES_TAREFAS_VALIDADE
+segundos, o que limita a defasagem entre processos diferentes.
+"""
+
+import time
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from flask import current_app, has_app_context, url_for
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session
+
+from auth import db
+from auth.auth_models import Usuario
+from .task_models import Projeto, Instituicao, UsuarioInstituicao
+
+TIPO_USUARIOS = 'usuarios'
+TIPO_INSTITUICOES = 'instituicoes'
+TIPO_PROJETOS = 'projetos'
+TIPOS_OPCOES = (TIPO_USUARIOS, TIPO_INSTITUICOES, TIPO_PROJETOS)
+
+# Escopo compartilhado pelos administradores
+ESCOPO_TODOS = 'todos'
+
+# Modelos de origem: tipos de lista afetados e atributos que mudam essas listas.
+# Alterações em outros atributos (último login, por exemplo) não invalidam nada.
+ORIGENS_OPCOES = {
+    Usuario: ((TIPO_USUARIOS,), ('nome_completo', 'tipo')),
+    Instituicao: ((TIPO_INSTITUICOES,), ('nome',)),
+    Projeto: ((TIPO_PROJETOS,), ('nome', 'usuario_id', 'instituicao_id')),
+    UsuarioInstituicao: (TIPOS_OPCOES, ('usuario_id', 'instituicao_id')),
+}
+
+def normalizar_rotulo(texto):
+    """
+    Normaliza um rótulo para ordenação e busca (minúsculas, sem acentos).
+
+    Args:
+        texto: Texto original
+
+    Returns:
+        Texto normalizado
+    """
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+class ListaOpcoes:
+    """
+    Lista imutável de opções (id, rótulo) ordenada pelo rótulo normalizado.
+
+    Mantém um índice ordenado com as palavras de todos os rótulos, de modo
+    que a busca por prefixo é feita com bisect, sem percorrer a lista.
+    """
+
+    def __init__(self, linhas):
+        ordenadas = sorted(((normalizar_rotulo(rotulo), id, rotulo or '') for id, rotulo in linhas))
+        self.opcoes = tuple((id, rotulo) for _, id, rotulo in ordenadas)
+        self._rotulos = dict(self.opcoes)
+        self._palavras_opcao = tuple(tuple(normalizado.split()) for normalizado, _, _ in ordenadas)
+
+        indice = sorted(
+            (palavra, posicao)
+            for posicao, palavras in enumerate(self._palavras_opcao)
+            for palavra in set(palavras)
+        )
+        self._palavras = [palavra for palavra, _ in indice]
+        self._posicoes = [posicao for _, posicao in indice]
+
+    def __len__(self):
+        return len(self.opcoes)
+
+    def __contains__(self, id):
+        return id in self._rotulos
+
+    def rotulo(self, id):
+        """Retorna o rótulo da opção com o ID informado, ou None."""
+        return self._rotulos.get(id)
+
+    def buscar(self, termo, limite=20):
+        """
+        Busca as opções cujo rótulo tem palavras começando com os termos.
+
+        Todos os termos precisam casar com o início de alguma palavra do
+        rótulo ("ana sil" encontra "Ana Paula da Silva"). O termo mais longo
+        delimita os candidatos pelo índice; os demais são conferidos só
+        nesses candidatos.
+
+        Args:
+            termo: Texto digitado pelo usuário
+            limite: Número máximo de opções retornadas
+
+        Returns:
+            Lista de tuplas (id, rótulo) na ordem dos rótulos
+        """
+        termos = normalizar_rotulo(termo).split()
+        if not termos:
+            return list(self.opcoes[:limite])
+
+        termos.sort(key=len, reverse=True)
+        principal, demais = termos[0], termos[1:]
+
+        candidatos = set()
+        posicao = bisect.bisect_left(self._palavras, principal)
+        while posicao < len(self._palavras) and self._palavras[posicao].startswith(principal):
+            candidatos.add(self._posicoes[posicao])
+            posicao += 1
+
+        resultado = []
+        for candidato in sorted(candidatos):
+            palavras = self._palavras_opcao[candidato]
+            if all(any(palavra.startswith(t) for palavra in palavras) for t in demais):
+                resultado.append(self.opcoes[candidato])
+                if len(resultado) >= limite:
+                    break
+
+        return resultado
+
+class CacheOpcoes:
+    """
+    Cache em memória (LRU) das listas de opções, por tipo e escopo.
+
+    Cada tipo tem um número de geração incrementado a cada invalidação;
+    uma lista carregada enquanto o tipo era invalidado não é guardada, para
+    que uma leitura concorrente não devolva ao cache dados anteriores à
+    alteração.
+    """
+
+    def __init__(self, validade, maximo_listas):
+        self.validade = validade
+        self.maximo_listas = maximo_listas
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self._itens = OrderedDict()
+        self._geracoes = dict.fromkeys(TIPOS_OPCOES, 0)
+        self._lock = threading.Lock()
+
+    def obter(self, tipo, escopo, carregar):
+        """
+        Retorna a lista do tipo e escopo, carregando-a se necessário.
+
+        Args:
+            tipo: Tipo da lista (TIPO_USUARIOS, TIPO_INSTITUICOES ou TIPO_PROJETOS)
+            escopo: Chave do escopo (hashable)
+            carregar: Função sem argumentos que retorna as linhas (id, rótulo)
+
+        Returns:
+            Instância de ListaOpcoes
+        """
+        chave = (tipo, escopo)
+        agora = time.monotonic()
+
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[0] > agora:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[1]
+            self.falhas += 1
+            geracao = self._geracoes[tipo]
+
+        lista = ListaOpcoes(carregar())
+
+        with self._lock:
+            if self._geracoes[tipo] == geracao:
+                self._itens[chave] = (agora + self.validade, lista)
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.maximo_listas:
+                    self._itens.popitem(last=False)
+
+        return lista
+
+    def invalidar(self, tipos):
+        """
+        Remove do cache todas as listas dos tipos informados.
+
+        Args:
+            tipos: Iterável com os tipos de lista
+        """
+        tipos = set(tipos)
+        if not tipos:
+            return
+
+        with self._lock:
+            for tipo in tipos:
+                self._geracoes[tipo] += 1
+            for chave in [chave for chave in self._itens if chave[0] in tipos]:
+                del self._itens[chave]
+            self.invalidacoes += 1
+
+    def estatisticas(self):
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            Dicionário com listas, acertos, falhas e invalidações
+        """
+        with self._lock:
+            return {
+                'listas': len(self._itens),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'invalidacoes': self.invalidacoes
+            }
+
+def obter_cache_opcoes():
+    """
+    Retorna o cache de listas de opções da aplicação, criando-o se necessário.
+
+    O cache é próprio de cada processo.
+
+    Returns:
+        Instância de CacheOpcoes
+    """
+    cache = current_app.extensions.get('cache_opcoes_tarefas')
+
+    if cache is None:
+        cache = CacheOpcoes(
+            current_app.config.get('OPCOES_TAREFAS_VALIDADE', 300),
+            current_app.config.get('OPCOES_TAREFAS_MAXIMO_LISTAS', 1000)
+        )
+        current_app.extensions['cache_opcoes_tarefas'] = cache
+
+    return cache
+
+def _instituicoes_usuario(usuario_id):
+    """Retorna os IDs das instituições às quais o usuário está vinculado."""
+    return frozenset(
+        id for (id,) in db.session.query(UsuarioInstituicao.instituicao_id)
+        .filter(UsuarioInstituicao.usuario_id == usuario_id)
+    )
+
+def _escopo(tipo, usuario):
+    """
+    Calcula a chave do escopo e a consulta da lista de um tipo para o usuário.
+
+    Usuários vinculados às mesmas instituições compartilham as listas de
+    usuários e de instituições; a de projetos inclui os projetos próprios
+    e por isso é individual.
+
+    Returns:
+        Tupla (escopo, consulta)
+    """
+    if usuario.tipo == 'admin':
+        consultas = {
+            TIPO_USUARIOS: db.session.query(Usuario.id, Usuario.nome_completo),
+            TIPO_INSTITUICOES: db.session.query(Instituicao.id, Instituicao.nome),
+            TIPO_PROJETOS: db.session.query(Projeto.id, Projeto.nome),
+        }
+        return ESCOPO_TODOS, consultas[tipo]
+
+    instituicoes = _instituicoes_usuario(usuario.id)
+
+    if tipo == TIPO_USUARIOS:
+        if not instituicoes:
+            return ('usuario', usuario.id), db.session.query(Usuario.id, Usuario.nome_completo).filter(
+                Usuario.id == usuario.id)
+        membros = db.session.query(UsuarioInstituicao.usuario_id).filter(
+            UsuarioInstituicao.instituicao_id.in_(instituicoes))
+        return instituicoes, db.session.query(Usuario.id, Usuario.nome_completo).filter(
+            or_(Usuario.id == usuario.id, Usuario.id.in_(membros)))
+
+    if tipo == TIPO_INSTITUICOES:
+        return instituicoes, db.session.query(Instituicao.id, Instituicao.nome).filter(
+            Instituicao.id.in_(instituicoes))
+
+    return (usuario.id, instituicoes), db.session.query(Projeto.id, Projeto.nome).filter(
+        or_(Projeto.usuario_id == usuario.id, Projeto.instituicao_id.in_(instituicoes)))
+
+def obter_opcoes(tipo, usuario):
+    """
+    Retorna a lista de opções de um tipo visível para o usuário.
+
+    Args:
+        tipo: Tipo da lista (TIPO_USUARIOS, TIPO_INSTITUICOES ou TIPO_PROJETOS)
+        usuario: Usuário
+
+    Returns:
+        Instância de ListaOpcoes
+
+    Raises:
+        ValueError: Se o tipo for desconhecido
+    """
+    if tipo not in TIPOS_OPCOES:
+        raise ValueError(f"Tipo de lista desconhecido: {tipo}")
+
+    escopo, consulta = _escopo(tipo, usuario)
+    return obter_cache_opcoes().obter(tipo, escopo, lambda: consulta.all())
+
+def aplicar_opcoes(campo, tipo, usuario, rotulo_vazio, selecionado=None, atual=None):
+    """
+    Define as opções de um SelectField a partir da lista em cache.
+
+    Listas maiores que OPCOES_TAREFAS_MAXIMO_RENDERIZADAS são renderizadas
+    só com as primeiras opções e a selecionada; o campo recebe o atributo
+    data-opcoes-url, usado pela busca incremental do template. A validação
+    do formulário continua aceitando qualquer opção visível ao usuário,
+    pois a opção enviada é acrescentada quando está na lista.
+
+    Args:
+        campo: SelectField com coerce=int
+        tipo: Tipo da lista
+        usuario: Usuário
+        rotulo_vazio: Rótulo da opção 0 ('Todos', 'Nenhum', ...)
+        selecionado: ID selecionado (padrão: campo.data)
+        atual: Tupla (id, rótulo) do valor já gravado, mantida mesmo fora do escopo
+
+    Returns:
+        Instância de ListaOpcoes
+    """
+    lista = obter_opcoes(tipo, usuario)
+    maximo = current_app.config.get('OPCOES_TAREFAS_MAXIMO_RENDERIZADAS', 200)
+    selecionado = campo.data if selecionado is None else selecionado
+
+    opcoes = list(lista.opcoes[:maximo])
+    ids = {id for id, _ in opcoes}
+
+    if selecionado and selecionado not in ids and selecionado in lista:
+        opcoes.append((selecionado, lista.rotulo(selecionado)))
+        ids.add(selecionado)
+
+    if atual and atual[0] and atual[0] not in ids:
+        opcoes.append(atual)
+
+    campo.choices = [(0, rotulo_vazio)] + opcoes
+
+    if len(lista) > maximo:
+        campo.render_kw = dict(campo.render_kw or {})
+        campo.render_kw['data-opcoes-url'] = url_for('tasks.api_opcoes', tipo=tipo)
+
+    return lista
+
+def _registrar_alteracao(session, tipos):
+    """Anota na sessão os tipos de lista alterados pela transação em curso."""
+    session.info.setdefault('opcoes_tarefas_alteradas', set()).update(tipos)
+
+def _apos_flush(session, flush_context):
+    """Registra os tipos de lista afetados pelos objetos gravados no flush."""
+    for objeto in session.new | session.deleted:
+        origem = ORIGENS_OPCOES.get(type(objeto))
+        if origem:
+            _registrar_alteracao(session, origem[0])
+
+    for objeto in session.dirty:
+        origem = ORIGENS_OPCOES.get(type(objeto))
+        if origem:
+            estado = inspect(objeto)
+            if any(estado.attrs[atributo].history.has_changes() for atributo in origem[1]):
+                _registrar_alteracao(session, origem[0])
+
+def _ao_executar(estado):
+    """Registra os tipos afetados por INSERT, UPDATE ou DELETE em massa."""
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+
+    mapper = estado.bind_mapper
+    origem = ORIGENS_OPCOES.get(mapper.class_) if mapper is not None else None
+    if origem:
+        _registrar_alteracao(estado.session, origem[0])
+
+def _apos_commit(session):
+    """Invalida, após o commit, as listas alteradas pela transação."""
+    tipos = session.info.pop('opcoes_tarefas_alteradas', None)
+    if tipos and has_app_context():
+        obter_cache_opcoes().invalidar(tipos)
+
+def _apos_transacao(session, transacao):
+    """
+    Descarta as alterações anotadas quando a transação externa termina sem commit.
+
+    O rollback de um savepoint (begin_nested) não descarta nada, pois as
+    alterações anteriores a ele continuam na transação externa.
+    """
+    if transacao.parent is None:
+        session.info.pop('opcoes_tarefas_alteradas', None)
+
+def registrar_invalidacao_opcoes():
+    """
+    Registra os eventos do SQLAlchemy que invalidam as listas de opções.
+
+    Os eventos valem para todas as sessões e são registrados uma única vez.
+    """
+    if event.contains(Session, 'after_flush', _apos_flush):
+        return
+
+    event.listen(Session, 'after_flush', _apos_flush)
+    event.listen(Session, 'do_orm_execute', _ao_executar)
+    event.listen(Session, 'after_commit', _apos_commit)
+    event.listen(Session, 'after_transaction_end', _apos_transacao)
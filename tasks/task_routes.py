@@ -10,11 +10,12 @@ from datetime import datetime, timedelta
 import json
 
 # Importar modelos e configurações
-from .task_models import Tarefa, Subtarefa, ComentarioTarefa, Projeto, Instituicao, EventoCalendario
+from .task_models import Tarefa, Subtarefa, ComentarioTarefa, EventoCalendario
 from .task_models import ClassificacaoTarefa, StatusTarefa, PrioridadeTarefa
 from .task_forms import (TarefaForm, SubtarefaForm, ComentarioTarefaForm, ProjetoForm, 
                          InstituicaoForm, EventoCalendarioForm, FiltroTarefasForm)
 from .task_utils import sincronizar_com_google_calendar, notificar_usuario
+from .task_opcoes import TIPO_USUARIOS, TIPO_INSTITUICOES, TIPO_PROJETOS, TIPOS_OPCOES, aplicar_opcoes, obter_opcoes
 
 # Importar extensões da aplicação
 from auth import db
@@ -31,17 +32,6 @@ def listar_tarefas():
     """
     form = FiltroTarefasForm()
     
-    # Carregar opções para os campos de seleção
-    form.responsavel_id.choices = [(0, 'Todos')] + [
-        (u.id, u.nome_completo) for u in Usuario.query.all()
-    ]
-    form.instituicao_id.choices = [(0, 'Todas')] + [
-        (i.id, i.nome) for i in Instituicao.query.all()
-    ]
-    form.projeto_id.choices = [(0, 'Todos')] + [
-        (p.id, p.nome) for p in Projeto.query.all()
-    ]
-    
     # Obter parâmetros de filtro
     classificacao = request.args.get('classificacao', '')
     status = request.args.get('status', '')
@@ -51,6 +41,14 @@ def listar_tarefas():
     projeto_id = request.args.get('projeto_id', '0')
     termo = request.args.get('termo', '')
     
+    # Carregar opções para os campos de seleção (listas em cache, restritas ao usuário)
+    aplicar_opcoes(form.responsavel_id, TIPO_USUARIOS, current_user, 'Todos',
+                   selecionado=request.args.get('responsavel_id', 0, type=int))
+    aplicar_opcoes(form.instituicao_id, TIPO_INSTITUICOES, current_user, 'Todas',
+                   selecionado=request.args.get('instituicao_id', 0, type=int))
+    aplicar_opcoes(form.projeto_id, TIPO_PROJETOS, current_user, 'Todos',
+                   selecionado=request.args.get('projeto_id', 0, type=int))
+    
     # Construir query base
     query = Tarefa.query.filter(
         or_(
@@ -125,16 +123,10 @@ def nova_tarefa():
     """
     form = TarefaForm()
     
-    # Carregar opções para os campos de seleção
-    form.responsavel_id.choices = [(0, 'Nenhum')] + [
-        (u.id, u.nome_completo) for u in Usuario.query.all()
-    ]
-    form.instituicao_id.choices = [(0, 'Nenhuma')] + [
-        (i.id, i.nome) for i in Instituicao.query.all()
-    ]
-    form.projeto_id.choices = [(0, 'Nenhum')] + [
-        (p.id, p.nome) for p in Projeto.query.all()
-    ]
+    # Carregar opções para os campos de seleção (listas em cache, restritas ao usuário)
+    aplicar_opcoes(form.responsavel_id, TIPO_USUARIOS, current_user, 'Nenhum')
+    aplicar_opcoes(form.instituicao_id, TIPO_INSTITUICOES, current_user, 'Nenhuma')
+    aplicar_opcoes(form.projeto_id, TIPO_PROJETOS, current_user, 'Nenhum')
     
     if form.validate_on_submit():
         try:
@@ -242,16 +234,14 @@ def editar_tarefa(tarefa_id):
     
     form = TarefaForm(obj=tarefa)
     
-    # Carregar opções para os campos de seleção
-    form.responsavel_id.choices = [(0, 'Nenhum')] + [
-        (u.id, u.nome_completo) for u in Usuario.query.all()
-    ]
-    form.instituicao_id.choices = [(0, 'Nenhuma')] + [
-        (i.id, i.nome) for i in Instituicao.query.all()
-    ]
-    form.projeto_id.choices = [(0, 'Nenhum')] + [
-        (p.id, p.nome) for p in Projeto.query.all()
-    ]
+    # Carregar opções para os campos de seleção (listas em cache, restritas ao usuário);
+    # os valores já gravados continuam válidos mesmo que estejam fora do escopo do usuário
+    aplicar_opcoes(form.responsavel_id, TIPO_USUARIOS, current_user, 'Nenhum',
+                   atual=(tarefa.responsavel_id, tarefa.responsavel.nome_completo) if tarefa.responsavel else None)
+    aplicar_opcoes(form.instituicao_id, TIPO_INSTITUICOES, current_user, 'Nenhuma',
+                   atual=(tarefa.instituicao_id, tarefa.instituicao.nome) if tarefa.instituicao else None)
+    aplicar_opcoes(form.projeto_id, TIPO_PROJETOS, current_user, 'Nenhum',
+                   atual=(tarefa.projeto_id, tarefa.projeto.nome) if tarefa.projeto else None)
     
     if form.validate_on_submit():
         try:
@@ -645,6 +635,31 @@ def excluir_comentario(comentario_id):
     
     return redirect(url_for('tasks.visualizar_tarefa', tarefa_id=tarefa_id))
 
+# API de busca nas listas de opções
+@tasks_bp.route('/api/opcoes/<tipo>')
+@login_required
+def api_opcoes(tipo):
+    """
+    Busca incremental nas opções de responsável, instituição ou projeto.
+    
+    Usada pelos campos de seleção cujas listas são grandes demais para
+    serem renderizadas por inteiro. Parâmetros: q (início das palavras do
+    rótulo) e limite (padrão 20, máximo 100).
+    """
+    if tipo not in TIPOS_OPCOES:
+        return jsonify({'error': 'Tipo de lista inválido'}), 404
+    
+    termo = request.args.get('q', '')
+    limite = min(max(request.args.get('limite', 20, type=int), 1), 100)
+    
+    try:
+        opcoes = obter_opcoes(tipo, current_user).buscar(termo, limite)
+    except Exception as e:
+        print(f"Erro ao buscar opções ({tipo}): {str(e)}")
+        return jsonify({'error': 'Erro ao buscar opções'}), 500
+    
+    return jsonify([{'id': id, 'rotulo': rotulo} for id, rotulo in opcoes])
+
 # Funções auxiliares
 def obter_cor_por_prioridade(prioridade):
     """